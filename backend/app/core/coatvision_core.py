@@ -1,71 +1,152 @@
 # backend/app/core/coatvision_core.py
+from __future__ import annotations
+
 import base64
 import os
-from typing import Dict, Optional
+from typing import TYPE_CHECKING, Dict, Optional
+
+from backend.app.lazy import lazy_import
+from backend.app.services import defects as defect_stage, lighting as lighting_stage, parameters, similarity
+from backend.app.services.metrics import stage
+
+if TYPE_CHECKING:
+    from backend.app.services.calibration.profiles import Profile
+    from backend.app.services.parameters import AnalysisParameters
+
+# cv2/numpy lastes først ved første analyse, ikke når routerne importeres
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+# Normaliseringer, Canny-terskler og CVI/CQI-vekter er versjonerte parametere (services/parameters.py)
+ANALYSIS_REVISION = parameters.ANALYSIS_REVISION
+# Rammefarge per defekttype i overlay (BGR)
+DEFECT_COLORS = {"high_spot": (0, 165, 255), "hologram": (255, 0, 255), "streak": (0, 0, 255)}
+
 
-import cv2
-import numpy as np
+def analysis_version() -> str:
+    """Short fingerprint of everything that changes the metrics for a given image.
 
-# Analysis configuration constants
-MAX_HUE_STD_DEVIATION = 90
-MAX_LAPLACIAN_VARIANCE = 5000
+    It is the version of the active parameter set. Stored results with another
+    version are stale (see services/reanalysis.py).
+    """
+    return parameters.current().version
 
 
 def decode_base64_image(base64_str: str) -> np.ndarray:
-    img_data = base64.b64decode(base64_str)
-    nparr = np.frombuffer(img_data, np.uint8)
-    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    with stage("decode"):
+        img_data = base64.b64decode(base64_str)
+        nparr = np.frombuffer(img_data, np.uint8)
+        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
     if img is None:
         raise ValueError("Decoded image is None. The input may not be a valid base64-encoded image.")
     return img
 
 
+def decode_image_bytes(data: bytes) -> np.ndarray:
+    """Decode raw JPEG/PNG bytes; np.frombuffer is a view, so no copy before imdecode."""
+    with stage("decode"):
+        img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("Decoded image is None. The body may not be a valid JPEG/PNG image.")
+    return img
+
+
 def encode_image_base64(img: np.ndarray) -> str:
     _, buffer = cv2.imencode('.png', img)
     return base64.b64encode(buffer.tobytes()).decode('utf-8')
 
 
-def analyze_coating(image: np.ndarray) -> Dict:
-    if image is None:
-        raise ValueError("Image could not be loaded")
-
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+def analyze_coating(image: np.ndarray, calibration: Optional["Profile"] = None,
+                    lighting: Optional[str] = None, params: Optional["AnalysisParameters"] = None) -> Dict:
+    """Heuristic coating metrics.
 
-    edges = cv2.Canny(gray, 50, 150)
-    edge_density = float(np.count_nonzero(edges) / edges.size)
+    With `calibration`, its lookup table is applied to `image` in place first. With
+    a `lighting` mode other than "off" (default COATVISION_LIGHTING), illumination is
+    then flattened in place (services/lighting.py) and the colour statistics
+    (hue spread, saturation, brightness) are computed over the segmented panel only.
+    The caller's frame is modified in both cases. The result carries a 48-value
+    panel descriptor ("embedding") for similarity search (services/similarity.py)
+    and localized defect regions with bounding boxes (services/defects.py).
 
-    hue_channel = hsv[:, :, 0].astype(np.float32)
-    hue_std = float(np.std(hue_channel))
-    color_uniformity = max(0, 1 - (hue_std / MAX_HUE_STD_DEVIATION))
-
-    saturation = hsv[:, :, 1]
-    mean_saturation = float(np.mean(saturation.astype(np.float32)))
+    Thresholds and weights come from `params`, by default the active parameter set
+    (services/parameters.py), read once per call; its version is returned as
+    "analysis_version".
+    """
+    if image is None:
+        raise ValueError("Image could not be loaded")
+    params = params or parameters.current()
+
+    if calibration is not None:
+        from backend.app.services.calibration import profiles
+
+        with stage("calibration"):
+            profiles.apply(image, calibration)
+
+    mode = lighting_stage.resolve_mode(lighting)
+    normalized = None
+    if mode != "off":
+        with stage("lighting"):
+            normalized = lighting_stage.normalize(image, mode)
+
+    with stage("cvtcolor_gray"):
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    with stage("cvtcolor_hsv"):
+        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+
+    with stage("canny"):
+        edges = cv2.Canny(gray, params.canny_low, params.canny_high)
+        edge_density = float(np.count_nonzero(edges) / edges.size)
+
+    if normalized is not None and normalized.mask is not None:
+        # Bare panelet: én maskert passering gir snitt og spredning for H, S og V
+        with stage("hsv_panel_stats"):
+            means, stds = cv2.meanStdDev(hsv, mask=normalized.mask)
+            hue_std = float(stds[0, 0])
+            mean_saturation, mean_brightness = float(means[1, 0]), float(means[2, 0])
+    else:
+        with stage("hue_std"):
+            hue_channel = hsv[:, :, 0].astype(np.float32)
+            hue_std = float(np.std(hue_channel))
+
+        with stage("saturation_brightness"):
+            saturation = hsv[:, :, 1]
+            mean_saturation = float(np.mean(saturation.astype(np.float32)))
+
+            value = hsv[:, :, 2]
+            mean_brightness = float(np.mean(value.astype(np.float32)))
+    color_uniformity = max(0, 1 - (hue_std / params.max_hue_std))
     saturation_score = mean_saturation / 255.0
-
-    value = hsv[:, :, 2]
-    mean_brightness = float(np.mean(value.astype(np.float32)))
     brightness_score = mean_brightness / 255.0
 
-    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-    coverage = float(np.count_nonzero(binary) / binary.size)
+    with stage("otsu"):
+        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        coverage = float(np.count_nonzero(binary) / binary.size)
+
+    with stage("laplacian"):
+        laplacian = cv2.Laplacian(gray, cv2.CV_64F)
+        laplacian_var = float(laplacian.var())
+        smoothness = max(0, 1 - (laplacian_var / params.max_laplacian_variance))
 
-    laplacian = cv2.Laplacian(gray, cv2.CV_64F)
-    laplacian_var = float(laplacian.var())
-    smoothness = max(0, 1 - (laplacian_var / MAX_LAPLACIAN_VARIANCE))
+    panel_mask = normalized.mask if normalized is not None else None
+    with stage("defects"):
+        found = defect_stage.detect(gray, edges, laplacian, panel_mask)
 
+    with stage("embedding"):
+        embedding = similarity.describe(hsv, laplacian, panel_mask)
+
+    cvi_weights, cqi_weights = params.cvi_weights, params.cqi_weights
     cvi = (
-        color_uniformity * 0.3 +
-        saturation_score * 0.25 +
-        smoothness * 0.25 +
-        (1 - edge_density) * 0.2
+        color_uniformity * cvi_weights["color_uniformity"] +
+        saturation_score * cvi_weights["saturation"] +
+        smoothness * cvi_weights["smoothness"] +
+        (1 - edge_density) * cvi_weights["flatness"]
     ) * 100
 
     cqi = (
-        coverage * 0.35 +
-        color_uniformity * 0.25 +
-        smoothness * 0.25 +
-        brightness_score * 0.15
+        coverage * cqi_weights["coverage"] +
+        color_uniformity * cqi_weights["color_uniformity"] +
+        smoothness * cqi_weights["smoothness"] +
+        brightness_score * cqi_weights["brightness"]
     ) * 100
 
     return {
@@ -79,20 +160,31 @@ def analyze_coating(image: np.ndarray) -> Dict:
         "brightness_score": round(brightness_score * 100, 2),
         "laplacian_variance": round(laplacian_var, 2),
         "note": "OpenCV-based heuristic analysis - no ML model",
+        "analysis_version": params.version,
+        "defects": [d.as_dict() for d in found],
+        "defect_counts": defect_stage.summary(found),
+        "embedding": embedding.tolist(),
+        **({"calibration": calibration.ref()} if calibration is not None else {}),
+        **({"lighting": {"mode": normalized.mode, "panel_fraction": normalized.panel_fraction,
+                         "mean_gain": normalized.mean_gain}} if normalized is not None else {}),
     }
 
 
-def process_image_file(file_path: str, output_dir: Optional[str] = None) -> Dict:
-    image = cv2.imread(file_path)
+def process_image_file(file_path: str, output_dir: Optional[str] = None,
+                       calibration: Optional["Profile"] = None, lighting: Optional[str] = None) -> Dict:
+    with stage("imread"):
+        image = cv2.imread(file_path)
     if image is None:
         raise ValueError(f"Could not read image: {file_path}")
 
-    metrics = analyze_coating(image)
+    metrics = analyze_coating(image, calibration, lighting)
 
     if output_dir:
-        overlay = create_analysis_overlay(image, metrics)
+        with stage("overlay"):
+            overlay = create_analysis_overlay(image, metrics)
         output_path = os.path.join(output_dir, f"analyzed_{os.path.basename(file_path)}")
-        cv2.imwrite(output_path, overlay)
+        with stage("imwrite"):
+            cv2.imwrite(output_path, overlay)
         metrics["output_path"] = output_path
 
     return metrics
@@ -101,13 +193,20 @@ def process_image_file(file_path: str, output_dir: Optional[str] = None) -> Dict
 def create_analysis_overlay(image: np.ndarray, metrics: Dict) -> np.ndarray:
     result = image.copy()
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    edges = cv2.Canny(gray, 50, 150)
+    params = parameters.current()
+    edges = cv2.Canny(gray, params.canny_low, params.canny_high)
 
     edge_overlay = np.zeros_like(image)
     edge_overlay[edges > 0] = [0, 255, 0]
 
     result = cv2.addWeighted(result, 0.7, edge_overlay, 0.3, 0)
 
+    for defect in metrics.get("defects", []):
+        x, y, w, h = defect["bbox"]
+        color = DEFECT_COLORS.get(defect["type"], (255, 255, 255))
+        cv2.rectangle(result, (x, y), (x + w, y + h), color, 2)
+        cv2.putText(result, defect["type"], (x, max(12, y - 6)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
+
     font = cv2.FONT_HERSHEY_SIMPLEX
     y_offset = 30
     for key in ['cvi', 'cqi', 'coverage']:
@@ -4,22 +4,11 @@ import importlib
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 
-from .db import Base, engine
-from sqlmodel import SQLModel
-
-
-RequestLoggingMiddleware = None  # Middleware import skipped: module not found
+from backend.app.middleware import RequestLoggingMiddleware
 
 # Opprett FastAPI-app her (ikke importer fra ikke-eksisterende modul)
 app = FastAPI(title="CoatVision Core")
-# Sørg for at tabellene finnes (bruker coatvision.db fra .env)
-Base.metadata.create_all(bind=engine)
-# Også opprett SQLModel-tabeller (CalibrationEvent, CalibrationWeightsProfile)
-try:
-    pass
-    SQLModel.metadata.create_all(bind=engine)
-except Exception:
-    pass
+# Tabeller (også SQLModel-tabellene) opprettes ved første DB-tilgang (se db.init_db), ikke ved import
 
 # Allow CORS for admin dashboard and mobile clients during MVP.
 _raw_origins = os.getenv("COATVISION_CORS_ORIGINS", "")
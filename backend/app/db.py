@@ -1,10 +1,18 @@
 import os
+import sys
+import threading
+from contextlib import contextmanager
 from pathlib import Path
-from sqlalchemy import create_engine
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Tuple
+from sqlalchemy import create_engine, event, insert
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 from sqlalchemy.orm.session import Session as SA_Session
-from sqlmodel import Session as SQLModelSession
+
+from backend.app.services.tracing import instrument_engine
+
+if TYPE_CHECKING:
+    from sqlmodel import Session as SQLModelSession
 
 try:
     # from app.services.config import DATABASE_URL, BASE_DIR  # foretrukket sti
@@ -30,30 +38,124 @@ except Exception:
     DATABASE_URL = _raw.strip().strip('"').strip("'") or _default_db_url
     BASE_DIR = _BASE_DIR
 
+# Produksjonsprofil for SQLite (settes på hver ny tilkobling). WAL lar lesere gå
+# parallelt med én skriver, og synchronous=NORMAL i WAL-modus fsync-er bare ved
+# checkpoint i stedet for ved hver commit.
+SQLITE_JOURNAL_MODE = os.getenv("COATVISION_SQLITE_JOURNAL_MODE", "WAL").upper()
+SQLITE_SYNCHRONOUS = os.getenv("COATVISION_SQLITE_SYNCHRONOUS", "NORMAL").upper()
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("COATVISION_SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_BYTES = int(os.getenv("COATVISION_SQLITE_MMAP_MB", "256")) * 1024 * 1024
+SQLITE_CACHE_KB = int(os.getenv("COATVISION_SQLITE_CACHE_KB", "16384"))
+# Tilkoblingspool for server-databaser (Postgres o.l.)
+DB_POOL_SIZE = int(os.getenv("COATVISION_DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("COATVISION_DB_MAX_OVERFLOW", "10"))
+DB_POOL_RECYCLE_S = int(os.getenv("COATVISION_DB_POOL_RECYCLE_S", "1800"))
+
+
+def _sqlite_pragmas(journal_mode: str) -> List[str]:
+    return [
+        f"PRAGMA journal_mode={journal_mode}",
+        f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}",
+        f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA mmap_size={SQLITE_MMAP_BYTES}",
+        f"PRAGMA cache_size=-{SQLITE_CACHE_KB}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+
+
+def tune_sqlite(engine, in_memory: bool) -> None:
+    # WAL gir ingen mening for :memory:-databaser
+    pragmas = _sqlite_pragmas("MEMORY" if in_memory else SQLITE_JOURNAL_MODE)
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, _record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+def resolve_sqlite_url(url: str) -> Tuple[str, bool]:
+    """Absolute-path form of a file SQLite URL (dirs created) and whether it is in-memory."""
+    prefix, _, db_path = url.partition("///")
+    in_memory = db_path in ("", ":memory:") or "mode=memory" in url
+    if not in_memory:
+        # Resolve relative path (e.g., ./data/dev.db) from repo root
+        if db_path.startswith("./"):
+            abs_db_path = os.path.join(str(BASE_DIR), db_path[2:])
+        else:
+            abs_db_path = db_path
+        os.makedirs(os.path.dirname(abs_db_path) or ".", exist_ok=True)
+        url = f"{prefix}///{Path(abs_db_path).resolve().as_posix()}"
+    return url, in_memory
+
+
+def pool_kwargs() -> Dict:
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_recycle": DB_POOL_RECYCLE_S,
+        "pool_pre_ping": True,
+    }
+
+
+def build_engine(url: str, tuned: bool = True):
+    """Create an engine for `url`: SQLite gets the pragma profile, others a pre-pinged pool."""
+    if not url.startswith("sqlite"):
+        return create_engine(url, **pool_kwargs()) if tuned else create_engine(url)
+
+    url, in_memory = resolve_sqlite_url(url)
+    new_engine = create_engine(url, connect_args={"check_same_thread": False})
+    if tuned:
+        tune_sqlite(new_engine, in_memory)
+    return new_engine
+
+
 # Sett opp SQLAlchemy-engine og session
 print(f"[db] DATABASE_URL={DATABASE_URL!r}")
-connect_args = {}
-if DATABASE_URL.startswith("sqlite"):
-    connect_args = {"check_same_thread": False}
-
-if DATABASE_URL.startswith("sqlite:///"):
-    db_path = DATABASE_URL.replace("sqlite:///", "", 1)
-    # Resolve relative path (e.g., ./data/dev.db) from repo root
-    if db_path.startswith("./"):
-        abs_db_path = os.path.join(str(BASE_DIR), db_path[2:])
-    else:
-        abs_db_path = db_path
-    os.makedirs(os.path.dirname(abs_db_path), exist_ok=True)
-    posix_db_path = Path(abs_db_path).resolve().as_posix()
-    engine = create_engine(f"sqlite:///{posix_db_path}", connect_args=connect_args)
-else:
-    engine = create_engine(DATABASE_URL, connect_args=connect_args)
+engine = build_engine(DATABASE_URL)
+# SQL-kall registreres som "db"-spans på aktiv request-trace
+instrument_engine(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+_schema_lock = threading.Lock()
+_schema_table_count = 0
+
+
+def _metadata_sets():
+    sets = [Base.metadata]
+    # SQLModel-tabeller tas bare med hvis sqlmodel allerede er importert av en modell
+    sqlmodel = sys.modules.get("sqlmodel")
+    if sqlmodel is not None:
+        sets.append(sqlmodel.SQLModel.metadata)
+    return sets
+
+
+def init_db() -> None:
+    """Create missing tables for every model imported so far.
+
+    Called lazily from `get_db()` instead of at app import, so cold starts don't pay
+    for `create_all`. Re-runs only when new models have been registered since last call.
+    """
+    global _schema_table_count
+    metadata_sets = _metadata_sets()
+    if sum(len(m.tables) for m in metadata_sets) == _schema_table_count:
+        return
+    with _schema_lock:
+        count = sum(len(m.tables) for m in metadata_sets)
+        if count == _schema_table_count:
+            return
+        for metadata in metadata_sets:
+            metadata.create_all(bind=engine)
+        _schema_table_count = count
+
 
 def get_db():
+    init_db()
     db: SA_Session = SessionLocal()
     try:
         yield db
@@ -61,9 +163,71 @@ def get_db():
         db.close()
 
 
-def get_session() -> SQLModelSession:
+@contextmanager
+def unit_of_work(db: Optional[SA_Session] = None) -> Iterator[SA_Session]:
+    """Run a batch of writes as one transaction: one commit (one fsync) at the end.
+
+    Store functions call `commit(db)`, which only flushes inside a unit of work, so
+    many creates/inserts can be grouped without changing their code. Nested units on
+    the same session join the outermost one. Rolls back on error.
+    """
+    owns_session = db is None
+    session = SessionLocal() if owns_session else db
+    depth = session.info.get("uow_depth", 0)
+    session.info["uow_depth"] = depth + 1
+    try:
+        yield session
+        if depth == 0:
+            session.commit()
+    except Exception:
+        if depth == 0:
+            session.rollback()
+        raise
+    finally:
+        session.info["uow_depth"] = depth
+        if owns_session:
+            session.close()
+
+
+def commit(db: SA_Session) -> None:
+    """Commit, unless an enclosing `unit_of_work` will commit for us (then just flush)."""
+    if db.info.get("uow_depth"):
+        db.flush()
+    else:
+        db.commit()
+
+
+def bulk_insert(db: SA_Session, model, rows: Iterable[Dict], chunk_size: int = 1000) -> int:
+    """executemany-insert `rows` in chunks; does not commit (use inside `unit_of_work`)."""
+    total = 0
+    chunk: List[Dict] = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            db.execute(insert(model), chunk)
+            total += len(chunk)
+            chunk = []
+    if chunk:
+        db.execute(insert(model), chunk)
+        total += len(chunk)
+    return total
+
+
+def upsert(db: SA_Session, model):
+    """INSERT for the session's dialect, with `on_conflict_do_update`/`on_conflict_do_nothing`."""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert(model)
+
+
+def get_session() -> "SQLModelSession":
     """
     Convenience helper for routers/services expecting a direct Session.
     Use with care; prefer dependency-injected `get_db()` when possible.
     """
+    from sqlmodel import Session as SQLModelSession
+
+    init_db()
     return SQLModelSession(engine)
@@ -0,0 +1,76 @@
+"""
+Async SQLAlchemy engine and session dependency, alongside the sync one in db.py.
+
+Hot read endpoints use `get_async_db` so they run on the event loop and don't
+each take a thread from Starlette's threadpool (40 threads by default). The URL is
+DATABASE_URL with an async driver swapped in: sqlite -> aiosqlite, postgres ->
+asyncpg. The engine is created on first use, so the drivers are only imported by
+processes that serve these routes. Existing store functions are reused through
+`AsyncSession.run_sync`.
+"""
+import threading
+from typing import TYPE_CHECKING, AsyncIterator
+
+from backend.app.db import DATABASE_URL, init_db, pool_kwargs, resolve_sqlite_url, tune_sqlite
+from backend.app.services.tracing import instrument_engine
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+_ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgres": "postgresql+asyncpg",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
+
+_lock = threading.Lock()
+_engine = None
+_sessionmaker = None
+
+
+def async_url(url: str) -> str:
+    """DATABASE_URL with the matching async driver (URLs that already name one are kept)."""
+    scheme, sep, rest = url.partition("://")
+    return _ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+
+def build_async_engine(url: str):
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url = async_url(url)
+    if not url.startswith("sqlite"):
+        return create_async_engine(url, **pool_kwargs())
+    url, in_memory = resolve_sqlite_url(url)
+    engine = create_async_engine(url)
+    tune_sqlite(engine.sync_engine, in_memory)
+    return engine
+
+
+def get_async_engine():
+    global _engine, _sessionmaker
+    if _engine is None:
+        with _lock:
+            if _engine is None:
+                from sqlalchemy.ext.asyncio import async_sessionmaker
+
+                engine = build_async_engine(DATABASE_URL)
+                instrument_engine(engine.sync_engine)
+                _sessionmaker = async_sessionmaker(engine, expire_on_commit=False, autoflush=False)
+                _engine = engine
+    return _engine
+
+
+async def dispose_async_engine() -> None:
+    global _engine, _sessionmaker
+    engine, _engine, _sessionmaker = _engine, None, None
+    if engine is not None:
+        await engine.dispose()
+
+
+async def get_async_db() -> AsyncIterator["AsyncSession"]:
+    init_db()
+    get_async_engine()
+    async with _sessionmaker() as session:
+        yield session
+
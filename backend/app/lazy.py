@@ -0,0 +1,69 @@
+"""
+Lazy imports og måling av importtid.
+
+Tunge avhengigheter (cv2, numpy, reportlab, openai) skal ikke lastes når appen
+starter, bare når en forespørsel faktisk trenger dem. `lazy_import` gir et
+modul-objekt som importerer den ekte modulen ved første attributtoppslag, og
+`timed_import` brukes av main.py for å bygge en oppstartsprofil per router.
+"""
+import importlib
+import sys
+import time
+import types
+from typing import Dict
+
+# modulnavn -> importtid i millisekunder (routere ved oppstart, lazy-moduler ved første bruk)
+IMPORT_TIMINGS: Dict[str, float] = {}
+
+
+def timed_import(name: str) -> types.ModuleType:
+    """Import a module and record how long it took (0 if already loaded)."""
+    already_loaded = name in sys.modules
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    if not already_loaded:
+        IMPORT_TIMINGS[name] = round((time.perf_counter() - start) * 1000, 2)
+    return module
+
+
+class LazyModule(types.ModuleType):
+    """Module proxy that performs the real import on first attribute access."""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_lazy_target"] = None
+
+    def _load(self) -> types.ModuleType:
+        module = self.__dict__["_lazy_target"]
+        if module is None:
+            module = timed_import(self.__name__)
+            self.__dict__["_lazy_target"] = module
+        return module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.__dict__["_lazy_target"] is not None else "not loaded"
+        return f"<lazy module {self.__name__!r} ({state})>"
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """Return the module if it is already imported, otherwise a lazy proxy for it."""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return LazyModule(name)
+
+
+def startup_report() -> Dict:
+    heavy = ("cv2", "numpy", "reportlab", "openai", "requests", "sqlmodel")
+    timings = sorted(IMPORT_TIMINGS.items(), key=lambda kv: kv[1], reverse=True)
+    return {
+        "import_ms": dict(timings),
+        "total_import_ms": round(sum(IMPORT_TIMINGS.values()), 2),
+        "heavy_modules_loaded": {name: name in sys.modules for name in heavy},
+    }
@@ -1,9 +1,18 @@
+import os
+import sys
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pathlib import Path
 from fastapi.responses import FileResponse
+from starlette.concurrency import run_in_threadpool
 
+from . import warmup
+from .lazy import timed_import
+from .middleware import RequestLoggingMiddleware
 from .models import AnalyzeResponse
+from .services.metrics import MetricsMiddleware
+from .services.ratelimit import RateLimitMiddleware
 from .services.analyzer import analyze_image
 
 # Basestier
@@ -15,8 +24,31 @@ FRONTEND_DIR = BASE_DIR / "frontend"
 UPLOAD_DIR.mkdir(exist_ok=True)
 OUTPUT_DIR.mkdir(exist_ok=True)
 
-app = FastAPI(title="CoatVision Core")
 
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    # Under gunicorn er warmup allerede gjort i master (gunicorn.conf.py); ellers valgfritt
+    if os.getenv("COATVISION_WARMUP", "0") == "1" and not warmup.is_preloaded():
+        await run_in_threadpool(warmup.preload)
+    warmup.report_rss()
+    # Aktivt analyseparametersett lastes før første analyse; deretter friskes det opp i bakgrunnen
+    if "backend.app.services.parameters" in sys.modules:
+        await run_in_threadpool(sys.modules["backend.app.services.parameters"].source.refresh)
+    yield
+    # Async-motoren finnes bare hvis en async rute har vært brukt
+    if "backend.app.db_async" in sys.modules:
+        await sys.modules["backend.app.db_async"].dispose_async_engine()
+    if "backend.app.services.workers" in sys.modules:
+        sys.modules["backend.app.services.workers"].pool.shutdown(wait=False)
+    if "backend.app.services.shadow" in sys.modules:
+        sys.modules["backend.app.services.shadow"].runner.shutdown()
+
+
+app = FastAPI(title="CoatVision Core", lifespan=lifespan)
+# Tabeller opprettes ved første DB-tilgang (se db.init_db), ikke ved import
+
+# Innerst: rate limit avviser før body leses, men etter CORS så 429 får CORS-headere
+app.add_middleware(RateLimitMiddleware)
 # Midlertidig åpen CORS – strammes inn senere
 app.add_middleware(
     CORSMiddleware,
@@ -24,6 +56,59 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+# Ytterst: request-ID og trace må dekke alt under, inkludert metrics
+app.add_middleware(RequestLoggingMiddleware)
+
+# Routere som ikke skal lastes i denne prosessen, f.eks. "reports,lyxbot"
+_DISABLED_ROUTERS = {
+    name.strip() for name in os.getenv("COATVISION_DISABLED_ROUTERS", "").split(",") if name.strip()
+}
+
+
+def _include_optional_router(module_path: str, attr_name: str = "router"):
+    """Safely import a router module and include it if available.
+    Import time is recorded in lazy.IMPORT_TIMINGS (see /api/diagnostics/startup).
+    Router modules must keep heavy deps (cv2, numpy, reportlab, openai) out of module scope.
+    """
+    if module_path.rsplit(".", 1)[-1] in _DISABLED_ROUTERS:
+        return
+    try:
+        module = timed_import(module_path)
+        router = getattr(module, attr_name)
+        if router:
+            app.include_router(router)
+    except Exception as e:
+        # Logg og fortsett slik at OpenAPI fortsatt viser tilgjengelige ruter
+        print(f"[routers] Skipped {module_path}: {e}")
+
+
+for _name in (
+    "lyxbot",
+    "producers",
+    "training",
+    "analyze",
+    "admin_mock",
+    "core",
+    "training_sessions",
+    "glass_client",
+    "auth",
+    "config",
+    "diagnostics",
+    "config_model",
+    "calibration",
+    "jobs",
+    "wash",
+    "history",
+    "similar",
+    "parameters",
+    "shadow",
+    "reports",
+    "coatvision_v1",
+    "dashboard",
+    "metrics",
+):
+    _include_optional_router(f"backend.app.routers.{_name}")
 
 @app.get("/")
 def root():
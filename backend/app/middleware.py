@@ -0,0 +1,76 @@
+"""
+RequestLoggingMiddleware: request-ID, spans per forespørsel og strukturerte logger.
+
+Hver forespørsel får en X-Request-ID (gjenbrukt fra klienten hvis den er gyldig),
+en Trace som samler spans (decode, analysestadier, db, supabase_insert) og én
+JSON-logglinje på loggeren `coatvision.request`. Forespørsler over
+COATVISION_SLOW_REQUEST_MS logges som WARNING og, med COATVISION_SLOW_PROFILE=1,
+får en stack-profil skrevet til profilkatalogen (se services/tracing.py).
+"""
+import json
+import logging
+import re
+import time
+import uuid
+
+from backend.app.services import tracing
+
+logger = logging.getLogger("coatvision.request")
+
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+def _incoming_request_id(scope) -> str:
+    for name, value in scope.get("headers") or []:
+        if name == b"x-request-id":
+            candidate = value.decode("latin-1")
+            if _VALID_REQUEST_ID.match(candidate):
+                return candidate
+            break
+    return uuid.uuid4().hex
+
+
+class RequestLoggingMiddleware:
+    """Pure ASGI middleware (no BaseHTTPMiddleware) so streaming bodies are untouched."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = _incoming_request_id(scope)
+        trace, token = tracing.start_trace(request_id)
+        profiled = tracing.maybe_attach_profiler(trace)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration_ms = (time.perf_counter() - trace.start) * 1000
+            route = getattr(scope.get("route"), "path", None)
+            record = {
+                "request_id": request_id,
+                "method": scope.get("method"),
+                "path": scope.get("path"),
+                "route": route,
+                "status": status["code"],
+                "duration_ms": round(duration_ms, 2),
+                "spans": trace.span_summary(),
+            }
+            if profiled:
+                profile_path = tracing.finish_profile(trace, duration_ms, record)
+                if profile_path:
+                    record["profile"] = str(profile_path)
+            tracing.end_trace(token)
+
+            slow = duration_ms >= tracing.SLOW_REQUEST_MS
+            logger.log(logging.WARNING if slow else logging.INFO, json.dumps(record))
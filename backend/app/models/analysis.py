@@ -0,0 +1,61 @@
+from sqlalchemy import BigInteger, Column, DateTime, Float, Index, Integer, LargeBinary, String, Text
+from sqlalchemy.sql import func
+
+from backend.app.db import Base
+
+
+class AnalysisRecord(Base):
+    """Local copy of an analysis tied to a vehicle panel (Supabase gets the full payload)."""
+
+    __tablename__ = "analysis_records"
+    __table_args__ = (
+        Index("ix_analysis_records_vehicle_panel_id", "vehicle_id", "panel", "id"),
+        Index("ix_analysis_records_image_id", "image_id"),
+        Index("ix_analysis_records_version", "analysis_version"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    image_id = Column(String, nullable=True)
+    vehicle_id = Column(String, nullable=False)
+    panel = Column(String, nullable=False)
+    product_id = Column(Integer, nullable=True)
+    cqi = Column(Float, nullable=False)
+    cvi = Column(Float, nullable=False)
+    # Panelbeskrivelse for likhetssøk (services/similarity.py), 48 byte
+    embedding = Column(LargeBinary, nullable=True)
+    # Parametersettet som ga tallene (services/parameters.py); annen versjon = utdatert rad
+    analysis_version = Column(String(32), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class ImageAnalysis(Base):
+    """Metrics of a stored image file, (re)computed offline by services/reanalysis.py."""
+
+    __tablename__ = "image_analyses"
+    __table_args__ = (Index("ix_image_analyses_version", "analysis_version"),)
+
+    path = Column(String, primary_key=True)
+    # Størrelse og mtime avgjør om filen er endret siden forrige analyse, uten å lese den
+    size = Column(BigInteger, nullable=False)
+    mtime_ns = Column(BigInteger, nullable=False)
+    analysis_version = Column(String(32), nullable=False)
+    # Lysnormaliseringen endrer tallene like mye som parametrene, så den lagres og sammenlignes også
+    lighting = Column(String(16), nullable=False, server_default="off")
+    cqi = Column(Float, nullable=True)
+    cvi = Column(Float, nullable=True)
+    metrics = Column(Text, nullable=True)  # JSON
+    error = Column(String, nullable=True)
+    analyzed_at = Column(DateTime(timezone=True), nullable=False)
+
+
+class AnalysisParameterSet(Base):
+    """One saved set of analysis parameters (services/parameters.py). Rows are never
+    updated; the newest row is the active set unless a parameter file overrides it."""
+
+    __tablename__ = "analysis_parameter_sets"
+
+    id = Column(Integer, primary_key=True)
+    analysis_version = Column(String(32), nullable=False)
+    parameters = Column(Text, nullable=False)  # JSON
+    note = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -0,0 +1,32 @@
+from sqlalchemy import Column, DateTime, Float, Index, Integer, String, UniqueConstraint
+from sqlalchemy.sql import func
+
+from backend.app.db import Base
+
+
+class CalibrationProfile(Base):
+    """One version of a device or site calibration profile. Rows are never updated;
+    a change inserts the next version, so cached lookup tables stay valid per version."""
+
+    __tablename__ = "calibration_profiles"
+    __table_args__ = (
+        UniqueConstraint("scope", "scope_id", "version", name="uq_calibration_profiles_version"),
+        Index("ix_calibration_profiles_scope_version", "scope", "scope_id", "version"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    scope = Column(String(16), nullable=False)  # "device" eller "site"
+    scope_id = Column(String, nullable=False)
+    version = Column(Integer, nullable=False)
+    brightness_offset = Column(Float, nullable=False, default=0.0)
+    contrast_factor = Column(Float, nullable=False, default=1.0)
+    # Forsterkning per kanal i RGB-rekkefølge
+    gain_r = Column(Float, nullable=False, default=1.0)
+    gain_g = Column(Float, nullable=False, default=1.0)
+    gain_b = Column(Float, nullable=False, default=1.0)
+    # Hvitbalanse: NULL betyr "auto" (kameraets egen), ellers faste RGB-forsterkninger
+    wb_r = Column(Float, nullable=True)
+    wb_g = Column(Float, nullable=True)
+    wb_b = Column(Float, nullable=True)
+    source = Column(String(16), nullable=False, default="manual")
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
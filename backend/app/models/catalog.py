@@ -0,0 +1,37 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String, Text
+from sqlalchemy.sql import func
+
+from backend.app.db import Base
+
+
+class Producer(Base):
+    """Coating producer (partner) in the product catalog."""
+
+    __tablename__ = "producers"
+    # Listing er nyeste først med keyset på id; filtre får (filter, id)-indekser
+    __table_args__ = (Index("ix_producers_country_id", "country", "id"),)
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    contact_email = Column(String, nullable=True)
+    country = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class Product(Base):
+    """Coating product with application parameters (flash/cure time in minutes)."""
+
+    __tablename__ = "products"
+    __table_args__ = (
+        Index("ix_products_producer_id_id", "producer_id", "id"),
+        Index("ix_products_type_id", "product_type", "id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    producer_id = Column(Integer, ForeignKey("producers.id"), nullable=False)
+    name = Column(String, nullable=False)
+    product_type = Column(String, nullable=True)
+    flash_time = Column(Integer, nullable=True)
+    cure_time = Column(Integer, nullable=True)
+    notes = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
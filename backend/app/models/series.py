@@ -0,0 +1,23 @@
+from sqlalchemy import BigInteger, Column, DateTime, Integer, LargeBinary, String, UniqueConstraint
+from sqlalchemy.sql import func
+
+from backend.app.db import Base
+
+
+class PanelSeries(Base):
+    """CQI/CVI history of one vehicle panel at one resolution, packed as a point array
+    (layout in services/series.py). One row per (vehicle, panel, tier)."""
+
+    __tablename__ = "panel_series"
+    __table_args__ = (UniqueConstraint("vehicle_id", "panel", "tier", name="uq_panel_series_tier"),)
+
+    id = Column(Integer, primary_key=True)
+    vehicle_id = Column(String, nullable=False)
+    panel = Column(String, nullable=False)
+    tier = Column(String(8), nullable=False)  # "raw", "day" eller "week"
+    points = Column(Integer, nullable=False, default=0)
+    # Punkter før dette tidspunktet (epoch-sekunder) er fjernet av retensjon; 0 = komplett
+    retained_from = Column(BigInteger, nullable=False, default=0)
+    last_t = Column(BigInteger, nullable=False, default=0)
+    data = Column(LargeBinary, nullable=False, default=b"")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
@@ -0,0 +1,37 @@
+from sqlalchemy import Column, DateTime, Float, Index, Integer, String, Text
+from sqlalchemy.sql import func
+
+from backend.app.db import Base
+
+
+class ShadowResult(Base):
+    """One live request analysed again by a shadow candidate (services/shadow.py)."""
+
+    __tablename__ = "shadow_results"
+    __table_args__ = (Index("ix_shadow_results_candidate_id", "candidate_version", "id"),)
+
+    id = Column(Integer, primary_key=True)
+    candidate = Column(String, nullable=False)
+    candidate_version = Column(String(32), nullable=False)
+    primary_version = Column(String(32), nullable=True)
+    # Kandidat minus primær
+    cqi_delta = Column(Float, nullable=True)
+    cvi_delta = Column(Float, nullable=True)
+    deltas = Column(Text, nullable=True)  # JSON: alle numeriske måltall og defekttellinger
+    primary_ms = Column(Float, nullable=False)
+    candidate_ms = Column(Float, nullable=True)
+    candidate_cpu_ms = Column(Float, nullable=True)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class ShadowCandidate(Base):
+    """Candidate set through PUT /api/shadow; the newest row applies to every server worker."""
+
+    __tablename__ = "shadow_candidates"
+
+    id = Column(Integer, primary_key=True)
+    label = Column(String, nullable=True)
+    parameters = Column(Text, nullable=True)  # JSON som i analysis_parameter_sets; NULL = kandidaten er fjernet
+    sample_rate = Column(Float, nullable=True)  # NULL = COATVISION_SHADOW_SAMPLE_RATE
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
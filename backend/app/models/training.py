@@ -0,0 +1,53 @@
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, Index, Enum
+from sqlalchemy.sql import func
+
+from backend.app.db import Base
+from backend.app.services.training import Phase
+
+
+def _phase_column(**kwargs) -> Column:
+    # Lagre enum-verdien ("phase_1_base_info"), ikke navnet, så rader er lesbare i SQL
+    return Column(
+        Enum(Phase, native_enum=False, length=40, values_callable=lambda e: [m.value for m in e]),
+        **kwargs,
+    )
+
+
+class TrainingSessionRecord(Base):
+    __tablename__ = "training_sessions"
+
+    id = Column(String, primary_key=True)
+    car_brand = Column(String, nullable=False)
+    panel = Column(String, nullable=False)
+    color = Column(String, nullable=False)
+    color_code = Column(String, nullable=False)
+    phase = _phase_column(nullable=False)
+    image_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("ix_training_sessions_phase_panel", "phase", "panel"),
+        Index("ix_training_sessions_created_id", "created_at", "id"),
+    )
+
+
+class TrainingImageRecord(Base):
+    __tablename__ = "training_images"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    session_id = Column(String, ForeignKey("training_sessions.id", ondelete="CASCADE"), nullable=False)
+    path = Column(String, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (Index("ix_training_images_session_id", "session_id", "id"),)
+
+
+class TrainingPhaseCount(Base):
+    """Løpende tellere per (fase, panel), oppdatert i samme transaksjon som innsettingene."""
+
+    __tablename__ = "training_phase_counts"
+
+    phase = _phase_column(primary_key=True)
+    panel = Column(String, primary_key=True)
+    session_count = Column(Integer, nullable=False, default=0)
+    image_count = Column(Integer, nullable=False, default=0)
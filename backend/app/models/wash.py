@@ -0,0 +1,33 @@
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Index, Integer, String
+from sqlalchemy.sql import func
+
+from backend.app.db import Base
+
+
+class WashEvent(Base):
+    """A wash of one vehicle panel, linked to the analysis taken after it."""
+
+    __tablename__ = "wash_events"
+    __table_args__ = (Index("ix_wash_events_vehicle_panel_id", "vehicle_id", "panel", "id"),)
+
+    id = Column(Integer, primary_key=True)
+    vehicle_id = Column(String, nullable=False)
+    panel = Column(String, nullable=False)
+    product_key = Column(String, nullable=False)
+    wash_count = Column(Integer, nullable=False)
+    analysis_id = Column(Integer, ForeignKey("analysis_records.id"), nullable=True)
+    # CQI etter vasken delt på CQI ved første analyse av panelet (NULL uten grunnlag)
+    retention = Column(Float, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class WashModel(Base):
+    """Running sums of the per-product degradation fit, updated with each wash event."""
+
+    __tablename__ = "wash_models"
+
+    product_key = Column(String, primary_key=True)
+    samples = Column(Integer, nullable=False, default=0)
+    sum_xx = Column(Float, nullable=False, default=0.0)
+    sum_xd = Column(Float, nullable=False, default=0.0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
@@ -0,0 +1,55 @@
+"""
+Rask JSON-serialisering for analyse-, dashboard- og jobb-rutene.
+
+FastJSONResponse bruker orjson (OPT_SERIALIZE_NUMPY) når den er installert, slik at
+per-fliser-data (np.ndarray, np.float32 osv.) kan returneres direkte uten tolist().
+Returner responsen direkte fra ruten for å hoppe over FastAPIs jsonable_encoder;
+med response_class/default_response_class alene gjør FastAPI fortsatt en
+jsonable_encoder-runde først. Uten orjson brukes stdlib json med samme default-hook.
+"""
+import json
+from datetime import date, datetime
+from enum import Enum
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # valgfri avhengighet
+    orjson = None
+
+_ORJSON_OPTIONS = (
+    (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z) if orjson is not None else 0
+)
+
+
+def _default(obj: Any) -> Any:
+    """Types neither encoder handles natively (non-contiguous arrays, pydantic models, ...)."""
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(mode="json")
+    if hasattr(obj, "tolist"):  # NumPy arrays/scalars orjson declined (non-contiguous, float16, ...)
+        return obj.tolist()
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if isinstance(obj, bytes):
+        return obj.decode("utf-8", errors="replace")
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize to compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=_ORJSON_OPTIONS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -1,51 +1,67 @@
 # backend/app/routers/analyze.py
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Request
 import tempfile
 import os
+from typing import Optional
 
-from backend.app.core.coatvision_core import process_image_file, analyze_coating
+from backend.app.core.coatvision_core import process_image_file
+from backend.app.responses import FastJSONResponse
+from backend.app.services import framing, shadow
+from backend.app.services.calibration import profiles
+from backend.app.services.metrics import stage
 
-router = APIRouter(prefix="/api/analyze", tags=["analyze"])
+router = APIRouter(prefix="/api/analyze", tags=["analyze"], default_response_class=FastJSONResponse)
 
 
 @router.post("/")
-async def analyze_image(file: UploadFile = File(...)):
+async def analyze_image(
+    file: UploadFile = File(...),
+    device_id: Optional[str] = Query(None),
+    site_id: Optional[str] = Query(None),
+    lighting: Optional[str] = Query(None, description="off | flatten | clahe"),
+):
     """
     Analyze an uploaded image for coating quality.
-    Returns CVI, CQI, coverage and other metrics.
+    Returns CVI, CQI, coverage and other metrics. device_id/site_id select the
+    calibration profile applied before analysis; lighting selects the optional
+    illumination normalization.
     """
     with tempfile.TemporaryDirectory() as temp_dir:
         temp_path = os.path.join(temp_dir, file.filename or "upload.jpg")
         contents = await file.read()
-        with open(temp_path, "wb") as f:
-            f.write(contents)
+        with stage("temp_write"):
+            with open(temp_path, "wb") as f:
+                f.write(contents)
 
         try:
-            metrics = process_image_file(temp_path, temp_dir)
-            return {
+            calibration = await profiles.for_request_async({"device_id": device_id, "site_id": site_id})
+            metrics = process_image_file(temp_path, temp_dir, calibration, lighting)
+            return FastJSONResponse({
                 "status": "success",
                 "filename": file.filename,
                 "metrics": metrics,
-            }
+            })
         except Exception as e:
             raise HTTPException(status_code=400, detail=str(e))
 
 
-@router.post("/base64")
-async def analyze_base64(payload: dict):
+@router.post(
+    "/base64",
+    openapi_extra=framing.openapi_body(
+        {"type": "object", "properties": {"image": {"type": "string"}}, "required": ["image"]}
+    ),
+)
+async def analyze_base64(request: Request):
     """
     Analyze a base64-encoded image.
-    Expects {"image": "<base64_string>"}
+    Expects {"image": "<base64_string>"}, a raw image/jpeg|png body, or a
+    msgpack/CBOR envelope {"frame": <bytes>, "meta": {...}} (see services/framing.py).
     """
-    from backend.app.core.coatvision_core import decode_base64_image
-
-    image_data = payload.get("image")
-    if not image_data:
-        raise HTTPException(status_code=400, detail="Missing 'image' field")
+    image, meta = await framing.read_frame(request, lambda p: p.get("image"), "Missing 'image' field")
 
     try:
-        image = decode_base64_image(image_data)
-        metrics = analyze_coating(image)
-        return {"status": "success", "metrics": metrics}
+        calibration = await profiles.for_request_async(meta)
+        metrics = shadow.runner.analyze(image, calibration, meta.get("lighting"))
+        return framing.respond(request, {"status": "success", "metrics": metrics})
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -1,28 +1,23 @@
-import os
 import uuid
-import hashlib
-from datetime import datetime, timedelta
 from typing import Optional
 
 import jwt
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException
 from pydantic import BaseModel, EmailStr
-from sqlalchemy.orm import Session
+from sqlalchemy import select
 
-from backend.app.db import get_db
+from backend.app.db_async import get_async_db
 from backend.app.models.user import User
+from backend.app.services.auth import (
+    create_access_token,
+    decode_token,
+    hash_password_async,
+    verify_password_async,
+)
 
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
-JWT_SECRET = os.getenv("JWT_SECRET", "dev-secret-change-me")
-JWT_ALGO = os.getenv("JWT_ALGO", "HS256")
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
-
-
-def _hash_password(password: str, salt: str) -> str:
-    return hashlib.sha256((salt + password).encode("utf-8")).hexdigest()
-
 
 class RegisterRequest(BaseModel):
     email: EmailStr
@@ -39,40 +34,48 @@ class TokenResponse(BaseModel):
     token_type: str = "bearer"
 
 
+async def _find_user(db, email: str) -> Optional[User]:
+    return (await db.execute(select(User).where(User.email == email.lower()))).scalar_one_or_none()
+
+
 @router.post("/register")
-def register(req: RegisterRequest, db: Session = Depends(get_db)):
-    existing = db.query(User).filter(User.email == req.email.lower()).first()
-    if existing:
+async def register(req: RegisterRequest, db=Depends(get_async_db)):
+    if await _find_user(db, req.email):
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    salt = uuid.uuid4().hex
-    password_hash = _hash_password(req.password, salt)
-    user = User(id=uuid.uuid4().hex, email=req.email.lower(), password_hash=password_hash, salt=salt)
+    # scrypt-hashen bærer sitt eget salt; salt-kolonnen brukes bare av eldre SHA-256-rader
+    password_hash = await hash_password_async(req.password)
+    user = User(id=uuid.uuid4().hex, email=req.email.lower(), password_hash=password_hash, salt="")
     db.add(user)
-    db.commit()
+    await db.commit()
     return {"status": "registered", "userId": user.id, "email": user.email}
 
 
 @router.post("/login", response_model=TokenResponse)
-def login(req: LoginRequest, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == req.email.lower()).first()
+async def login(req: LoginRequest, db=Depends(get_async_db)):
+    user = await _find_user(db, req.email)
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    if user.password_hash != _hash_password(req.password, user.salt):
+    valid, needs_rehash = await verify_password_async(req.password, user.password_hash, user.salt)
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    if needs_rehash:
+        # Eldre SHA-256 (eller scrypt med gamle parametre) oppgraderes ved vellykket innlogging
+        user.password_hash = await hash_password_async(req.password)
+        user.salt = ""
+        await db.commit()
 
-    exp = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    payload = {"sub": user.id, "email": user.email, "exp": exp}
-    token = jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGO)
-    return TokenResponse(access_token=token)
+    return TokenResponse(access_token=create_access_token(user.id, user.email))
 
 
 @router.get("/me")
-def me(token: Optional[str] = None):
+async def me(token: Optional[str] = None, authorization: Optional[str] = Header(default=None)):
+    if not token and authorization and authorization.lower().startswith("bearer "):
+        token = authorization[7:].strip()
     if not token:
         raise HTTPException(status_code=401, detail="Token required")
     try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGO])
-        return {"userId": payload.get("sub"), "email": payload.get("email")}
-    except Exception as e:
+        payload = decode_token(token)
+    except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
+    return {"userId": payload.get("sub"), "email": payload.get("email")}
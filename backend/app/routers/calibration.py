@@ -1,34 +1,105 @@
 # backend/app/routers/calibration.py
-from fastapi import APIRouter, Depends
+from typing import List, Literal, Optional, Union
+
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, UploadFile
+from pydantic import BaseModel, Field
+from sqlalchemy.orm import Session
+
+from backend.app.db import get_db
 from backend.app.security import admin_guard
+from backend.app.services.calibration import profiles, runs
+from backend.app.services.workers import pool
 
 router = APIRouter(prefix="/api/calibration", tags=["calibration"])
 
+MAX_PHOTOS = 10
+MAX_PHOTO_BYTES = 20 * 1024 * 1024
+
+
+class ProfileIn(BaseModel):
+    brightness_offset: float = Field(0.0, ge=-128, le=128)
+    contrast_factor: float = Field(1.0, gt=0, le=4)
+    color_correction: List[float] = Field([1.0, 1.0, 1.0], min_length=3, max_length=3)
+    # "auto" eller faste RGB-forsterkninger
+    white_balance: Union[Literal["auto"], List[float]] = "auto"
+
+
+def _profile_out(profile: profiles.Profile) -> dict:
+    return {**profile.ref(), "source": profile.source, **profile.parameters()}
+
 
 @router.get("/status")
-async def calibration_status():
-    return {
-        "status": "ok",
-        "calibrated": True,
-        "last_calibration": "2024-01-01T00:00:00Z",
-        "next_recommended": "2024-07-01T00:00:00Z",
-    }
+def calibration_status(db: Session = Depends(get_db)):
+    return runs.status(profiles.latest_profile(db))
 
 
-@router.post("/run")
-async def run_calibration(_=Depends(admin_guard)):
-    return {
-        "status": "started",
-        "message": "Calibration process initiated",
-        "estimated_time_seconds": 60,
-    }
+@router.post("/run", status_code=202)
+async def run_calibration(
+    photos: List[UploadFile] = File(..., description="Photos of the 24-patch reference card"),
+    scope: Literal["device", "site"] = Form("site"),
+    scope_id: str = Form("default"),
+    _=Depends(admin_guard),
+):
+    """Queue a calibration run; poll /api/calibration/jobs/{job_id} for progress."""
+    if len(photos) > MAX_PHOTOS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_PHOTOS} photos per run")
+    data = []
+    for photo in photos:
+        content = await photo.read()
+        if len(content) > MAX_PHOTO_BYTES:
+            raise HTTPException(status_code=413, detail=f"{photo.filename} is larger than 20 MB")
+        data.append(content)
+    job = runs.start(data, scope, scope_id)
+    return {"status": "queued", "job_id": job.id, "poll": f"/api/calibration/jobs/{job.id}"}
+
+
+@router.get("/jobs/{job_id}")
+def calibration_job(job_id: str):
+    # Jobben kan kjøre i en annen worker; da leses tilstanden fra jobbfilen (trådpool, ikke event-loopen)
+    job = pool.get(job_id)
+    if job is None or job.kind != runs.KIND:
+        raise HTTPException(status_code=404, detail="Calibration job not found")
+    return job.as_dict()
 
 
 @router.get("/parameters")
-async def get_calibration_parameters():
-    return {
-        "brightness_offset": 0,
-        "contrast_factor": 1.0,
-        "color_correction": [1.0, 1.0, 1.0],
-        "white_balance": "auto",
-    }
+def get_calibration_parameters(
+    device_id: Optional[str] = Query(None),
+    site_id: Optional[str] = Query(None),
+    db: Session = Depends(get_db),
+):
+    """Effective parameters for a device/site (device profile wins), or the defaults."""
+    profile = profiles.resolve(db, device_id, site_id)
+    if profile is None:
+        return {**profiles.DEFAULT_PARAMETERS, "scope": "default", "scope_id": None, "version": 0}
+    return _profile_out(profile)
+
+
+@router.get("/profiles")
+def list_calibration_profiles(db: Session = Depends(get_db)):
+    return {"profiles": [_profile_out(p) for p in profiles.list_active_profiles(db)]}
+
+
+@router.put("/profiles/{scope}/{scope_id}")
+def save_calibration_profile(
+    scope: Literal["device", "site"],
+    scope_id: str,
+    body: ProfileIn,
+    db: Session = Depends(get_db),
+    _=Depends(admin_guard),
+):
+    """Store a new version of the profile; frames pick it up within REFRESH_S."""
+    white_balance = None if body.white_balance == "auto" else tuple(body.white_balance)
+    if white_balance is not None and len(white_balance) != 3:
+        raise HTTPException(status_code=422, detail="white_balance must be 'auto' or three RGB gains")
+    try:
+        profile = profiles.save_profile(
+            db, scope, scope_id,
+            brightness_offset=body.brightness_offset,
+            contrast_factor=body.contrast_factor,
+            color_correction=tuple(body.color_correction),
+            white_balance=white_balance,
+        )
+    except profiles.VersionConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"status": "saved", "profile": _profile_out(profile)}
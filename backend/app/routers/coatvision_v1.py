@@ -1,28 +1,42 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from datetime import datetime
 import tempfile
 import os
+import uuid
 from typing import Optional, Dict, Any
 
-from backend.app.core.coatvision_core import (
-    process_image_file,
-    analyze_coating,
-    decode_base64_image,
-)
+from backend.app.core.coatvision_core import process_image_file
+from backend.app.responses import FastJSONResponse
+from backend.app.services import analysis_store, framing, shadow
+from backend.app.services.calibration import profiles
 from backend.app.services.supabase_client import insert_analysis_payload
+from backend.app.services.metrics import stage
 
-router = APIRouter(prefix="/v1/coatvision", tags=["coatvision-v1"])
+router = APIRouter(prefix="/v1/coatvision", tags=["coatvision-v1"], default_response_class=FastJSONResponse)
 
 
 def _result_payload(result: Dict[str, Any], mode: str) -> Dict[str, Any]:
+    now = datetime.utcnow()
     return {
-        "id": f"res_{int(datetime.utcnow().timestamp())}",
+        # Millisekunder + tilfeldig suffiks: id-en brukes som koblingsnøkkel (vask), så den må være unik
+        "id": f"res_{int(now.timestamp() * 1000)}_{uuid.uuid4().hex[:8]}",
         "mode": mode,
-        "createdAt": datetime.utcnow().isoformat() + "Z",
+        "createdAt": now.isoformat() + "Z",
         "result": result,
     }
 
 
+def _record_locally(result: Dict[str, Any], meta: Optional[Dict[str, Any]]) -> None:
+    """Keep a local row for vehicle/panel-tagged analyses (wash model, trends); non-fatal."""
+    try:
+        with stage("analysis_record"):
+            analysis_id = analysis_store.record_from_request(result, meta)
+        if analysis_id is not None:
+            result["analysisId"] = analysis_id
+    except Exception as e:
+        print(f"[analysis_store] Could not record analysis: {e}")
+
+
 @router.post("/analyze-image")
 async def analyze_image(payload: Dict[str, Any]):
     image = payload.get("image") or {}
@@ -35,41 +49,60 @@ async def analyze_image(payload: Dict[str, Any]):
         import requests
         with tempfile.TemporaryDirectory() as tmp:
             filename = os.path.join(tmp, "remote_image.jpg")
-            resp = requests.get(image_url, timeout=15)
-            resp.raise_for_status()
-            with open(filename, "wb") as f:
-                f.write(resp.content)
+            with stage("download"):
+                resp = requests.get(image_url, timeout=15)
+                resp.raise_for_status()
+            with stage("temp_write"):
+                with open(filename, "wb") as f:
+                    f.write(resp.content)
 
-            metrics = process_image_file(filename, tmp)
+            meta = payload.get("meta") or payload
+            calibration = await profiles.for_request_async(meta)
+            metrics = process_image_file(filename, tmp, calibration, meta.get("lighting"))
         result = _result_payload(metrics, mode="image")
         # Attach minimal request context and attempt Supabase insert (non-fatal)
         result["request"] = {"imageUrl": image_url}
+        _record_locally(result, meta)
         try:
-            insert_analysis_payload(result)
+            with stage("supabase_insert"):
+                insert_analysis_payload(result)
         except Exception:
             pass
-        return result
+        return FastJSONResponse(result)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
-@router.post("/analyze-live")
-async def analyze_live(payload: Dict[str, Any]):
-    frame = payload.get("frame") or {}
-    frame_b64: Optional[str] = frame.get("frameBase64")
-    if not frame_b64:
-        raise HTTPException(status_code=400, detail="Missing frame.frameBase64")
+@router.post(
+    "/analyze-live",
+    openapi_extra=framing.openapi_body(
+        {"type": "object", "properties": {"frame": {"type": "object", "properties": {
+            "frameBase64": {"type": "string"}}}}, "required": ["frame"]}
+    ),
+)
+async def analyze_live(request: Request):
+    """
+    Live frame analysis. Accepts {"frame": {"frameBase64": ...}}, a raw image/jpeg body
+    (metadata as query parameters) or a msgpack/CBOR envelope; Accept negotiates the response.
+    """
+    img, meta = await framing.read_frame(
+        request, lambda p: (p.get("frame") or {}).get("frameBase64"), "Missing frame.frameBase64"
+    )
 
     try:
-        img = decode_base64_image(frame_b64)
-        metrics = analyze_coating(img)
+        # Et utvalg av bildene kjøres også av skyggekandidaten, etter at svaret er klart
+        calibration = await profiles.for_request_async(meta)
+        metrics = shadow.runner.analyze(img, calibration, meta.get("lighting"))
         result = _result_payload(metrics, mode="live")
-        # Do not store raw base64; only store minimal context
-        result["request"] = {"source": "live"}
+        # Do not store raw frame bytes; only store minimal context
+        context = {k: v for k, v in meta.items() if isinstance(v, (str, int, float, bool))}
+        result["request"] = {**context, "source": "live"}
+        _record_locally(result, meta)
         try:
-            insert_analysis_payload(result)
+            with stage("supabase_insert"):
+                insert_analysis_payload(result)
         except Exception:
             pass
-        return result
+        return framing.respond(request, result)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
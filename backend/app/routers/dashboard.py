@@ -1,7 +1,8 @@
 from fastapi import APIRouter, HTTPException
+from backend.app.responses import FastJSONResponse
 from backend.app.services.supabase_client import get_dashboard_summary, get_latest_analyses
 
-router = APIRouter(prefix="/api/dashboard", tags=["dashboard"])
+router = APIRouter(prefix="/api/dashboard", tags=["dashboard"], default_response_class=FastJSONResponse)
 
 
 @router.get("/summary")
@@ -9,7 +10,7 @@ async def summary():
     data = get_dashboard_summary()
     if data is None:
         raise HTTPException(status_code=500, detail="Supabase not configured or unavailable")
-    return data
+    return FastJSONResponse(data)
 
 
 @router.get("/latest")
@@ -17,4 +18,4 @@ async def latest(limit: int = 10):
     data = get_latest_analyses(limit)
     if data is None:
         raise HTTPException(status_code=500, detail="Supabase not configured or unavailable")
-    return data
+    return FastJSONResponse(data)
@@ -1,8 +1,31 @@
+import os
+
 from fastapi import APIRouter
 
+from backend.app.lazy import startup_report
+
 router = APIRouter(prefix="/api/diagnostics", tags=["diagnostics"])
 
 
 @router.get("/ping")
 async def ping():
     return {"pong": True}
+
+
+@router.get("/startup")
+async def startup():
+    """Per-module import times recorded at startup and which heavy deps are loaded so far."""
+    return startup_report()
+
+
+@router.get("/workers")
+async def workers():
+    """Resident memory per live worker process, plus what was preloaded in the master."""
+    from backend.app import warmup
+
+    return {
+        "pid": os.getpid(),
+        "preloaded": warmup.is_preloaded(),
+        "preload_ms": warmup.PRELOAD_TIMINGS,
+        "workers": warmup.worker_rss_report(),
+    }
@@ -0,0 +1,47 @@
+# backend/app/routers/history.py
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from backend.app.db import get_db
+from backend.app.services import series
+
+router = APIRouter(prefix="/api/history", tags=["history"])
+
+
+# Kjøretøytrenden ligger på /{vehicle_id}, så /{vehicle_id}/{panel} når også et panel som heter "trend"
+@router.get("/{vehicle_id}")
+def vehicle_trend(vehicle_id: str, days: Optional[int] = Query(None, ge=1, le=3650), db: Session = Depends(get_db)):
+    """CQI/CVI trend of every recorded panel of the vehicle."""
+    names = series.panels(db, vehicle_id)
+    if not names:
+        raise HTTPException(status_code=404, detail="No history for this vehicle")
+    return {"vehicle_id": vehicle_id, "panels": [series.trend(db, vehicle_id, name, days) for name in names]}
+
+
+@router.get("/{vehicle_id}/{panel}/trend")
+def panel_trend(
+    vehicle_id: str, panel: str, days: Optional[int] = Query(None, ge=1, le=3650), db: Session = Depends(get_db)
+):
+    out = series.trend(db, vehicle_id, panel, days)
+    if out is None:
+        raise HTTPException(status_code=404, detail="No history for this panel")
+    return out
+
+
+@router.get("/{vehicle_id}/{panel}")
+def panel_history(
+    vehicle_id: str,
+    panel: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    max_points: int = Query(series.MAX_POINTS, ge=2, le=5000),
+    db: Session = Depends(get_db),
+):
+    """Points between `start` and `end`, from the finest tier that still covers `start`."""
+    out = series.query(db, vehicle_id, panel, start, end, max_points)
+    if out is None:
+        raise HTTPException(status_code=404, detail="No history for this panel")
+    return out
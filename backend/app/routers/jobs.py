@@ -1,11 +1,12 @@
 # backend/app/routers/jobs.py
 from fastapi import APIRouter, Depends
 from backend.app.security import admin_guard
+from backend.app.responses import FastJSONResponse
 from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime
 
-router = APIRouter(prefix="/api/jobs", tags=["jobs"])
+router = APIRouter(prefix="/api/jobs", tags=["jobs"], default_response_class=FastJSONResponse)
 
 
 class Job(BaseModel):
@@ -21,7 +22,7 @@ jobs_db: List[dict] = []
 
 @router.get("/")
 async def list_jobs():
-    return {"jobs": jobs_db}
+    return FastJSONResponse({"jobs": jobs_db})
 
 
 @router.post("/")
@@ -1,6 +1,14 @@
 # backend/app/routers/lyxbot.py
-from fastapi import APIRouter, Depends
+import json
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
+
 from backend.app.security import admin_guard
+from backend.app.services import knowledge, lyxbot
 
 router = APIRouter(prefix="/api/lyxbot", tags=["lyxbot"])
 
@@ -18,3 +26,92 @@ async def lyxbot_command(payload: dict, _=Depends(admin_guard)):
         "command": command,
         "message": "LYXbot command processing not yet implemented",
     }
+
+
+class LyxbotRequest(BaseModel):
+    message: str = Field(..., min_length=1, max_length=4000)
+
+
+class LyxbotResponse(BaseModel):
+    reply: str
+    cached: bool = False
+    source: str = "llm"  # "llm" eller "faq" (svar direkte fra indeksen)
+    sources: List[str] = []
+
+
+async def _ground(message: str):
+    """(direct FAQ hit or None, context for the prompt, source ids) from the local index."""
+    try:
+        hits = await run_in_threadpool(knowledge.retrieve, message)
+    except Exception as e:
+        # Indeksen er en forbedring; chat skal virke uten den
+        print("LYXBOT INDEX ERROR:", repr(e))
+        return None, "", []
+    return knowledge.direct_answer(message, hits), knowledge.context_for(hits), [h.source for h in hits]
+
+
+@router.post("/chat", response_model=LyxbotResponse)
+async def lyxbot_chat(body: LyxbotRequest) -> LyxbotResponse:
+    """
+    Chat med LYXbot. Treffsikre FAQ-spørsmål besvares direkte fra den lokale indeksen;
+    ellers sendes de beste utdragene med som kontekst. Like spørsmål (etter
+    normalisering) besvares fra cache.
+    """
+    direct, context, sources = await _ground(body.message)
+    if direct is not None:
+        return LyxbotResponse(reply=direct.answer, source="faq", sources=[direct.source])
+    try:
+        reply, cached = await lyxbot.get_reply(body.message, context)
+    except Exception as e:
+        print("LYXBOT ERROR:", repr(e))
+        raise HTTPException(status_code=500, detail="Feil mot AI-tjenesten. Prøv igjen senere.") from e
+    return LyxbotResponse(reply=reply, cached=cached, sources=sources)
+
+
+@router.post("/chat/stream")
+async def lyxbot_chat_stream(body: LyxbotRequest):
+    """
+    Samme som /chat, men som Server-Sent Events: først `data: {"sources": [...]}`, så
+    `data: {"delta": "..."}` per bit etter hvert som de kommer, avsluttet med `data: [DONE]`.
+    """
+
+    direct, context, sources = await _ground(body.message)
+
+    async def events():
+        yield f"data: {json.dumps({'sources': [direct.source] if direct else sources})}\n\n"
+        if direct is not None:
+            yield f"data: {json.dumps({'delta': direct.answer}, ensure_ascii=False)}\n\n"
+            yield "data: [DONE]\n\n"
+            return
+        try:
+            async for delta in lyxbot.stream_reply(body.message, context):
+                yield f"data: {json.dumps({'delta': delta}, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            print("LYXBOT ERROR:", repr(e))
+            yield f"data: {json.dumps({'error': 'Feil mot AI-tjenesten. Prøv igjen senere.'}, ensure_ascii=False)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.get("/search")
+async def lyxbot_search(q: str = Query(..., min_length=1, max_length=500), k: int = Query(5, ge=1, le=20)):
+    """Topp-k treff i den lokale kunnskapsindeksen (for feilsøking av grounding)."""
+    hits = await run_in_threadpool(knowledge.retrieve, q, k)
+    return {"hits": [{"title": h.title, "snippet": h.snippet, "source": h.source, "kind": h.kind,
+                      "score": round(h.score, 4)} for h in hits]}
+
+
+@router.post("/index/rebuild")
+async def lyxbot_rebuild_index(_=Depends(admin_guard)):
+    def rebuild():
+        from backend.app.db import SessionLocal, init_db
+        import backend.app.models.catalog  # noqa: F401
+
+        init_db()
+        with SessionLocal() as db:
+            knowledge.ensure_index(db, force=True)
+
+    await run_in_threadpool(rebuild)
+    return {"status": "rebuilt"}
@@ -0,0 +1,53 @@
+# backend/app/routers/parameters.py
+from typing import Dict, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel, Field
+from sqlalchemy.orm import Session
+
+from backend.app.db import get_db
+from backend.app.security import admin_guard
+from backend.app.services import parameters
+
+router = APIRouter(prefix="/api/parameters", tags=["parameters"])
+
+
+class ParametersIn(BaseModel):
+    # Felt som mangler beholder standardverdien
+    max_hue_std: Optional[float] = Field(None, gt=0)
+    max_laplacian_variance: Optional[float] = Field(None, gt=0)
+    canny_low: Optional[int] = Field(None, ge=0, le=1000)
+    canny_high: Optional[int] = Field(None, ge=0, le=1000)
+    cvi_weights: Optional[Dict[str, float]] = None
+    cqi_weights: Optional[Dict[str, float]] = None
+    note: Optional[str] = None
+
+
+@router.get("")
+def active_parameters():
+    """The parameter set new analyses use, and where it came from (file, db or default)."""
+    return parameters.current().as_dict()
+
+
+@router.put("")
+def save_parameters(body: ParametersIn, db: Session = Depends(get_db), _=Depends(admin_guard)):
+    """Store a new parameter set; other processes pick it up within the refresh interval."""
+    data = body.model_dump(exclude_none=True)
+    note = data.pop("note", None)
+    try:
+        saved = parameters.save_set(db, data, note)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {"saved": saved.as_dict(), "active": parameters.current().as_dict()}
+
+
+@router.get("/sets")
+def parameter_sets(limit: int = Query(50, ge=1, le=500), db: Session = Depends(get_db)):
+    return {"sets": parameters.list_sets(db, limit)}
+
+
+@router.get("/stale")
+def stale_results(db: Session = Depends(get_db)):
+    """Stored results made with another parameter version than the active one."""
+    version = parameters.current().version
+    return {"version": version, **parameters.stale_counts(db, version)}
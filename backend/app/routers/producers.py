@@ -1,8 +1,106 @@
-from fastapi import APIRouter
+from typing import Optional
 
-router = APIRouter(prefix="/api/producers", tags=["producers"])
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel, EmailStr
+from sqlalchemy.orm import Session
 
+from backend.app.db import get_db
+from backend.app.db_async import get_async_db
+from backend.app.security import admin_guard
+from backend.app.services import catalog_store
 
-@router.get("/")
-async def list_producers():
-    return {"producers": []}
+router = APIRouter(prefix="/api", tags=["producers"])
+
+
+class ProducerCreate(BaseModel):
+    name: str
+    contact_email: Optional[EmailStr] = None
+    country: Optional[str] = None
+
+
+class ProductCreate(BaseModel):
+    producer_id: int
+    name: str
+    product_type: Optional[str] = None
+    flash_time: Optional[int] = None
+    cure_time: Optional[int] = None
+    notes: Optional[str] = None
+
+
+def _producer_out(record) -> dict:
+    return {
+        "id": record.id,
+        "name": record.name,
+        "contact_email": record.contact_email,
+        "country": record.country,
+        "created_at": record.created_at.isoformat() if record.created_at else None,
+    }
+
+
+def _product_out(record) -> dict:
+    return {
+        "id": record.id,
+        "producer_id": record.producer_id,
+        "name": record.name,
+        "product_type": record.product_type,
+        "flash_time": record.flash_time,
+        "cure_time": record.cure_time,
+        "notes": record.notes,
+        "created_at": record.created_at.isoformat() if record.created_at else None,
+    }
+
+
+def _page(key: str, items: list, out, limit: int) -> dict:
+    return {
+        key: [out(r) for r in items],
+        "limit": limit,
+        "next_before_id": items[-1].id if len(items) == limit else None,
+    }
+
+
+@router.post("/producers")
+def create_producer(body: ProducerCreate, db: Session = Depends(get_db), _=Depends(admin_guard)):
+    record = catalog_store.create_producer(db, **body.model_dump())
+    return {"status": "created", "producer": _producer_out(record)}
+
+
+@router.get("/producers")
+async def list_producers(
+    limit: int = Query(50, ge=1, le=catalog_store.MAX_PAGE_SIZE),
+    before_id: Optional[int] = Query(None, ge=1),
+    q: Optional[str] = Query(None, max_length=100),
+    country: Optional[str] = None,
+    db=Depends(get_async_db),
+):
+    """Newest first. Pass `next_before_id` from the previous page as `before_id`."""
+    # Lesing på event-loopen (async driver), uten trådpool-hopp
+    records = await db.run_sync(
+        lambda s: catalog_store.list_producers(s, limit=limit, before_id=before_id, q=q, country=country)
+    )
+    return _page("producers", records, _producer_out, limit)
+
+
+@router.post("/products")
+def create_product(body: ProductCreate, db: Session = Depends(get_db), _=Depends(admin_guard)):
+    if not catalog_store.get_producer(db, body.producer_id):
+        raise HTTPException(status_code=404, detail="Producer not found")
+    record = catalog_store.create_product(db, **body.model_dump())
+    return {"status": "created", "product": _product_out(record)}
+
+
+@router.get("/products")
+async def list_products(
+    limit: int = Query(50, ge=1, le=catalog_store.MAX_PAGE_SIZE),
+    before_id: Optional[int] = Query(None, ge=1),
+    producer_id: Optional[int] = None,
+    product_type: Optional[str] = None,
+    q: Optional[str] = Query(None, max_length=100),
+    db=Depends(get_async_db),
+):
+    """Newest first. Pass `next_before_id` from the previous page as `before_id`."""
+    records = await db.run_sync(
+        lambda s: catalog_store.list_products(
+            s, limit=limit, before_id=before_id, producer_id=producer_id, product_type=product_type, q=q
+        )
+    )
+    return _page("products", records, _product_out, limit)
@@ -0,0 +1,58 @@
+# backend/app/routers/shadow.py
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel, Field
+from sqlalchemy.orm import Session
+
+from backend.app.db import get_db
+from backend.app.security import admin_guard
+from backend.app.services import parameters, shadow
+
+router = APIRouter(prefix="/api/shadow", tags=["shadow"])
+
+
+class CandidateIn(BaseModel):
+    # Samme felt som PUT /api/parameters; felt som mangler beholder standardverdien
+    parameters: Dict[str, Any] = Field(default_factory=dict)
+    sample_rate: Optional[float] = Field(None, ge=0, le=1)
+    label: str = "parameters"
+
+
+@router.get("/status")
+def shadow_status():
+    return shadow.runner.status()
+
+
+@router.put("")
+def set_candidate(body: CandidateIn, db: Session = Depends(get_db), _=Depends(admin_guard)):
+    """Shadow-run a candidate parameter set on sampled live frames (every worker, within the refresh interval)."""
+    try:
+        params = parameters.from_mapping(body.parameters)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    shadow.save_candidate(db, shadow.Candidate.from_parameters(params, body.label), body.sample_rate)
+    return shadow.runner.status()
+
+
+@router.delete("")
+def clear_candidate(db: Session = Depends(get_db), _=Depends(admin_guard)):
+    shadow.save_candidate(db, None)
+    return shadow.runner.status()
+
+
+@router.get("/summary")
+def shadow_summary(
+    candidate_version: Optional[str] = Query(None, description="Default: the running candidate, else the newest"),
+    limit: int = Query(shadow.SUMMARY_ROWS, ge=1, le=100_000),
+    db: Session = Depends(get_db),
+):
+    """Metric deltas (candidate minus primary) and timings per candidate version."""
+    known = shadow.versions(db)
+    if candidate_version is None:
+        running = shadow.runner.candidate()
+        candidate_version = running.version if running is not None else (known[0]["candidate_version"] if known else None)
+    out = shadow.summary(db, candidate_version, limit) if candidate_version else None
+    if out is None:
+        raise HTTPException(status_code=404, detail="No shadow results for this candidate")
+    return {**out, "versions": known}
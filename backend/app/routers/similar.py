@@ -0,0 +1,87 @@
+# backend/app/routers/similar.py
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel, Field
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from backend.app.db import get_db
+from backend.app.models.analysis import AnalysisRecord
+
+router = APIRouter(prefix="/api/similar", tags=["similar"])
+
+MAX_K = 100
+
+
+class EmbeddingQuery(BaseModel):
+    # "embedding" fra analyseresultatet (48 verdier 0..255)
+    embedding: List[int] = Field(..., min_length=48, max_length=48)
+    k: int = Field(10, ge=1, le=MAX_K)
+    exclude_vehicle_id: Optional[str] = None
+
+
+def _matches(db: Session, code, k: int, exclude_ids=(), exclude_vehicle_id: Optional[str] = None) -> dict:
+    from backend.app.services.similarity import index
+
+    index.refresh(db)
+    # Litt ekstra kandidater så filtrering på kjøretøy fortsatt gir k treff
+    hits, scanned = index.search(code, k * 3 if exclude_vehicle_id else k, exclude=exclude_ids)
+    rows = {
+        r.id: r for r in db.execute(
+            select(AnalysisRecord).where(AnalysisRecord.id.in_([h[0] for h in hits]))
+        ).scalars()
+    } if hits else {}
+    matches = []
+    for analysis_id, distance in hits:
+        row = rows.get(analysis_id)
+        if row is None or (exclude_vehicle_id is not None and row.vehicle_id == exclude_vehicle_id):
+            continue
+        matches.append({
+            "analysis_id": analysis_id,
+            "distance": distance,
+            "vehicle_id": row.vehicle_id,
+            "panel": row.panel,
+            "product_id": row.product_id,
+            "cqi": row.cqi,
+            "cvi": row.cvi,
+            "created_at": row.created_at.isoformat() if row.created_at else None,
+        })
+    return {"matches": matches[:k], "scanned": scanned, "index": index.stats()}
+
+
+@router.get("/status")
+def similar_status(db: Session = Depends(get_db)):
+    from backend.app.services.similarity import index
+
+    index.refresh(db)
+    return {"status": "ok", **index.stats()}
+
+
+@router.post("")
+def similar_to_embedding(body: EmbeddingQuery, db: Session = Depends(get_db)):
+    """Nearest stored panels to a descriptor from an analysis result."""
+    if any(v < 0 or v > 255 for v in body.embedding):
+        raise HTTPException(status_code=422, detail="Embedding values must be 0..255")
+    return _matches(db, body.embedding, body.k, exclude_vehicle_id=body.exclude_vehicle_id)
+
+
+@router.get("/{analysis_id}")
+def similar_to_analysis(
+    analysis_id: int,
+    k: int = Query(10, ge=1, le=MAX_K),
+    exclude_same_vehicle: bool = False,
+    db: Session = Depends(get_db),
+):
+    """Most similar past panels to a stored analysis (itself excluded)."""
+    from backend.app.services.similarity import decode_code
+
+    record = db.get(AnalysisRecord, analysis_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    code = decode_code(record.embedding)
+    if code is None:
+        raise HTTPException(status_code=409, detail="Analysis has no stored descriptor")
+    out = _matches(db, code, k, exclude_ids=(analysis_id,),
+                   exclude_vehicle_id=record.vehicle_id if exclude_same_vehicle else None)
+    return {"analysis_id": analysis_id, **out}
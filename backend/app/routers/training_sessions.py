@@ -1,8 +1,122 @@
-from fastapi import APIRouter
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel, Field
+from sqlalchemy.orm import Session
+
+from backend.app.db import get_db
+from backend.app.db_async import get_async_db
+from backend.app.security import admin_guard
+from backend.app.services import training_store
+from backend.app.services.training import Phase
 
 router = APIRouter(prefix="/api/training-sessions", tags=["training-sessions"])
 
 
+class SessionCreate(BaseModel):
+    car_brand: str
+    panel: str
+    color: str
+    color_code: str
+    phase: Phase
+
+
+class BulkImages(BaseModel):
+    image_paths: List[str] = Field(..., max_length=training_store.MAX_BULK_IMAGES)
+
+
+def _session_out(record) -> dict:
+    return {
+        "id": record.id,
+        "car_brand": record.car_brand,
+        "panel": record.panel,
+        "color": record.color,
+        "color_code": record.color_code,
+        "phase": record.phase.value,
+        "image_count": record.image_count,
+        "created_at": record.created_at.isoformat() if record.created_at else None,
+    }
+
+
+def _get_or_404(db: Session, session_id: str):
+    record = training_store.get_session(db, session_id)
+    if not record:
+        raise HTTPException(status_code=404, detail="Training session not found")
+    return record
+
+
+async def _get_or_404_async(db, session_id: str):
+    record = await db.run_sync(training_store.get_session, session_id)
+    if not record:
+        raise HTTPException(status_code=404, detail="Training session not found")
+    return record
+
+
+# Lese-rutene bruker async-sesjonen (se db_async.py); skriving går via get_db
 @router.get("/")
-async def list_sessions():
-    return {"sessions": []}
+async def list_sessions(
+    limit: int = Query(50, ge=1, le=training_store.MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    phase: Optional[Phase] = None,
+    panel: Optional[str] = None,
+    db=Depends(get_async_db),
+):
+    items, total = await db.run_sync(
+        lambda s: training_store.list_sessions(s, limit=limit, offset=offset, phase=phase, panel=panel)
+    )
+    next_offset = offset + len(items)
+    return {
+        "sessions": [_session_out(r) for r in items],
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "next_offset": next_offset if next_offset < total else None,
+    }
+
+
+@router.post("/")
+def create_session(body: SessionCreate, db: Session = Depends(get_db), _=Depends(admin_guard)):
+    record = training_store.create_session(
+        db,
+        car_brand=body.car_brand,
+        panel=body.panel,
+        color=body.color,
+        color_code=body.color_code,
+        phase=body.phase,
+    )
+    return {"status": "created", "session": _session_out(record)}
+
+
+@router.get("/counts")
+async def session_counts(db=Depends(get_async_db)):
+    """Sessions and images per (phase, panel), read from incrementally maintained counters."""
+    return {"counts": await db.run_sync(training_store.phase_counts)}
+
+
+@router.get("/{session_id}")
+async def get_session(session_id: str, db=Depends(get_async_db)):
+    return _session_out(await _get_or_404_async(db, session_id))
+
+
+@router.post("/{session_id}/images/bulk")
+def add_images_bulk(
+    session_id: str, body: BulkImages, db: Session = Depends(get_db), _=Depends(admin_guard)
+):
+    record = _get_or_404(db, session_id)
+    added = training_store.add_images(db, record, body.image_paths)
+    return {"status": "added", "added": added, "image_count": record.image_count}
+
+
+@router.get("/{session_id}/images")
+async def list_session_images(
+    session_id: str,
+    limit: int = Query(100, ge=1, le=training_store.MAX_PAGE_SIZE),
+    after_id: int = Query(0, ge=0),
+    db=Depends(get_async_db),
+):
+    await _get_or_404_async(db, session_id)
+    images = await db.run_sync(lambda s: training_store.list_images(s, session_id, limit=limit, after_id=after_id))
+    return {
+        "images": [{"id": img.id, "path": img.path} for img in images],
+        "next_after_id": images[-1].id if len(images) == limit else None,
+    }
@@ -1,29 +1,84 @@
 # backend/app/routers/wash.py
-from fastapi import APIRouter
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel, Field
+from sqlalchemy.orm import Session
 from typing import Optional
 
+from backend.app.db import get_db
+from backend.app.services import analysis_store, wash_model
+
 router = APIRouter(prefix="/api/wash", tags=["wash"])
 
 
 class WashAnalysis(BaseModel):
+    # analysis_id (analysisId fra analyze-live) foretrekkes; image_id er resultat-id-en
+    analysis_id: Optional[int] = None
     image_id: Optional[str] = None
     wash_count: int = 0
     condition: str = "good"
+    product_id: Optional[int] = None
+
+
+class WashEventIn(BaseModel):
+    vehicle_id: str
+    panel: str
+    wash_count: int = Field(..., ge=0, description="Total washes since coating, including this one")
+    product_id: Optional[int] = None
+    # Analysen tatt etter vasken; uten begge brukes siste analyse av panelet
+    analysis_id: Optional[int] = None
+    image_id: Optional[str] = None
 
 
 @router.get("/status")
 async def wash_status():
-    return {"status": "ok", "module": "wash_analysis", "version": "1.0.0"}
+    return {"status": "ok", "module": "wash_analysis", "version": "1.1.0"}
 
 
 @router.post("/analyze")
-async def analyze_wash(analysis: WashAnalysis):
-    durability_score = max(0, 100 - (analysis.wash_count * 2))
+def analyze_wash(analysis: WashAnalysis, db: Session = Depends(get_db)):
+    """Predicted durability after `wash_count` washes from the product's fitted curve.
+
+    With `analysis_id` (or the result id as `image_id`), the stored analysis supplies
+    the product and the observed retention against the panel's first analysis.
+    """
+    if analysis.analysis_id is not None:
+        record = analysis_store.get_analysis(db, analysis.analysis_id)
+        if record is None:
+            raise HTTPException(status_code=404, detail="Analysis not found")
+    else:
+        record = analysis_store.by_image_id(db, analysis.image_id) if analysis.image_id else None
+    product_id = analysis.product_id if analysis.product_id is not None else (record.product_id if record else None)
+    prediction = wash_model.predict(db, product_id, analysis.wash_count)
+    observed = wash_model.retention_for(db, record) if record is not None else None
     return {
         "status": "analyzed",
         "wash_count": analysis.wash_count,
         "condition": analysis.condition,
-        "durability_score": durability_score,
-        "recommendation": "continue" if durability_score > 50 else "recoat_recommended",
+        **prediction,
+        "analysis_id": record.id if record is not None else None,
+        "observed_retention": round(observed * 100, 2) if observed is not None else None,
+    }
+
+
+@router.post("/events")
+def add_wash_event(body: WashEventIn, db: Session = Depends(get_db)):
+    """Record a wash and fold the linked analysis into the product's degradation fit."""
+    if body.analysis_id is not None and analysis_store.get_analysis(db, body.analysis_id) is None:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    try:
+        event = wash_model.add_event(db, **body.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    product_id = None if event.product_key == "unknown" else int(event.product_key)
+    return {
+        "status": "recorded",
+        "event": {
+            "id": event.id,
+            "vehicle_id": event.vehicle_id,
+            "panel": event.panel,
+            "wash_count": event.wash_count,
+            "analysis_id": event.analysis_id,
+            "retention": round(event.retention * 100, 2) if event.retention is not None else None,
+        },
+        "prediction": wash_model.predict(db, product_id, event.wash_count),
     }
@@ -0,0 +1,114 @@
+"""
+Local analysis records per vehicle panel.
+
+The analysis routes store a compact row (CQI, CVI, ids) when the request
+metadata names a vehicle and panel (vehicleId/vehicle_id, panel, optional
+productId/product_id). Wash events and trends link to these rows. Lookups by
+vehicle and panel use the (vehicle_id, panel, id) index: the first row is the
+panel's baseline and the last is the latest state, each found with one index seek.
+Each record is also appended to the panel's time series (services/series.py) in
+the same transaction. The analysis descriptor, if the result has one, is stored
+with the row and added to the similarity index (services/similarity.py), and so
+is the version of the parameter set that produced the numbers.
+"""
+from datetime import datetime, timezone
+from typing import Mapping, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from backend.app.db import commit
+from backend.app.models.analysis import AnalysisRecord
+from backend.app.services import series, similarity
+
+
+def record_analysis(
+    db: Session,
+    vehicle_id: str,
+    panel: str,
+    metrics: Mapping,
+    image_id: Optional[str] = None,
+    product_id: Optional[int] = None,
+    at: Optional[datetime] = None,
+) -> AnalysisRecord:
+    at = at or datetime.now(timezone.utc)
+    record = AnalysisRecord(
+        vehicle_id=vehicle_id,
+        panel=panel,
+        image_id=image_id,
+        product_id=product_id,
+        cqi=float(metrics["cqi"]),
+        cvi=float(metrics["cvi"]),
+        created_at=at,
+        embedding=bytes(bytearray(metrics["embedding"])) if metrics.get("embedding") else None,
+        analysis_version=metrics.get("analysis_version"),
+    )
+    db.add(record)
+    series.append(db, vehicle_id, panel, at, record.cqi, record.cvi)
+    commit(db)
+    # Ikke lastet indeks henter raden selv ved første søk
+    if record.embedding is not None and similarity.index.loaded:
+        similarity.index.add(record.id, similarity.decode_code(record.embedding))
+    return record
+
+
+def get_analysis(db: Session, analysis_id: int) -> Optional[AnalysisRecord]:
+    return db.get(AnalysisRecord, analysis_id)
+
+
+def by_image_id(db: Session, image_id: str) -> Optional[AnalysisRecord]:
+    return db.execute(
+        select(AnalysisRecord).where(AnalysisRecord.image_id == image_id)
+        .order_by(AnalysisRecord.id.desc()).limit(1)
+    ).scalar_one_or_none()
+
+
+def _edge(db: Session, vehicle_id: str, panel: str, first: bool) -> Optional[AnalysisRecord]:
+    order = AnalysisRecord.id.asc() if first else AnalysisRecord.id.desc()
+    return db.execute(
+        select(AnalysisRecord)
+        .where(AnalysisRecord.vehicle_id == vehicle_id, AnalysisRecord.panel == panel)
+        .order_by(order).limit(1)
+    ).scalar_one_or_none()
+
+
+def baseline(db: Session, vehicle_id: str, panel: str) -> Optional[AnalysisRecord]:
+    """First stored analysis of the panel (taken after coating, before any wash)."""
+    return _edge(db, vehicle_id, panel, first=True)
+
+
+def latest(db: Session, vehicle_id: str, panel: str) -> Optional[AnalysisRecord]:
+    return _edge(db, vehicle_id, panel, first=False)
+
+
+def _meta_value(meta: Mapping, *names):
+    for name in names:
+        value = meta.get(name)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def record_from_request(result: Mapping, meta: Optional[Mapping]) -> Optional[int]:
+    """Store the analysis if `meta` names a vehicle and panel; returns the row id.
+
+    Called from the analysis routes; opens its own session.
+    """
+    if not meta:
+        return None
+    vehicle_id = _meta_value(meta, "vehicleId", "vehicle_id")
+    panel = _meta_value(meta, "panel")
+    if vehicle_id is None or panel is None:
+        return None
+    product_id = _meta_value(meta, "productId", "product_id")
+
+    from backend.app.db import SessionLocal, init_db
+
+    init_db()
+    with SessionLocal() as db:
+        record = record_analysis(
+            db, str(vehicle_id), str(panel), result["result"],
+            image_id=result.get("id"),
+            product_id=int(product_id) if product_id is not None else None,
+        )
+        return record.id
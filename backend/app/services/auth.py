@@ -0,0 +1,149 @@
+"""
+Password hashing and JWT verification for the auth router.
+
+Passwords are hashed with scrypt (memory-hard, in hashlib). A stored hash is
+self-describing: "scrypt$<n>$<r>$<p>$<salt_hex>$<hash_hex>". Legacy rows store
+sha256(salt + password) as plain hex plus a separate salt column. They still verify,
+and `verify_password` reports that they need a rehash, so login upgrades them.
+
+Hashing is deliberately slow, so it runs in its own bounded executor rather than on the
+event loop or Starlette's threadpool. COATVISION_HASH_WORKERS caps both the CPU and
+the memory (~128 * n * r bytes per hash) that concurrent logins can use.
+
+Verified tokens are kept in a small LRU keyed by sha256(token) until their `exp`,
+so repeated requests with the same bearer token skip signature verification.
+"""
+import asyncio
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+import jwt
+
+from backend.app.services.metrics import cache_hit, cache_miss
+
+JWT_SECRET = os.getenv("JWT_SECRET", "dev-secret-change-me")
+JWT_ALGO = os.getenv("JWT_ALGO", "HS256")
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
+
+SCRYPT_N = int(os.getenv("COATVISION_SCRYPT_N", str(2 ** 14)))
+SCRYPT_R = int(os.getenv("COATVISION_SCRYPT_R", "8"))
+SCRYPT_P = int(os.getenv("COATVISION_SCRYPT_P", "1"))
+HASH_WORKERS = int(os.getenv("COATVISION_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+TOKEN_CACHE_SIZE = int(os.getenv("COATVISION_TOKEN_CACHE_SIZE", "1024"))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(password.encode("utf-8"), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r * p, dklen=32)
+
+
+def _legacy_sha256(password: str, salt: str) -> str:
+    return hashlib.sha256((salt + password).encode("utf-8")).hexdigest()
+
+
+def hash_password(password: str) -> str:
+    salt = secrets.token_bytes(16)
+    digest = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${salt.hex()}${digest.hex()}"
+
+
+def verify_password(password: str, stored: str, legacy_salt: Optional[str] = None) -> Tuple[bool, bool]:
+    """Return (valid, needs_rehash). Comparisons are constant-time."""
+    if stored.startswith("scrypt$"):
+        try:
+            _, n, r, p, salt_hex, hash_hex = stored.split("$")
+            n, r, p = int(n), int(r), int(p)
+            digest = _scrypt(password, bytes.fromhex(salt_hex), n, r, p)
+        except ValueError:
+            return False, False
+        valid = hmac.compare_digest(digest.hex(), hash_hex)
+        return valid, valid and (n, r, p) != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    valid = hmac.compare_digest(_legacy_sha256(password, legacy_salt or ""), stored)
+    return valid, valid
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="pwhash")
+    return _executor
+
+
+async def hash_password_async(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_get_executor(), hash_password, password)
+
+
+async def verify_password_async(password: str, stored: str, legacy_salt: Optional[str] = None) -> Tuple[bool, bool]:
+    return await asyncio.get_running_loop().run_in_executor(
+        _get_executor(), verify_password, password, stored, legacy_salt
+    )
+
+
+def create_access_token(user_id: str, email: str) -> str:
+    exp = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    return jwt.encode({"sub": user_id, "email": email, "exp": exp}, JWT_SECRET, algorithm=JWT_ALGO)
+
+
+class TokenCache:
+    """LRU of verified JWT claims keyed by token digest; entries expire with the token."""
+
+    def __init__(self, maxsize: int = TOKEN_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._items: "OrderedDict[bytes, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: bytes) -> Optional[Dict]:
+        with self._lock:
+            claims = self._items.get(key)
+            if claims is None:
+                return None
+            if claims.get("exp", 0) <= time.time():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return claims
+
+    def put(self, key: bytes, claims: Dict) -> None:
+        if self.maxsize <= 0 or "exp" not in claims:
+            return  # tokens uten utløp caches ikke
+        with self._lock:
+            self._items[key] = claims
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+token_cache = TokenCache()
+
+
+def decode_token(token: str) -> Dict:
+    """Verified claims for `token`; raises jwt.InvalidTokenError. Cached until `exp`."""
+    key = hashlib.sha256(token.encode("utf-8")).digest()
+    claims = token_cache.get(key)
+    if claims is not None:
+        cache_hit("jwt")
+        return claims
+    cache_miss("jwt")
+    claims = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGO])
+    token_cache.put(key, claims)
+    return claims
@@ -0,0 +1,187 @@
+"""
+Reference-card calibration: patch detection and the color solve.
+
+The reference card is a 24-patch ColorChecker Classic (6 x 4, neutral row from
+white to black). `detect_patches` finds the patches as a grid of similar-sized
+quadrilaterals on a reduced-resolution copy. It orders them into the chart
+layout and rotates 180 degrees if the neutral row is on top. It returns the
+median RGB of the inner part of each patch.
+
+`solve` fits the profile model used by profiles.compile_lut,
+    out_c = g_c * ((x_c - 128) * contrast + 128 + brightness),
+to the reference values: a per-channel line through the neutral patches gives
+contrast and brightness (green as reference) and the white-balance gains; a
+least-squares gain per channel over all 24 patches then gives the color
+correction. The residual mean error before and after is reported.
+"""
+from typing import Dict, List, Optional, Sequence
+
+from backend.app.lazy import lazy_import
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+ROWS, COLS = 4, 6
+NEUTRAL_ROW = 3
+MAX_SIDE = 1024
+
+# ColorChecker Classic, sRGB 8-bit referanseverdier (rad for rad)
+REFERENCE_RGB = [
+    (115, 82, 68), (194, 150, 130), (98, 122, 157), (87, 108, 67), (133, 128, 177), (103, 189, 170),
+    (214, 126, 44), (80, 91, 166), (193, 90, 99), (94, 60, 108), (157, 188, 64), (224, 163, 46),
+    (56, 61, 150), (70, 148, 73), (175, 54, 60), (231, 199, 31), (187, 86, 149), (8, 133, 161),
+    (243, 243, 242), (200, 200, 200), (160, 160, 160), (122, 122, 121), (85, 85, 85), (52, 52, 52),
+]
+
+
+class ChartNotFound(ValueError):
+    pass
+
+
+def _candidate_quads(gray: "np.ndarray") -> List:
+    edges = cv2.Canny(cv2.GaussianBlur(gray, (5, 5), 0), 20, 60)
+    edges = cv2.dilate(edges, np.ones((3, 3), np.uint8))
+    contours, _ = cv2.findContours(edges, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+    min_area = gray.size / 2000
+    quads = []
+    for contour in contours:
+        area = cv2.contourArea(contour)
+        if area < min_area or area > gray.size / 30:
+            continue
+        approx = cv2.approxPolyDP(contour, 0.08 * cv2.arcLength(contour, True), True)
+        if len(approx) != 4 or not cv2.isContourConvex(approx):
+            continue
+        (_, _), (w, h), _ = cv2.minAreaRect(approx)
+        if min(w, h) == 0 or not 0.6 < w / h < 1.6:
+            continue
+        quads.append(approx.reshape(4, 2).astype(np.float32))
+    return quads
+
+
+def _dedupe(quads: List) -> List:
+    # Innsiden og utsiden av samme kant gir to nesten like konturer; behold den minste
+    quads = sorted(quads, key=cv2.contourArea)
+    kept, centers = [], []
+    for quad in quads:
+        center = quad.mean(axis=0)
+        size = np.sqrt(cv2.contourArea(quad))
+        if all(np.linalg.norm(center - c) > size / 2 for c in centers):
+            kept.append(quad)
+            centers.append(center)
+    return kept
+
+
+def _grid_order(centers: "np.ndarray") -> "np.ndarray":
+    """Indices of `centers` in chart order (row-major, rows along the long side)."""
+    (cx, cy), (w, h), angle = cv2.minAreaRect(centers.astype(np.float32))
+    if w < h:
+        angle += 90
+    theta = np.deg2rad(angle)
+    rotation = np.array([[np.cos(theta), np.sin(theta)], [-np.sin(theta), np.cos(theta)]])
+    local = (centers - (cx, cy)) @ rotation.T
+    by_row = np.argsort(local[:, 1], kind="stable")
+    order = []
+    for r in range(ROWS):
+        row = by_row[r * COLS:(r + 1) * COLS]
+        order.extend(row[np.argsort(local[row, 0], kind="stable")])
+    return np.array(order)
+
+
+def _neutrality(rgb: "np.ndarray") -> float:
+    # Lav kroma og fallende lyshet fra hvit mot svart kjennetegner nøytralraden
+    chroma = float(np.mean(rgb.max(axis=1) - rgb.min(axis=1)))
+    luma = rgb.mean(axis=1)
+    monotonic = float(np.mean(np.diff(luma) < 0))
+    return monotonic * 100 - chroma
+
+
+def detect_patches(image: "np.ndarray") -> "np.ndarray":
+    """24x3 float array of measured patch RGB in chart order; raises ChartNotFound."""
+    scale = min(1.0, MAX_SIDE / max(image.shape[:2]))
+    small = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else image
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    quads = _dedupe(_candidate_quads(gray))
+    if len(quads) < ROWS * COLS:
+        raise ChartNotFound(f"Found {len(quads)} of {ROWS * COLS} chart patches")
+    areas = np.array([cv2.contourArea(q) for q in quads])
+    median = np.median(areas)
+    quads = [q for q, a in zip(quads, areas) if 0.5 * median < a < 2 * median]
+    if len(quads) != ROWS * COLS:
+        raise ChartNotFound(f"Found {len(quads)} similar patches, expected {ROWS * COLS}")
+
+    centers = np.array([q.mean(axis=0) for q in quads])
+    quads = [quads[i] for i in _grid_order(centers)]
+    rgb = np.empty((ROWS * COLS, 3), dtype=np.float64)
+    for i, quad in enumerate(quads):
+        # Midtre halvdel av feltet unngår kanter og skygger fra rammen
+        center = quad.mean(axis=0)
+        inner = (center + (quad - center) * 0.5).astype(np.int32)
+        mask = np.zeros(gray.shape, np.uint8)
+        cv2.fillConvexPoly(mask, inner, 255)
+        bgr = small[mask > 0]
+        rgb[i] = np.median(bgr, axis=0)[::-1]
+
+    if _neutrality(rgb[:COLS][::-1]) > _neutrality(rgb[NEUTRAL_ROW * COLS:]):
+        rgb = rgb[::-1]  # kortet er fotografert opp ned
+    return rgb
+
+
+def _apply(rgb: "np.ndarray", contrast: float, brightness: float, gains: "np.ndarray") -> "np.ndarray":
+    return np.clip(((rgb - 128.0) * contrast + 128.0 + brightness) * gains, 0, 255)
+
+
+def solve(measured: "np.ndarray", reference: Optional[Sequence] = None) -> Dict:
+    """Profile parameters mapping `measured` (24x3 RGB) onto the reference chart."""
+    reference = np.asarray(reference if reference is not None else REFERENCE_RGB, dtype=np.float64)
+    neutral = slice(NEUTRAL_ROW * COLS, (NEUTRAL_ROW + 1) * COLS)
+    slopes, offsets = [], []
+    for c in range(3):
+        slope, offset = np.polyfit(measured[neutral, c], reference[neutral, c], 1)
+        slopes.append(slope)
+        offsets.append(offset)
+    contrast = float(slopes[1])
+    if contrast <= 0:
+        raise ChartNotFound("Neutral patches do not increase in brightness; check the chart photo")
+    brightness = float(offsets[1] - 128.0 * (1.0 - contrast))
+    white_balance = np.array([slopes[0] / slopes[1], 1.0, slopes[2] / slopes[1]])
+
+    balanced = _apply(measured, contrast, brightness, white_balance)
+    correction = (balanced * reference).sum(axis=0) / np.maximum((balanced ** 2).sum(axis=0), 1e-9)
+    corrected = _apply(measured, contrast, brightness, white_balance * correction)
+    return {
+        "brightness_offset": round(float(np.clip(brightness, -128, 128)), 3),
+        "contrast_factor": round(float(np.clip(contrast, 0.05, 4.0)), 4),
+        "color_correction": [round(float(g), 4) for g in correction],
+        "white_balance": [round(float(g), 4) for g in white_balance],
+        "error_before": round(float(np.abs(measured - reference).mean()), 2),
+        "error_after": round(float(np.abs(corrected - reference).mean()), 2),
+    }
+
+
+def render_chart(
+    width: int = 960,
+    cast: Sequence[float] = (1.0, 1.0, 1.0),
+    contrast: float = 1.0,
+    brightness: float = 0.0,
+) -> "np.ndarray":
+    """Synthetic BGR photo of the chart on a gray background (tests and benchmarks).
+
+    The reference values are distorted by the inverse of the profile model, so the
+    solve recovers `contrast`, `brightness` and `cast` as the channel gains (up to
+    clipping of values pushed outside 0..255).
+    """
+    height = int(width * 0.75)
+    image = np.full((height, width, 3), 90, np.uint8)
+    cell = width // 10
+    gap = cell // 6
+    x0, y0 = (width - COLS * cell) // 2, (height - ROWS * cell) // 2
+    cv2.rectangle(image, (x0 - gap, y0 - gap), (x0 + COLS * cell + gap, y0 + ROWS * cell + gap), (25, 25, 25), -1)
+    for i, (r, g, b) in enumerate(REFERENCE_RGB):
+        row, col = divmod(i, COLS)
+        raw = (np.array([r, g, b], dtype=np.float64) / np.asarray(cast) - 128.0 - brightness) / contrast + 128.0
+        bgr = tuple(int(v) for v in np.clip(np.rint(raw[::-1]), 0, 255))
+        top_left = (x0 + col * cell + gap, y0 + row * cell + gap)
+        bottom_right = (x0 + (col + 1) * cell - gap, y0 + (row + 1) * cell - gap)
+        cv2.rectangle(image, top_left, bottom_right, bgr, -1)
+    return image
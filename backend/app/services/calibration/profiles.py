@@ -0,0 +1,342 @@
+"""
+Calibration profiles per device and site, compiled to 8-bit lookup tables.
+
+A profile holds brightness offset, contrast factor, per-channel color correction
+and (optionally fixed) white-balance gains. Every pixel transform here is a pure
+function of the input value per channel, so the whole profile compiles to one
+256x3 uint8 table, applied with `cv2.LUT` in place before feature extraction.
+That replaces several float passes over the frame with one table lookup per byte.
+
+Profiles are versioned rows (models/calibration.py). Compiled tables are cached
+by (scope, scope_id, version), so a new version never reuses a stale table. The
+(device, site) -> active profile lookup is cached for COATVISION_CALIBRATION_REFRESH_S
+seconds (at most COATVISION_CALIBRATION_PROFILE_CACHE pairs, least recently used
+dropped first) and dropped in-process when a profile is saved. Async routes use
+`for_request_async`, which does the database lookup on a miss in a worker thread. The device profile wins
+over the site profile; with neither, frames are analysed uncalibrated.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Mapping, Optional, Tuple
+
+from anyio import to_thread
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from backend.app.db import commit
+from backend.app.lazy import lazy_import
+from backend.app.models.calibration import CalibrationProfile
+from backend.app.services.metrics import cache_hit, cache_miss
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+SCOPES = ("device", "site")
+REFRESH_S = float(os.getenv("COATVISION_CALIBRATION_REFRESH_S", "30"))
+LUT_CACHE_SIZE = int(os.getenv("COATVISION_CALIBRATION_LUT_CACHE", "64"))
+PROFILE_CACHE_SIZE = int(os.getenv("COATVISION_CALIBRATION_PROFILE_CACHE", "1024"))
+# Forsøk på å lagre neste versjon når en samtidig lagring tok versjonsnummeret
+SAVE_ATTEMPTS = 3
+
+DEFAULT_PARAMETERS = {
+    "brightness_offset": 0,
+    "contrast_factor": 1.0,
+    "color_correction": [1.0, 1.0, 1.0],
+    "white_balance": "auto",
+}
+
+RGB = Tuple[float, float, float]
+
+
+class VersionConflict(RuntimeError):
+    """Concurrent saves kept taking the next version number of a profile."""
+
+
+@dataclass(frozen=True)
+class Profile:
+    scope: str
+    scope_id: str
+    version: int
+    brightness_offset: float = 0.0
+    contrast_factor: float = 1.0
+    color_correction: RGB = (1.0, 1.0, 1.0)
+    white_balance: Optional[RGB] = None  # None = "auto"
+    source: str = "manual"
+    created_at: Optional[datetime] = field(default=None, compare=False)
+
+    @property
+    def key(self) -> Tuple[str, str, int]:
+        return self.scope, self.scope_id, self.version
+
+    @property
+    def is_identity(self) -> bool:
+        return (
+            self.brightness_offset == 0
+            and self.contrast_factor == 1
+            and all(g == 1 for g in self.gains)
+        )
+
+    @property
+    def gains(self) -> RGB:
+        wb = self.white_balance or (1.0, 1.0, 1.0)
+        return tuple(c * w for c, w in zip(self.color_correction, wb))
+
+    def parameters(self) -> dict:
+        return {
+            "brightness_offset": self.brightness_offset,
+            "contrast_factor": self.contrast_factor,
+            "color_correction": list(self.color_correction),
+            "white_balance": list(self.white_balance) if self.white_balance else "auto",
+        }
+
+    def ref(self) -> dict:
+        return {"scope": self.scope, "scope_id": self.scope_id, "version": self.version}
+
+
+def _from_record(record: CalibrationProfile) -> Profile:
+    wb = (record.wb_r, record.wb_g, record.wb_b)
+    return Profile(
+        scope=record.scope,
+        scope_id=record.scope_id,
+        version=record.version,
+        brightness_offset=record.brightness_offset,
+        contrast_factor=record.contrast_factor,
+        color_correction=(record.gain_r, record.gain_g, record.gain_b),
+        white_balance=None if None in wb else wb,
+        source=record.source,
+        created_at=record.created_at,
+    )
+
+
+# --- lagring ---
+
+def save_profile(
+    db: Session,
+    scope: str,
+    scope_id: str,
+    brightness_offset: float = 0.0,
+    contrast_factor: float = 1.0,
+    color_correction: RGB = (1.0, 1.0, 1.0),
+    white_balance: Optional[RGB] = None,
+    source: str = "manual",
+) -> Profile:
+    """Insert the next version of a profile and return it.
+
+    Raises VersionConflict if concurrent saves of the same profile keep winning
+    the version number.
+    """
+    if scope not in SCOPES:
+        raise ValueError(f"Unknown calibration scope: {scope}")
+    wb = white_balance or (None, None, None)
+    for _ in range(SAVE_ATTEMPTS):
+        current = db.execute(
+            select(func.max(CalibrationProfile.version)).where(
+                CalibrationProfile.scope == scope, CalibrationProfile.scope_id == scope_id
+            )
+        ).scalar()
+        record = CalibrationProfile(
+            scope=scope,
+            scope_id=scope_id,
+            version=(current or 0) + 1,
+            brightness_offset=float(brightness_offset),
+            contrast_factor=float(contrast_factor),
+            gain_r=float(color_correction[0]),
+            gain_g=float(color_correction[1]),
+            gain_b=float(color_correction[2]),
+            wb_r=wb[0],
+            wb_g=wb[1],
+            wb_b=wb[2],
+            source=source,
+        )
+        # Savepoint: en kollisjon på versjonen ruller bare tilbake denne raden
+        try:
+            with db.begin_nested():
+                db.add(record)
+            break
+        except IntegrityError:
+            continue
+    else:
+        raise VersionConflict(f"Could not save a new version of {scope} profile {scope_id!r}")
+    commit(db)
+    db.refresh(record)
+    resolver.invalidate()
+    return _from_record(record)
+
+
+def active_profile(db: Session, scope: str, scope_id: str) -> Optional[Profile]:
+    record = db.execute(
+        select(CalibrationProfile)
+        .where(CalibrationProfile.scope == scope, CalibrationProfile.scope_id == scope_id)
+        .order_by(CalibrationProfile.version.desc())
+        .limit(1)
+    ).scalar_one_or_none()
+    return _from_record(record) if record else None
+
+
+def list_active_profiles(db: Session) -> List[Profile]:
+    latest = (
+        select(CalibrationProfile.scope, CalibrationProfile.scope_id,
+               func.max(CalibrationProfile.version).label("version"))
+        .group_by(CalibrationProfile.scope, CalibrationProfile.scope_id)
+        .subquery()
+    )
+    records = db.execute(
+        select(CalibrationProfile).join(
+            latest,
+            (CalibrationProfile.scope == latest.c.scope)
+            & (CalibrationProfile.scope_id == latest.c.scope_id)
+            & (CalibrationProfile.version == latest.c.version),
+        ).order_by(CalibrationProfile.scope, CalibrationProfile.scope_id)
+    ).scalars()
+    return [_from_record(r) for r in records]
+
+
+def latest_profile(db: Session) -> Optional[Profile]:
+    """The most recently saved profile version of any scope."""
+    record = db.execute(
+        select(CalibrationProfile).order_by(CalibrationProfile.id.desc()).limit(1)
+    ).scalar_one_or_none()
+    return _from_record(record) if record else None
+
+
+def resolve(db: Session, device_id: Optional[str], site_id: Optional[str]) -> Optional[Profile]:
+    """Device profile if one exists, else the site profile, else None."""
+    for scope, scope_id in (("device", device_id), ("site", site_id)):
+        if scope_id:
+            profile = active_profile(db, scope, scope_id)
+            if profile is not None:
+                return profile
+    return None
+
+
+# --- kompilering og bruk ---
+
+def compile_lut(profile: Profile) -> "np.ndarray":
+    """1x256x3 uint8 table in BGR channel order, as cv2.LUT expects for BGR frames.
+
+    With equal gains on all channels it is a 1x256 table instead; cv2.LUT applies a
+    single-channel table to every channel at about half the cost.
+    """
+    x = np.arange(256, dtype=np.float32)
+    base = (x - 128.0) * profile.contrast_factor + 128.0 + profile.brightness_offset
+    r, g, b = profile.gains
+    if r == g == b:
+        return np.clip(np.rint(base * r), 0, 255).astype(np.uint8).reshape(1, 256)
+    table = np.stack([base * b, base * g, base * r], axis=1)
+    return np.clip(np.rint(table), 0, 255).astype(np.uint8).reshape(1, 256, 3)
+
+
+class LutCache:
+    """LRU of compiled tables keyed by profile version."""
+
+    def __init__(self, maxsize: int = LUT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._items: "OrderedDict[Tuple[str, str, int], np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, profile: Profile) -> "np.ndarray":
+        with self._lock:
+            table = self._items.get(profile.key)
+            if table is not None:
+                self._items.move_to_end(profile.key)
+                cache_hit("calibration_lut")
+                return table
+        cache_miss("calibration_lut")
+        table = compile_lut(profile)
+        table.setflags(write=False)
+        with self._lock:
+            self._items[profile.key] = table
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        return table
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+_MISS = object()
+
+
+class ProfileResolver:
+    """TTL + LRU cache of (device_id, site_id) -> active profile, so frames don't hit the DB."""
+
+    def __init__(self, ttl: float = REFRESH_S, maxsize: int = PROFILE_CACHE_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        # Nøklene kommer fra klienten, så cachen må ha en øvre grense
+        self._items: "OrderedDict[Tuple[Optional[str], Optional[str]], Tuple[float, Optional[Profile]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def cached(self, device_id: Optional[str], site_id: Optional[str]):
+        """The cached profile (None included), or `_MISS` if a lookup is needed."""
+        if not device_id and not site_id:
+            return None
+        key = (device_id, site_id)
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and item[0] > time.monotonic():
+                self._items.move_to_end(key)
+                return item[1]
+        return _MISS
+
+    def get(self, device_id: Optional[str], site_id: Optional[str]) -> Optional[Profile]:
+        profile = self.cached(device_id, site_id)
+        if profile is not _MISS:
+            return profile
+        from backend.app.db import SessionLocal, init_db
+
+        init_db()
+        with SessionLocal() as db:
+            profile = resolve(db, device_id, site_id)
+        with self._lock:
+            self._items[(device_id, site_id)] = (time.monotonic() + self.ttl, profile)
+            self._items.move_to_end((device_id, site_id))
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        return profile
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+lut_cache = LutCache()
+resolver = ProfileResolver()
+
+
+def _request_key(meta: Optional[Mapping]) -> Tuple[Optional[str], Optional[str]]:
+    if not meta:
+        return None, None
+    device_id = meta.get("deviceId") or meta.get("device_id")
+    site_id = meta.get("siteId") or meta.get("site_id")
+    return str(device_id) if device_id else None, str(site_id) if site_id else None
+
+
+def for_request(meta: Optional[Mapping]) -> Optional[Profile]:
+    """Active profile for a request's deviceId/siteId metadata (either spelling)."""
+    return resolver.get(*_request_key(meta))
+
+
+async def for_request_async(meta: Optional[Mapping]) -> Optional[Profile]:
+    """`for_request` for async routes: cache hits inline, the DB lookup in a worker thread."""
+    key = _request_key(meta)
+    profile = resolver.cached(*key)
+    if profile is _MISS:
+        profile = await to_thread.run_sync(resolver.get, *key)
+    return profile
+
+
+def apply(image: "np.ndarray", profile: Optional[Profile]) -> "np.ndarray":
+    """Apply the profile's table to a BGR uint8 frame in place (no-op for identity/None)."""
+    if profile is None or profile.is_identity:
+        return image
+    return cv2.LUT(image, lut_cache.get(profile), dst=image)
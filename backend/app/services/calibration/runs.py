@@ -0,0 +1,82 @@
+"""
+Calibration runs as background jobs on the shared worker pool (services/workers.py).
+
+`start` only checks the scope and hands the uploaded photo bytes to a job, so the
+request returns at once. The job detects the chart in each photo and solves on the
+per-patch median across the photos that succeeded. It then saves the result as
+the next profile version (source "chart"). Photos without a detectable chart are
+reported in the result, and the run fails only if none of them had one.
+"""
+import os
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+from backend.app.lazy import lazy_import
+from backend.app.services.calibration import chart, profiles
+from backend.app.services.workers import Job, pool
+
+np = lazy_import("numpy")
+
+KIND = "calibration"
+INTERVAL_DAYS = int(os.getenv("COATVISION_CALIBRATION_INTERVAL_DAYS", "180"))
+
+
+def run(job: Job, photos: List[bytes], scope: str, scope_id: str) -> Dict:
+    from backend.app.core.coatvision_core import decode_image_bytes
+    from backend.app.db import SessionLocal, init_db
+
+    steps = len(photos) + 2
+    measured, failures = [], []
+    for i, data in enumerate(photos):
+        job.report(i / steps, f"Detecting chart patches in photo {i + 1}/{len(photos)}")
+        try:
+            measured.append(chart.detect_patches(decode_image_bytes(data)))
+        except ValueError as e:
+            failures.append({"photo": i, "error": str(e)})
+    if not measured:
+        raise chart.ChartNotFound("No reference chart found in any photo: "
+                                  + "; ".join(f["error"] for f in failures))
+
+    job.report(len(photos) / steps, "Solving color correction and white balance")
+    solution = chart.solve(np.median(np.stack(measured), axis=0))
+
+    job.report((len(photos) + 1) / steps, "Saving profile")
+    init_db()
+    with SessionLocal() as db:
+        profile = profiles.save_profile(
+            db, scope, scope_id,
+            brightness_offset=solution["brightness_offset"],
+            contrast_factor=solution["contrast_factor"],
+            color_correction=tuple(solution["color_correction"]),
+            white_balance=tuple(solution["white_balance"]),
+            source="chart",
+        )
+    return {
+        "profile": profile.ref(),
+        "photos": len(photos),
+        "photos_used": len(measured),
+        "failures": failures,
+        "error_before": solution["error_before"],
+        "error_after": solution["error_after"],
+    }
+
+
+def start(photos: List[bytes], scope: str, scope_id: str) -> Job:
+    if scope not in profiles.SCOPES:
+        raise ValueError(f"Unknown calibration scope: {scope}")
+    return pool.submit(KIND, run, photos, scope, scope_id)
+
+
+def status(latest: Optional[profiles.Profile]) -> Dict:
+    """/api/calibration/status payload from the newest profile and the jobs of every worker."""
+    jobs = pool.jobs(KIND)
+    last_job = jobs[-1].as_dict() if jobs else None
+    last = latest.created_at if latest is not None else None
+    return {
+        "status": "running" if any(not j.finished for j in jobs) else "ok",
+        "calibrated": latest is not None,
+        "last_calibration": last.isoformat() if last else None,
+        "next_recommended": (last + timedelta(days=INTERVAL_DAYS)).isoformat() if last else None,
+        "profile": {**latest.ref(), "source": latest.source} if latest is not None else None,
+        "last_job": last_job,
+    }
@@ -0,0 +1,86 @@
+"""
+Producer/product catalog queries.
+
+Plain functions over a sync `Session`, like training_store. Async routes call them
+through `AsyncSession.run_sync`, so the queries exist once for both layers.
+
+Listings are newest first and keyset-paginated on id (`before_id`), so a page costs
+the same at any depth. The filters have composite (filter, id) indexes, so a
+filtered page is a backwards range scan. Name search is a case-insensitive
+substring match.
+"""
+from typing import List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from backend.app.db import commit
+from backend.app.models.catalog import Producer, Product
+
+MAX_PAGE_SIZE = 500
+
+
+def create_producer(db: Session, **fields) -> Producer:
+    record = Producer(**fields)
+    db.add(record)
+    commit(db)
+    db.refresh(record)
+    return record
+
+
+def get_producer(db: Session, producer_id: int) -> Optional[Producer]:
+    return db.get(Producer, producer_id)
+
+
+def _name_filter(column, q: str):
+    escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return column.ilike(f"%{escaped}%", escape="\\")
+
+
+def list_producers(
+    db: Session,
+    *,
+    limit: int = 50,
+    before_id: Optional[int] = None,
+    q: Optional[str] = None,
+    country: Optional[str] = None,
+) -> List[Producer]:
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = select(Producer)
+    if before_id is not None:
+        query = query.where(Producer.id < before_id)
+    if country is not None:
+        query = query.where(Producer.country == country)
+    if q:
+        query = query.where(_name_filter(Producer.name, q))
+    return list(db.scalars(query.order_by(Producer.id.desc()).limit(limit)))
+
+
+def create_product(db: Session, **fields) -> Product:
+    record = Product(**fields)
+    db.add(record)
+    commit(db)
+    db.refresh(record)
+    return record
+
+
+def list_products(
+    db: Session,
+    *,
+    limit: int = 50,
+    before_id: Optional[int] = None,
+    producer_id: Optional[int] = None,
+    product_type: Optional[str] = None,
+    q: Optional[str] = None,
+) -> List[Product]:
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = select(Product)
+    if before_id is not None:
+        query = query.where(Product.id < before_id)
+    if producer_id is not None:
+        query = query.where(Product.producer_id == producer_id)
+    if product_type is not None:
+        query = query.where(Product.product_type == product_type)
+    if q:
+        query = query.where(_name_filter(Product.name, q))
+    return list(db.scalars(query.order_by(Product.id.desc()).limit(limit)))
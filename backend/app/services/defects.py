@@ -0,0 +1,149 @@
+"""
+Defect localization on the maps analyze_coating already computes.
+
+The gray frame, the Canny edges and |Laplacian| are each reduced once to a work
+grid of at most COATVISION_DEFECTS_WORK_SIDE pixels on the long side, by an
+integer block average (INTER_AREA, so every full-resolution pixel counts). The
+full-resolution cost is three linear passes per megapixel. All other work is
+bounded by the grid size. On the grid:
+- tone anomaly: deviation of the gray level from a smooth background estimate;
+- texture anomaly: Laplacian energy well above the panel's median;
+each thresholded robustly (median + k * MAD over the panel). The union is cleaned
+up with a morphological close and split into regions with
+connectedComponentsWithStats. Regions are then classified from contour features:
+  "streak":    elongated (minAreaRect aspect >= STREAK_ASPECT), e.g. drying streaks;
+  "hologram":  texture-dominated (fine buffer marks raise the Laplacian energy
+               without shifting the tone much);
+  "high_spot": tone-dominated compact blob (uneven coating left to cure).
+Regions covering more than MAX_REGION_FRACTION of the panel are treated as
+lighting and skipped. Bounding boxes are returned in full-resolution pixels.
+"""
+import os
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+
+from backend.app.lazy import lazy_import
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+WORK_SIDE = int(os.getenv("COATVISION_DEFECTS_WORK_SIDE", "384"))
+MAX_DEFECTS = int(os.getenv("COATVISION_DEFECTS_MAX", "20"))
+TYPES = ("high_spot", "hologram", "streak")
+TONE_K = 6.0
+TEXTURE_K = 6.0
+MIN_TONE = 6.0
+MIN_REGION_FRACTION = 0.0005
+MAX_REGION_FRACTION = 0.25
+STREAK_ASPECT = 4.0
+
+
+@dataclass
+class Defect:
+    type: str
+    bbox: Tuple[int, int, int, int]  # x, y, bredde, høyde i fullt bilde
+    area_pct: float
+    severity: float  # 0..1
+    tone: float  # snittavvik i gråtone (negativ = mørkere)
+    texture: float  # Laplace-energi relativt til panelets median
+
+    def as_dict(self) -> Dict:
+        out = asdict(self)
+        out["bbox"] = list(self.bbox)
+        return out
+
+
+def _reduce(image: "np.ndarray", factor: int) -> "np.ndarray":
+    if factor == 1:
+        return image.astype(np.float32)
+    h, w = image.shape[:2]
+    # Heltallsfaktor på et utsnitt delelig med faktoren tar OpenCVs raske blokkmiddel-vei
+    crop = image[:h - h % factor, :w - w % factor]
+    return cv2.resize(crop, (w // factor, h // factor), interpolation=cv2.INTER_AREA).astype(np.float32)
+
+
+def _robust_threshold(values: "np.ndarray", k: float, floor: float) -> float:
+    # Hver fjerde verdi holder for median og MAD, og halverer tiden for sorteringen
+    values = values[::4]
+    median = float(np.median(values))
+    mad = float(np.median(np.abs(values - median)))
+    return median + max(k * 1.4826 * mad, floor)
+
+
+def _classify(aspect: float, tone: float, texture: float, tone_limit: float) -> str:
+    if aspect >= STREAK_ASPECT:
+        return "streak"
+    if texture >= 2.0 and abs(tone) < 2 * tone_limit:
+        return "hologram"
+    return "high_spot"
+
+
+def detect(
+    gray: "np.ndarray",
+    edges: "np.ndarray",
+    laplacian: "np.ndarray",
+    mask: Optional["np.ndarray"] = None,
+) -> List[Defect]:
+    """Candidate defect regions, most severe first (at most MAX_DEFECTS)."""
+    h, w = gray.shape[:2]
+    factor = max(1, -(-max(h, w) // WORK_SIDE))
+    small_gray = _reduce(gray, factor)
+    energy = _reduce(cv2.convertScaleAbs(laplacian), factor)
+    edge_density = _reduce(edges, factor) / 255.0
+    size = (small_gray.shape[1], small_gray.shape[0])
+    panel = (cv2.resize(mask, size, interpolation=cv2.INTER_NEAREST) > 0) if mask is not None \
+        else np.ones((size[1], size[0]), bool)
+    if panel.sum() < 16:
+        return []
+
+    # Bakgrunn: stor uskarphet av gråtonen; avvik fra den er lokale flekker
+    sigma = max(size) / 24
+    background = cv2.GaussianBlur(small_gray, (0, 0), sigma)
+    tone = small_gray - background
+    smooth_energy = cv2.GaussianBlur(energy, (0, 0), 1.0)
+
+    tone_abs = np.abs(tone)
+    tone_limit = _robust_threshold(tone_abs[panel], TONE_K, MIN_TONE)
+    baseline = max(float(np.median(smooth_energy[panel][::4])), 1.0)
+    texture_limit = _robust_threshold(smooth_energy[panel], TEXTURE_K, baseline)
+    candidates = ((tone_abs > tone_limit) | (smooth_energy > texture_limit)) & panel
+
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
+    candidates = cv2.morphologyEx(candidates.astype(np.uint8) * 255, cv2.MORPH_CLOSE, kernel)
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(candidates, connectivity=8)
+
+    panel_area = float(panel.sum())
+    found = []
+    for label in range(1, count):
+        x, y, bw, bh, area = (int(v) for v in stats[label])
+        fraction = area / panel_area
+        if fraction < MIN_REGION_FRACTION or fraction > MAX_REGION_FRACTION:
+            continue
+        region = labels[y:y + bh, x:x + bw] == label
+        contours, _ = cv2.findContours(region.astype(np.uint8), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        (_, _), (rw, rh), _ = cv2.minAreaRect(max(contours, key=cv2.contourArea))
+        aspect = max(rw, rh) / max(min(rw, rh), 1.0)
+        region_tone = float(tone[y:y + bh, x:x + bw][region].mean())
+        region_texture = float(smooth_energy[y:y + bh, x:x + bw][region].mean()) / baseline
+        region_edges = float(edge_density[y:y + bh, x:x + bw][region].mean())
+        kind = _classify(aspect, region_tone, region_texture, tone_limit)
+        # Alvorlighet: hvor langt over terskelen regionen ligger, og hvor mye kant den har
+        strength = max(abs(region_tone) / tone_limit, region_texture * baseline / texture_limit)
+        severity = min(1.0, 0.5 * min(strength, 2.0) / 2.0 + 0.3 * min(1.0, fraction * 50) + 0.2 * region_edges)
+        found.append(Defect(
+            type=kind,
+            bbox=(x * factor, y * factor, bw * factor, bh * factor),
+            area_pct=round(fraction * 100, 3),
+            severity=round(severity, 3),
+            tone=round(region_tone, 2),
+            texture=round(region_texture, 2),
+        ))
+    found.sort(key=lambda d: d.severity, reverse=True)
+    return found[:MAX_DEFECTS]
+
+
+def summary(defects: List[Defect]) -> Dict[str, int]:
+    counts = {kind: 0 for kind in TYPES}
+    for defect in defects:
+        counts[defect.type] += 1
+    return counts
@@ -0,0 +1,140 @@
+"""
+Binær rammeprotokoll for analyse- og live-endepunktene.
+
+Forespørsel (velges med Content-Type):
+- application/json: eksisterende base64-i-JSON-format (uendret for gamle klienter)
+- image/jpeg, image/png, image/webp, application/octet-stream: rå bildebytes i body;
+  metadata som query-parametre. Ingen base64 (33 % mindre opplasting) og ingen
+  mellomliggende str/bytes-kopier før cv2.imdecode.
+- application/msgpack, application/cbor: kompakt konvolutt {"frame": <bytes>, "meta": {...}}
+
+Svar: klienten kan be om application/msgpack eller application/cbor via Accept;
+ellers JSON (FastJSONResponse). msgpack og cbor2 er valgfrie avhengigheter (415/JSON-fallback uten dem).
+"""
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException, Request, Response
+
+from backend.app.responses import FastJSONResponse
+
+RAW_IMAGE_TYPES = {"image/jpeg", "image/jpg", "image/png", "image/webp", "application/octet-stream"}
+MSGPACK_TYPES = {"application/msgpack", "application/x-msgpack", "application/vnd.msgpack"}
+CBOR_TYPES = {"application/cbor"}
+MAX_FRAME_BYTES = 20 * 1024 * 1024
+
+
+def _media_type(value: Optional[str]) -> str:
+    return (value or "").split(";", 1)[0].strip().lower()
+
+
+def _codec(kind: str):
+    try:
+        if kind == "msgpack":
+            import msgpack
+
+            return msgpack
+        import cbor2
+
+        return cbor2
+    except ImportError:
+        return None
+
+
+def _unpack_envelope(kind: str, body: bytes) -> Tuple[bytes, Dict[str, Any]]:
+    codec = _codec(kind)
+    if codec is None:
+        raise HTTPException(status_code=415, detail=f"{kind} support is not installed on this server")
+    try:
+        envelope = codec.unpackb(body, raw=False) if kind == "msgpack" else codec.loads(body)
+    except Exception:
+        raise HTTPException(status_code=400, detail=f"Invalid {kind} body")
+    frame = envelope.get("frame") if isinstance(envelope, dict) else None
+    if not isinstance(frame, (bytes, bytearray, memoryview)):
+        raise HTTPException(status_code=400, detail="Missing binary 'frame' in envelope")
+    meta = envelope.get("meta") or {}
+    return frame, meta if isinstance(meta, dict) else {}
+
+
+async def read_frame(
+    request: Request,
+    extract_base64: Callable[[Dict[str, Any]], Optional[str]],
+    missing_detail: str,
+) -> Tuple[Any, Dict[str, Any]]:
+    """Decode the request body into (BGR image, metadata) for any supported encoding."""
+    from backend.app.core.coatvision_core import decode_base64_image, decode_image_bytes
+
+    content_type = _media_type(request.headers.get("content-type")) or "application/json"
+
+    if content_type == "application/json":
+        try:
+            payload = await request.json()
+        except Exception:
+            payload = {}
+        payload = payload if isinstance(payload, dict) else {}
+        image_b64 = extract_base64(payload)
+        if not image_b64:
+            raise HTTPException(status_code=400, detail=missing_detail)
+        decode = lambda: decode_base64_image(image_b64)  # noqa: E731
+        meta = payload.get("meta") or {}
+    else:
+        body = await request.body()
+        if len(body) > MAX_FRAME_BYTES:
+            raise HTTPException(status_code=413, detail="Frame too large")
+        if content_type in RAW_IMAGE_TYPES:
+            frame, meta = body, dict(request.query_params)
+        elif content_type in MSGPACK_TYPES:
+            frame, meta = _unpack_envelope("msgpack", body)
+        elif content_type in CBOR_TYPES:
+            frame, meta = _unpack_envelope("cbor", body)
+        else:
+            raise HTTPException(status_code=415, detail=f"Unsupported Content-Type: {content_type}")
+        if not frame:
+            raise HTTPException(status_code=400, detail=missing_detail)
+        decode = lambda: decode_image_bytes(frame)  # noqa: E731
+
+    try:
+        return decode(), meta if isinstance(meta, dict) else {}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def negotiated_type(request: Request) -> str:
+    """First of json/msgpack/cbor named in Accept (in the client's order); json by default."""
+    for part in (request.headers.get("accept") or "").split(","):
+        media = _media_type(part)
+        if media in MSGPACK_TYPES and _codec("msgpack") is not None:
+            return "application/msgpack"
+        if media in CBOR_TYPES and _codec("cbor") is not None:
+            return "application/cbor"
+        if media == "application/json":
+            break
+    return "application/json"
+
+
+def respond(request: Request, payload: Dict[str, Any]):
+    """Encode `payload` as msgpack/CBOR if negotiated, else as JSON via orjson."""
+    media_type = negotiated_type(request)
+    if media_type == "application/msgpack":
+        return Response(content=_codec("msgpack").packb(payload, use_bin_type=True), media_type=media_type)
+    if media_type == "application/cbor":
+        return Response(content=_codec("cbor").dumps(payload), media_type=media_type)
+    return FastJSONResponse(payload)
+
+
+def openapi_body(json_schema: Dict[str, Any]) -> Dict[str, Any]:
+    """openapi_extra documenting every accepted request encoding."""
+    binary = {"schema": {"type": "string", "format": "binary"}}
+    envelope = {"schema": {"type": "object", "properties": {"frame": {"type": "string", "format": "binary"},
+                                                            "meta": {"type": "object"}}}}
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": json_schema},
+                "image/jpeg": binary,
+                "image/png": binary,
+                "application/msgpack": envelope,
+                "application/cbor": envelope,
+            },
+        }
+    }
@@ -0,0 +1,230 @@
+"""
+Local retrieval index for LYXbot (SQLite FTS5, BM25 ranking).
+
+Indexes the FAQ/docs markdown files (split on "## " headings) and the producer and
+product catalog into a single on-disk FTS5 table. Queries return the top-k snippets
+to ground the LLM prompt. If the best hit is an FAQ entry whose question nearly
+matches the user's (content-word overlap >= COATVISION_FAQ_DIRECT_THRESHOLD), its
+answer is returned directly without an LLM call.
+
+The index file (RUNTIME_DIR/knowledge.db by default) is built into a temp file and
+swapped in with os.replace, so workers never see a half-built index. It is
+rebuilt when the source fingerprint (doc mtimes, catalog size and max ids) changes.
+That check runs at most once every COATVISION_KNOWLEDGE_REFRESH_S seconds.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from contextlib import closing
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from backend.app.warmup import RUNTIME_DIR
+
+REPO_DIR = Path(__file__).resolve().parents[3]
+DOCS = [
+    p.strip()
+    for p in os.getenv("COATVISION_KNOWLEDGE_DOCS", "AI_FAQ.md,OPENAI_INTEGRATION_GUIDE.md,README.md").split(",")
+    if p.strip()
+]
+INDEX_PATH = Path(os.getenv("COATVISION_KNOWLEDGE_DB", str(RUNTIME_DIR / "knowledge.db")))
+REFRESH_S = float(os.getenv("COATVISION_KNOWLEDGE_REFRESH_S", "300"))
+FAQ_DIRECT_THRESHOLD = float(os.getenv("COATVISION_FAQ_DIRECT_THRESHOLD", "0.6"))
+TOP_K = int(os.getenv("COATVISION_KNOWLEDGE_TOP_K", "4"))
+MAX_SECTION_CHARS = 4000
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+# Vanlige ord som ikke skiller spørsmål fra hverandre (norsk og engelsk)
+_STOPWORDS = {
+    "the", "and", "for", "with", "what", "how", "can", "does", "are", "this", "that", "you", "your", "from",
+    "hva", "hvordan", "jeg", "kan", "det", "den", "som", "med", "til", "for", "har", "skal", "min", "mitt",
+    "eller", "ikke", "når", "hvor", "hvilken", "hvilke", "er", "på", "en", "et",
+}
+
+_lock = threading.Lock()
+_last_check = 0.0
+_fingerprint: Optional[str] = None
+
+
+@dataclass
+class Hit:
+    title: str
+    snippet: str
+    source: str
+    kind: str
+    answer: str
+    score: float
+
+
+def content_words(text: str) -> List[str]:
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return [w for w in _WORD.findall(text) if len(w) > 2 and w not in _STOPWORDS]
+
+
+def _markdown_sections(path: Path) -> Iterator[Tuple[str, str]]:
+    title, lines = path.stem, []
+    for line in path.read_text(encoding="utf-8", errors="replace").splitlines():
+        if line.startswith("## "):
+            if any(s.strip() for s in lines):
+                yield title, "\n".join(lines).strip()[:MAX_SECTION_CHARS]
+            title, lines = line[3:].strip().strip('"'), []
+        else:
+            lines.append(line)
+    if any(s.strip() for s in lines):
+        yield title, "\n".join(lines).strip()[:MAX_SECTION_CHARS]
+
+
+def _doc_rows(docs: Iterable[str]) -> Iterator[Tuple[str, str, str, str, str]]:
+    for name in docs:
+        path = REPO_DIR / name
+        if not path.exists():
+            continue
+        kind = "faq" if "faq" in path.stem.lower() else "doc"
+        for title, body in _markdown_sections(path):
+            body = body.rstrip("-").strip()
+            yield title, body, f"{name}#{title}", kind, body
+
+
+def _catalog_rows(db: Session) -> Iterator[Tuple[str, str, str, str, str]]:
+    from backend.app.models.catalog import Producer, Product
+
+    producers = {}
+    for p in db.execute(select(Producer.id, Producer.name, Producer.country)):
+        producers[p.id] = p.name
+        body = f"Produsent {p.name}" + (f" ({p.country})" if p.country else "")
+        yield p.name, body, f"producer:{p.id}", "producer", body
+    for p in db.execute(select(Product.id, Product.producer_id, Product.name, Product.product_type,
+                               Product.flash_time, Product.cure_time, Product.notes)):
+        parts = [f"Produkt {p.name} fra {producers.get(p.producer_id, 'ukjent produsent')}"]
+        if p.product_type:
+            parts.append(f"type {p.product_type}")
+        if p.flash_time is not None:
+            parts.append(f"flash-tid {p.flash_time} min")
+        if p.cure_time is not None:
+            parts.append(f"herdetid {p.cure_time} min")
+        if p.notes:
+            parts.append(p.notes)
+        body = ", ".join(parts)
+        yield p.name, body, f"product:{p.id}", "product", body
+
+
+def fingerprint(db: Optional[Session], docs: Iterable[str] = DOCS) -> str:
+    parts = []
+    for name in docs:
+        path = REPO_DIR / name
+        parts.append(f"{name}:{path.stat().st_mtime_ns if path.exists() else 0}")
+    if db is not None:
+        from backend.app.models.catalog import Producer, Product
+
+        for model in (Producer, Product):
+            count, max_id = db.execute(select(func.count(), func.max(model.id)).select_from(model)).one()
+            parts.append(f"{model.__tablename__}:{count}:{max_id}")
+    return hashlib.sha256("|".join(parts).encode()).hexdigest()
+
+
+def build_index(db: Optional[Session], path: Path = INDEX_PATH, docs: Iterable[str] = DOCS) -> int:
+    """(Re)build the index file atomically; returns the number of indexed chunks."""
+    docs = list(docs)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp_path.unlink(missing_ok=True)
+    conn = sqlite3.connect(str(tmp_path))
+    try:
+        conn.execute(
+            "CREATE VIRTUAL TABLE chunks USING fts5("
+            "title, body, source UNINDEXED, kind UNINDEXED, answer UNINDEXED, "
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+        rows = list(_doc_rows(docs))
+        if db is not None:
+            rows.extend(_catalog_rows(db))
+        conn.executemany("INSERT INTO chunks (title, body, source, kind, answer) VALUES (?, ?, ?, ?, ?)", rows)
+        conn.execute("INSERT INTO chunks (chunks) VALUES ('optimize')")
+        conn.execute("INSERT INTO meta VALUES ('fingerprint', ?)", (fingerprint(db, docs),))
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, path)
+    return len(rows)
+
+
+def _stored_fingerprint(path: Path) -> Optional[str]:
+    if not path.exists():
+        return None
+    try:
+        with closing(sqlite3.connect(f"file:{path}?mode=ro", uri=True)) as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'fingerprint'").fetchone()
+            return row[0] if row else None
+    except sqlite3.Error:
+        return None
+
+
+def ensure_index(db: Optional[Session], path: Path = INDEX_PATH, force: bool = False) -> bool:
+    """Rebuild if sources changed (checked at most every REFRESH_S). Returns True if rebuilt."""
+    global _last_check, _fingerprint
+    now = time.monotonic()
+    if not force and _fingerprint is not None and now - _last_check < REFRESH_S and path.exists():
+        return False
+    with _lock:
+        current = fingerprint(db)
+        _last_check = now
+        if not force and path.exists() and current in (_fingerprint, _stored_fingerprint(path)):
+            _fingerprint = current
+            return False
+        build_index(db, path)
+        _fingerprint = current
+        return True
+
+
+def _match_expression(query: str) -> Optional[str]:
+    words = content_words(query)
+    # Frasesitat hindrer at FTS5-syntaks i brukerteksten tolkes
+    return " OR ".join(f'"{w}"' for w in dict.fromkeys(words)) or None
+
+
+def search(query: str, k: int = TOP_K, path: Path = INDEX_PATH) -> List[Hit]:
+    expression = _match_expression(query)
+    if expression is None or not path.exists():
+        return []
+    with closing(sqlite3.connect(f"file:{path}?mode=ro", uri=True)) as conn:
+        rows = conn.execute(
+            "SELECT title, snippet(chunks, 1, '', '', ' … ', 32), source, kind, answer, bm25(chunks, 4.0, 1.0) "
+            "FROM chunks WHERE chunks MATCH ? ORDER BY bm25(chunks, 4.0, 1.0) LIMIT ?",
+            (expression, k),
+        ).fetchall()
+    return [Hit(title, snippet, source, kind, answer, -score) for title, snippet, source, kind, answer, score in rows]
+
+
+def direct_answer(query: str, hits: List[Hit]) -> Optional[Hit]:
+    """The top FAQ hit if its question matches `query` closely enough to skip the LLM."""
+    if not hits or hits[0].kind != "faq":
+        return None
+    asked, question = set(content_words(query)), set(content_words(hits[0].title))
+    if not asked or not question:
+        return None
+    overlap = len(asked & question) / len(asked | question)
+    return hits[0] if overlap >= FAQ_DIRECT_THRESHOLD else None
+
+
+def context_for(hits: List[Hit]) -> str:
+    return "\n".join(f"- [{h.source}] {h.title}: {h.snippet}" for h in hits)
+
+
+def retrieve(query: str, k: int = TOP_K) -> List[Hit]:
+    """ensure_index against the app database, then search. Blocking; call from a thread."""
+    from backend.app.db import SessionLocal, init_db
+    import backend.app.models.catalog  # noqa: F401  (katalogtabellene må finnes)
+
+    init_db()
+    with SessionLocal() as db:
+        ensure_index(db)
+    return search(query, k)
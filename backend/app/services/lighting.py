@@ -0,0 +1,139 @@
+"""
+Optional lighting normalization before analysis (training phases 4 and 5:
+background noise and new light).
+
+All estimation runs on a copy reduced to COATVISION_LIGHTING_WORK_SIDE pixels on
+the long side:
+- panel/background segmentation: weighted Lab L1 distance from the median colour
+  of the central window, Otsu-thresholded and cleaned up; the connected region under the
+  centre is the panel.
+- a gain map, by one of two modes:
+  "flatten": large-kernel background (illumination) estimate of the L channel,
+             with gain = TARGET_L / background, so both gradients and overall
+             exposure are normalized;
+  "clahe":   ratio of a CLAHE-equalized L channel to the original, smoothed.
+The gain map is stored as fixed-point uint8, upsampled bilinearly and applied to
+the full-resolution frame in place with one saturating cv2.multiply. That is the
+only full-resolution pass, besides upsampling the panel mask with nearest neighbour.
+Gains keep hue and saturation unchanged.
+"""
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from backend.app.lazy import lazy_import
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+MODES = ("off", "flatten", "clahe")
+DEFAULT_MODE = os.getenv("COATVISION_LIGHTING", "off")
+WORK_SIDE = int(os.getenv("COATVISION_LIGHTING_WORK_SIDE", "256"))
+TARGET_L = 140.0
+MIN_GAIN, MAX_GAIN = 0.4, 2.6
+# Fastpunktsskala for gain-kartet i uint8 (1/96 ≈ 1 % oppløsning, maks 2.65)
+GAIN_SCALE = 96
+MIN_PANEL_FRACTION = 0.05
+
+
+@dataclass
+class Normalized:
+    mode: str
+    mask: Optional["np.ndarray"]  # uint8 0/255 i full oppløsning, None uten panel
+    panel_fraction: float
+    mean_gain: float
+
+
+def resolve_mode(mode: Optional[str]) -> str:
+    mode = (mode or DEFAULT_MODE).strip().lower()
+    if mode not in MODES:
+        raise ValueError(f"Unknown lighting mode {mode!r}; expected one of {', '.join(MODES)}")
+    return mode
+
+
+def _work_copy(image: "np.ndarray") -> "np.ndarray":
+    scale = min(1.0, WORK_SIDE / max(image.shape[:2]))
+    if scale >= 1.0:
+        return image
+    # INTER_LINEAR leser bare noen få piksler per målpiksel (INTER_AREA er ~50x dyrere);
+    # aliasing betyr lite for lavfrekvente lys- og segmenteringsestimater
+    return cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_LINEAR)
+
+
+def segment_panel(lab: "np.ndarray") -> "np.ndarray":
+    """uint8 0/255 mask of the panel (the region under the frame centre) in a small Lab frame."""
+    h, w = lab.shape[:2]
+    center = lab[h * 7 // 20:h * 13 // 20, w * 7 // 20:w * 13 // 20].reshape(-1, 3)
+    reference = tuple(float(v) for v in np.median(center, axis=0)) + (0.0,)
+    # L1-avstand i uint8; L vektes ned så lysfall over panelet ikke regnes som bakgrunn
+    distance = cv2.transform(cv2.absdiff(lab, reference), np.array([[0.35, 1.0, 1.0]], dtype=np.float32))
+    distance = cv2.normalize(distance, None, 0, 255, cv2.NORM_MINMAX)
+    _, background = cv2.threshold(cv2.GaussianBlur(distance, (5, 5), 0), 0, 255,
+                                  cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    panel = cv2.bitwise_not(background)
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
+    panel = cv2.morphologyEx(cv2.morphologyEx(panel, cv2.MORPH_OPEN, kernel), cv2.MORPH_CLOSE, kernel)
+
+    count, labels = cv2.connectedComponents(panel)
+    if count <= 1:
+        return np.full((h, w), 255, np.uint8)
+    center_labels = labels[h * 2 // 5:h * 3 // 5, w * 2 // 5:w * 3 // 5]
+    hits = np.bincount(center_labels.ravel(), minlength=count)
+    hits[0] = 0
+    if hits.max() == 0:
+        return np.full((h, w), 255, np.uint8)
+    return np.where(labels == hits.argmax(), 255, 0).astype(np.uint8)
+
+
+def _background(l_channel: "np.ndarray", mask: "np.ndarray") -> "np.ndarray":
+    """Illumination estimate from panel pixels only (normalized convolution), so the
+    background neither pulls the estimate nor hides the gradient."""
+    h, w = l_channel.shape
+    # Stor kjerne = liten kjerne på et bilde fire ganger mindre, skalert opp igjen
+    size = (max(1, w // 4), max(1, h // 4))
+    weight = cv2.resize((mask > 0).astype(np.float32), size, interpolation=cv2.INTER_AREA)
+    values = cv2.resize(cv2.medianBlur(l_channel, 5).astype(np.float32), size, interpolation=cv2.INTER_AREA)
+    sigma = max(size) / 8
+    numerator = cv2.GaussianBlur(values * weight, (0, 0), sigma)
+    denominator = cv2.GaussianBlur(weight, (0, 0), sigma)
+    fallback = cv2.GaussianBlur(values, (0, 0), sigma)
+    estimate = np.where(denominator > 0.05, numerator / np.maximum(denominator, 1e-6), fallback)
+    return np.maximum(cv2.resize(estimate, (w, h), interpolation=cv2.INTER_LINEAR), 1.0)
+
+
+def gain_map(l_channel: "np.ndarray", mode: str, mask: "np.ndarray") -> "np.ndarray":
+    if mode == "flatten":
+        gain = TARGET_L / _background(l_channel, mask)
+    else:
+        equalized = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)).apply(l_channel)
+        sigma = max(l_channel.shape) / 32
+        gain = (cv2.GaussianBlur(equalized.astype(np.float32), (0, 0), sigma)
+                / np.maximum(cv2.GaussianBlur(l_channel.astype(np.float32), (0, 0), sigma), 1.0))
+    return np.clip(gain, MIN_GAIN, MAX_GAIN).astype(np.float32)
+
+
+def normalize(image: "np.ndarray", mode: Optional[str] = None, with_mask: bool = True) -> Normalized:
+    """Flatten lighting of a BGR uint8 frame in place; return the panel mask and stats."""
+    mode = resolve_mode(mode)
+    if mode == "off":
+        return Normalized(mode, None, 1.0, 1.0)
+
+    lab = cv2.cvtColor(_work_copy(image), cv2.COLOR_BGR2LAB)
+    small_mask = segment_panel(lab)
+    panel_fraction = float(np.count_nonzero(small_mask)) / small_mask.size
+    if panel_fraction < MIN_PANEL_FRACTION:
+        small_mask[:] = 255
+        panel_fraction = 1.0
+
+    gain = gain_map(np.ascontiguousarray(lab[:, :, 0]), mode, small_mask)
+    h, w = image.shape[:2]
+    fixed = np.rint(gain * GAIN_SCALE).astype(np.uint8)
+    if fixed.shape != (h, w):
+        fixed = cv2.resize(fixed, (w, h), interpolation=cv2.INTER_LINEAR)
+    cv2.multiply(image, cv2.cvtColor(fixed, cv2.COLOR_GRAY2BGR), dst=image, scale=1.0 / GAIN_SCALE)
+
+    mask = None
+    if with_mask and panel_fraction < 1.0:
+        mask = small_mask if small_mask.shape == (h, w) else cv2.resize(small_mask, (w, h),
+                                                                        interpolation=cv2.INTER_NEAREST)
+    return Normalized(mode, mask, round(panel_fraction, 4), round(float(gain.mean()), 4))
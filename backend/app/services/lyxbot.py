@@ -0,0 +1,182 @@
+"""
+LYXbot chat: OpenAI calls with a response cache and streaming.
+
+- One AsyncOpenAI client per event loop, so its HTTP connection pool is reused across
+  requests (the openai import is deferred to first use, keeping cold starts light).
+- Replies are cached by normalized prompt (case, whitespace, trailing punctuation,
+  Unicode form) and model, with TTL and LRU eviction. Concurrent identical prompts
+  share one in-flight completion.
+- `stream_reply` yields text deltas as they arrive; the assembled reply is cached.
+
+OPENAI_BASE_URL can point at the local stand-in (backend/scripts/openai_stub.py)
+for offline development and tests.
+"""
+import asyncio
+import hashlib
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+from backend.app.services.metrics import cache_hit, cache_miss
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4.1-mini")
+OPENAI_TIMEOUT_S = float(os.getenv("OPENAI_TIMEOUT_S", "30"))
+CACHE_TTL_S = float(os.getenv("COATVISION_LYXBOT_CACHE_TTL_S", "3600"))
+CACHE_SIZE = int(os.getenv("COATVISION_LYXBOT_CACHE_SIZE", "512"))
+
+SYSTEM_PROMPT = (
+    "Du er LYXbot, en ekspert på bilpleie, lakkorrigering og keramisk coating.\n"
+    "Svar på norsk, kort og presist, som en dyktig detailer.\n"
+    "Gi konkrete råd om vask, polering, beskyttelse og vedlikehold av bil.\n"
+)
+FALLBACK_REPLY = "Beklager, jeg klarte ikke å generere et svar akkurat nå."
+
+_TRAILING_PUNCT = re.compile(r"[\s?!.,;:]+$")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_prompt(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return _TRAILING_PUNCT.sub("", _WHITESPACE.sub(" ", text).strip())
+
+
+class ResponseCache:
+    """LRU of replies with a per-entry TTL."""
+
+    def __init__(self, maxsize: int = CACHE_SIZE, ttl: float = CACHE_TTL_S):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            expires, reply = item
+            if expires <= time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return reply
+
+    def put(self, key: str, reply: str) -> None:
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.ttl, reply)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+response_cache = ResponseCache()
+_inflight: Dict[str, "asyncio.Future"] = {}
+_clients: Dict[int, Tuple[asyncio.AbstractEventLoop, object]] = {}
+
+
+def cache_key(message: str, model: str = OPENAI_MODEL, context: str = "") -> str:
+    raw = "\x00".join((model, SYSTEM_PROMPT, context, normalize_prompt(message)))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def get_client():
+    """AsyncOpenAI bound to the running loop (its connection pool can't cross loops)."""
+    loop = asyncio.get_running_loop()
+    entry = _clients.get(id(loop))
+    if entry is None or entry[0] is not loop:
+        from openai import AsyncOpenAI
+
+        # Klienter for lukkede løkker slippes (TestClient lager en løkke per kall)
+        for key in [k for k, (other, _) in _clients.items() if other.is_closed()]:
+            del _clients[key]
+        client = AsyncOpenAI(api_key=OPENAI_API_KEY or "missing", base_url=OPENAI_BASE_URL,
+                             timeout=OPENAI_TIMEOUT_S, max_retries=1)
+        entry = _clients[id(loop)] = (loop, client)
+    return entry[1]
+
+
+def _messages(message: str, context: str = "") -> list:
+    system = SYSTEM_PROMPT + (f"\nRelevant kunnskap:\n{context}\n" if context else "")
+    return [{"role": "system", "content": system}, {"role": "user", "content": message}]
+
+
+async def _complete(message: str, context: str) -> str:
+    completion = await get_client().chat.completions.create(model=OPENAI_MODEL, messages=_messages(message, context))
+    return str(completion.choices[0].message.content or FALLBACK_REPLY)
+
+
+async def get_reply(message: str, context: str = "") -> Tuple[str, bool]:
+    """Return (reply, cached)."""
+    key = cache_key(message, context=context)
+    reply = response_cache.get(key)
+    if reply is not None:
+        cache_hit("lyxbot")
+        return reply, True
+    cache_miss("lyxbot")
+
+    loop = asyncio.get_running_loop()
+    while True:
+        pending = _inflight.get(key)
+        if pending is None or pending.get_loop() is not loop:
+            break
+        try:
+            return await asyncio.shield(pending), True
+        except asyncio.CancelledError:
+            # Lederen ble avbrutt (f.eks. klienten koblet fra): prøv på nytt, med mindre det er dette kallet
+            if not pending.cancelled() or asyncio.current_task().cancelling():
+                raise
+    future = loop.create_future()
+    _inflight[key] = future
+    try:
+        reply = await _complete(message, context)
+        response_cache.put(key, reply)
+        future.set_result(reply)
+        return reply, False
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # markert som hentet; ventende kall får feilen selv
+        raise
+    finally:
+        if _inflight.get(key) is future:
+            del _inflight[key]
+        # Avbrutt leder (CancelledError er ikke Exception): ventende kall må ikke henge
+        if not future.done():
+            future.cancel()
+
+
+async def stream_reply(message: str, context: str = "") -> AsyncIterator[str]:
+    """Yield reply text as it arrives; a cached reply is yielded in one piece."""
+    key = cache_key(message, context=context)
+    reply = response_cache.get(key)
+    if reply is not None:
+        cache_hit("lyxbot")
+        yield reply
+        return
+    cache_miss("lyxbot")
+
+    parts = []
+    stream = await get_client().chat.completions.create(
+        model=OPENAI_MODEL, messages=_messages(message, context), stream=True
+    )
+    async for chunk in stream:
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if delta:
+            parts.append(delta)
+            yield delta
+    if parts:
+        response_cache.put(key, "".join(parts))
@@ -0,0 +1,249 @@
+"""
+In-process metrics with Prometheus text export (GET /metrics).
+
+- `stage("canny")` times a pipeline stage into `coatvision_stage_seconds`
+- `MetricsMiddleware` counts requests by route/method/status and times them
+- `register_gauge()` exposes live values (queue depths) evaluated at scrape time
+- `cache_hit()` / `cache_miss()` feed `coatvision_cache_requests_total`
+
+Set COATVISION_METRICS=0 to disable: `stage()` then returns a shared no-op context
+(unless a request trace is active, see tracing.py) and the counters return immediately.
+Values are per process; under gunicorn each worker exports its own.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from backend.app.services import tracing
+
+ENABLED = os.getenv("COATVISION_METRICS", "1") != "0"
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_NOOP = nullcontext()
+_registry: Dict[str, "_Metric"] = {}
+_gauges: Dict[str, Tuple[str, Optional[str], Callable[[], object]]] = {}
+_registry_lock = threading.Lock()
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1.0) -> None:
+        if not ENABLED:
+            return
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def value(self, *labelvalues: str) -> float:
+        return self._values.get(labelvalues, 0.0)
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        with self._lock:
+            items = list(self._values.items())
+        for labelvalues, value in items:
+            lines.append(f"{self.name}{_labels(self.labelnames, labelvalues)} {value:g}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # labelvalues -> [bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        if not ENABLED:
+            return
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(labelvalues)
+            if row is None:
+                row = self._values[labelvalues] = [0.0] * (len(self.buckets) + 2)
+            row[index] += 1
+            row[-1] += value
+
+    def count(self, *labelvalues: str) -> int:
+        row = self._values.get(labelvalues)
+        return int(sum(row[:-1])) if row else 0
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        for labelvalues, row in items:
+            cumulative = 0.0
+            for bound, n in zip(self.buckets + (float("inf"),), row[:-1]):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                bucket_labels = _labels(self.labelnames, labelvalues, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative:g}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labelvalues)} {row[-1]:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labelvalues)} {cumulative:g}")
+        return lines
+
+
+def _get_or_create(cls, name: str, help_text: str, labelnames: Iterable[str] = (), **kwargs):
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = cls(name, help_text, labelnames, **kwargs)
+        return metric
+
+
+def counter(name: str, help_text: str, labelnames: Iterable[str] = ()) -> Counter:
+    return _get_or_create(Counter, name, help_text, labelnames)
+
+
+def histogram(name: str, help_text: str, labelnames: Iterable[str] = (), **kwargs) -> Histogram:
+    return _get_or_create(Histogram, name, help_text, labelnames, **kwargs)
+
+
+def register_gauge(name: str, help_text: str, fn: Callable[[], object], labelname: Optional[str] = None) -> None:
+    """Expose a value computed at scrape time (e.g. a queue's current depth).
+
+    With `labelname`, `fn` returns a dict of label value -> number.
+    """
+    _gauges[name] = (help_text, labelname, fn)
+
+
+STAGE_SECONDS = histogram("coatvision_stage_seconds", "Time spent per analysis/pipeline stage.", ("stage",))
+HTTP_REQUESTS = counter("coatvision_http_requests_total", "HTTP requests by route, method and status.",
+                        ("route", "method", "status"))
+HTTP_SECONDS = histogram("coatvision_http_request_seconds", "HTTP request latency by route.", ("route",))
+CACHE_REQUESTS = counter("coatvision_cache_requests_total", "Cache lookups by cache and result.", ("cache", "result"))
+
+
+def _threadpool_in_flight() -> float:
+    # Sync-endepunkter kjører i AnyIOs standard trådpool; antall lånte plasser = kødybde der
+    from anyio.to_thread import current_default_thread_limiter
+
+    return current_default_thread_limiter().borrowed_tokens
+
+
+register_gauge("coatvision_threadpool_in_flight", "Sync handlers currently running in the threadpool.",
+               _threadpool_in_flight)
+
+
+class _StageTimer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        tracing.note_thread()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        STAGE_SECONDS.observe(elapsed, self.name)
+        tracing.record_span(self.name, self.start, elapsed)
+        return False
+
+
+def stage(name: str):
+    """Context manager timing one pipeline stage into the histogram and the active trace.
+
+    A shared no-op when metrics are off and no request trace is active.
+    """
+    if not ENABLED and not tracing.active():
+        return _NOOP
+    return _StageTimer(name)
+
+
+def cache_hit(cache: str) -> None:
+    CACHE_REQUESTS.inc(cache, "hit")
+
+
+def cache_miss(cache: str) -> None:
+    CACHE_REQUESTS.inc(cache, "miss")
+
+
+def cache_hit_ratio(cache: str) -> Optional[float]:
+    hits = CACHE_REQUESTS.value(cache, "hit")
+    total = hits + CACHE_REQUESTS.value(cache, "miss")
+    return hits / total if total else None
+
+
+def render() -> str:
+    """All metrics in Prometheus text exposition format 0.0.4."""
+    lines: List[str] = []
+    for metric in list(_registry.values()):
+        lines.extend(metric.render())
+    for name, (help_text, labelname, fn) in list(_gauges.items()):
+        try:
+            values = fn() if labelname else {None: fn()}
+            samples = [(label, float(value)) for label, value in values.items()]
+        except Exception:
+            continue
+        lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} gauge"])
+        for label, value in samples:
+            suffix = _labels((labelname,), (label,)) if labelname else ""
+            lines.append(f"{name}{suffix} {value:g}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: request counts and latency keyed by route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not ENABLED or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            # Rute-mal (/api/jobs/{job_id}), ikke rå sti, for å holde antall label-verdier nede
+            route_path = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUESTS.inc(route_path, scope.get("method", ""), str(status["code"]))
+            HTTP_SECONDS.observe(time.perf_counter() - start, route_path)
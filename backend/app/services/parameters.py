@@ -0,0 +1,301 @@
+"""
+Versioned analysis parameters: the hue and Laplacian normalizers, the Canny
+thresholds and the CVI/CQI weights that analyze_coating uses.
+
+The active set comes from, in order of precedence:
+  the JSON file named by COATVISION_ANALYSIS_PARAMS (any subset of the fields);
+  the newest analysis_parameter_sets row (insert-only, saved via /api/parameters);
+  the built-in DEFAULTS.
+`current()` returns an immutable AnalysisParameters snapshot (the weights are
+read-only mappings). At most every COATVISION_ANALYSIS_PARAMS_REFRESH_S seconds
+it rechecks the source and, when that changed, validates the new set and swaps
+the snapshot reference. A file is rechecked in the call (one stat). The database
+is queried on a background thread, so `current()` never waits for it and is safe
+on the event loop; the app loads the set once at startup, and a set saved
+through the API is active in its own process at once. Offline callers (the
+reanalysis CLI) call the blocking `source.refresh()` instead, since a fresh
+process would otherwise start on DEFAULT. The swap is a single assignment, so an
+analysis that already holds a snapshot finishes with it and the next call sees
+the new set; worker threads need no restart, and the reanalysis processes are
+handed the set explicitly. An invalid file or row is logged and ignored, and the
+previous set stays active.
+
+`version` is "<ANALYSIS_REVISION>-<first 10 hex digits of the SHA-1 of the values>". Equal
+values give equal versions wherever they come from. The version is stamped into
+every result ("analysis_version") and stored with analysis_records and
+image_analyses rows, so stale stored results are found with one string comparison.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from backend.app.db import commit
+from backend.app.models.analysis import AnalysisParameterSet
+
+logger = logging.getLogger("coatvision.parameters")
+
+# Økes når selve algoritmen endres på en måte som gir andre tall for samme bilde
+ANALYSIS_REVISION = 1
+PARAMS_FILE = os.getenv("COATVISION_ANALYSIS_PARAMS", "")
+REFRESH_S = float(os.getenv("COATVISION_ANALYSIS_PARAMS_REFRESH_S", "10"))
+
+DEFAULTS: Dict[str, Any] = {
+    # OpenCV-hue går 0-180; spredning på 90 gir fargeuniformitet 0
+    "max_hue_std": 90.0,
+    # Laplace-varians der glatthet blir 0
+    "max_laplacian_variance": 5000.0,
+    "canny_low": 50,
+    "canny_high": 150,
+    "cvi_weights": {"color_uniformity": 0.3, "saturation": 0.25, "smoothness": 0.25, "flatness": 0.2},
+    "cqi_weights": {"coverage": 0.35, "color_uniformity": 0.25, "smoothness": 0.25, "brightness": 0.15},
+}
+
+
+@dataclass(frozen=True)
+class AnalysisParameters:
+    max_hue_std: float
+    max_laplacian_variance: float
+    canny_low: int
+    canny_high: int
+    cvi_weights: Mapping[str, float]
+    cqi_weights: Mapping[str, float]
+    source: str = field(default="default", compare=False)
+    set_id: Optional[int] = field(default=None, compare=False)
+    version: str = field(init=False, compare=False)
+
+    def __post_init__(self):
+        digest = hashlib.sha1(json.dumps(
+            {"revision": ANALYSIS_REVISION, **self.values()}, sort_keys=True
+        ).encode()).hexdigest()
+        object.__setattr__(self, "version", f"{ANALYSIS_REVISION}-{digest[:10]}")
+
+    def values(self) -> Dict[str, Any]:
+        return {
+            "max_hue_std": self.max_hue_std,
+            "max_laplacian_variance": self.max_laplacian_variance,
+            "canny_low": self.canny_low,
+            "canny_high": self.canny_high,
+            "cvi_weights": dict(self.cvi_weights),
+            "cqi_weights": dict(self.cqi_weights),
+        }
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"version": self.version, "source": self.source, "set_id": self.set_id, **self.values()}
+
+    def __reduce__(self):
+        # mappingproxy kan ikke pickles; prosessene (reanalyse, skygge) får settet som dict
+        return from_mapping, (self.values(), self.source, self.set_id)
+
+
+def _weights(name: str, value: Any) -> Mapping[str, float]:
+    expected = DEFAULTS[name]
+    if not isinstance(value, Mapping) or set(value) != set(expected):
+        raise ValueError(f"{name} must have exactly the keys {sorted(expected)}")
+    weights = {key: float(value[key]) for key in expected}
+    if any(w < 0 for w in weights.values()):
+        raise ValueError(f"{name} must not be negative")
+    # Vektene må summere til 1, ellers havner indeksen utenfor 0-100
+    if abs(sum(weights.values()) - 1.0) > 1e-6:
+        raise ValueError(f"{name} must sum to 1 (got {sum(weights.values()):.6g})")
+    return MappingProxyType(weights)
+
+
+def from_mapping(data: Mapping[str, Any], source: str = "default",
+                 set_id: Optional[int] = None) -> AnalysisParameters:
+    """Validated parameter set; fields missing from `data` keep their defaults."""
+    unknown = set(data) - set(DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown analysis parameters: {sorted(unknown)}")
+    merged = {**DEFAULTS, **data}
+    max_hue_std = float(merged["max_hue_std"])
+    max_laplacian_variance = float(merged["max_laplacian_variance"])
+    if max_hue_std <= 0 or max_laplacian_variance <= 0:
+        raise ValueError("max_hue_std and max_laplacian_variance must be positive")
+    canny_low, canny_high = merged["canny_low"], merged["canny_high"]
+    if not all(isinstance(v, int) and not isinstance(v, bool) for v in (canny_low, canny_high)) \
+            or not 0 <= canny_low <= canny_high <= 1000:
+        raise ValueError("canny_low and canny_high must be integers with 0 <= canny_low <= canny_high <= 1000")
+    return AnalysisParameters(
+        max_hue_std=max_hue_std,
+        max_laplacian_variance=max_laplacian_variance,
+        canny_low=canny_low,
+        canny_high=canny_high,
+        cvi_weights=_weights("cvi_weights", merged["cvi_weights"]),
+        cqi_weights=_weights("cqi_weights", merged["cqi_weights"]),
+        source=source,
+        set_id=set_id,
+    )
+
+
+DEFAULT = from_mapping({})
+
+
+def _from_record(record: AnalysisParameterSet) -> AnalysisParameters:
+    return from_mapping(json.loads(record.parameters), source="db", set_id=record.id)
+
+
+# --- lagring ---
+
+def save_set(db: Session, data: Mapping[str, Any], note: Optional[str] = None) -> AnalysisParameters:
+    """Validate and insert a new parameter set; it becomes active unless a file overrides it."""
+    params = from_mapping(data)
+    record = AnalysisParameterSet(
+        analysis_version=params.version,
+        parameters=json.dumps(params.values(), sort_keys=True),
+        note=note,
+    )
+    db.add(record)
+    commit(db)
+    db.refresh(record)
+    saved = _from_record(record)
+    source.adopt(saved)
+    return saved
+
+
+def list_sets(db: Session, limit: int = 50) -> List[Dict[str, Any]]:
+    records = db.execute(
+        select(AnalysisParameterSet).order_by(AnalysisParameterSet.id.desc()).limit(limit)
+    ).scalars()
+    return [
+        {"set_id": r.id, "version": r.analysis_version, "note": r.note,
+         "created_at": r.created_at.isoformat() if isinstance(r.created_at, datetime) else None,
+         **json.loads(r.parameters)}
+        for r in records
+    ]
+
+
+def stale_counts(db: Session, version: str) -> Dict[str, Dict[str, int]]:
+    """Stored results per table, and how many of them were made with another version."""
+    from sqlalchemy import func
+
+    from backend.app.models.analysis import AnalysisRecord, ImageAnalysis
+
+    out = {}
+    for name, model in (("analysis_records", AnalysisRecord), ("image_analyses", ImageAnalysis)):
+        total, current_rows = db.execute(select(
+            func.count(), func.count().filter(model.analysis_version == version)
+        ).select_from(model)).one()
+        out[name] = {"total": total, "stale": total - current_rows}
+    return out
+
+
+# --- aktivt sett ---
+
+class ParameterSource:
+    """The active parameter set, rechecked against its source at most every `ttl` seconds."""
+
+    # Navn i loggen og på oppfriskningstråden (services/shadow.py gjenbruker kilden)
+    what = "Analysis parameters"
+    thread_name = "analysis-params-refresh"
+
+    def __init__(self, path: str = PARAMS_FILE, ttl: float = REFRESH_S):
+        self.path = path
+        self.ttl = ttl
+        self._current = DEFAULT
+        self._stamp: Any = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def current(self) -> AnalysisParameters:
+        if time.monotonic() < self._next_check:
+            return self._current
+        # Bare én tråd sjekker kilden; de andre bruker settet de allerede har
+        if self._lock.acquire(blocking=False):
+            try:
+                if time.monotonic() >= self._next_check:
+                    if self.path:
+                        self._refresh()
+                    else:
+                        # Databasen spørres i bakgrunnen; kallet (ofte på event-loopen) venter ikke
+                        self._next_check = time.monotonic() + self.ttl
+                        threading.Thread(target=self.refresh, name=self.thread_name, daemon=True).start()
+            finally:
+                self._lock.release()
+        return self._current
+
+    def refresh(self) -> AnalysisParameters:
+        """Recheck the source now (blocking) and return the active set."""
+        with self._lock:
+            self._refresh()
+        return self._current
+
+    def adopt(self, params: AnalysisParameters) -> None:
+        """Make a just-saved database set active in this process (a parameter file still wins)."""
+        if self.path:
+            return
+        with self._lock:
+            self._stamp = ("db", params.set_id)
+            self._current = params
+            self._next_check = time.monotonic() + self.ttl
+
+    def invalidate(self) -> None:
+        self._next_check = 0.0
+
+    def _after_fork(self) -> None:
+        self._lock = threading.Lock()
+        self._next_check = 0.0
+
+    def _refresh(self) -> None:
+        self._next_check = time.monotonic() + self.ttl
+        try:
+            if self.path:
+                stamp, load = self._file()
+            else:
+                stamp, load = self._db()
+        except Exception as e:
+            logger.warning("%s: source unavailable, keeping %s: %s", self.what, self._current.version, e)
+            return
+        if stamp == self._stamp:
+            return
+        self._stamp = stamp
+        try:
+            params = load()
+        except Exception as e:
+            logger.warning("%s: invalid data from %s, keeping %s: %s",
+                           self.what, self.path or "database", self._current.version, e)
+            return
+        if params.version != self._current.version:
+            logger.info("%s: %s -> %s (%s)", self.what, self._current.version, params.version, params.source)
+        self._current = params
+
+    def _file(self):
+        st = os.stat(self.path)
+
+        def load() -> AnalysisParameters:
+            with open(self.path, encoding="utf-8") as f:
+                return from_mapping(json.load(f), source="file")
+
+        return ("file", st.st_mtime_ns, st.st_size), load
+
+    def _db(self):
+        from backend.app.db import SessionLocal, init_db
+
+        init_db()
+        with SessionLocal() as db:
+            record = db.execute(
+                select(AnalysisParameterSet).order_by(AnalysisParameterSet.id.desc()).limit(1)
+            ).scalar_one_or_none()
+            if record is None:
+                return ("db", None), lambda: DEFAULT
+            set_id, raw = record.id, record.parameters
+        return ("db", set_id), lambda: from_mapping(json.loads(raw), source="db", set_id=set_id)
+
+
+source = ParameterSource()
+if hasattr(os, "register_at_fork"):
+    # En oppfriskningstråd overlever ikke fork; låsen den holdt må ikke gjøre det heller
+    os.register_at_fork(after_in_child=lambda: source._after_fork())
+
+
+def current() -> AnalysisParameters:
+    return source.current()
@@ -0,0 +1,268 @@
+"""
+Token-bucket rate limiting and per-client concurrency quotas.
+
+RateLimitMiddleware is pure ASGI and decides from the scope alone (path and
+headers). A rejected request gets a 429 before the app, and so before the upload
+body is read. Clients are keyed by X-API-Key if the key is in COATVISION_API_KEYS,
+then by the JWT subject from an Authorization: Bearer token (verified through the
+token cache in services/auth.py), then by IP. Unknown API keys are ignored, so
+a client cannot get a fresh bucket by sending a new key.
+
+There are two budgets, each "rate/s:burst":
+- heavy (analysis, calibration, reports, LYXbot): COATVISION_RATE_HEAVY, default 2:10,
+  plus at most COATVISION_MAX_INFLIGHT_HEAVY concurrent heavy requests per client
+- cheap (everything else): COATVISION_RATE_CHEAP, default 20:100
+/health and /metrics are never limited.
+
+Buckets live in process memory by default. COATVISION_RATE_LIMIT_BACKEND=sqlite
+keeps them in a SQLite file under RUNTIME_DIR that all gunicorn workers share; its
+lookups run in the threadpool, so a contended file never blocks the event loop, and
+idle rows are pruned periodically. If the file stays locked past its 1 s busy
+timeout, the request is let through and counted in
+coatvision_rate_limit_errors_total rather than failing. The in-flight quota is
+always per process.
+COATVISION_RATE_LIMIT=0 turns it all off.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from anyio import to_thread
+
+from backend.app.services.metrics import counter
+
+ENABLED = os.getenv("COATVISION_RATE_LIMIT", "1") == "1"
+BACKEND = os.getenv("COATVISION_RATE_LIMIT_BACKEND", "memory")
+MAX_INFLIGHT_HEAVY = int(os.getenv("COATVISION_MAX_INFLIGHT_HEAVY", "2"))
+TRUST_PROXY = os.getenv("COATVISION_TRUST_PROXY", "0") == "1"
+HEAVY_PREFIXES = tuple(
+    p.strip()
+    for p in os.getenv(
+        "COATVISION_RATE_HEAVY_PATHS",
+        "/api/analyze,/analyze,/v1/coatvision/analyze,/api/wash/analyze,/api/calibration/run,"
+        "/api/report/demo,/api/lyxbot/command,/api/lyxbot/chat",
+    ).split(",")
+    if p.strip()
+)
+EXEMPT_PATHS = {"/health", "/metrics"}
+MAX_MEMORY_KEYS = 50_000
+# Bøtter uten trafikk så lenge er fulle igjen og kan slettes
+IDLE_S = 600
+PRUNE_EVERY_S = 60
+
+
+def _key_hashes(value: str) -> FrozenSet[str]:
+    return frozenset(hashlib.sha256(k.strip().encode()).hexdigest() for k in value.split(",") if k.strip())
+
+
+# Bare nøkler på listen får egen bøtte
+API_KEY_HASHES = _key_hashes(os.getenv("COATVISION_API_KEYS", ""))
+
+RATE_LIMITED = counter("coatvision_rate_limited_total", "Requests rejected by the rate limiter.", ("budget", "reason"))
+LIMITER_ERRORS = counter("coatvision_rate_limit_errors_total",
+                         "Requests let through because the bucket store failed.", ("backend",))
+
+
+def _parse_budget(value: str) -> Tuple[float, float]:
+    rate, _, burst = value.partition(":")
+    return float(rate), float(burst or rate)
+
+
+BUDGETS: Dict[str, Tuple[float, float]] = {
+    "heavy": _parse_budget(os.getenv("COATVISION_RATE_HEAVY", "2:10")),
+    "cheap": _parse_budget(os.getenv("COATVISION_RATE_CHEAP", "20:100")),
+}
+
+
+class MemoryBuckets:
+    """Token buckets in a dict: key -> (tokens, last refill time)."""
+
+    blocking = False
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: float, now: Optional[float] = None) -> float:
+        """Take one token. Returns 0 when allowed, otherwise seconds until one is available."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, last = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - last) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                return 0.0
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > MAX_MEMORY_KEYS:
+                self._prune(now)
+            return (1 - tokens) / rate if rate > 0 else 60.0
+
+    def _prune(self, now: float) -> None:
+        # Fulle bøtter har ingen tilstand verdt å beholde
+        stale = [k for k, (_, last) in self._buckets.items() if now - last > IDLE_S]
+        for k in stale:
+            del self._buckets[k]
+
+
+class SQLiteBuckets:
+    """Token buckets in a SQLite file, shared by every worker on the host."""
+
+    # Kall må gå i en tråd, ikke på event-loopen (låsventing kan ta opptil timeout)
+    blocking = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._next_prune = 0.0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")  # tap av bøttetilstand ved krasj er ufarlig
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, rate: float, burst: float, now: Optional[float] = None) -> float:
+        # Veggklokke: må være sammenlignbar mellom prosesser
+        now = time.time() if now is None else now
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens, last = row if row else (burst, now)
+            tokens = min(burst, tokens + max(0.0, now - last) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            conn.execute("INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)", (key, tokens, now))
+            if now >= self._next_prune:
+                self._next_prune = now + PRUNE_EVERY_S
+                conn.execute("DELETE FROM buckets WHERE updated < ?", (now - IDLE_S,))
+            conn.execute("COMMIT")
+        except sqlite3.OperationalError:
+            # Låst fil (mange workere) eller diskfeil: slipp forespørselen gjennom heller enn 500
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            LIMITER_ERRORS.inc("sqlite")
+            return 0.0
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        if allowed:
+            return 0.0
+        return (1 - tokens) / rate if rate > 0 else 60.0
+
+
+def make_backend(name: str = BACKEND):
+    if name == "sqlite":
+        from backend.app.warmup import RUNTIME_DIR
+
+        return SQLiteBuckets(os.getenv("COATVISION_RATE_LIMIT_DB", str(RUNTIME_DIR / "ratelimit.db")))
+    return MemoryBuckets()
+
+
+def budget_for(path: str) -> Optional[str]:
+    if path in EXEMPT_PATHS:
+        return None
+    return "heavy" if path.startswith(HEAVY_PREFIXES) else "cheap"
+
+
+def client_key(scope) -> str:
+    headers = dict(scope.get("headers") or [])
+    api_key = headers.get(b"x-api-key")
+    if api_key:
+        digest = hashlib.sha256(api_key).hexdigest()
+        if digest in API_KEY_HASHES:
+            return "key:" + digest[:32]
+    auth = headers.get(b"authorization", b"")
+    if auth[:7].lower() == b"bearer ":
+        from backend.app.services.auth import decode_token
+
+        try:
+            sub = decode_token(auth[7:].strip().decode("latin-1")).get("sub")
+            if sub:
+                return f"sub:{sub}"
+        except Exception:
+            pass  # ugyldig token: behandles som anonym klient
+    forwarded = headers.get(b"x-forwarded-for")
+    if TRUST_PROXY and forwarded:
+        return "ip:" + forwarded.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return "ip:" + (client[0] if client else "unknown")
+
+
+async def _reject(send, retry_after: float, detail: str) -> None:
+    body = json.dumps({"detail": detail}).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": 429,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("latin-1")),
+            (b"retry-after", str(max(1, int(retry_after + 0.999))).encode("latin-1")),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class RateLimitMiddleware:
+    """Pure ASGI middleware; see module docstring."""
+
+    def __init__(self, app, backend=None, budgets: Optional[Dict[str, Tuple[float, float]]] = None,
+                 max_inflight_heavy: int = MAX_INFLIGHT_HEAVY, enabled: bool = ENABLED):
+        self.app = app
+        self.enabled = enabled
+        self.backend = backend if backend is not None else (make_backend() if enabled else None)
+        self.budgets = budgets or BUDGETS
+        self.max_inflight_heavy = max_inflight_heavy
+        self._inflight: Dict[str, int] = {}
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        budget = budget_for(scope.get("path", ""))
+        if budget is None:
+            await self.app(scope, receive, send)
+            return
+
+        key = client_key(scope)
+        rate, burst = self.budgets[budget]
+        if getattr(self.backend, "blocking", False):
+            retry_after = await to_thread.run_sync(self.backend.take, f"{budget}:{key}", rate, burst)
+        else:
+            retry_after = self.backend.take(f"{budget}:{key}", rate, burst)
+        if retry_after > 0:
+            RATE_LIMITED.inc(budget, "rate")
+            await _reject(send, retry_after, "Rate limit exceeded")
+            return
+
+        if budget != "heavy" or self.max_inflight_heavy <= 0:
+            await self.app(scope, receive, send)
+            return
+        # Event-loopen er entrådet, så telleren trenger ingen lås
+        if self._inflight.get(key, 0) >= self.max_inflight_heavy:
+            RATE_LIMITED.inc(budget, "concurrency")
+            await _reject(send, 1, "Too many concurrent analysis requests")
+            return
+        self._inflight[key] = self._inflight.get(key, 0) + 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            remaining = self._inflight[key] - 1
+            if remaining:
+                self._inflight[key] = remaining
+            else:
+                del self._inflight[key]
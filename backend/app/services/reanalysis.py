@@ -0,0 +1,327 @@
+"""
+Offline bulk re-analysis of stored images (CLI: backend/scripts/reanalyze.py).
+
+Candidates come from image directories (walked recursively) and/or the rows
+already in image_analyses. A candidate is skipped when its row has the version
+of the active parameter set (services/parameters.py) and the run's lighting
+mode, and the file's size and mtime are unchanged, so that check never opens
+the file. Failed rows are retried
+on the next run. The set is resolved once per run and handed to every worker, so
+a parameter change during a run does not mix versions.
+
+The pipeline keeps every stage busy:
+  reader threads (I/O, `prefetch` of them) read file bytes ahead of the analyzers;
+  a process pool (`workers` processes, one OpenCV thread each) decodes and analyzes;
+  the main process collects results in submission order and writes them in bulk,
+  one transaction per `batch` rows (delete + executemany insert).
+After each batch the last written path is saved to a checkpoint file (temp file,
+then os.replace). Candidates are processed in sorted path order, so a resumed
+run skips everything up to that path without touching the database. The
+checkpoint is keyed by version, sources and lighting mode, and is removed when a
+run completes.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from backend.app.warmup import RUNTIME_DIR
+
+if TYPE_CHECKING:
+    from backend.app.services.parameters import AnalysisParameters
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff"}
+CHECKPOINT_PATH = Path(os.getenv("COATVISION_REANALYZE_CHECKPOINT", str(RUNTIME_DIR / "reanalyze-checkpoint.json")))
+PROGRESS_EVERY_S = 5.0
+
+
+@dataclass(frozen=True)
+class Candidate:
+    path: str
+    size: int
+    mtime_ns: int
+
+
+@dataclass
+class Stats:
+    candidates: int = 0
+    skipped: int = 0
+    resumed_past: int = 0
+    analyzed: int = 0
+    failed: int = 0
+    batches: int = 0
+    started: float = field(default_factory=time.perf_counter)
+    seconds: float = 0.0
+
+    @property
+    def images_per_sec(self) -> float:
+        return self.analyzed / self.seconds if self.seconds > 0 else 0.0
+
+    def as_dict(self) -> Dict:
+        out = asdict(self)
+        out.pop("started")
+        out["seconds"] = round(self.seconds, 2)
+        out["images_per_sec"] = round(self.images_per_sec, 2)
+        return out
+
+
+def _candidate(path: str) -> Optional[Candidate]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return Candidate(os.path.abspath(path), st.st_size, st.st_mtime_ns)
+
+
+def walk(roots: Iterable[str]) -> Iterator[Candidate]:
+    """Image files under `roots` (files are accepted as they are)."""
+    stack = [os.path.abspath(r) for r in roots]
+    while stack:
+        root = stack.pop()
+        if os.path.isfile(root):
+            candidate = _candidate(root)
+            if candidate is not None:
+                yield candidate
+            continue
+        try:
+            entries = list(os.scandir(root))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(entry.path)
+            elif os.path.splitext(entry.name)[1].lower() in IMAGE_SUFFIXES:
+                st = entry.stat()
+                yield Candidate(os.path.abspath(entry.path), st.st_size, st.st_mtime_ns)
+
+
+class Checkpoint:
+    def __init__(self, path: Path = CHECKPOINT_PATH):
+        self.path = Path(path)
+
+    def load(self, key: str) -> Optional[str]:
+        try:
+            data = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return None
+        return data.get("last_path") if data.get("key") == key else None
+
+    def save(self, key: str, last_path: str, stats: Stats) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps({"key": key, "last_path": last_path, "stats": stats.as_dict()}))
+        os.replace(tmp, self.path)
+
+    def clear(self) -> None:
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _init_worker() -> None:
+    import cv2
+
+    # Én tråd per prosess; parallelliteten kommer fra prosessene
+    cv2.setNumThreads(1)
+
+
+def read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def analyze_file(path: str, data: bytes, lighting: Optional[str] = None,
+                 params: Optional["AnalysisParameters"] = None) -> Dict:
+    """Worker entry point: decode and analyze one image; errors are returned, not raised."""
+    from backend.app.core.coatvision_core import analyze_coating, decode_image_bytes
+
+    try:
+        return {"path": path, "metrics": analyze_coating(decode_image_bytes(data), lighting=lighting, params=params)}
+    except Exception as e:
+        return {"path": path, "error": f"{type(e).__name__}: {e}"}
+
+
+def _done(value) -> Future:
+    future: Future = Future()
+    future.set_result(value)
+    return future
+
+
+def run_key(version: str, sources: Sequence[str], from_db: bool, lighting: Optional[str]) -> str:
+    from backend.app.services.lighting import resolve_mode
+
+    spec = json.dumps([version, sorted(os.path.abspath(s) for s in sources), from_db, resolve_mode(lighting)])
+    return hashlib.sha1(spec.encode()).hexdigest()[:16]
+
+
+def _row(candidate: Candidate, version: str, lighting: str, out: Dict, now: datetime) -> Dict:
+    metrics = out.get("metrics")
+    return {
+        "path": candidate.path,
+        "size": candidate.size,
+        "mtime_ns": candidate.mtime_ns,
+        "analysis_version": version,
+        "lighting": lighting,
+        "cqi": metrics["cqi"] if metrics else None,
+        "cvi": metrics["cvi"] if metrics else None,
+        "metrics": json.dumps(metrics, separators=(",", ":")) if metrics else None,
+        "error": out.get("error"),
+        "analyzed_at": now,
+    }
+
+
+def _write(rows: List[Dict]) -> None:
+    from sqlalchemy import delete
+
+    from backend.app.db import bulk_insert, unit_of_work
+    from backend.app.models.analysis import ImageAnalysis
+
+    with unit_of_work() as db:
+        db.execute(delete(ImageAnalysis).where(ImageAnalysis.path.in_([r["path"] for r in rows])))
+        bulk_insert(db, ImageAnalysis, rows)
+
+
+def plan(sources: Sequence[str], from_db: bool, version: str, lighting: str, force: bool,
+         stats: Stats) -> List[Candidate]:
+    """Sorted candidates that need analysis."""
+    from sqlalchemy import select
+
+    from backend.app.db import SessionLocal, init_db
+    from backend.app.models.analysis import ImageAnalysis
+
+    init_db()
+    with SessionLocal() as db:
+        known = {
+            path: (size, mtime_ns, row_version, row_lighting, error)
+            for path, size, mtime_ns, row_version, row_lighting, error in db.execute(select(
+                ImageAnalysis.path, ImageAnalysis.size, ImageAnalysis.mtime_ns,
+                ImageAnalysis.analysis_version, ImageAnalysis.lighting, ImageAnalysis.error))
+        }
+    found = {c.path: c for c in walk(sources)}
+    if from_db:
+        for path, (_, _, row_version, row_lighting, error) in known.items():
+            if path not in found and ((row_version, row_lighting) != (version, lighting) or error or force):
+                candidate = _candidate(path)
+                if candidate is not None:
+                    found[path] = candidate
+
+    todo = []
+    for path in sorted(found):
+        candidate = found[path]
+        stats.candidates += 1
+        row = known.get(path)
+        if not force and row is not None and row == (candidate.size, candidate.mtime_ns, version, lighting, None):
+            stats.skipped += 1
+            continue
+        todo.append(candidate)
+    return todo
+
+
+def run(
+    sources: Sequence[str] = (),
+    from_db: bool = False,
+    workers: int = os.cpu_count() or 1,
+    prefetch: int = 4,
+    batch: int = 200,
+    checkpoint: Optional[Checkpoint] = None,
+    resume: bool = True,
+    force: bool = False,
+    lighting: Optional[str] = None,
+    progress: Optional[Callable[[str], None]] = print,
+) -> Stats:
+    """Re-analyze stale images; `workers=0` analyzes in this process (tests, debugging)."""
+    from backend.app.services import lighting as lighting_stage, parameters
+
+    # Blokkerende oppslag: current() gir standardsettet til bakgrunnsoppfriskningen er ferdig
+    params = parameters.source.refresh()
+    version = params.version
+    # None betyr COATVISION_LIGHTING; raden lagrer modusen som faktisk ble brukt
+    lighting = lighting_stage.resolve_mode(lighting)
+    stats = Stats()
+    checkpoint = checkpoint or Checkpoint()
+    key = run_key(version, sources, from_db, lighting)
+    todo = plan(sources, from_db, version, lighting, force, stats)
+    last_done = checkpoint.load(key) if resume else None
+    if last_done is not None:
+        before = len(todo)
+        todo = [c for c in todo if c.path > last_done]
+        stats.resumed_past = before - len(todo)
+
+    reader = ThreadPoolExecutor(max_workers=max(1, prefetch), thread_name_prefix="reanalyze-read")
+    # spawn: arbeiderne arver verken lesetrådene eller databaseforbindelsene
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=_init_worker) if workers > 0 else None
+    read_ahead = max(2, prefetch * 2)
+    window = max(2, workers * 2)
+    reads: deque = deque()
+    analyses: deque = deque()
+    pending = iter(todo)
+    rows: List[Dict] = []
+    last_report = time.perf_counter()
+
+    def fill_reads() -> None:
+        while len(reads) < read_ahead:
+            candidate = next(pending, None)
+            if candidate is None:
+                return
+            reads.append((candidate, reader.submit(read_file, candidate.path)))
+
+    def flush() -> None:
+        if not rows:
+            return
+        _write(rows)
+        stats.batches += 1
+        checkpoint.save(key, rows[-1]["path"], stats)
+        rows.clear()
+
+    try:
+        fill_reads()
+        while reads or analyses:
+            while reads and len(analyses) < window:
+                candidate, read = reads.popleft()
+                try:
+                    data = read.result()
+                except OSError as e:
+                    analyses.append((candidate, _done({"path": candidate.path, "error": f"read failed: {e}"})))
+                else:
+                    if pool is not None:
+                        analyses.append((candidate, pool.submit(analyze_file, candidate.path, data, lighting, params)))
+                    else:
+                        analyses.append((candidate, _done(analyze_file(candidate.path, data, lighting, params))))
+                fill_reads()
+            if not analyses:
+                continue
+            # Resultatene tas i innsendingsrekkefølge, så sjekkpunktet er et sammenhengende prefiks
+            candidate, future = analyses.popleft()
+            out = future.result()
+            if "error" in out:
+                stats.failed += 1
+            else:
+                stats.analyzed += 1
+            rows.append(_row(candidate, version, lighting, out, datetime.now(timezone.utc)))
+            if len(rows) >= batch:
+                flush()
+            now = time.perf_counter()
+            if progress is not None and now - last_report >= PROGRESS_EVERY_S:
+                last_report = now
+                stats.seconds = now - stats.started
+                done = stats.analyzed + stats.failed
+                progress(f"[reanalyze] {done}/{len(todo)} images, {stats.images_per_sec:.2f} images/s")
+        flush()
+        checkpoint.clear()
+    finally:
+        reader.shutdown(wait=False, cancel_futures=True)
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+        stats.seconds = time.perf_counter() - stats.started
+    return stats
@@ -0,0 +1,248 @@
+"""
+Per-panel coating history as packed time series.
+
+Every stored analysis (services/analysis_store.py) is appended to three tiers of
+its vehicle panel, in the same transaction:
+  "raw":  one point per analysis, kept COATVISION_SERIES_RAW_DAYS;
+  "day":  one point per UTC day, kept COATVISION_SERIES_DAY_DAYS;
+  "week": one point per week (from Monday), kept forever.
+A tier is one panel_series row whose `data` is a numpy array of POINT records
+sorted by time (28 bytes per point). Rollup points hold the count, the mean CQI and
+CVI and the CQI min/max of their bucket. Retention drops points older than the
+newest point minus the tier's window and records the cutoff in `retained_from`.
+Nothing is lost that a coarser tier does not summarize.
+
+Range queries read the finest tier that still covers the start of the range and
+merge neighbouring points into wider buckets if more than `max_points` remain.
+Trends fit a count-weighted line to the day (or week) tier. Neither reads
+analysis_records.
+"""
+import math
+import os
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from backend.app.db import upsert
+from backend.app.lazy import lazy_import
+from backend.app.models.series import PanelSeries
+
+np = lazy_import("numpy")
+
+DAY_S = 86400
+TIERS = ("raw", "day", "week")
+BUCKET_S = {"raw": 0, "day": DAY_S, "week": 7 * DAY_S}
+RETENTION_S = {
+    "raw": int(os.getenv("COATVISION_SERIES_RAW_DAYS", "90")) * DAY_S,
+    "day": int(os.getenv("COATVISION_SERIES_DAY_DAYS", "730")) * DAY_S,
+    "week": None,
+}
+# Epoch (1970-01-01) var en torsdag; uker regnes fra mandag
+WEEK_ORIGIN_S = 4 * DAY_S
+MAX_POINTS = 500
+# Endring i CQI per 30 dager innenfor dette regnes som stabilt
+STABLE_SLOPE = 0.5
+
+_POINT = None
+
+
+def point_dtype():
+    global _POINT
+    if _POINT is None:
+        _POINT = np.dtype([("t", "<i8"), ("n", "<u4"), ("cqi", "<f4"), ("cvi", "<f4"),
+                           ("cqi_min", "<f4"), ("cqi_max", "<f4")])
+    return _POINT
+
+
+def epoch(at: datetime) -> int:
+    if at.tzinfo is None:
+        at = at.replace(tzinfo=timezone.utc)
+    return int(at.timestamp())
+
+
+def _iso(t: int) -> str:
+    return datetime.fromtimestamp(int(t), tz=timezone.utc).isoformat()
+
+
+def decode(row: Optional[PanelSeries]) -> "np.ndarray":
+    if row is None or not row.data:
+        return np.empty(0, dtype=point_dtype())
+    return np.frombuffer(row.data, dtype=point_dtype()).copy()
+
+
+def _bucket(t: int, tier: str) -> int:
+    size = BUCKET_S[tier]
+    if not size:
+        return t
+    origin = WEEK_ORIGIN_S if tier == "week" else 0
+    return t - (t - origin) % size
+
+
+def _merge(points: "np.ndarray", tier: str, t: int, cqi: float, cvi: float) -> "np.ndarray":
+    t = _bucket(t, tier)
+    if tier == "raw":
+        i = int(np.searchsorted(points["t"], t, side="right"))
+    else:
+        i = int(np.searchsorted(points["t"], t))
+        if i < len(points) and points["t"][i] == t:
+            n = float(points["n"][i])
+            points["cqi"][i] = (points["cqi"][i] * n + cqi) / (n + 1)
+            points["cvi"][i] = (points["cvi"][i] * n + cvi) / (n + 1)
+            points["cqi_min"][i] = min(points["cqi_min"][i], cqi)
+            points["cqi_max"][i] = max(points["cqi_max"][i], cqi)
+            points["n"][i] += 1
+            return points
+    point = np.array([(t, 1, cqi, cvi, cqi, cqi)], dtype=point_dtype())
+    return np.insert(points, i, point)
+
+
+def append(db: Session, vehicle_id: str, panel: str, at: datetime, cqi: float, cvi: float) -> None:
+    """Add one analysis to every tier of the panel; the caller commits."""
+    t = epoch(at)
+    stmt = (
+        select(PanelSeries)
+        .where(PanelSeries.vehicle_id == vehicle_id, PanelSeries.panel == panel)
+        .with_for_update()
+    )
+    rows = {row.tier: row for row in db.execute(stmt).scalars()}
+    if len(rows) < len(TIERS):
+        # FOR UPDATE er en no-op på SQLite, så to første analyser av samme panel kan
+        # begge mangle radene; ON CONFLICT DO NOTHING lar den ene innsettingen vinne
+        db.execute(upsert(db, PanelSeries).values([
+            {"vehicle_id": vehicle_id, "panel": panel, "tier": tier} for tier in TIERS if tier not in rows
+        ]).on_conflict_do_nothing(index_elements=["vehicle_id", "panel", "tier"]))
+        rows = {row.tier: row for row in db.execute(stmt.execution_options(populate_existing=True)).scalars()}
+    for tier in TIERS:
+        row = rows[tier]
+        points = _merge(decode(row), tier, t, float(cqi), float(cvi))
+        window = RETENTION_S[tier]
+        if window is not None:
+            cutoff = int(points["t"][-1]) - window
+            keep = int(np.searchsorted(points["t"], cutoff))
+            if keep:
+                points = points[keep:]
+                row.retained_from = max(row.retained_from or 0, cutoff)
+        row.data = points.tobytes()
+        row.points = len(points)
+        row.last_t = int(points["t"][-1])
+
+
+def _tiers(db: Session, vehicle_id: str, panel: str) -> Dict[str, PanelSeries]:
+    return {
+        row.tier: row
+        for row in db.execute(
+            select(PanelSeries).where(PanelSeries.vehicle_id == vehicle_id, PanelSeries.panel == panel)
+        ).scalars()
+    }
+
+
+def _covering(rows: Dict[str, PanelSeries], start: int) -> Optional[PanelSeries]:
+    for tier in TIERS:
+        row = rows.get(tier)
+        if row is not None and row.retained_from <= start:
+            return row
+    return rows.get(TIERS[-1])
+
+
+def downsample(points: "np.ndarray", max_points: int) -> Tuple["np.ndarray", int]:
+    """Merge points into equal-width buckets so at most `max_points` remain."""
+    if len(points) <= max_points:
+        return points, 0
+    origin = int(points["t"][0])
+    width = max(1, math.ceil((int(points["t"][-1]) - origin + 1) / max_points))
+    groups = (points["t"] - origin) // width
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    n = np.add.reduceat(points["n"].astype(np.float64), starts)
+    out = np.empty(len(starts), dtype=point_dtype())
+    out["t"] = origin + groups[starts] * width
+    out["n"] = n
+    out["cqi"] = np.add.reduceat(points["cqi"] * points["n"], starts, dtype=np.float64) / n
+    out["cvi"] = np.add.reduceat(points["cvi"] * points["n"], starts, dtype=np.float64) / n
+    out["cqi_min"] = np.minimum.reduceat(points["cqi_min"], starts)
+    out["cqi_max"] = np.maximum.reduceat(points["cqi_max"], starts)
+    return out, width
+
+
+def _point_out(p) -> Dict:
+    return {
+        "t": _iso(p["t"]),
+        "n": int(p["n"]),
+        "cqi": round(float(p["cqi"]), 2),
+        "cvi": round(float(p["cvi"]), 2),
+        "cqi_min": round(float(p["cqi_min"]), 2),
+        "cqi_max": round(float(p["cqi_max"]), 2),
+    }
+
+
+def query(
+    db: Session,
+    vehicle_id: str,
+    panel: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    max_points: int = MAX_POINTS,
+) -> Optional[Dict]:
+    """Points of the panel between `start` and `end` (inclusive); None for an unknown panel."""
+    rows = _tiers(db, vehicle_id, panel)
+    if not rows:
+        return None
+    lo = epoch(start) if start is not None else 0
+    row = _covering(rows, lo)
+    points = decode(row)
+    i = int(np.searchsorted(points["t"], _bucket(lo, row.tier)))
+    j = int(np.searchsorted(points["t"], epoch(end), side="right")) if end is not None else len(points)
+    points, width = downsample(points[i:j], max_points)
+    return {
+        "vehicle_id": vehicle_id,
+        "panel": panel,
+        "tier": row.tier,
+        "bucket_seconds": width or BUCKET_S[row.tier],
+        "points": [_point_out(p) for p in points],
+    }
+
+
+def trend(db: Session, vehicle_id: str, panel: str, days: Optional[int] = None) -> Optional[Dict]:
+    """Count-weighted linear CQI/CVI trend over the last `days` (all history without)."""
+    rows = _tiers(db, vehicle_id, panel)
+    if not rows:
+        return None
+    newest = max(row.last_t for row in rows.values())
+    lo = newest - days * DAY_S if days else 0
+    row = rows.get("day") if rows.get("day") is not None and rows["day"].retained_from <= lo else rows.get("week")
+    points = decode(row)
+    points = points[int(np.searchsorted(points["t"], _bucket(lo, row.tier))):]
+    if not len(points):
+        return None
+
+    out = {
+        "vehicle_id": vehicle_id,
+        "panel": panel,
+        "window_days": days,
+        "tier": row.tier,
+        "analyses": int(points["n"].sum()),
+        "first": _point_out(points[0]),
+        "last": _point_out(points[-1]),
+        "cqi_change": round(float(points["cqi"][-1] - points["cqi"][0]), 2),
+        "cqi_per_30d": None,
+        "cvi_per_30d": None,
+        "direction": "unknown",
+    }
+    if len(points) >= 2:
+        x = (points["t"] - points["t"][-1]) / (30.0 * DAY_S)
+        weights = np.sqrt(points["n"].astype(np.float64))
+        cqi_slope = float(np.polyfit(x, points["cqi"].astype(np.float64), 1, w=weights)[0])
+        cvi_slope = float(np.polyfit(x, points["cvi"].astype(np.float64), 1, w=weights)[0])
+        out["cqi_per_30d"] = round(cqi_slope, 3)
+        out["cvi_per_30d"] = round(cvi_slope, 3)
+        out["direction"] = ("stable" if abs(cqi_slope) <= STABLE_SLOPE
+                            else "improving" if cqi_slope > 0 else "declining")
+    return out
+
+
+def panels(db: Session, vehicle_id: str) -> List[str]:
+    return list(db.execute(
+        select(PanelSeries.panel).where(PanelSeries.vehicle_id == vehicle_id, PanelSeries.tier == "week")
+        .order_by(PanelSeries.panel)
+    ).scalars())
@@ -0,0 +1,501 @@
+"""
+Shadow evaluation of a candidate analyzer on live traffic.
+
+The frame routes call `runner.analyze(...)` in place of analyze_coating. With
+probability COATVISION_SHADOW_SAMPLE_RATE, and when a candidate is configured,
+the frame is also queued for the candidate after the primary result is ready.
+The request never waits for the candidate. Its only extra cost is a copy of the
+frame, and only when calibration or lighting normalization would modify it in
+place. A candidate is a parameter set (services/parameters.py): the file named by
+COATVISION_SHADOW_PARAMS, hot-reloaded like the primary set, or one set through
+PUT /api/shadow. PUT and DELETE insert a shadow_candidates row; every server
+worker reads the newest row through the same background TTL check as the
+active parameter set (COATVISION_ANALYSIS_PARAMS_REFRESH_S), so all of them
+sample the same candidate at the same rate. That row takes precedence over the
+file. Candidates with their own `analyzer` (e.g. a model) plug in through
+`Candidate` (set_candidate, this runner only).
+
+One shadow thread takes samples off a small bounded queue and runs the candidate
+in a separate process at nice 19 (COATVISION_SHADOW_PROCESS=0 runs it on the
+thread instead). Each result is stored as a shadow_results row: the candidate
+minus primary delta of every numeric metric and defect count, and the primary
+and candidate timings.
+
+CPU budget: COATVISION_SHADOW_CPU_BUDGET is the share of one core that shadow
+work may use on the whole host. The runner, its queue and its process exist
+once per server worker, so each worker gets the budget divided by
+WEB_CONCURRENCY (gunicorn.conf.py sets it to the worker count). A token bucket
+per worker holds CPU seconds and refills at that share per wall second. Each evaluation is charged the CPU time it measured. While
+the bucket is empty, new samples are dropped at the request (one comparison)
+and the shadow thread sleeps until it refills. A full queue also drops samples.
+"""
+import json
+import math
+import multiprocessing
+import os
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from backend.app.db import commit
+from backend.app.models.shadow import ShadowCandidate, ShadowResult
+from backend.app.services import parameters
+from backend.app.services.metrics import counter
+
+if TYPE_CHECKING:
+    from backend.app.services.calibration.profiles import Profile
+
+SAMPLE_RATE = float(os.getenv("COATVISION_SHADOW_SAMPLE_RATE", "0"))
+SERVER_WORKERS = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+# Budsjettet gjelder hele verten; hver server-worker har sin egen bøtte
+CPU_BUDGET = float(os.getenv("COATVISION_SHADOW_CPU_BUDGET", "0.1")) / SERVER_WORKERS
+QUEUE_SIZE = int(os.getenv("COATVISION_SHADOW_QUEUE", "4"))
+CANDIDATE_FILE = os.getenv("COATVISION_SHADOW_PARAMS", "")
+USE_PROCESS = os.getenv("COATVISION_SHADOW_PROCESS", "1") != "0"
+# Så mange CPU-sekunder kan spares opp mens det ikke kommer prøver
+BURST_S = 2.0
+SUMMARY_ROWS = 5000
+
+SAMPLES = counter("coatvision_shadow_samples_total", "Shadow evaluation samples by outcome.", ("outcome",))
+OUTCOMES = ("queued", "dropped_budget", "dropped_queue", "done", "failed")
+
+
+@dataclass(frozen=True)
+class Candidate:
+    label: str
+    version: str
+    params: Optional[parameters.AnalysisParameters] = None
+    # analyzer(image, calibration, lighting, params) -> metrics; må kunne pickles i prosessmodus
+    analyzer: Optional[Callable] = None
+
+    @classmethod
+    def from_parameters(cls, params: parameters.AnalysisParameters, label: str = "parameters") -> "Candidate":
+        return cls(label=label, version=params.version, params=params)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"label": self.label, "version": self.version,
+                "parameters": self.params.values() if self.params is not None else None}
+
+
+@dataclass(frozen=True)
+class SharedCandidate:
+    """The newest shadow_candidates row (candidate None: cleared or never set)."""
+
+    candidate: Optional[Candidate] = None
+    sample_rate: Optional[float] = None
+    set_id: Optional[int] = None
+    source: str = "db"
+
+    @property
+    def version(self) -> str:
+        return self.candidate.version if self.candidate is not None else "none"
+
+
+NO_SHARED = SharedCandidate()
+
+
+def _shared_from(record: ShadowCandidate) -> SharedCandidate:
+    if record.parameters is None:
+        return SharedCandidate(sample_rate=record.sample_rate, set_id=record.id)
+    params = parameters.from_mapping(json.loads(record.parameters), source="db")
+    return SharedCandidate(Candidate.from_parameters(params, record.label or "parameters"),
+                           record.sample_rate, record.id)
+
+
+class CandidateSource(parameters.ParameterSource):
+    """The shared candidate, rechecked in the background at most every `ttl` seconds."""
+
+    what = "Shadow candidate"
+    thread_name = "shadow-candidate-refresh"
+
+    def __init__(self, ttl: float = parameters.REFRESH_S):
+        super().__init__("", ttl)
+        self._current = NO_SHARED
+
+    def _db(self):
+        from backend.app.db import SessionLocal, init_db
+
+        init_db()
+        with SessionLocal() as db:
+            record = db.execute(
+                select(ShadowCandidate).order_by(ShadowCandidate.id.desc()).limit(1)
+            ).scalar_one_or_none()
+            if record is None:
+                return ("db", None), lambda: NO_SHARED
+            shared = _shared_from(record)
+        return ("db", shared.set_id), lambda: shared
+
+
+@dataclass
+class Sample:
+    image: Any
+    calibration: Optional["Profile"]
+    lighting: Optional[str]
+    primary: Dict
+    primary_ms: float
+    candidate: Candidate
+
+
+class CpuBudget:
+    """Token bucket of CPU seconds, refilled at `rate` per wall second up to `burst`."""
+
+    def __init__(self, rate: float = CPU_BUDGET, burst: float = BURST_S):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> float:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._at) * self.rate)
+        self._at = now
+        return self._tokens
+
+    def available(self) -> bool:
+        with self._lock:
+            return self._refill() > 0
+
+    def charge(self, cpu_s: float) -> None:
+        with self._lock:
+            self._refill()
+            self._tokens -= cpu_s
+
+    def wait_s(self) -> float:
+        """Seconds until the bucket is positive again."""
+        with self._lock:
+            tokens = self._refill()
+        if tokens > 0:
+            return 0.0
+        return -tokens / self.rate if self.rate > 0 else math.inf
+
+    @property
+    def tokens(self) -> float:
+        with self._lock:
+            return self._refill()
+
+
+def _lower_priority() -> None:
+    try:
+        # På Linux gjelder nice per tråd (native id); ellers for hele prosessen, som i arbeiderprosessen
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+    except (AttributeError, OSError):
+        pass
+
+
+def evaluate(image, calibration, lighting, params, analyzer=None, clock: Callable[[], float] = time.process_time) -> Dict:
+    """Run a candidate on one frame; returns its metrics (or error), wall ms and CPU seconds."""
+    from backend.app.core.coatvision_core import analyze_coating
+
+    wall, cpu = time.perf_counter(), clock()
+    try:
+        out = {"metrics": (analyzer or analyze_coating)(image, calibration, lighting, params)}
+    except Exception as e:
+        out = {"error": f"{type(e).__name__}: {e}"}
+    out["ms"] = (time.perf_counter() - wall) * 1000
+    out["cpu_s"] = clock() - cpu
+    return out
+
+
+def deltas(primary: Dict, candidate: Dict) -> Dict[str, float]:
+    """Candidate minus primary for every numeric metric and defect count both have."""
+    out = {}
+    for key, value in primary.items():
+        other = candidate.get(key)
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and isinstance(other, (int, float)):
+            out[key] = round(float(other) - float(value), 4)
+    for kind, count in (primary.get("defect_counts") or {}).items():
+        out[f"defects.{kind}"] = float((candidate.get("defect_counts") or {}).get(kind, 0) - count)
+    return out
+
+
+def _row(sample: Sample, out: Dict) -> Dict:
+    metrics = out.get("metrics")
+    diff = deltas(sample.primary, metrics) if metrics else {}
+    return {
+        "candidate": sample.candidate.label,
+        "candidate_version": sample.candidate.version,
+        "primary_version": sample.primary.get("analysis_version"),
+        "cqi_delta": diff.get("cqi"),
+        "cvi_delta": diff.get("cvi"),
+        "deltas": json.dumps(diff, separators=(",", ":")) if metrics else None,
+        "primary_ms": round(sample.primary_ms, 3),
+        "candidate_ms": round(out["ms"], 3),
+        "candidate_cpu_ms": round(out["cpu_s"] * 1000, 3),
+        "error": out.get("error"),
+    }
+
+
+def _store(row: Dict) -> None:
+    from backend.app.db import init_db, unit_of_work
+
+    init_db()
+    with unit_of_work() as db:
+        db.add(ShadowResult(**row))
+
+
+class ShadowRunner:
+    def __init__(
+        self,
+        sample_rate: float = SAMPLE_RATE,
+        cpu_budget: float = CPU_BUDGET,
+        queue_size: int = QUEUE_SIZE,
+        use_process: bool = USE_PROCESS,
+        candidate_file: str = CANDIDATE_FILE,
+        store: Callable[[Dict], None] = _store,
+        shared: Optional[CandidateSource] = None,
+    ):
+        self.sample_rate = sample_rate
+        self.budget = CpuBudget(cpu_budget)
+        self.use_process = use_process
+        self.store = store
+        self.shared = shared
+        self._candidate: Optional[Candidate] = None
+        self._file_source = parameters.ParameterSource(candidate_file) if candidate_file else None
+        self._queue: "queue.Queue[Optional[Sample]]" = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._random = random.Random()
+
+    # --- konfigurasjon ---
+
+    def _active(self) -> Tuple[Optional[Candidate], float]:
+        """Candidate and sample rate in effect: set on this runner, else the shared row, else the file."""
+        if self._candidate is not None:
+            return self._candidate, self.sample_rate
+        if self.shared is not None:
+            state = self.shared.current()
+            if state.candidate is not None:
+                return state.candidate, self.sample_rate if state.sample_rate is None else state.sample_rate
+        if self._file_source is not None:
+            params = self._file_source.current()
+            if params.source == "file":
+                return Candidate.from_parameters(params, label="file"), self.sample_rate
+        return None, self.sample_rate
+
+    def candidate(self) -> Optional[Candidate]:
+        return self._active()[0]
+
+    def set_candidate(self, candidate: Optional[Candidate], sample_rate: Optional[float] = None) -> None:
+        self._candidate = candidate
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+
+    # --- forespørselsveien ---
+
+    def _pick(self) -> Optional[Candidate]:
+        candidate, rate = self._active()
+        if candidate is None or rate <= 0 or self._random.random() >= rate:
+            return None
+        if not self.budget.available():
+            SAMPLES.inc("dropped_budget")
+            return None
+        return candidate
+
+    def analyze(self, image, calibration: Optional["Profile"] = None, lighting: Optional[str] = None) -> Dict:
+        """analyze_coating for a live request; a sampled frame also goes to the candidate."""
+        from backend.app.core.coatvision_core import analyze_coating
+        from backend.app.services import lighting as lighting_stage
+
+        candidate = self._pick()
+        frame = image
+        if candidate is not None:
+            try:
+                in_place = calibration is not None or lighting_stage.resolve_mode(lighting) != "off"
+            except ValueError:
+                in_place = True
+            # analyze_coating endrer bildet på stedet ved kalibrering og lysnormalisering
+            frame = image.copy() if in_place else image
+        started = time.perf_counter()
+        metrics = analyze_coating(image, calibration, lighting)
+        if candidate is not None:
+            self._enqueue(Sample(frame, calibration, lighting, metrics,
+                                 (time.perf_counter() - started) * 1000, candidate))
+        return metrics
+
+    def _enqueue(self, sample: Sample) -> None:
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(sample)
+        except queue.Full:
+            SAMPLES.inc("dropped_queue")
+            return
+        SAMPLES.inc("queued")
+
+    # --- skyggetråden ---
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="shadow", daemon=True)
+                self._thread.start()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: arbeideren arver ingen tråder eller databaseforbindelser
+            self._executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"),
+                                                 initializer=_lower_priority)
+        return self._executor
+
+    def _loop(self) -> None:
+        _lower_priority()
+        while True:
+            sample = self._queue.get()
+            try:
+                if sample is None:
+                    return
+                wait = self.budget.wait_s()
+                if wait > 0:
+                    time.sleep(wait)
+                self._evaluate(sample)
+            except Exception as e:
+                print(f"[shadow] Evaluation failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _evaluate(self, sample: Sample) -> None:
+        local = time.thread_time()
+        candidate = sample.candidate
+        args = (sample.image, sample.calibration, sample.lighting, candidate.params, candidate.analyzer)
+        if self.use_process:
+            out = self._get_executor().submit(evaluate, *args).result()
+        else:
+            out = evaluate(*args, clock=time.thread_time)
+        sample.image = None
+        self.store(_row(sample, out))
+        SAMPLES.inc("failed" if "error" in out else "done")
+        # Prosessens CPU-tid i tillegg til trådens egen (henting, lagring); i tråden er den allerede med
+        self.budget.charge(time.thread_time() - local + (out["cpu_s"] if self.use_process else 0.0))
+
+    def wait(self, timeout: float = 30.0) -> bool:
+        """Poll until every queued sample is evaluated (tests and benchmarks)."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return not self._queue.unfinished_tasks
+
+    def status(self) -> Dict[str, Any]:
+        candidate, rate = self._active()
+        return {
+            "enabled": rate > 0 and candidate is not None,
+            "sample_rate": rate,
+            "candidate": candidate.as_dict() if candidate is not None else None,
+            "cpu_budget": self.budget.rate,
+            "server_workers": SERVER_WORKERS,
+            "cpu_tokens_s": round(self.budget.tokens, 3),
+            "queued": self._queue.qsize(),
+            "mode": "process" if self.use_process else "thread",
+            "samples": {outcome: int(SAMPLES.value(outcome)) for outcome in OUTCOMES},
+        }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            thread, self._thread = self._thread, None
+            executor, self._executor = self._executor, None
+        if thread is not None:
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                pass
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+shared = CandidateSource()
+runner = ShadowRunner(shared=shared)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=lambda: shared._after_fork())
+
+
+def save_candidate(db: Session, candidate: Optional[Candidate], sample_rate: Optional[float] = None) -> SharedCandidate:
+    """Insert the candidate every worker shadow-runs (None clears it) and adopt it in this process."""
+    record = ShadowCandidate(
+        label=candidate.label if candidate is not None else None,
+        parameters=json.dumps(candidate.params.values(), sort_keys=True) if candidate is not None else None,
+        sample_rate=sample_rate,
+    )
+    db.add(record)
+    commit(db)
+    db.refresh(record)
+    saved = _shared_from(record)
+    shared.adopt(saved)
+    return saved
+
+
+# --- oppsummering ---
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+def versions(db: Session) -> List[Dict[str, Any]]:
+    return [
+        {"candidate_version": version, "candidate": label, "samples": n}
+        for version, label, n in db.execute(
+            select(ShadowResult.candidate_version, func.max(ShadowResult.candidate), func.count())
+            .group_by(ShadowResult.candidate_version).order_by(func.max(ShadowResult.id).desc())
+        )
+    ]
+
+
+def summary(db: Session, candidate_version: str, limit: int = SUMMARY_ROWS) -> Optional[Dict[str, Any]]:
+    """Delta and timing statistics over the newest `limit` samples of a candidate version."""
+    rows = db.execute(
+        select(ShadowResult.deltas, ShadowResult.primary_ms, ShadowResult.candidate_ms,
+               ShadowResult.candidate_cpu_ms, ShadowResult.error, ShadowResult.primary_version)
+        .where(ShadowResult.candidate_version == candidate_version)
+        .order_by(ShadowResult.id.desc()).limit(limit)
+    ).all()
+    if not rows:
+        return None
+    per_metric: Dict[str, List[float]] = {}
+    primary_ms, candidate_ms, candidate_cpu_ms = [], [], []
+    for raw, p_ms, c_ms, c_cpu, error, _ in rows:
+        if error:
+            continue
+        for key, value in json.loads(raw or "{}").items():
+            per_metric.setdefault(key, []).append(value)
+        primary_ms.append(p_ms)
+        candidate_ms.append(c_ms)
+        candidate_cpu_ms.append(c_cpu)
+
+    metrics = {}
+    for key, values in sorted(per_metric.items()):
+        magnitudes = [abs(v) for v in values]
+        metrics[key] = {
+            "mean": round(sum(values) / len(values), 4),
+            "mean_abs": round(sum(magnitudes) / len(magnitudes), 4),
+            "p95_abs": round(_percentile(magnitudes, 0.95), 4),
+            "max_abs": round(max(magnitudes), 4),
+            "changed": sum(1 for m in magnitudes if m > 0),
+        }
+    p50_primary = _percentile(primary_ms, 0.5)
+    p50_candidate = _percentile(candidate_ms, 0.5)
+    return {
+        "candidate_version": candidate_version,
+        "primary_versions": sorted({r[5] for r in rows if r[5]}),
+        "samples": len(rows),
+        "errors": sum(1 for r in rows if r[4]),
+        "metrics": metrics,
+        "timing": {
+            "primary_ms_p50": p50_primary,
+            "primary_ms_p95": _percentile(primary_ms, 0.95),
+            "candidate_ms_p50": p50_candidate,
+            "candidate_ms_p95": _percentile(candidate_ms, 0.95),
+            "candidate_cpu_ms_p50": _percentile(candidate_cpu_ms, 0.5),
+            "candidate_vs_primary": round(p50_candidate / p50_primary, 3) if p50_primary and p50_candidate else None,
+        },
+    }
@@ -0,0 +1,367 @@
+"""
+"Most similar past panels": compact panel descriptors and a local IVF index.
+
+`describe` builds a 48-byte descriptor from stages analyze_coating already runs:
+a joint hue/saturation histogram (8 x 4 bins), a value histogram (8 bins) and a
+histogram of |Laplacian| on log-spaced bins (8). The texture histogram captures
+scratches and swirl marks. Each block is L1-normalized and square-rooted, so the
+L2 distance between descriptors is a Hellinger distance per block. The result is
+quantized to uint8. Histograms use every 4th pixel in each direction (with the
+panel mask when lighting normalization found one).
+
+Descriptors are stored with the analysis (analysis_records.embedding); the table
+is the source of truth. `PanelIndex` keeps them in memory as an inverted-file
+(IVF) index:
+- k-means centroids, trained on the shared worker pool once TRAIN_MIN vectors
+  exist, and retrained in the background when the index has grown RETRAIN_GROWTH
+  times;
+- vectors stored contiguously by list, plus an unsorted tail of recent inserts
+  (each already assigned to a list), regrouped once the tail passes TAIL_MAX.
+A query scans the NPROBE nearest lists (contiguous slices) and the tail, so the
+cost depends on the list sizes, not the index size. Below TRAIN_MIN the query scans every vector.
+The index is snapshotted to RUNTIME_DIR/similarity.npz (written to a temp file,
+then os.replace) after training and every SNAPSHOT_EVERY inserts. Catch-up from
+the table uses its own watermark, `synced_id`: the highest id that `refresh` has
+read. Rows this process inserts itself do not move it; they are remembered by
+id until a refresh passes them, so a lower id committed by another worker
+is still read. (SQLite commits one writer at a time, so ids become visible in
+order.) A snapshot stores its watermark, so any worker's snapshot is a valid
+start: a restart loads it and reads only rows above the watermark that it does
+not already hold. Other workers' inserts arrive the same way, at most every
+COATVISION_SIMILARITY_REFRESH_S.
+"""
+import math
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from backend.app.lazy import lazy_import
+from backend.app.warmup import RUNTIME_DIR
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+DIM = 48
+SAMPLE_STEP = 4
+# log-fordelte grenser for |Laplace| (uint8), siste bin er alt over 128
+TEXTURE_EDGES = [0, 2, 4, 8, 16, 32, 64, 128, 256]
+
+INDEX_PATH = Path(os.getenv("COATVISION_SIMILARITY_INDEX", str(RUNTIME_DIR / "similarity.npz")))
+NPROBE = int(os.getenv("COATVISION_SIMILARITY_NPROBE", "16"))
+REFRESH_S = float(os.getenv("COATVISION_SIMILARITY_REFRESH_S", "2"))
+TRAIN_MIN = 2048
+MAX_LISTS = 1024
+RETRAIN_GROWTH = 4
+TAIL_MAX = 20000
+SNAPSHOT_EVERY = 5000
+KMEANS_ITERATIONS = 8
+
+
+_TEXTURE_LUT = None
+
+
+def _texture_bins() -> "np.ndarray":
+    global _TEXTURE_LUT
+    if _TEXTURE_LUT is None:
+        _TEXTURE_LUT = (np.searchsorted(TEXTURE_EDGES, np.arange(256), side="right") - 1).astype(np.uint8)
+    return _TEXTURE_LUT
+
+
+def describe(hsv: "np.ndarray", laplacian: "np.ndarray", mask: Optional["np.ndarray"] = None) -> "np.ndarray":
+    """uint8 descriptor of length DIM from the HSV frame and the Laplacian of its gray image."""
+    step = SAMPLE_STEP
+    hsv = np.ascontiguousarray(hsv[::step, ::step])
+    # |Laplace| som uint8, slått opp til bin-nummer (calcHist tar bare jevne bins)
+    texture = cv2.LUT(cv2.convertScaleAbs(np.ascontiguousarray(laplacian[::step, ::step])), _texture_bins())
+    mask = np.ascontiguousarray(mask[::step, ::step]) if mask is not None else None
+    blocks = [
+        cv2.calcHist([hsv], [0, 1], mask, [8, 4], [0, 180, 0, 256]).ravel(),
+        cv2.calcHist([hsv], [2], mask, [8], [0, 256]).ravel(),
+        cv2.calcHist([texture], [0], mask, [len(TEXTURE_EDGES) - 1], [0, len(TEXTURE_EDGES) - 1]).ravel(),
+    ]
+    parts = [np.sqrt(b / max(float(b.sum()), 1.0)) for b in blocks]
+    return np.rint(np.concatenate(parts) * 255).astype(np.uint8)
+
+
+def _distances(candidates: "np.ndarray", query: "np.ndarray") -> "np.ndarray":
+    diff = candidates.astype(np.float32) - query
+    return np.einsum("ij,ij->i", diff, diff)
+
+
+def _nearest(vectors: "np.ndarray", centroids: "np.ndarray", chunk: int = 65536) -> "np.ndarray":
+    """Index of the nearest centroid for each row (||c||^2 - 2 v.c, in chunks)."""
+    norms = (centroids ** 2).sum(axis=1)
+    out = np.empty(len(vectors), dtype=np.int32)
+    for i in range(0, len(vectors), chunk):
+        block = vectors[i:i + chunk].astype(np.float32)
+        out[i:i + chunk] = np.argmin(norms - 2.0 * block @ centroids.T, axis=1)
+    return out
+
+
+def kmeans(vectors: "np.ndarray", lists: int, seed: int = 0) -> "np.ndarray":
+    rng = np.random.default_rng(seed)
+    sample = vectors[rng.choice(len(vectors), min(len(vectors), lists * 64), replace=False)].astype(np.float32)
+    centroids = sample[rng.choice(len(sample), lists, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assign = _nearest(sample, centroids)
+        counts = np.bincount(assign, minlength=lists).astype(np.float32)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # Tomme lister får et tilfeldig punkt fra utvalget
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            centroids[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+    return centroids
+
+
+class PanelIndex:
+    """In-memory IVF index of analysis id -> descriptor; thread-safe."""
+
+    def __init__(self, path: Optional[Path] = INDEX_PATH, background: bool = True):
+        self.path = path
+        # Uten bakgrunnsjobber trenes og lagres indeksen bare ved eksplisitte kall
+        self.background = background
+        self._lock = threading.RLock()
+        # Arrayene opprettes ved første bruk, så import ikke laster numpy
+        self._codes = self._ids = self._assign = None
+        self.size = 0
+        self.centroids: Optional["np.ndarray"] = None
+        self.trained_size = 0
+        # Rader [0, sorted_size) ligger gruppert per liste; liste c er [_offsets[c], _offsets[c + 1])
+        self._offsets = None
+        self.sorted_size = 0
+        self.max_id = 0
+        # Høyeste id lest fra tabellen; egne innsettinger over den ligger i _local_ids
+        self.synced_id = 0
+        self._local_ids: set = set()
+        self.loaded = False
+        self.training = False
+        self._unsaved = 0
+        self._last_refresh = 0.0
+
+    # --- innsetting -------------------------------------------------------
+    def _grow(self, needed: int) -> None:
+        if self._ids is None:
+            self._codes = np.empty((0, DIM), dtype=np.uint8)
+            self._ids = np.empty(0, dtype=np.int64)
+            self._assign = np.empty(0, dtype=np.int32)
+        capacity = len(self._ids)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, 1024)
+        for name in ("_codes", "_ids", "_assign"):
+            old = getattr(self, name)
+            new = np.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def add_many(self, ids: Sequence[int], codes: "np.ndarray") -> None:
+        codes = np.asarray(codes, dtype=np.uint8).reshape(-1, DIM)
+        if not len(codes):
+            return
+        with self._lock:
+            n = len(codes)
+            self._grow(self.size + n)
+            end = self.size + n
+            self._codes[self.size:end] = codes
+            self._ids[self.size:end] = ids
+            self._assign[self.size:end] = _nearest(codes, self.centroids) if self.centroids is not None else 0
+            self.size = end
+            self.max_id = max(self.max_id, int(np.max(ids)))
+            self._unsaved += n
+            if self.size - self.sorted_size > TAIL_MAX and not self.training:
+                self._sort()
+        self._maintain()
+
+    def add(self, analysis_id: int, code: "np.ndarray") -> None:
+        """Add a row this process just inserted; the next refresh skips it."""
+        with self._lock:
+            if analysis_id > self.synced_id:
+                self._local_ids.add(int(analysis_id))
+            self.add_many([analysis_id], np.asarray(code).reshape(1, DIM))
+
+    def _sort(self) -> None:
+        if self.centroids is None:
+            return
+        n = self.size
+        order = np.argsort(self._assign[:n], kind="stable")
+        # Flytter radene fysisk, så en liste er et sammenhengende utsnitt ved søk
+        for array in (self._codes, self._ids, self._assign):
+            array[:n] = array[:n][order]
+        self._offsets = np.searchsorted(self._assign[:n], np.arange(len(self.centroids) + 1))
+        self.sorted_size = n
+
+    # --- trening og lagring ------------------------------------------------
+    def _maintain(self) -> None:
+        if not self.background:
+            return
+        due = (self.centroids is None and self.size >= TRAIN_MIN) or (
+            self.centroids is not None and self.size >= self.trained_size * RETRAIN_GROWTH)
+        if due and not self.training:
+            self.training = True
+            from backend.app.services.workers import pool
+
+            pool.submit("similarity_train", lambda job: self.train(job))
+        elif self._unsaved >= SNAPSHOT_EVERY and not self.training:
+            self._unsaved = 0
+            from backend.app.services.workers import pool
+
+            pool.submit("similarity_snapshot", lambda job: self.save())
+
+    def train(self, job=None) -> Dict:
+        """Fit centroids on the current vectors and regroup everything (runs off the request path)."""
+        self.training = True
+        try:
+            # Radene [0, n) flyttes ikke mens training er satt (se add_many)
+            with self._lock:
+                n = self.size
+                codes = self._codes[:n].copy()
+            lists = int(min(MAX_LISTS, max(16, math.sqrt(n))))
+            if job is not None:
+                job.report(0.1, f"k-means with {lists} lists on {n} vectors")
+            centroids = kmeans(codes, lists)
+            assign = _nearest(codes, centroids)
+            with self._lock:
+                # Vektorer lagt til under treningen tilordnes de nye sentroidene her
+                self._assign[:n] = assign
+                if self.size > n:
+                    self._assign[n:self.size] = _nearest(self._codes[n:self.size], centroids)
+                self.centroids = centroids
+                self.trained_size = self.size
+                self._sort()
+            self.save()
+            return {"lists": lists, "vectors": n}
+        finally:
+            self.training = False
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        with self._lock:
+            self._grow(0)
+            n = self.size
+            arrays = {
+                "codes": self._codes[:n].copy(),
+                "ids": self._ids[:n].copy(),
+                "assign": self._assign[:n].copy(),
+                "centroids": self.centroids if self.centroids is not None else np.empty((0, DIM), np.float32),
+                "trained_size": np.array(self.trained_size),
+                "synced_id": np.array(self.synced_id),
+            }
+            self._unsaved = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(f".{os.getpid()}.tmp.npz")
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, self.path)
+
+    def _load_snapshot(self, max_db_id: int) -> None:
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            with np.load(self.path) as data:
+                ids = data["ids"]
+                # Øyeblikksbildet hører til en annen (nyere) database; bygg fra tabellen i stedet
+                if len(ids) and int(ids.max()) > max_db_id:
+                    return
+                self._grow(len(ids))
+                self.size = len(ids)
+                self._codes[:self.size] = data["codes"]
+                self._ids[:self.size] = ids
+                self._assign[:self.size] = data["assign"]
+                self.centroids = data["centroids"] if len(data["centroids"]) else None
+                self.trained_size = int(data["trained_size"])
+                self.max_id = int(ids.max()) if len(ids) else 0
+                self.synced_id = int(data["synced_id"]) if "synced_id" in data else 0
+                self._local_ids = {int(i) for i in ids[ids > self.synced_id]}
+        except (OSError, KeyError, ValueError) as e:
+            print(f"[similarity] Ignoring unreadable index snapshot {self.path}: {e}")
+            self.size, self.centroids, self.max_id, self.synced_id = 0, None, 0, 0
+            self._local_ids = set()
+        self._sort()
+
+    def refresh(self, db, force: bool = False) -> None:
+        """Load the snapshot on first use, then add rows above `synced_id` not yet held."""
+        from sqlalchemy import func, select
+
+        from backend.app.models.analysis import AnalysisRecord
+
+        now = time.monotonic()
+        if self.loaded and not force and now - self._last_refresh < REFRESH_S:
+            return
+        with self._lock:
+            if not self.loaded:
+                self._load_snapshot(db.execute(select(func.max(AnalysisRecord.id))).scalar() or 0)
+                self.loaded = True
+            self._last_refresh = now
+            rows = db.execute(
+                select(AnalysisRecord.id, AnalysisRecord.embedding)
+                .where(AnalysisRecord.id > self.synced_id, AnalysisRecord.embedding.is_not(None))
+                .order_by(AnalysisRecord.id)
+            )
+            while True:
+                batch = rows.fetchmany(50000)
+                if not batch:
+                    break
+                self.synced_id = max(self.synced_id, batch[-1][0])
+                batch = [r for r in batch if r[0] not in self._local_ids]
+                if batch:
+                    self.add_many([r[0] for r in batch],
+                                  np.frombuffer(b"".join(r[1] for r in batch), dtype=np.uint8))
+            self._local_ids = {i for i in self._local_ids if i > self.synced_id}
+
+    # --- søk --------------------------------------------------------------
+    def _slices(self, query: "np.ndarray", nprobe: int) -> List[Tuple[int, int]]:
+        if self.centroids is None:
+            return [(0, self.size)]
+        nprobe = min(nprobe, len(self.centroids))
+        probe = np.argpartition(((self.centroids - query) ** 2).sum(axis=1), nprobe - 1)[:nprobe]
+        slices = [(int(self._offsets[c]), int(self._offsets[c + 1])) for c in np.sort(probe)]
+        return slices + [(self.sorted_size, self.size)]
+
+    def search(self, code: "np.ndarray", k: int = 10, nprobe: int = NPROBE,
+               exclude: Sequence[int] = ()) -> Tuple[List[Tuple[int, float]], int]:
+        """[(analysis_id, distance)] nearest first, and the number of vectors scanned."""
+        query = np.asarray(code, dtype=np.float32).reshape(DIM)
+        with self._lock:
+            if not self.size:
+                return [], 0
+            slices = [(a, b) for a, b in self._slices(query, nprobe) if b > a]
+            if not slices:
+                return [], 0
+            distances = np.concatenate([_distances(self._codes[a:b], query) for a, b in slices])
+            ids = np.concatenate([self._ids[a:b] for a, b in slices])
+        scanned = len(ids)
+        if exclude:
+            keep = ~np.isin(ids, np.asarray(exclude, dtype=np.int64))
+            ids, distances = ids[keep], distances[keep]
+        top = min(k, len(ids))
+        if not top:
+            return [], scanned
+        best = np.argpartition(distances, top - 1)[:top]
+        best = best[np.argsort(distances[best], kind="stable")]
+        # Avstand på skala 0..1 per blokk (Hellinger), uavhengig av uint8-kvantiseringen
+        return [(int(ids[i]), round(math.sqrt(float(distances[i])) / 255.0, 4)) for i in best], scanned
+
+    def stats(self) -> Dict:
+        return {
+            "vectors": self.size,
+            "lists": len(self.centroids) if self.centroids is not None else 0,
+            "unsorted_tail": self.size - self.sorted_size if self.centroids is not None else self.size,
+            "trained_on": self.trained_size,
+            "training": self.training,
+            "nprobe": NPROBE,
+        }
+
+
+index = PanelIndex()
+
+
+def decode_code(data: Optional[bytes]) -> Optional["np.ndarray"]:
+    if not data:
+        return None
+    return np.frombuffer(data, dtype=np.uint8)
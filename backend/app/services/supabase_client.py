@@ -1,8 +1,11 @@
-import json
 import logging
-import requests
 import importlib
 
+from backend.app.lazy import lazy_import
+
+# requests importeres først når Supabase faktisk kalles
+requests = lazy_import("requests")
+
 _pkg = __package__ or "backend.app.services"
 try:
     _config = importlib.import_module(_pkg + ".config")
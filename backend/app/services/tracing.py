@@ -0,0 +1,224 @@
+"""
+Request-scoped tracing and a slow-request stack sampler.
+
+- `start_trace()` (kalt av RequestLoggingMiddleware) legger en Trace i en contextvar;
+  `metrics.stage()` og DB-hendelser registrerer spans i den aktive tracen. Contextvars
+  følger med inn i AnyIO-trådpoolen, så sync-endepunkter får også spans.
+- `StackSampler` er en stdlib-basert sampling-profiler: mens sporede forespørsler
+  pågår tar en bakgrunnstråd stack-prøver av trådene som jobber for hver av dem
+  (tråden som startet tracen, og trådpool-tråder der den har hatt stages eller
+  DB-kall), og bare av rammer som kjører backend-kode. Går en
+  forespørsel over terskelen, skrives prøvene (collapsed stacks, flamegraph-format)
+  til en roterende katalog; ellers kastes de.
+"""
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+_current: ContextVar[Optional["Trace"]] = ContextVar("coatvision_trace", default=None)
+
+SLOW_REQUEST_MS = float(os.getenv("COATVISION_SLOW_REQUEST_MS", "1000"))
+PROFILE_SAMPLE_RATE = float(os.getenv("COATVISION_PROFILE_SAMPLE_RATE", "1.0"))
+PROFILE_INTERVAL_MS = float(os.getenv("COATVISION_PROFILE_INTERVAL_MS", "10"))
+PROFILE_KEEP = int(os.getenv("COATVISION_PROFILE_KEEP", "50"))
+PROFILE_ENABLED = os.getenv("COATVISION_SLOW_PROFILE", "0") == "1"
+MAX_SPANS = 256
+MAX_SAMPLES = 5000
+
+_BACKEND_ROOT = str(Path(__file__).resolve().parents[2])
+
+
+def _profile_dir() -> Path:
+    from backend.app.warmup import RUNTIME_DIR
+
+    return Path(os.getenv("COATVISION_PROFILE_DIR", str(RUNTIME_DIR / "profiles")))
+
+
+class Trace:
+    __slots__ = ("request_id", "start", "spans", "samples", "threads", "_lock")
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.start = time.perf_counter()
+        self.spans: List[tuple] = []
+        self.samples: Optional[Counter] = None
+        # Tråd-id-er som sampleren tar prøver av; bare satt mens profilering er koblet på
+        self.threads: Optional[Set[int]] = None
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, start: float, duration: float) -> None:
+        with self._lock:
+            if len(self.spans) < MAX_SPANS:
+                self.spans.append((name, round((start - self.start) * 1000, 3), round(duration * 1000, 3)))
+
+    def span_summary(self) -> Dict[str, Dict[str, float]]:
+        """Total ms and count per span name."""
+        summary: Dict[str, Dict[str, float]] = {}
+        with self._lock:
+            for name, _offset, duration in self.spans:
+                entry = summary.setdefault(name, {"ms": 0.0, "count": 0})
+                entry["ms"] = round(entry["ms"] + duration, 3)
+                entry["count"] += 1
+        return summary
+
+
+def start_trace(request_id: str):
+    trace = Trace(request_id)
+    return trace, _current.set(trace)
+
+
+def end_trace(token) -> None:
+    _current.reset(token)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+def active() -> bool:
+    return _current.get() is not None
+
+
+def current_request_id() -> Optional[str]:
+    trace = _current.get()
+    return trace.request_id if trace else None
+
+
+def note_thread() -> None:
+    """Mark the calling thread as working for the active trace, if it is being profiled."""
+    trace = _current.get()
+    if trace is not None and trace.threads is not None:
+        trace.threads.add(threading.get_ident())
+
+
+def record_span(name: str, start: float, duration: float) -> None:
+    trace = _current.get()
+    if trace is not None:
+        trace.add_span(name, start, duration)
+
+
+def instrument_engine(engine) -> None:
+    """Record every SQL statement as a `db` span on the active trace."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        note_thread()
+        conn.info.setdefault("coatvision_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("coatvision_query_start")
+        if starts:
+            start = starts.pop()
+            record_span("db", start, time.perf_counter() - start)
+
+
+class StackSampler:
+    """Background thread sampling stacks while attached traces are in flight."""
+
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.interval = interval_ms / 1000.0
+        self._attached: Dict[int, Trace] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def attach(self, trace: Trace) -> None:
+        trace.samples = Counter()
+        trace.threads = {threading.get_ident()}
+        with self._lock:
+            self._attached[id(trace)] = trace
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="coatvision-stack-sampler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def detach(self, trace: Trace) -> None:
+        with self._lock:
+            self._attached.pop(id(trace), None)
+
+    @staticmethod
+    def _collapse(frame) -> Optional[str]:
+        stack = deque()
+        in_backend = False
+        while frame is not None:
+            code = frame.f_code
+            filename = code.co_filename
+            if filename.startswith(_BACKEND_ROOT) and "site-packages" not in filename and filename != __file__:
+                in_backend = True
+            stack.appendleft(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+            frame = frame.f_back
+        # Tråder som ikke kjører backend-kode (selector, idle pool) er støy
+        return ";".join(stack) if in_backend else None
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while True:
+            with self._lock:
+                idle = not self._attached
+            if idle:
+                self._wake.clear()
+                self._wake.wait(timeout=5.0)
+                continue
+            frames = sys._current_frames()
+            frames.pop(own_id, None)
+            stacks: Dict[int, Optional[str]] = {}
+            with self._lock:
+                # Under låsen: etter detach() endres ikke prøvene lenger
+                for trace in self._attached.values():
+                    if trace.samples is None or sum(trace.samples.values()) >= MAX_SAMPLES:
+                        continue
+                    # Bare trådene som jobber for denne forespørselen, ikke alle backend-tråder
+                    for thread_id in list(trace.threads or ()):
+                        if thread_id not in stacks and thread_id in frames:
+                            stacks[thread_id] = self._collapse(frames[thread_id])
+                        if stacks.get(thread_id):
+                            trace.samples[stacks[thread_id]] += 1
+            time.sleep(self.interval)
+
+
+_sampler = StackSampler()
+
+
+def maybe_attach_profiler(trace: Trace) -> bool:
+    if not PROFILE_ENABLED or random.random() >= PROFILE_SAMPLE_RATE:
+        return False
+    _sampler.attach(trace)
+    return True
+
+
+def finish_profile(trace: Trace, duration_ms: float, meta: Dict) -> Optional[Path]:
+    """Detach the trace; persist its samples if the request was slow."""
+    _sampler.detach(trace)
+    if trace.samples is None or duration_ms < SLOW_REQUEST_MS or not trace.samples:
+        return None
+    directory = _profile_dir()
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{int(time.time() * 1000)}_{trace.request_id}_{int(duration_ms)}ms.json"
+        payload = dict(meta)
+        payload["interval_ms"] = _sampler.interval * 1000
+        payload["spans"] = trace.span_summary()
+        payload["folded"] = [f"{stack} {count}" for stack, count in trace.samples.most_common()]
+        path.write_text(json.dumps(payload, indent=1))
+        _rotate(directory)
+        return path
+    except OSError:
+        return None
+
+
+def _rotate(directory: Path) -> None:
+    files = sorted(directory.glob("*.json"), key=lambda p: p.stat().st_mtime)
+    for old in files[:-PROFILE_KEEP] if PROFILE_KEEP > 0 else files:
+        try:
+            old.unlink()
+        except OSError:
+            pass
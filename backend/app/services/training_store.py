@@ -0,0 +1,141 @@
+"""
+Database-backed store for training sessions.
+
+Sessions and their images live in indexed tables (see models/training.py).
+Per-(phase, panel) counts are kept in `training_phase_counts` and bumped in the
+same transaction as the inserts, so statistics never require a table scan.
+Writes go through `backend.app.db.commit`, so callers can batch several of them
+in one `unit_of_work` transaction.
+"""
+import uuid
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.orm import Session
+
+from backend.app.db import commit, upsert
+from backend.app.models.training import TrainingImageRecord, TrainingPhaseCount, TrainingSessionRecord
+from backend.app.services.training import Phase
+
+# Øvre grense per bulk-kall og per side, så et enkelt kall ikke kan laste alt
+MAX_BULK_IMAGES = 5000
+MAX_PAGE_SIZE = 500
+
+
+def _bump_counts(db: Session, phase: Phase, panel: str, sessions: int = 0, images: int = 0) -> None:
+    # Upsert: to samtidige første økter for samme (fase, panel) gir ikke IntegrityError
+    stmt = upsert(db, TrainingPhaseCount).values(
+        phase=phase, panel=panel, session_count=sessions, image_count=images
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[TrainingPhaseCount.phase, TrainingPhaseCount.panel],
+        set_={
+            "session_count": TrainingPhaseCount.session_count + sessions,
+            "image_count": TrainingPhaseCount.image_count + images,
+        },
+    ))
+
+
+def create_session(
+    db: Session,
+    *,
+    car_brand: str,
+    panel: str,
+    color: str,
+    color_code: str,
+    phase: Phase,
+) -> TrainingSessionRecord:
+    record = TrainingSessionRecord(
+        id=uuid.uuid4().hex,
+        car_brand=car_brand,
+        panel=panel,
+        color=color,
+        color_code=color_code,
+        phase=phase,
+        image_count=0,
+    )
+    db.add(record)
+    _bump_counts(db, phase, panel, sessions=1)
+    commit(db)
+    db.refresh(record)
+    return record
+
+
+def get_session(db: Session, session_id: str) -> Optional[TrainingSessionRecord]:
+    return db.get(TrainingSessionRecord, session_id)
+
+
+def add_images(db: Session, record: TrainingSessionRecord, image_paths: Iterable[str]) -> int:
+    """Bulk-insert image paths for a session in one executemany + one counter update."""
+    rows = [{"session_id": record.id, "path": str(p)} for p in image_paths]
+    if not rows:
+        return 0
+    if len(rows) > MAX_BULK_IMAGES:
+        raise ValueError(f"At most {MAX_BULK_IMAGES} images per call")
+
+    db.execute(insert(TrainingImageRecord), rows)
+    db.execute(
+        update(TrainingSessionRecord)
+        .where(TrainingSessionRecord.id == record.id)
+        .values(image_count=TrainingSessionRecord.image_count + len(rows))
+    )
+    _bump_counts(db, record.phase, record.panel, images=len(rows))
+    commit(db)
+    db.refresh(record)
+    return len(rows)
+
+
+def list_sessions(
+    db: Session,
+    *,
+    limit: int = 50,
+    offset: int = 0,
+    phase: Optional[Phase] = None,
+    panel: Optional[str] = None,
+) -> Tuple[List[TrainingSessionRecord], int]:
+    """Return one page of sessions (newest first) and the filtered total.
+
+    The total is summed from the counter table rather than counted over sessions.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = select(TrainingSessionRecord)
+    count_query = select(func.coalesce(func.sum(TrainingPhaseCount.session_count), 0))
+    if phase is not None:
+        query = query.where(TrainingSessionRecord.phase == phase)
+        count_query = count_query.where(TrainingPhaseCount.phase == phase)
+    if panel is not None:
+        query = query.where(TrainingSessionRecord.panel == panel)
+        count_query = count_query.where(TrainingPhaseCount.panel == panel)
+
+    query = query.order_by(TrainingSessionRecord.created_at.desc(), TrainingSessionRecord.id.desc())
+    items = list(db.scalars(query.limit(limit).offset(max(0, offset))))
+    total = db.scalar(count_query) or 0
+    return items, total
+
+
+def list_images(
+    db: Session, session_id: str, *, limit: int = 100, after_id: int = 0
+) -> List[TrainingImageRecord]:
+    """Page through a session's images by id, using the (session_id, id) index."""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = (
+        select(TrainingImageRecord)
+        .where(TrainingImageRecord.session_id == session_id, TrainingImageRecord.id > after_id)
+        .order_by(TrainingImageRecord.id)
+        .limit(limit)
+    )
+    return list(db.scalars(query))
+
+
+def phase_counts(db: Session) -> List[Dict]:
+    rows = db.scalars(select(TrainingPhaseCount).order_by(TrainingPhaseCount.phase, TrainingPhaseCount.panel))
+    return [
+        {
+            "phase": row.phase.value,
+            "panel": row.panel,
+            "session_count": row.session_count,
+            "image_count": row.image_count,
+        }
+        for row in rows
+    ]
+
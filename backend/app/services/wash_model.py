@@ -0,0 +1,181 @@
+"""
+Per-product wash durability model.
+
+Each wash event is linked to the analysis taken after it. Its retention is that
+analysis's CQI divided by the panel's baseline CQI (its first stored analysis).
+Degradation is modelled as exponential decay with wash count,
+    retention(x) = exp(-k * x),
+with k fitted per product by least squares on d = -ln(retention) through the
+origin. The fit is shrunk towards a prior k0 with weight PRIOR_WEIGHT, so a
+product with a few events is not judged on noise:
+    k = (sum(x * d) + PRIOR_WEIGHT * k0) / (sum(x * x) + PRIOR_WEIGHT)
+Only the two running sums and the sample count are stored per product
+(wash_models), and they are incremented in SQL in the same transaction as the
+event (one upsert, so the first events for a new product can arrive together).
+Predictions read the fitted k from an in-process cache with at most
+COATVISION_WASH_FIT_CACHE products, each reloaded by one primary-key lookup
+after COATVISION_WASH_REFRESH_S seconds, so they never scan history and pick up
+events recorded by other workers. Products without events fall
+back to the original linear rule, 100 - 2 * washes.
+"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from backend.app.db import commit, upsert
+from backend.app.models.wash import WashEvent, WashModel
+from backend.app.services import analysis_store
+
+PRIOR_K = float(os.getenv("COATVISION_WASH_PRIOR_K", "0.02"))
+PRIOR_WEIGHT = float(os.getenv("COATVISION_WASH_PRIOR_WEIGHT", "100"))
+REFRESH_S = float(os.getenv("COATVISION_WASH_REFRESH_S", "30"))
+FIT_CACHE_SIZE = int(os.getenv("COATVISION_WASH_FIT_CACHE", "1024"))
+RECOAT_THRESHOLD = 50.0
+# Retensjon klemmes så én støyete måling ikke gir uendelig -ln
+MIN_RETENTION, MAX_RETENTION = 0.05, 1.5
+
+
+def product_key(product_id: Optional[int]) -> str:
+    return str(product_id) if product_id is not None else "unknown"
+
+
+@dataclass(frozen=True)
+class Fit:
+    product_key: str
+    samples: int
+    k: float
+
+    def predict(self, washes: int) -> float:
+        if self.samples == 0:
+            return float(max(0, 100 - washes * 2))
+        return round(100.0 * math.exp(-self.k * max(0, washes)), 2)
+
+    def washes_until(self, score: float = RECOAT_THRESHOLD) -> Optional[int]:
+        """Washes until the predicted score drops to `score`."""
+        if self.samples == 0:
+            return max(0, math.ceil((100 - score) / 2))
+        if self.k <= 0:
+            return None
+        return max(0, math.ceil(math.log(100.0 / score) / self.k))
+
+
+def _fit_from(row: Optional[WashModel], key: str) -> Fit:
+    if row is None or not row.samples:
+        return Fit(key, 0, PRIOR_K)
+    k = (row.sum_xd + PRIOR_WEIGHT * PRIOR_K) / (row.sum_xx + PRIOR_WEIGHT)
+    return Fit(key, row.samples, k)
+
+
+class FitCache:
+    """LRU of product_key -> Fit; entries are reloaded after `ttl` seconds (other workers' events)."""
+
+    def __init__(self, ttl: float = REFRESH_S, maxsize: int = FIT_CACHE_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._fits: "OrderedDict[str, Tuple[float, Fit]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, key: str) -> Fit:
+        with self._lock:
+            item = self._fits.get(key)
+            if item is not None and item[0] > time.monotonic():
+                self._fits.move_to_end(key)
+                return item[1]
+        fit = _fit_from(db.get(WashModel, key), key)
+        self.put(fit)
+        return fit
+
+    def put(self, fit: Fit) -> None:
+        with self._lock:
+            self._fits[fit.product_key] = (time.monotonic() + self.ttl, fit)
+            self._fits.move_to_end(fit.product_key)
+            while len(self._fits) > self.maxsize:
+                self._fits.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._fits.clear()
+
+
+fits = FitCache()
+
+
+def retention_for(db: Session, analysis) -> Optional[float]:
+    base = analysis_store.baseline(db, analysis.vehicle_id, analysis.panel)
+    if base is None or base.id == analysis.id or base.cqi <= 0:
+        return None
+    return min(MAX_RETENTION, max(MIN_RETENTION, analysis.cqi / base.cqi))
+
+
+def _accumulate(db: Session, key: str, x: float, d: float) -> WashModel:
+    # Upsert med inkrement i SQL, så samtidige hendelser for samme produkt
+    # (også de første) verken overskriver hverandre eller gir IntegrityError
+    stmt = upsert(db, WashModel).values(product_key=key, samples=1, sum_xx=x * x, sum_xd=x * d)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[WashModel.product_key],
+        set_={
+            "samples": WashModel.samples + 1,
+            "sum_xx": WashModel.sum_xx + x * x,
+            "sum_xd": WashModel.sum_xd + x * d,
+            "updated_at": func.now(),
+        },
+    ))
+    return db.execute(
+        select(WashModel).where(WashModel.product_key == key).execution_options(populate_existing=True)
+    ).scalar_one()
+
+
+def add_event(
+    db: Session,
+    vehicle_id: str,
+    panel: str,
+    wash_count: int,
+    product_id: Optional[int] = None,
+    analysis_id: Optional[int] = None,
+    image_id: Optional[str] = None,
+) -> WashEvent:
+    """Record a wash, link it to an analysis and fold it into the product's fit."""
+    if analysis_id is not None:
+        analysis = analysis_store.get_analysis(db, analysis_id)
+    elif image_id is not None:
+        analysis = analysis_store.by_image_id(db, image_id)
+    else:
+        analysis = analysis_store.latest(db, vehicle_id, panel)
+    if analysis is not None and (analysis.vehicle_id, analysis.panel) != (vehicle_id, panel):
+        raise ValueError("Analysis belongs to another vehicle panel")
+    if product_id is None and analysis is not None:
+        product_id = analysis.product_id
+
+    key = product_key(product_id)
+    retention = retention_for(db, analysis) if analysis is not None else None
+    event = WashEvent(vehicle_id=vehicle_id, panel=panel, product_key=key, wash_count=wash_count,
+                      analysis_id=analysis.id if analysis is not None else None, retention=retention)
+    db.add(event)
+    fit = None
+    if retention is not None and wash_count > 0:
+        fit = _fit_from(_accumulate(db, key, float(wash_count), -math.log(retention)), key)
+    commit(db)
+    if fit is not None:
+        fits.put(fit)
+    return event
+
+
+def predict(db: Session, product_id: Optional[int], washes: int) -> Dict:
+    fit = fits.get(db, product_key(product_id))
+    score = fit.predict(washes)
+    return {
+        "product_key": fit.product_key,
+        "durability_score": score,
+        "model": "fitted" if fit.samples else "default",
+        "samples": fit.samples,
+        "decay_per_wash": round(fit.k, 5),
+        "washes_until_recoat": fit.washes_until(),
+        "recommendation": "continue" if score > RECOAT_THRESHOLD else "recoat_recommended",
+    }
@@ -0,0 +1,236 @@
+"""
+Shared background worker pool with pollable job state.
+
+Long computations (calibration runs, bulk work) are submitted here instead of
+running on the request path. The route returns a job id at once and clients poll
+`get(job_id)`, which reports status, progress (0..1) and a message the task updates
+as it goes. A task is `fn(job, *args)` and calls `job.report(progress, message)`.
+
+One bounded ThreadPoolExecutor (COATVISION_WORKERS threads) is shared by all job
+kinds and created lazily. OpenCV and NumPy release the GIL in their kernels, so
+threads suffice here. A job runs in the worker process that accepted it, but its
+state is also written to one JSON file per job under RUNTIME_DIR/jobs (temp file,
+then os.replace) on every status change and progress report. `get()` and `jobs()`
+read those files, so a poll that reaches another gunicorn worker sees the same
+job. A job whose owning process has exited without finishing reads as failed.
+The newest COATVISION_JOBS_KEPT finished jobs are retained. Queue depth and
+running count (this process) are exported as the `coatvision_worker_jobs` gauge.
+"""
+import json
+import os
+import re
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from backend.app.services.metrics import counter, register_gauge
+from backend.app.warmup import RUNTIME_DIR
+
+WORKERS = int(os.getenv("COATVISION_WORKERS", str(min(4, os.cpu_count() or 1))))
+JOBS_KEPT = int(os.getenv("COATVISION_JOBS_KEPT", "200"))
+JOBS_DIR = Path(os.getenv("COATVISION_JOBS_DIR", str(RUNTIME_DIR / "jobs")))
+_JOB_ID = re.compile(r"[0-9a-f]{12}")
+
+JOBS_FINISHED = counter("coatvision_worker_jobs_finished_total", "Background jobs finished by kind and status.",
+                        ("kind", "status"))
+
+
+@dataclass
+class Job:
+    kind: str
+    id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    status: str = "queued"  # queued | running | done | failed
+    progress: float = 0.0
+    message: str = ""
+    result: Any = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    pid: int = field(default_factory=os.getpid)
+    # Kalles ved hver endring så andre workere ser fremdriften (JobFiles.save)
+    sink: Optional[Callable[["Job"], None]] = field(default=None, repr=False, compare=False)
+
+    def report(self, progress: float, message: Optional[str] = None) -> None:
+        self.progress = max(0.0, min(1.0, float(progress)))
+        if message is not None:
+            self.message = message
+        self.publish()
+
+    def publish(self) -> None:
+        if self.sink is not None:
+            self.sink(self)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": round(self.progress, 3),
+            "message": self.message,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Job":
+        job = cls(**{k: data[k] for k in (
+            "kind", "id", "status", "progress", "message", "result", "error",
+            "created_at", "started_at", "finished_at", "pid") if k in data})
+        if not job.finished and not _alive(job.pid):
+            # Prosessen som eide jobben er borte (omstart, krasj); jobben blir aldri ferdig
+            job.status, job.error = "failed", "Worker process exited"
+        return job
+
+
+def _alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobFiles:
+    """Job state as one JSON file per job, readable by every worker process on the host."""
+
+    def __init__(self, path: Path = JOBS_DIR):
+        self.path = Path(path)
+
+    def save(self, job: Job) -> None:
+        try:
+            self.path.mkdir(parents=True, exist_ok=True)
+            tmp = self.path / f".{job.id}.{threading.get_ident()}.tmp"
+            tmp.write_text(json.dumps({**job.as_dict(), "pid": job.pid}, default=str))
+            tmp.replace(self.path / f"{job.id}.json")
+        except OSError:
+            pass
+
+    def load(self, job_id: str) -> Optional[Job]:
+        if not _JOB_ID.fullmatch(job_id):
+            return None
+        return self._read(self.path / f"{job_id}.json")
+
+    def _read(self, path: Path) -> Optional[Job]:
+        try:
+            return Job.from_dict(json.loads(path.read_text()))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def all(self) -> List[Job]:
+        try:
+            paths = list(self.path.glob("*.json"))
+        except OSError:
+            return []
+        jobs = [job for job in map(self._read, paths) if job is not None]
+        return sorted(jobs, key=lambda job: job.created_at)
+
+    def prune(self, keep: int) -> None:
+        finished = [job for job in self.all() if job.finished]
+        for job in finished[: max(0, len(finished) - keep)]:
+            try:
+                (self.path / f"{job.id}.json").unlink()
+            except OSError:
+                pass
+
+
+class WorkerPool:
+    def __init__(self, workers: int = WORKERS, jobs_kept: int = JOBS_KEPT, store: Optional[JobFiles] = None):
+        self.workers = workers
+        self.jobs_kept = jobs_kept
+        self.store = store if store is not None else JobFiles()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="worker")
+        return self._executor
+
+    def submit(self, kind: str, fn: Callable[..., Any], *args, **kwargs) -> Job:
+        job = Job(kind=kind, sink=self.store.save)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._evict()
+        job.publish()
+        self._get_executor().submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job: Job, fn: Callable[..., Any], args, kwargs) -> None:
+        job.status, job.started_at = "running", time.time()
+        job.publish()
+        try:
+            job.result = fn(job, *args, **kwargs)
+            job.status, job.progress = "done", 1.0
+        except Exception as e:
+            job.status, job.error = "failed", str(e) or e.__class__.__name__
+            traceback.print_exc()
+        finally:
+            job.finished_at = time.time()
+            job.publish()
+            self.store.prune(self.jobs_kept)
+            JOBS_FINISHED.inc(job.kind, job.status)
+
+    def _evict(self) -> None:
+        # Ferdige jobber utover grensen kastes, eldste først; aktive beholdes alltid
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[: max(0, len(finished) - self.jobs_kept)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """The job from this process, else as last published by the worker that runs it."""
+        job = self._jobs.get(job_id)
+        return job if job is not None else self.store.load(job_id)
+
+    def jobs(self, kind: Optional[str] = None) -> List[Job]:
+        """Jobs of every worker on the host, oldest first."""
+        merged = {job.id: job for job in self.store.all()}
+        with self._lock:
+            merged.update(self._jobs)
+        jobs = sorted(merged.values(), key=lambda job: job.created_at)
+        return [job for job in jobs if kind is None or job.kind == kind]
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            states = [job.status for job in self._jobs.values()]
+        return {"queued": states.count("queued"), "running": states.count("running")}
+
+    def wait(self, job_id: str, timeout: float = 30.0) -> Optional[Job]:
+        """Poll until the job finishes or `timeout` passes (tests and CLI tools)."""
+        deadline = time.monotonic() + timeout
+        job = self.get(job_id)
+        while job is not None and not job.finished and time.monotonic() < deadline:
+            time.sleep(0.01)
+            job = self.get(job_id)
+        return job
+
+    def shutdown(self, wait: bool = False) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=not wait)
+
+
+pool = WorkerPool()
+register_gauge("coatvision_worker_jobs", "Background jobs in the shared worker pool by state.",
+               pool.counts, labelname="state")
@@ -0,0 +1,184 @@
+"""
+Preload/warmup for prefork servers (gunicorn med preload_app, se backend/gunicorn.conf.py).
+
+Tung, skrivebeskyttet tilstand (OpenCV, numpy, parametre, modeller) initialiseres
+én gang i master-prosessen og deles copy-on-write med workerne etter fork:
+
+- `preload()` kjører alle registrerte preloadere, en warmup-analyse slik at første
+  ekte forespørsel ikke betaler OpenCVs lazy-init, og `gc.freeze()` slik at GC i
+  workerne ikke skriver til delte sider.
+- `post_fork()` kaster arvede DB-tilkoblinger og registrerer workerens RSS.
+- `worker_rss_report()` leser RSS/PSS for alle levende workere (GET /api/diagnostics/workers);
+  PSS viser hvor mye som faktisk deles copy-on-write.
+"""
+import gc
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+RUNTIME_DIR = Path(os.getenv("COATVISION_RUNTIME_DIR", os.path.join(tempfile.gettempdir(), "coatvision-runtime")))
+WORKERS_DIR = RUNTIME_DIR / "workers"
+
+# navn -> funksjon som laster delt tilstand; kjøres i registreringsrekkefølge
+_PRELOADERS: Dict[str, Callable[[], object]] = {}
+_state_lock = threading.Lock()
+_preloaded = False
+PRELOAD_TIMINGS: Dict[str, float] = {}
+
+
+def register_preload(name: str, loader: Callable[[], object]) -> None:
+    """Register read-only state that should be built once in the master before fork."""
+    _PRELOADERS[name] = loader
+
+
+def _load_opencv() -> None:
+    from backend.app.core import coatvision_core
+
+    cv_threads = os.getenv("COATVISION_CV_THREADS")
+    if cv_threads:
+        # Med flere workere per maskin gir én OpenCV-tråd per worker minst overbooking
+        coatvision_core.cv2.setNumThreads(int(cv_threads))
+    coatvision_core.np.zeros(1)
+
+
+def warmup_analysis() -> Dict:
+    """Run the full decode/analyze/overlay path once on a synthetic frame."""
+    from backend.app.core import coatvision_core as core
+
+    np = core.np
+    cv2 = core.cv2
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 255, size=(480, 640, 3), dtype=np.uint8)
+    frame = cv2.GaussianBlur(frame, (9, 9), 0)
+    ok, buf = cv2.imencode(".jpg", frame)
+    if not ok:
+        raise RuntimeError("Warmup encode failed")
+    image = cv2.imdecode(buf, cv2.IMREAD_COLOR)
+    metrics = core.analyze_coating(image)
+    core.create_analysis_overlay(image, metrics)
+    return metrics
+
+
+def _dispose_engine(close: bool = True) -> None:
+    from backend.app.db import engine
+
+    engine.dispose(close=close)
+
+
+register_preload("opencv", _load_opencv)
+register_preload("warmup_analysis", warmup_analysis)
+
+
+def preload() -> Dict[str, float]:
+    """Build all registered shared state once per process tree. Safe to call twice."""
+    global _preloaded
+    with _state_lock:
+        if _preloaded:
+            return PRELOAD_TIMINGS
+        for name, loader in list(_PRELOADERS.items()):
+            start = time.perf_counter()
+            try:
+                loader()
+            except Exception as e:
+                # Warmup er en optimalisering; en feil her skal ikke stoppe serveren
+                print(f"[warmup] {name} failed: {e}")
+                continue
+            PRELOAD_TIMINGS[name] = round((time.perf_counter() - start) * 1000, 2)
+        # Ingen åpne DB-tilkoblinger skal arves av workerne
+        _dispose_engine()
+        gc.collect()
+        if hasattr(gc, "freeze"):
+            gc.freeze()
+        _preloaded = True
+        return PRELOAD_TIMINGS
+
+
+def is_preloaded() -> bool:
+    return _preloaded
+
+
+def rss_bytes() -> int:
+    """Resident set size of the current process."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+
+        # ru_maxrss er topp-RSS i KiB på Linux, bytes på macOS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def pss_bytes() -> int:
+    """Proportional set size (shared pages split between sharers); 0 where unsupported."""
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return 0
+
+
+def report_rss() -> Dict:
+    """Write this worker's pid/RSS/PSS to the shared runtime dir and return it."""
+    entry = {
+        "pid": os.getpid(),
+        "rss_bytes": rss_bytes(),
+        "pss_bytes": pss_bytes(),
+        "updated_at": time.time(),
+        "preloaded": _preloaded,
+    }
+    try:
+        WORKERS_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = WORKERS_DIR / f".{entry['pid']}.tmp"
+        tmp.write_text(json.dumps(entry))
+        tmp.replace(WORKERS_DIR / f"{entry['pid']}.json")
+    except OSError:
+        pass
+    return entry
+
+
+def forget_worker(pid: int) -> None:
+    try:
+        (WORKERS_DIR / f"{pid}.json").unlink()
+    except OSError:
+        pass
+
+
+def post_fork() -> None:
+    """Run in each worker right after fork."""
+    # close=False: ikke lukk master-prosessens sockets, bare glem poolen i denne prosessen
+    _dispose_engine(close=False)
+    report_rss()
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def worker_rss_report() -> List[Dict]:
+    """RSS per live worker, refreshing the calling worker's own entry first."""
+    report_rss()
+    workers = []
+    for path in WORKERS_DIR.glob("*.json"):
+        try:
+            entry = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        if _alive(entry.get("pid", -1)):
+            workers.append(entry)
+        else:
+            forget_worker(entry.get("pid", -1))
+    return sorted(workers, key=lambda e: e["pid"])
@@ -0,0 +1,56 @@
+"""
+Calibration cost per frame (services/calibration/profiles.py).
+
+Compares the naive float-math application of brightness/contrast/color gains with
+the compiled 8-bit table applied in place by cv2.LUT, per resolution (with
+per-channel gains, and with equal gains where a single-channel table suffices). Also times
+table compilation (a cache miss) and the cached profile lookup a request performs.
+"""
+from typing import Dict, List
+
+from backend.benchmarks.harness import timing_result
+
+SUITE = "calibration"
+RESOLUTIONS = [(640, 480), (1280, 720), (1920, 1080)]
+QUICK_RESOLUTIONS = [(640, 480)]
+
+
+def _float_apply(frame, profile):
+    import numpy as np
+
+    gains = np.array(profile.gains[::-1], dtype=np.float32)
+    base = (frame.astype(np.float32) - 128.0) * profile.contrast_factor + 128.0 + profile.brightness_offset
+    return np.clip(base * gains, 0, 255).astype(np.uint8)
+
+
+def run(quick: bool = False) -> List[Dict]:
+    import numpy as np
+
+    from backend.app.services.calibration import profiles
+
+    repeat = 5 if quick else 30
+    profile = profiles.Profile("device", "bench", 1, brightness_offset=6, contrast_factor=1.15,
+                               color_correction=(1.04, 1.0, 0.97), white_balance=(1.02, 1.0, 0.98))
+    brightness_only = profiles.Profile("device", "bench", 2, brightness_offset=6, contrast_factor=1.15)
+    results = [timing_result(SUITE, "compile_lut", lambda: profiles.compile_lut(profile), repeat * 10)]
+
+    rng = np.random.default_rng(0)
+    for width, height in QUICK_RESOLUTIONS if quick else RESOLUTIONS:
+        frame = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+        res = f"{width}x{height}"
+        results.append(timing_result(SUITE, f"float_math[{res}]", lambda: _float_apply(frame, profile), repeat))
+        results.append(timing_result(SUITE, f"lut_in_place[{res}]", lambda: profiles.apply(frame, profile), repeat))
+        results.append(timing_result(SUITE, f"lut_in_place_gray_gains[{res}]",
+                                     lambda: profiles.apply(frame, brightness_only), repeat))
+
+    resolver = profiles.ProfileResolver(ttl=3600)
+    resolver._items[("bench", None)] = (float("inf"), profile)
+    results.append(timing_result(SUITE, "cached_lookup", lambda: profiles.lut_cache.get(resolver.get("bench", None)),
+                                 repeat * 100))
+    return results
+
+
+if __name__ == "__main__":
+    import json
+
+    print(json.dumps(run(quick=True), indent=2))
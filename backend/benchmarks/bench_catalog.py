@@ -0,0 +1,85 @@
+"""
+Producers/products listing on a seeded catalog (100k products, 1k producers).
+
+Compares the old unbounded listing (every row, newest first) with keyset pages
+(first page, a deep page, producer filter, type filter, name search). Records
+query latency and JSON payload size per call.
+"""
+import os
+import tempfile
+from typing import Dict, List
+
+from backend.benchmarks.harness import result, timing_result
+
+SUITE = "catalog"
+PRODUCTS = 100_000
+QUICK_PRODUCTS = 10_000
+PRODUCT_TYPES = ["ceramic", "graphene", "sealant", "wax", "ppf"]
+
+
+def seed(db, products: int) -> None:
+    from backend.app.db import bulk_insert, unit_of_work
+    from backend.app.models.catalog import Producer, Product
+
+    producers = max(10, products // 100)
+    with unit_of_work(db):
+        bulk_insert(db, Producer, ({"name": f"Producer {i}", "country": ["NO", "SE", "DE", "US"][i % 4]}
+                                   for i in range(producers)))
+        bulk_insert(db, Product, ({"producer_id": 1 + i % producers, "name": f"Coat {i} {PRODUCT_TYPES[i % 5]}",
+                                   "product_type": PRODUCT_TYPES[i % 5], "cure_time": 30 + i % 90}
+                                  for i in range(products)))
+
+
+def _unbounded(db):
+    """Baseline: the previous behaviour, all rows ordered newest first."""
+    from sqlalchemy import select
+
+    from backend.app.models.catalog import Product
+
+    return list(db.scalars(select(Product).order_by(Product.created_at.desc())))
+
+
+def run(quick: bool = False) -> List[Dict]:
+    from sqlalchemy.orm import sessionmaker
+
+    from backend.app.db import Base, build_engine
+    from backend.app.responses import dumps
+    from backend.app.routers.producers import _product_out
+    from backend.app.services import catalog_store
+
+    products = QUICK_PRODUCTS if quick else PRODUCTS
+    repeat = 3 if quick else 20
+    results = []
+    with tempfile.TemporaryDirectory(prefix="coatvision-bench-catalog-") as tmp:
+        engine = build_engine(f"sqlite:///{os.path.join(tmp, 'catalog.db')}")
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine, autoflush=False)()
+        try:
+            seed(db, products)
+            cases = {
+                "unbounded (previous)": lambda: _unbounded(db),
+                "first page": lambda: catalog_store.list_products(db, limit=50),
+                "deep page": lambda: catalog_store.list_products(db, limit=50, before_id=products // 2),
+                "producer filter": lambda: catalog_store.list_products(db, limit=50, producer_id=7),
+                "type filter": lambda: catalog_store.list_products(db, limit=50, product_type="graphene"),
+                "name search": lambda: catalog_store.list_products(db, limit=50, q="coat 4242"),
+            }
+            for label, fn in cases.items():
+                case_repeat = min(repeat, 3) if label.startswith("unbounded") else repeat
+                params = {"rows": products, "case": label}
+                # expunge_all: mål spørring og mapping, ikke identity-map-treff fra forrige kall
+                call = lambda fn=fn: (fn(), db.expunge_all())  # noqa: E731
+                results.append(timing_result(SUITE, f"list_products[{label}]", call, case_repeat, **params))
+                payload = dumps({"products": [_product_out(r) for r in fn()]})
+                results.append(result(SUITE, f"payload_bytes[{label}]", len(payload), "bytes", params=params))
+                db.expunge_all()
+        finally:
+            db.close()
+            engine.dispose()
+    return results
+
+
+if __name__ == "__main__":
+    import json
+
+    print(json.dumps(run(quick=True), indent=2))
@@ -0,0 +1,119 @@
+"""
+Read throughput under many concurrent clients: sync `get_db` route (threadpool)
+against the async `get_async_db` route (event loop), same catalog query.
+
+Requests are driven straight into the ASGI app from one event loop with
+asyncio.gather, so the numbers show scheduling and threadpool cost rather than
+socket overhead. The default 200 clients is well above Starlette's 40 threadpool
+threads.
+"""
+import asyncio
+import time
+from typing import Dict, List
+
+from backend.benchmarks.harness import result, summarize
+
+SUITE = "concurrency"
+CLIENTS = 200
+QUICK_CLIENTS = 50
+SEED_PRODUCERS = 50
+
+
+def _bench_app():
+    from fastapi import Depends, FastAPI
+
+    from backend.app.db import get_db
+    from backend.app.db_async import get_async_db
+    from backend.app.services import catalog_store
+
+    app = FastAPI()
+
+    @app.get("/sync")
+    def sync_route(db=Depends(get_db)):
+        return {"n": len(catalog_store.list_producers(db, limit=SEED_PRODUCERS))}
+
+    @app.get("/async")
+    async def async_route(db=Depends(get_async_db)):
+        return {"n": len(await db.run_sync(lambda s: catalog_store.list_producers(s, limit=SEED_PRODUCERS)))}
+
+    return app
+
+
+def _seed() -> None:
+    from sqlalchemy import delete
+
+    from backend.app.db import bulk_insert, init_db, unit_of_work
+    from backend.app.models.catalog import Producer
+
+    init_db()
+    with unit_of_work() as db:
+        db.execute(delete(Producer))
+        bulk_insert(db, Producer, ({"name": f"Producer {i}", "country": "NO"} for i in range(SEED_PRODUCERS)))
+
+
+async def _asgi_get(app, path: str) -> int:
+    """One GET through the ASGI interface; returns the status code."""
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+             "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+             "root_path": "", "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 0),
+             "server": ("bench", 80)}
+    status = 500
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def _drive(app, path: str, clients: int, per_client: int) -> Dict:
+    latencies: List[float] = []
+    errors = 0
+
+    async def client():
+        nonlocal errors
+        for _ in range(per_client):
+            start = time.perf_counter()
+            errors += await _asgi_get(app, path) >= 400
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await _asgi_get(app, path)  # oppvarming (engine, tabeller)
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    wall = time.perf_counter() - wall_start
+    return {"latency": summarize(latencies), "throughput_rps": len(latencies) / wall, "errors": errors}
+
+
+async def _run(clients: int, per_client: int) -> List[Dict]:
+    from backend.app.db_async import dispose_async_engine
+
+    app = _bench_app()
+    results = []
+    try:
+        for path in ("/sync", "/async"):
+            measured = await _drive(app, path, clients, per_client)
+            params = {"clients": clients, "requests": clients * per_client, "rows": SEED_PRODUCERS}
+            label = f"list_producers[{path.strip('/')},c={clients}]"
+            results.append(result(SUITE, f"{label}:p50", measured["latency"]["median"],
+                                  stats=measured["latency"], params=params, errors=measured["errors"]))
+            results.append(result(SUITE, f"{label}:throughput", measured["throughput_rps"], "req/s",
+                                  params=params, lower_is_better=False))
+    finally:
+        await dispose_async_engine()
+    return results
+
+
+def run(quick: bool = False) -> List[Dict]:
+    _seed()
+    return asyncio.run(_run(QUICK_CLIENTS if quick else CLIENTS, 2 if quick else 10))
+
+
+if __name__ == "__main__":
+    import json
+
+    print(json.dumps(run(quick=True), indent=2))
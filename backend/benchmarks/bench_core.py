@@ -0,0 +1,92 @@
+"""
+Mikro-benchmarks for analysepipelinen i backend/app/core/coatvision_core.py.
+
+Kjører analyze_coating, decode_base64_image, encode_image_base64 og
+create_analysis_overlay over syntetiske bilder (fast seed) og bilder fra
+training_data/ skalert til flere oppløsninger.
+"""
+import base64
+from typing import Dict, Iterator, List, Tuple
+
+from backend.benchmarks.harness import REPO_DIR, timing_result
+
+SUITE = "micro"
+RESOLUTIONS = [(640, 480), (1280, 720), (1920, 1080), (4032, 3024)]
+QUICK_RESOLUTIONS = [(640, 480)]
+TRAINING_DIR = REPO_DIR / "training_data"
+
+
+def synthetic_image(width: int, height: int, seed: int = 0):
+    """Panel-like test frame: smooth lighting gradient, fine noise and a few hard edges."""
+    import cv2
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 1, width, dtype=np.float32)
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, None]
+    base = 60 + 120 * (0.6 * x + 0.4 * y)
+    image = np.repeat(base[..., None], 3, axis=2) * np.array([0.9, 1.0, 1.1], dtype=np.float32)
+    image += rng.normal(0, 6, size=image.shape).astype(np.float32)
+    image = np.clip(image, 0, 255).astype(np.uint8)
+    for i in range(5):
+        y0 = int(height * (i + 1) / 6)
+        cv2.line(image, (0, y0), (width - 1, y0 + height // 10), (30, 30, 30), 2)
+    return image
+
+
+def training_images(limit: int = 3) -> List[Tuple[str, object]]:
+    import cv2
+
+    images = []
+    for path in sorted(TRAINING_DIR.glob("*.jp*g"))[:limit]:
+        image = cv2.imread(str(path))
+        if image is not None:
+            images.append((path.stem, image))
+    return images
+
+
+def _inputs(quick: bool) -> Iterator[Tuple[str, object]]:
+    import cv2
+
+    resolutions = QUICK_RESOLUTIONS if quick else RESOLUTIONS
+    for width, height in resolutions:
+        yield f"synthetic-{width}x{height}", synthetic_image(width, height)
+    for stem, image in training_images(1 if quick else 3):
+        for width, height in resolutions:
+            yield f"{stem}-{width}x{height}", cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+
+
+def _repeat_for(image, quick: bool) -> int:
+    megapixels = image.shape[0] * image.shape[1] / 1e6
+    if quick:
+        return 3
+    return max(5, min(50, int(40 / max(megapixels, 0.1))))
+
+
+def run(quick: bool = False) -> List[Dict]:
+    import cv2
+    from backend.app.core import coatvision_core as core
+
+    results = []
+    for label, image in _inputs(quick):
+        repeat = _repeat_for(image, quick)
+        params = {"input": label, "shape": list(image.shape)}
+        _, jpeg = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+        b64 = base64.b64encode(jpeg.tobytes()).decode("ascii")
+        metrics = core.analyze_coating(image)
+
+        results.append(timing_result(SUITE, f"analyze_coating[{label}]", lambda: core.analyze_coating(image),
+                                     repeat, **params))
+        results.append(timing_result(SUITE, f"decode_base64_image[{label}]", lambda: core.decode_base64_image(b64),
+                                     repeat, payload_bytes=len(b64), **params))
+        results.append(timing_result(SUITE, f"encode_image_base64[{label}]", lambda: core.encode_image_base64(image),
+                                     repeat, **params))
+        results.append(timing_result(SUITE, f"create_analysis_overlay[{label}]",
+                                     lambda: core.create_analysis_overlay(image, metrics), repeat, **params))
+    return results
+
+
+if __name__ == "__main__":
+    import json
+
+    print(json.dumps(run(quick=True), indent=2))
@@ -0,0 +1,85 @@
+"""
+Write throughput for the SQLite profile in backend/app/db.py.
+
+Inserts training sessions into fresh temp databases and reports rows/s for:
+- default engine (rollback journal, synchronous=FULL), one commit per row
+- tuned engine (WAL, synchronous=NORMAL, mmap), one commit per row
+- tuned engine, all rows in one `unit_of_work`
+- tuned engine, `bulk_insert` of image rows in one `unit_of_work`
+"""
+import os
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+from backend.benchmarks.harness import result
+
+SUITE = "db"
+
+
+def _fresh_session(tmp: str, name: str, tuned: bool):
+    from sqlalchemy.orm import sessionmaker
+
+    from backend.app.db import Base, build_engine
+    import backend.app.models.training  # noqa: F401  (registrerer tabellene)
+
+    engine = build_engine(f"sqlite:///{os.path.join(tmp, name + '.db')}", tuned=tuned)
+    Base.metadata.create_all(bind=engine)
+    return engine, sessionmaker(bind=engine, autoflush=False)()
+
+
+def _create_sessions(db, n: int) -> None:
+    from backend.app.services import training_store
+    from backend.app.services.training import Phase
+
+    for i in range(n):
+        training_store.create_session(db, car_brand="Bench", panel=f"panel-{i % 8}", color="black",
+                                      color_code="040", phase=Phase.BASE_INFO)
+
+
+def _measure(tmp: str, label: str, tuned: bool, n: int, body: Callable) -> float:
+    engine, db = _fresh_session(tmp, label, tuned)
+    try:
+        start = time.perf_counter()
+        body(db, n)
+        return n / (time.perf_counter() - start)
+    finally:
+        db.close()
+        engine.dispose()
+
+
+def run(quick: bool = False) -> List[Dict]:
+    from backend.app.db import bulk_insert, unit_of_work
+    from backend.app.models.training import TrainingImageRecord
+
+    def per_row(db, n):
+        _create_sessions(db, n)
+
+    def batched(db, n):
+        with unit_of_work(db):
+            _create_sessions(db, n)
+
+    def bulk_images(db, n):
+        with unit_of_work(db):
+            bulk_insert(db, TrainingImageRecord, ({"session_id": "bench", "path": f"img_{i}.jpg"} for i in range(n)))
+
+    n = 200 if quick else 2000
+    cases = [
+        ("commit-per-row[default]", False, per_row, n),
+        ("commit-per-row[tuned]", True, per_row, n),
+        ("unit_of_work[tuned]", True, batched, n),
+        ("bulk_insert[tuned]", True, bulk_images, n * 10),
+    ]
+    results = []
+    with tempfile.TemporaryDirectory(prefix="coatvision-bench-db-") as tmp:
+        for i, (name, tuned, body, rows) in enumerate(cases):
+            rate = _measure(tmp, f"case{i}", tuned, rows, body)
+            results.append(result(SUITE, f"write_throughput:{name}", rate, "rows/s", lower_is_better=False,
+                                  params={"rows": rows, "tuned": tuned}))
+    return results
+
+
+if __name__ == "__main__":
+    import json
+
+    print(json.dumps(run(quick=True), indent=2))
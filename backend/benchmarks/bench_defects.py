@@ -0,0 +1,60 @@
+"""
+Defect localization (services/defects.py): cost per megapixel and findings.
+
+detect() is timed on the gray/edge/Laplacian maps analyze_coating produces,
+for synthetic panels at several resolutions and for the distinct photos in
+training_data/. ms per megapixel should stay roughly flat as resolution grows:
+only the reduction to the work grid touches every pixel. The number of regions
+per type found in each training photo is reported alongside.
+"""
+import hashlib
+from typing import Dict, List
+
+from backend.benchmarks.bench_core import synthetic_image, training_images
+from backend.benchmarks.harness import result, timing_result
+
+SUITE = "defects"
+RESOLUTIONS = [(1280, 960), (2560, 1920), (4032, 3024)]
+QUICK_RESOLUTIONS = [(1280, 960)]
+
+
+def _maps(image):
+    import cv2
+
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return gray, cv2.Canny(gray, 50, 150), cv2.Laplacian(gray, cv2.CV_64F)
+
+
+def run(quick: bool = False) -> List[Dict]:
+    from backend.app.services import defects
+
+    repeat = 3 if quick else 10
+    results = []
+    frames = [(f"synthetic-{w}x{h}", synthetic_image(w, h)) for w, h in (QUICK_RESOLUTIONS if quick else RESOLUTIONS)]
+    seen = set()
+    for stem, image in training_images(1 if quick else 7):
+        # training_data/ har identiske kopier; de skal ikke telle flere ganger
+        digest = hashlib.sha1(image.tobytes()).digest()
+        if digest not in seen:
+            seen.add(digest)
+            frames.append((f"training-{stem}", image))
+
+    for name, image in frames:
+        gray, edges, laplacian = _maps(image)
+        megapixels = gray.size / 1e6
+        timing = timing_result(SUITE, f"detect[{name}]", lambda: defects.detect(gray, edges, laplacian), repeat,
+                               megapixels=round(megapixels, 2))
+        results.append(timing)
+        results.append(result(SUITE, f"detect_per_mp[{name}]", round(timing["value"] / megapixels, 3), "ms/MP",
+                              params={"megapixels": round(megapixels, 2)}))
+        if name.startswith("training-"):
+            found = defects.detect(gray, edges, laplacian)
+            for kind, count in defects.summary(found).items():
+                results.append(result(SUITE, f"found[{kind},{name}]", count, "regions", lower_is_better=False))
+    return results
+
+
+if __name__ == "__main__":
+    import json
+
+    print(json.dumps(run(quick=True), indent=2))
@@ -0,0 +1,99 @@
+"""
+Benchmarks for the live frame protocol (services/framing.py).
+
+For each encoding (JSON+base64, raw image/jpeg, msgpack and CBOR envelopes) it
+records the request size on the wire and the server-side cost of turning the body
+into a decoded frame, then the end-to-end latency of /v1/coatvision/analyze-live
+through TestClient with each request encoding and each response encoding.
+"""
+import base64
+import json
+from typing import Callable, Dict, List
+
+from backend.benchmarks.harness import result, timing_result
+
+SUITE = "framing"
+RESOLUTIONS = [(640, 480), (1280, 720), (1920, 1080)]
+QUICK_RESOLUTIONS = [(640, 480)]
+
+
+def encodings(jpeg: bytes) -> Dict[str, Dict]:
+    """name -> {"content_type", "body"} for every supported request encoding."""
+    encoded = {
+        "json+base64": {
+            "content_type": "application/json",
+            "body": json.dumps({"frame": {"frameBase64": base64.b64encode(jpeg).decode("ascii")}}).encode(),
+        },
+        "raw-jpeg": {"content_type": "image/jpeg", "body": jpeg},
+    }
+    try:
+        import msgpack
+
+        encoded["msgpack"] = {"content_type": "application/msgpack",
+                              "body": msgpack.packb({"frame": jpeg, "meta": {"device": "bench"}})}
+    except ImportError:
+        pass
+    try:
+        import cbor2
+
+        encoded["cbor"] = {"content_type": "application/cbor",
+                           "body": cbor2.dumps({"frame": jpeg, "meta": {"device": "bench"}})}
+    except ImportError:
+        pass
+    return encoded
+
+
+def _server_decode(content_type: str, body: bytes) -> Callable:
+    """What the endpoint does with the body before analysis (parse + imdecode)."""
+    from backend.app.core import coatvision_core as core
+
+    if content_type == "application/json":
+        return lambda: core.decode_base64_image(json.loads(body)["frame"]["frameBase64"])
+    if content_type == "application/msgpack":
+        import msgpack
+
+        return lambda: core.decode_image_bytes(msgpack.unpackb(body)["frame"])
+    if content_type == "application/cbor":
+        import cbor2
+
+        return lambda: core.decode_image_bytes(cbor2.loads(body)["frame"])
+    return lambda: core.decode_image_bytes(body)
+
+
+def run(quick: bool = False) -> List[Dict]:
+    import cv2
+    from fastapi.testclient import TestClient
+    from backend.app.main import app
+    from backend.benchmarks.bench_core import synthetic_image
+
+    repeat = 5 if quick else 30
+    results = []
+    with TestClient(app) as client:
+        for width, height in (QUICK_RESOLUTIONS if quick else RESOLUTIONS):
+            _, buf = cv2.imencode(".jpg", synthetic_image(width, height), [cv2.IMWRITE_JPEG_QUALITY, 90])
+            frame = f"{width}x{height}"
+            for name, enc in encodings(buf.tobytes()).items():
+                params = {"encoding": name, "frame": frame}
+                results.append(result(SUITE, f"request_bytes[{name},{frame}]", len(enc["body"]), "bytes",
+                                      params=params))
+                results.append(timing_result(SUITE, f"server_decode[{name},{frame}]",
+                                             _server_decode(enc["content_type"], enc["body"]), repeat, **params))
+                headers = {"content-type": enc["content_type"]}
+                results.append(timing_result(
+                    SUITE, f"analyze-live[{name},{frame}]",
+                    lambda: client.post("/v1/coatvision/analyze-live", content=enc["body"], headers=headers),
+                    repeat, **params))
+
+            raw = {"content-type": "image/jpeg"}
+            for accept in ("application/json", "application/msgpack", "application/cbor"):
+                response = client.post("/v1/coatvision/analyze-live", content=buf.tobytes(),
+                                       headers={**raw, "accept": accept})
+                if response.headers.get("content-type", "").split(";")[0] != accept:
+                    continue  # codec not installed
+                results.append(result(SUITE, f"response_bytes[{accept},{frame}]", len(response.content), "bytes",
+                                      params={"accept": accept, "frame": frame}))
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(quick=True), indent=2))
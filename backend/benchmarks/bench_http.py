@@ -0,0 +1,104 @@
+"""
+Makro-benchmarks for HTTP-endepunktene under samtidighet.
+
+/api/analyze (multipart), /api/analyze/base64 og /v1/coatvision/analyze-live kjøres
+med N samtidige klienter. Standard er in-process via TestClient (samme event loop og
+trådpool som produksjon); med --base-url måles en kjørende server over nettverket.
+"""
+import base64
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from backend.benchmarks.harness import result, summarize
+
+SUITE = "http"
+CONCURRENCY = [1, 4, 16]
+QUICK_CONCURRENCY = [1, 4]
+
+
+def _jpeg_bytes(width: int, height: int) -> bytes:
+    import cv2
+    from backend.benchmarks.bench_core import synthetic_image
+
+    ok, buf = cv2.imencode(".jpg", synthetic_image(width, height), [cv2.IMWRITE_JPEG_QUALITY, 90])
+    if not ok:
+        raise RuntimeError("JPEG encode failed")
+    return buf.tobytes()
+
+
+def endpoint_calls(jpeg: bytes) -> Dict[str, Callable]:
+    """name -> fn(client) issuing one request; client is TestClient or requests.Session-like."""
+    b64 = base64.b64encode(jpeg).decode("ascii")
+    return {
+        "POST /api/analyze/": lambda c: c.post("/api/analyze/", files={"file": ("bench.jpg", jpeg, "image/jpeg")}),
+        "POST /api/analyze/base64": lambda c: c.post("/api/analyze/base64", json={"image": b64}),
+        "POST /v1/coatvision/analyze-live": lambda c: c.post(
+            "/v1/coatvision/analyze-live", json={"frame": {"frameBase64": b64}}
+        ),
+    }
+
+
+class _BaseUrlClient:
+    """Minimal adapter so the same call lambdas work against a live server."""
+
+    def __init__(self, base_url: str):
+        import requests
+
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+
+    def post(self, path: str, **kwargs):
+        return self.session.post(self.base_url + path, timeout=60, **kwargs)
+
+
+def _drive(call: Callable, client, concurrency: int, total: int) -> Dict:
+    latencies: List[float] = []
+    errors = 0
+
+    def one(_):
+        start = time.perf_counter()
+        response = call(client)
+        return (time.perf_counter() - start) * 1000, response.status_code
+
+    call(client)  # oppvarming
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for latency, status in pool.map(one, range(total)):
+            latencies.append(latency)
+            errors += status >= 400
+    wall = time.perf_counter() - wall_start
+    return {"latency": summarize(latencies), "throughput_rps": total / wall, "errors": errors}
+
+
+def run(quick: bool = False, base_url: Optional[str] = None) -> List[Dict]:
+    width, height = (640, 480) if quick else (1280, 720)
+    jpeg = _jpeg_bytes(width, height)
+    levels = QUICK_CONCURRENCY if quick else CONCURRENCY
+
+    if base_url:
+        client = _BaseUrlClient(base_url)
+        context = None
+    else:
+        from fastapi.testclient import TestClient
+        from backend.app.main import app
+
+        context = TestClient(app)
+        client = context.__enter__()
+
+    results = []
+    try:
+        for name, call in endpoint_calls(jpeg).items():
+            for concurrency in levels:
+                total = max(8, concurrency * (2 if quick else 8))
+                measured = _drive(call, client, concurrency, total)
+                params = {"concurrency": concurrency, "requests": total, "frame": f"{width}x{height}",
+                          "target": base_url or "in-process"}
+                results.append(result(SUITE, f"{name}[c={concurrency}]:p50", measured["latency"]["median"],
+                                      stats=measured["latency"], params=params, errors=measured["errors"]))
+                results.append(result(SUITE, f"{name}[c={concurrency}]:throughput", measured["throughput_rps"],
+                                      "req/s", params=params, lower_is_better=False))
+    finally:
+        if context is not None:
+            context.__exit__(None, None, None)
+    return results
@@ -0,0 +1,85 @@
+"""
+JSON-serialisering av responser: FastAPIs standardvei (jsonable_encoder + stdlib
+json via JSONResponse) mot FastJSONResponse (orjson, NumPy-bevisst).
+
+Nyttelaster: ett analyseresultat, en jobbliste og et flisbasert resultat med
+per-flis-matriser. Måler kodetid (ms) og største allokering under koding
+(tracemalloc peak, bytes).
+"""
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List
+
+from backend.benchmarks.harness import result, timing_result
+
+SUITE = "json"
+
+
+def payloads(quick: bool) -> Dict[str, object]:
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    metrics = {"cvi": 81.2, "cqi": 77.9, "coverage": 64.1, "color_uniformity": 88.0, "smoothness": 92.3,
+               "edge_density": 4.1, "saturation_score": 40.2, "brightness_score": 55.5,
+               "laplacian_variance": 312.7, "note": "OpenCV-based heuristic analysis - no ML model"}
+    jobs = [{"id": f"job_{i}", "name": f"batch {i}", "status": "done", "created_at": datetime(2026, 1, 1).isoformat(),
+             "updated_at": None} for i in range(200 if quick else 2000)]
+    grid = 16 if quick else 64
+    tiles = {
+        "status": "success",
+        "metrics": metrics,
+        "grid": [grid, grid],
+        "heatmap": rng.random((grid, grid), dtype=np.float32),
+        "tiles": [{"row": r, "col": c, "cvi": float(v), "hist": rng.random(16, dtype=np.float32)}
+                  for r in range(grid) for c in range(0, grid, 4) for v in (rng.random(),)],
+    }
+    return {"analysis": {"status": "success", "metrics": metrics}, "jobs": {"jobs": jobs}, "tiled": tiles}
+
+
+def _stdlib_path(payload) -> Callable:
+    """What a route returning a dict costs today (NumPy converted up front, as a route would have to)."""
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+
+    def to_builtin(obj):
+        if isinstance(obj, dict):
+            return {k: to_builtin(v) for k, v in obj.items()}
+        if isinstance(obj, list):
+            return [to_builtin(v) for v in obj]
+        return obj.tolist() if hasattr(obj, "tolist") else obj
+
+    return lambda: JSONResponse(jsonable_encoder(to_builtin(payload))).body
+
+
+def _fast_path(payload) -> Callable:
+    from backend.app.responses import FastJSONResponse
+
+    return lambda: FastJSONResponse(payload).body
+
+
+def _peak_bytes(fn: Callable) -> int:
+    fn()
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(quick: bool = False) -> List[Dict]:
+    repeat = 5 if quick else 50
+    results = []
+    for label, payload in payloads(quick).items():
+        for encoder, make in (("stdlib", _stdlib_path), ("orjson", _fast_path)):
+            fn = make(payload)
+            params = {"payload": label, "encoder": encoder, "body_bytes": len(fn())}
+            results.append(timing_result(SUITE, f"encode[{label},{encoder}]", fn, repeat, **params))
+            results.append(result(SUITE, f"peak_alloc[{label},{encoder}]", _peak_bytes(fn), "bytes", params=params))
+    return results
+
+
+if __name__ == "__main__":
+    import json
+
+    print(json.dumps(run(quick=True), indent=2))
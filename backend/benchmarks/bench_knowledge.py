@@ -0,0 +1,69 @@
+"""
+LYXbot retrieval index (services/knowledge.py): build time and query latency.
+
+Builds the FTS5 index over the FAQ/docs files plus a seeded catalog, then times
+search + direct-answer detection for a mix of FAQ, product and off-topic questions.
+"""
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from backend.benchmarks.harness import result, timing_result
+
+SUITE = "knowledge"
+QUERIES = [
+    "What is LYXbot?",
+    "How much does OpenAI cost?",
+    "herdetid for graphene coating",
+    "Coat 4242 ceramic",
+    "beste coating for svart bil om vinteren",
+]
+
+
+def run(quick: bool = False) -> List[Dict]:
+    from sqlalchemy.orm import sessionmaker
+
+    from backend.app.db import Base, build_engine
+    import backend.app.models.catalog  # noqa: F401  (registrerer tabellene)
+    from backend.app.services import knowledge
+    from backend.benchmarks.bench_catalog import seed
+
+    products = 1_000 if quick else 10_000
+    repeat = 5 if quick else 50
+    results = []
+    with tempfile.TemporaryDirectory(prefix="coatvision-bench-knowledge-") as tmp:
+        engine = build_engine(f"sqlite:///{os.path.join(tmp, 'catalog.db')}")
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine, autoflush=False)()
+        index_path = Path(tmp) / "knowledge.db"
+        try:
+            seed(db, products)
+            start = time.perf_counter()
+            chunks = knowledge.build_index(db, index_path)
+            build_ms = (time.perf_counter() - start) * 1000
+            params = {"products": products, "chunks": chunks, "docs": knowledge.DOCS}
+            results.append(result(SUITE, "build_index", build_ms, params=params))
+            results.append(result(SUITE, "index_bytes", index_path.stat().st_size, "bytes", params=params))
+        finally:
+            db.close()
+            engine.dispose()
+
+        direct = 0
+        for query in QUERIES:
+            hits = knowledge.search(query, path=index_path)
+            direct += knowledge.direct_answer(query, hits) is not None
+            results.append(timing_result(
+                SUITE, f"search[{query}]",
+                lambda q=query: knowledge.direct_answer(q, knowledge.search(q, path=index_path)),
+                repeat, hits=len(hits), top=hits[0].source if hits else None))
+        results.append(result(SUITE, "direct_answers", direct, "queries", lower_is_better=False,
+                              params={"queries": len(QUERIES)}))
+    return results
+
+
+if __name__ == "__main__":
+    import json
+
+    print(json.dumps(run(quick=True), indent=2))
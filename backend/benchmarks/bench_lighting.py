@@ -0,0 +1,79 @@
+"""
+Lighting normalization (services/lighting.py): cost and metric stability.
+
+Cost: normalize() per mode next to analyze_coating() without it, per resolution.
+Stability: each base frame (synthetic panel and training_data/ photos) is re-lit
+with global exposure changes and a left-to-right light falloff; the spread
+(max - min) of CQI, CVI and brightness_score across those variants is reported per
+mode. Lower spread means the metric depends less on the light.
+"""
+import hashlib
+from typing import Dict, List
+
+from backend.benchmarks.bench_core import synthetic_image, training_images
+from backend.benchmarks.harness import result, timing_result
+
+SUITE = "lighting"
+MODES = ("off", "flatten", "clahe")
+RESOLUTIONS = [(640, 480), (1280, 960), (1920, 1440)]
+QUICK_RESOLUTIONS = [(640, 480)]
+EXPOSURES = (0.6, 0.8, 1.0, 1.25, 1.5)
+STABILITY_SIZE = (960, 720)
+METRICS = ("cqi", "cvi", "brightness_score")
+
+
+def relight(image, exposure: float = 1.0, falloff: float = 0.0):
+    """Scale brightness by `exposure` with a linear falloff of `falloff` towards the right edge."""
+    import numpy as np
+
+    width = image.shape[1]
+    ramp = exposure * (1.0 - falloff * np.linspace(0, 1, width, dtype=np.float32))
+    return np.clip(image.astype(np.float32) * ramp[None, :, None], 0, 255).astype(np.uint8)
+
+
+def variants(image) -> List:
+    return [relight(image, e) for e in EXPOSURES] + [relight(image, 1.0, f) for f in (0.3, 0.5)]
+
+
+def run(quick: bool = False) -> List[Dict]:
+    import cv2
+
+    from backend.app.core.coatvision_core import analyze_coating
+    from backend.app.services import lighting
+
+    repeat = 3 if quick else 10
+    results = []
+    for width, height in QUICK_RESOLUTIONS if quick else RESOLUTIONS:
+        frame = synthetic_image(width, height)
+        res = f"{width}x{height}"
+        results.append(timing_result(SUITE, f"analyze_coating[{res}]",
+                                     lambda: analyze_coating(frame.copy(), lighting="off"), repeat))
+        for mode in MODES[1:]:
+            results.append(timing_result(SUITE, f"normalize[{mode},{res}]",
+                                         lambda m=mode: lighting.normalize(frame.copy(), m), repeat))
+
+    bases, seen = [("synthetic", synthetic_image(*STABILITY_SIZE))], set()
+    for stem, image in training_images(1 if quick else 3):
+        # training_data/ har identiske kopier; de skal ikke telle flere ganger
+        digest = hashlib.sha1(image.tobytes()).digest()
+        if digest not in seen:
+            seen.add(digest)
+            bases.append((stem, cv2.resize(image, STABILITY_SIZE, interpolation=cv2.INTER_AREA)))
+    for mode in MODES:
+        spreads = {name: [] for name in METRICS}
+        for _, base in bases:
+            runs = [analyze_coating(v, lighting=mode) for v in variants(base)]
+            for name in METRICS:
+                values = [r[name] for r in runs]
+                spreads[name].append(max(values) - min(values))
+        for name in METRICS:
+            mean_spread = sum(spreads[name]) / len(spreads[name])
+            results.append(result(SUITE, f"spread[{name},{mode}]", round(mean_spread, 3), "points",
+                                  params={"frames": len(bases), "variants": len(EXPOSURES) + 2}))
+    return results
+
+
+if __name__ == "__main__":
+    import json
+
+    print(json.dumps(run(quick=True), indent=2))
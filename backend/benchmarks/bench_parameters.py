@@ -0,0 +1,95 @@
+"""
+Versioned analysis parameters (services/parameters.py).
+
+- current(): the per-analysis lookup between refreshes, and a refresh that finds
+  the file unchanged (one stat) or changed (read, validate, swap);
+- analyze_coating with an explicit set vs resolving the active one, i.e. what the
+  lookup adds to a frame;
+- stale_counts() over 100k stored results, half of them from an older version.
+"""
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+from typing import Dict, List
+
+from backend.benchmarks.harness import result, timing_result
+
+SUITE = "parameters"
+
+
+def run(quick: bool = False) -> List[Dict]:
+    import numpy as np
+    from sqlalchemy.orm import sessionmaker
+
+    from backend.app.core import coatvision_core
+    from backend.app.db import Base, build_engine, bulk_insert
+    from backend.app.models.analysis import ImageAnalysis
+    from backend.app.services import parameters
+
+    repeat = 200 if quick else 5_000
+    rows = 5_000 if quick else 100_000
+    results = []
+    with tempfile.TemporaryDirectory(prefix="coatvision-bench-params-") as tmp:
+        path = os.path.join(tmp, "params.json")
+        with open(path, "w") as f:
+            json.dump({"max_laplacian_variance": 4000}, f)
+
+        cached = parameters.ParameterSource(path, ttl=3600)
+        cached.current()
+        results.append(timing_result(SUITE, "current[cached]", cached.current, repeat * 10))
+        unchanged = parameters.ParameterSource(path, ttl=0)
+        unchanged.current()
+        results.append(timing_result(SUITE, "refresh[file unchanged]", unchanged.current, repeat))
+
+        reloading = parameters.ParameterSource(path, ttl=0)
+        state = {"n": 0}
+
+        def reload():
+            # Ny mtime tvinger lesing, validering og bytte
+            state["n"] += 1
+            os.utime(path, ns=(state["n"], state["n"]))
+            return reloading.current()
+
+        results.append(timing_result(SUITE, "refresh[file changed]", reload, max(20, repeat // 10)))
+
+        frame = np.clip(np.random.default_rng(0).normal(120, 25, (720, 1280, 3)), 0, 255).astype(np.uint8)
+        active = parameters.source
+        parameters.source = cached
+        try:
+            frames = 5 if quick else 30
+            results.append(timing_result(
+                SUITE, "analyze_coating[explicit params, 1280x720]",
+                lambda: coatvision_core.analyze_coating(frame.copy(), params=parameters.DEFAULT), frames))
+            results.append(timing_result(
+                SUITE, "analyze_coating[active params, 1280x720]",
+                lambda: coatvision_core.analyze_coating(frame.copy()), frames))
+        finally:
+            parameters.source = active
+
+        engine = build_engine(f"sqlite:///{os.path.join(tmp, 'params.db')}")
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine, autoflush=False)()
+        try:
+            now = datetime.now(timezone.utc)
+            versions = (parameters.DEFAULT.version, "1-0000000000")
+            bulk_insert(db, ImageAnalysis, [
+                {"path": f"/images/{i:07d}.jpg", "size": 1, "mtime_ns": 1, "analysis_version": versions[i % 2],
+                 "cqi": 80.0, "cvi": 70.0, "analyzed_at": now}
+                for i in range(rows)
+            ])
+            db.commit()
+            counts = parameters.stale_counts(db, parameters.DEFAULT.version)
+            results.append(timing_result(
+                SUITE, "stale_counts", lambda: parameters.stale_counts(db, parameters.DEFAULT.version),
+                max(5, repeat // 100), rows=rows))
+            results.append(result(SUITE, "stale_rows", counts["image_analyses"]["stale"], "rows",
+                                  params={"rows": rows}, lower_is_better=False))
+        finally:
+            db.close()
+            engine.dispose()
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(quick=True), indent=2))
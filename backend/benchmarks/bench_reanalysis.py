@@ -0,0 +1,49 @@
+"""
+Bulk re-analysis throughput (services/reanalysis.py) on copies of training_data/.
+
+Reports images/sec in-process and with the process pool (one process per CPU),
+both forced to re-analyze everything. Also times the no-op pass where every image
+is already current, which must not read any file. Results go to the benchmark
+database (DATABASE_URL set by run.py).
+"""
+import os
+import shutil
+import tempfile
+import time
+from typing import Dict, List
+
+from backend.benchmarks.harness import REPO_DIR, result
+
+SUITE = "reanalysis"
+
+
+def run(quick: bool = False) -> List[Dict]:
+    from backend.app.services import reanalysis
+
+    sources = sorted((REPO_DIR / "training_data").glob("*.jp*g"))[:2 if quick else 7]
+    if not sources:
+        return []
+    workers = os.cpu_count() or 1
+    results = []
+    with tempfile.TemporaryDirectory(prefix="coatvision-bench-reanalysis-") as tmp:
+        folder = os.path.join(tmp, "images")
+        os.makedirs(folder)
+        for path in sources:
+            shutil.copy(path, folder)
+        checkpoint = reanalysis.Checkpoint(os.path.join(tmp, "checkpoint.json"))
+        params = {"images": len(sources)}
+        for name, count in (("in_process", 0), (f"process_pool[{workers}]", workers)):
+            stats = reanalysis.run([folder], workers=count, force=True, checkpoint=checkpoint, progress=None)
+            results.append(result(SUITE, f"images_per_sec[{name}]", round(stats.images_per_sec, 3), "images/s",
+                                  params={**params, "workers": count}, lower_is_better=False))
+        started = time.perf_counter()
+        stats = reanalysis.run([folder], workers=0, checkpoint=checkpoint, progress=None)
+        results.append(result(SUITE, "up_to_date_pass", round((time.perf_counter() - started) * 1000, 2), "ms",
+                              params={**params, "skipped": stats.skipped}))
+    return results
+
+
+if __name__ == "__main__":
+    import json
+
+    print(json.dumps(run(quick=True), indent=2))
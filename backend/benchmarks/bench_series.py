@@ -0,0 +1,95 @@
+"""
+Panel history (services/series.py) against the raw analysis rows it replaces.
+
+Seeds one panel with two years of analyses (several per day) plus a crowd of
+other panels, then times the trend and range endpoints' service calls against
+aggregating the same answer from analysis_records, and the per-analysis cost of
+maintaining the three tiers.
+"""
+import os
+import random
+import tempfile
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+from backend.benchmarks.harness import result, timing_result
+
+SUITE = "series"
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def _scan_trend(db, vehicle_id: str, panel: str):
+    import numpy as np
+    from sqlalchemy import select
+
+    from backend.app.models.analysis import AnalysisRecord
+
+    rows = db.execute(select(AnalysisRecord.created_at, AnalysisRecord.cqi).where(
+        AnalysisRecord.vehicle_id == vehicle_id, AnalysisRecord.panel == panel)).all()
+    t = np.array([r[0].timestamp() for r in rows]) / 86400.0
+    return float(np.polyfit(t - t[-1], np.array([r[1] for r in rows]), 1)[0]) * 30
+
+
+def run(quick: bool = False) -> List[Dict]:
+    from sqlalchemy.orm import sessionmaker
+
+    from backend.app.db import Base, build_engine
+    import backend.app.models.analysis  # noqa: F401  (registrerer tabellene)
+    import backend.app.models.series  # noqa: F401
+    from backend.app.services import analysis_store, series
+
+    days = 120 if quick else 730
+    per_day = 4
+    others = 20 if quick else 200
+    repeat = 10 if quick else 50
+    rng = random.Random(0)
+    results = []
+    with tempfile.TemporaryDirectory(prefix="coatvision-bench-series-") as tmp:
+        engine = build_engine(f"sqlite:///{os.path.join(tmp, 'series.db')}")
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine, autoflush=False)()
+        try:
+            for day in range(days):
+                for i in range(per_day):
+                    at = START + timedelta(days=day, hours=i * 5)
+                    db.add(backend.app.models.analysis.AnalysisRecord(
+                        vehicle_id="BENCH", panel="hood", cqi=90 - day / 30 + rng.uniform(-2, 2), cvi=70.0,
+                        created_at=at))
+                    series.append(db, "BENCH", "hood", at, 90 - day / 30, 70.0)
+                    # Andre paneler gjør at skanningen må gå via indeksen, som i drift
+                    db.add(backend.app.models.analysis.AnalysisRecord(
+                        vehicle_id=f"V{rng.randrange(others)}", panel="door", cqi=80.0, cvi=70.0, created_at=at))
+            db.commit()
+
+            params = {"analyses": days * per_day, "days": days}
+            results.append(timing_result(SUITE, "trend[series]", lambda: series.trend(db, "BENCH", "hood"),
+                                         repeat, **params))
+            results.append(timing_result(SUITE, "trend[scan analysis_records]",
+                                         lambda: _scan_trend(db, "BENCH", "hood"), repeat, **params))
+            results.append(timing_result(SUITE, "range[all, max 500]", lambda: series.query(db, "BENCH", "hood"),
+                                         repeat, **params))
+            last_week = START + timedelta(days=days - 7)
+            results.append(timing_result(SUITE, "range[last 7 days]",
+                                         lambda: series.query(db, "BENCH", "hood", start=last_week),
+                                         repeat, **params))
+
+            counter = iter(range(10 ** 9))
+
+            def record():
+                at = START + timedelta(days=days, minutes=next(counter))
+                analysis_store.record_analysis(db, "BENCH", "hood", {"cqi": 70.0, "cvi": 70.0}, at=at)
+
+            results.append(timing_result(SUITE, "record_analysis[with series]", record, repeat, **params))
+            stored = sum(len(r.data) for r in db.query(backend.app.models.series.PanelSeries)
+                         .filter_by(vehicle_id="BENCH", panel="hood"))
+            results.append(result(SUITE, "stored_bytes[panel]", stored, "bytes", params=params))
+        finally:
+            db.close()
+            engine.dispose()
+    return results
+
+
+if __name__ == "__main__":
+    import json
+
+    print(json.dumps(run(quick=True), indent=2))
@@ -0,0 +1,68 @@
+"""
+Shadow evaluation (services/shadow.py) on a stream of live-sized frames.
+
+- request latency of runner.analyze with shadow off vs every frame sampled, with
+  the candidate in a nice-19 process (the default) and on the shadow thread;
+- per sampled mode: samples evaluated, dropped for budget or a full queue, and the
+  CPU share the shadow work actually used against COATVISION_SHADOW_CPU_BUDGET.
+On a single core the candidate competes with the request path for the same CPU,
+so the latency difference there is the worst case the budget bounds.
+"""
+import json
+import time
+from typing import Dict, List
+
+from backend.benchmarks.harness import result, timing_result
+
+SUITE = "shadow"
+BUDGET = 0.25
+
+
+def run(quick: bool = False) -> List[Dict]:
+    import numpy as np
+
+    from backend.app.services import parameters, shadow
+
+    frames = 10 if quick else 60
+    frame = np.clip(np.random.default_rng(0).normal(120, 25, (720, 1280, 3)), 0, 255).astype(np.uint8)
+    candidate = shadow.Candidate.from_parameters(parameters.from_mapping({"canny_low": 30, "canny_high": 90}))
+    params = {"frames": frames, "resolution": "1280x720"}
+    results = []
+
+    off = shadow.ShadowRunner(sample_rate=0.0, store=lambda row: None)
+    results.append(timing_result(SUITE, "analyze[shadow off]", lambda: off.analyze(frame.copy()), frames, **params))
+
+    for mode, use_process in (("process", True), ("thread", False)):
+        rows = []
+        runner = shadow.ShadowRunner(sample_rate=1.0, cpu_budget=BUDGET, use_process=use_process, store=rows.append)
+        runner.set_candidate(candidate)
+        if use_process:
+            # Arbeiderprosessen startes før målingen; oppstarten er en engangskostnad
+            runner.analyze(frame.copy())
+            runner.wait(timeout=120)
+            rows.clear()
+        dropped = {reason: shadow.SAMPLES.value(reason) for reason in ("dropped_budget", "dropped_queue")}
+        runner.budget = shadow.CpuBudget(BUDGET)
+        started = time.perf_counter()
+        try:
+            results.append(timing_result(SUITE, f"analyze[shadow {mode}, sample=1.0]",
+                                         lambda: runner.analyze(frame.copy()), frames, warmup=0,
+                                         budget=BUDGET, **params))
+            runner.wait(timeout=120)
+        finally:
+            elapsed = time.perf_counter() - started
+            runner.shutdown()
+        cpu_s = sum(r["candidate_cpu_ms"] for r in rows) / 1000
+        results.append(result(SUITE, f"evaluated[{mode}]", len(rows), "frames", params=params,
+                              lower_is_better=False))
+        for reason, before in dropped.items():
+            results.append(result(SUITE, f"{reason}[{mode}]", shadow.SAMPLES.value(reason) - before, "frames",
+                                  params=params))
+        # Brukt CPU-andel over hele vinduet, inkludert at køen tømmes; burst tillater litt over budsjett
+        results.append(result(SUITE, f"cpu_share[{mode}]", cpu_s / elapsed, "cores",
+                              params={**params, "budget": BUDGET, "burst_s": shadow.BURST_S}))
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(quick=True), indent=2))
@@ -0,0 +1,99 @@
+"""
+Similar-panel search (services/similarity.py).
+
+- describe(): descriptor cost per frame, on the stages analyze_coating has already
+  computed (HSV frame and Laplacian).
+- Index: builds an index of clustered synthetic descriptors (1M, quick 50k) and
+  reports training time, query latency, vectors scanned per query and recall@10
+  against an exact scan, which is also timed. Also reports the cost of one
+  incremental insert and the snapshot size.
+"""
+import os
+import tempfile
+import time
+from typing import Dict, List
+
+from backend.benchmarks.bench_core import synthetic_image, training_images
+from backend.benchmarks.harness import result, timing_result
+
+SUITE = "similar"
+CLUSTERS = 2000
+QUERIES = 100
+
+
+def clustered_codes(n: int, seed: int = 0):
+    import numpy as np
+
+    from backend.app.services.similarity import DIM
+
+    rng = np.random.default_rng(seed)
+    centers = rng.integers(0, 256, (CLUSTERS, DIM)).astype(np.float32)
+    codes = centers[rng.integers(0, CLUSTERS, n)]
+    codes += rng.normal(0, 14, codes.shape).astype(np.float32)
+    return np.clip(codes, 0, 255).astype(np.uint8)
+
+
+def run(quick: bool = False) -> List[Dict]:
+    import cv2
+    import numpy as np
+
+    from backend.app.services import similarity
+
+    repeat = 5 if quick else 20
+    results = []
+    frames = [("synthetic-1280x720", synthetic_image(1280, 720))] + [
+        (f"training-{stem}", image) for stem, image in training_images(1)]
+    for name, frame in frames:
+        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+        laplacian = cv2.Laplacian(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), cv2.CV_64F)
+        results.append(timing_result(SUITE, f"describe[{name}]", lambda: similarity.describe(hsv, laplacian),
+                                     repeat, shape=list(frame.shape)))
+
+    n = 50_000 if quick else 1_000_000
+    codes = clustered_codes(n)
+    params = {"vectors": n, "nprobe": similarity.NPROBE}
+    with tempfile.TemporaryDirectory(prefix="coatvision-bench-similar-") as tmp:
+        index = similarity.PanelIndex(similarity.Path(os.path.join(tmp, "index.npz")), background=False)
+        index.add_many(np.arange(1, n + 1), codes)
+        started = time.perf_counter()
+        index.train()
+        results.append(result(SUITE, "train_and_snapshot", round((time.perf_counter() - started) * 1000, 1), "ms",
+                              params={**params, "lists": index.stats()["lists"]}))
+        results.append(result(SUITE, "snapshot_size", os.path.getsize(os.path.join(tmp, "index.npz")), "bytes",
+                              params=params))
+
+        rng = np.random.default_rng(1)
+        queries = clustered_codes(QUERIES, seed=2)
+        cursor = iter(range(10 ** 9))
+        results.append(timing_result(SUITE, "search[top10]",
+                                     lambda: index.search(queries[next(cursor) % QUERIES], k=10),
+                                     max(QUERIES, repeat), **params))
+        flat = codes.astype(np.float32)
+
+        def exact(q):
+            d = np.einsum("ij,ij->i", flat - q, flat - q)
+            return set((np.argpartition(d, 9)[:10] + 1).tolist())
+
+        results.append(timing_result(SUITE, "exact_scan[top10]", lambda: exact(queries[0].astype(np.float32)),
+                                     3 if quick else 5, **params))
+        found, scanned = 0, 0
+        for q in queries:
+            hits, count = index.search(q, k=10)
+            found += len(exact(q.astype(np.float32)) & {h[0] for h in hits})
+            scanned += count
+        results.append(result(SUITE, "recall@10", round(found / (10 * QUERIES), 4), "ratio",
+                              params=params, lower_is_better=False))
+        results.append(result(SUITE, "scanned_per_query", scanned // QUERIES, "vectors", params=params))
+
+        extra = clustered_codes(repeat * 20, seed=3)
+        ids = iter(range(n + 1, n + 1 + len(extra) + 10))
+        results.append(timing_result(SUITE, "insert[one]",
+                                     lambda: index.add(next(ids), extra[rng.integers(len(extra))]),
+                                     repeat * 10, **params))
+    return results
+
+
+if __name__ == "__main__":
+    import json
+
+    print(json.dumps(run(quick=True), indent=2))
@@ -0,0 +1,102 @@
+"""
+Cold-start benchmark for the backend app.
+Usage:
+    python -m backend.benchmarks.bench_startup [--runs 5] [--budget-ms 1500]
+
+Each run starts a fresh interpreter, imports `backend.app.main` and serves the
+first GET /health through TestClient. The median of (import + first request)
+is checked against the budget; exit code 1 when it is exceeded or when a heavy
+dependency (cv2, numpy, reportlab, openai) was imported at startup.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parents[2]
+DEFAULT_BUDGET_MS = float(os.getenv("COATVISION_COLD_START_BUDGET_MS", "1500"))
+HEAVY_MODULES = ("cv2", "numpy", "reportlab", "openai")
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+from backend.app.main import app
+t1 = time.perf_counter()
+from fastapi.testclient import TestClient
+t2 = time.perf_counter()
+TestClient(app).get("/health")
+t3 = time.perf_counter()
+print(json.dumps({
+    "import_ms": (t1 - t0) * 1000,
+    "first_request_ms": (t3 - t2) * 1000,
+    "heavy_loaded": [m for m in %r if m in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+
+def run_once() -> dict:
+    proc = subprocess.run(
+        [sys.executable, "-c", _PROBE],
+        cwd=str(REPO_DIR),
+        env=dict(os.environ),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def measure(runs: int) -> dict:
+    samples = [run_once() for _ in range(runs)]
+    import_ms = statistics.median(s["import_ms"] for s in samples)
+    request_ms = statistics.median(s["first_request_ms"] for s in samples)
+    return {
+        "import_ms": import_ms,
+        "first_request_ms": request_ms,
+        "cold_start_ms": import_ms + request_ms,
+        "heavy_loaded": sorted({m for s in samples for m in s["heavy_loaded"]}),
+    }
+
+
+def run(quick: bool = False) -> list:
+    """Results for the benchmark suite (see run.py)."""
+    from backend.benchmarks.harness import result
+
+    runs = 2 if quick else 5
+    measured = measure(runs)
+    params = {"runs": runs, "heavy_loaded": measured["heavy_loaded"]}
+    return [
+        result("startup", "import backend.app.main", measured["import_ms"], params=params),
+        result("startup", "cold_start", measured["cold_start_ms"], params=params, budget_ms=DEFAULT_BUDGET_MS),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    args = parser.parse_args()
+
+    measured = measure(args.runs)
+    import_ms = measured["import_ms"]
+    request_ms = measured["first_request_ms"]
+    cold_start_ms = measured["cold_start_ms"]
+    heavy = measured["heavy_loaded"]
+
+    print(f"import backend.app.main: {import_ms:8.1f} ms (median of {args.runs})")
+    print(f"first GET /health:       {request_ms:8.1f} ms")
+    print(f"cold start:              {cold_start_ms:8.1f} ms (budget {args.budget_ms:.0f} ms)")
+    if heavy:
+        print(f"FAIL: heavy modules imported at startup: {', '.join(heavy)}")
+    if cold_start_ms > args.budget_ms:
+        print("FAIL: cold start over budget")
+    if heavy or cold_start_ms > args.budget_ms:
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Wash durability predictions (services/wash_model.py) against a seeded history.
+
+Compares the cached per-product fit with refitting from the full event history
+on each call, which is what a model without running sums would have to do, and
+times adding an event (link + incremental update).
+"""
+import math
+import os
+import random
+import tempfile
+from typing import Dict, List
+
+from backend.benchmarks.harness import result, timing_result
+
+SUITE = "wash"
+PRODUCTS = 20
+
+
+def seed(db, events: int) -> None:
+    from backend.app.db import bulk_insert, unit_of_work
+    from backend.app.models.analysis import AnalysisRecord
+    from backend.app.models.wash import WashEvent
+    from backend.app.services import wash_model
+
+    rng = random.Random(0)
+    rows, analyses = [], []
+    for i in range(events):
+        product = i % PRODUCTS
+        washes = rng.randint(1, 60)
+        retention = math.exp(-(0.01 + product * 0.001) * washes) * rng.uniform(0.95, 1.05)
+        analyses.append({"vehicle_id": f"V{i // 10}", "panel": "hood", "product_id": product,
+                         "cqi": 80 * retention, "cvi": 70.0})
+        rows.append({"vehicle_id": f"V{i // 10}", "panel": "hood", "product_key": str(product),
+                     "wash_count": washes, "retention": min(1.5, retention)})
+    with unit_of_work(db):
+        bulk_insert(db, AnalysisRecord, analyses)
+        bulk_insert(db, WashEvent, rows)
+    # Løpende summer bygget fra historikken, som add_event ville gjort én og én
+    for product in range(PRODUCTS):
+        key = str(product)
+        for row in (r for r in rows if r["product_key"] == key):
+            wash_model._accumulate(db, key, float(row["wash_count"]), -math.log(row["retention"]))
+    db.commit()
+
+
+def _refit(db, key: str, washes: int) -> float:
+    from sqlalchemy import select
+
+    from backend.app.models.wash import WashEvent
+    from backend.app.services import wash_model
+
+    sxx = sxd = 0.0
+    for x, r in db.execute(select(WashEvent.wash_count, WashEvent.retention).where(
+            WashEvent.product_key == key, WashEvent.retention.is_not(None))):
+        sxx += x * x
+        sxd += x * -math.log(r)
+    k = (sxd + wash_model.PRIOR_WEIGHT * wash_model.PRIOR_K) / (sxx + wash_model.PRIOR_WEIGHT)
+    return 100.0 * math.exp(-k * washes)
+
+
+def run(quick: bool = False) -> List[Dict]:
+    from sqlalchemy.orm import sessionmaker
+
+    from backend.app.db import Base, build_engine
+    import backend.app.models.analysis  # noqa: F401  (registrerer tabellene)
+    import backend.app.models.wash  # noqa: F401
+    from backend.app.services import analysis_store, wash_model
+
+    events = 2_000 if quick else 50_000
+    repeat = 20 if quick else 200
+    results = []
+    with tempfile.TemporaryDirectory(prefix="coatvision-bench-wash-") as tmp:
+        engine = build_engine(f"sqlite:///{os.path.join(tmp, 'wash.db')}")
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine, autoflush=False)()
+        try:
+            seed(db, events)
+            params = {"events": events, "products": PRODUCTS}
+            wash_model.fits.clear()
+            results.append(timing_result(SUITE, "predict_cached", lambda: wash_model.predict(db, 7, 30),
+                                         repeat * 10, **params))
+            results.append(timing_result(SUITE, "predict_refit_from_history", lambda: _refit(db, "7", 30),
+                                         max(3, repeat // 20), **params))
+
+            analysis_store.record_analysis(db, "BENCH", "door", {"cqi": 80.0, "cvi": 70.0}, product_id=7)
+            latest = analysis_store.record_analysis(db, "BENCH", "door", {"cqi": 60.0, "cvi": 60.0}, product_id=7)
+            results.append(timing_result(
+                SUITE, "add_event", lambda: wash_model.add_event(db, "BENCH", "door", 25, analysis_id=latest.id),
+                repeat, **params))
+            results.append(result(SUITE, "fitted_k[product 7]", wash_model.fits.get(db, "7").k, "1/wash",
+                                  params={"true_k": 0.017}, lower_is_better=False))
+        finally:
+            db.close()
+            engine.dispose()
+    return results
+
+
+if __name__ == "__main__":
+    import json
+
+    print(json.dumps(run(quick=True), indent=2))
@@ -0,0 +1,169 @@
+"""
+Felles verktøy for benchmark-suiten: timing, JSON-resultater og regresjonssammenligning.
+
+Resultatformat (én fil per kjøring):
+{
+  "schema": 1,
+  "created_at": "...",
+  "environment": {"python": ..., "numpy": ..., "opencv": ..., "cpu_count": ..., "git_commit": ...},
+  "results": [
+    {"suite": "micro", "name": "analyze_coating[synthetic-1280x720]", "unit": "ms",
+     "value": 12.3, "lower_is_better": true, "stats": {...}, "params": {...}}
+  ]
+}
+`value` er primærmålet som sammenlignes (median for tider).
+"""
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+SCHEMA_VERSION = 1
+REPO_DIR = Path(__file__).resolve().parents[2]
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def summarize(samples_ms: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples_ms)
+    return {
+        "n": len(ordered),
+        "min": round(ordered[0], 4),
+        "median": round(statistics.median(ordered), 4),
+        "mean": round(statistics.fmean(ordered), 4),
+        "p95": round(_percentile(ordered, 95), 4),
+        "p99": round(_percentile(ordered, 99), 4),
+        "max": round(ordered[-1], 4),
+        "stdev": round(statistics.stdev(ordered), 4) if len(ordered) > 1 else 0.0,
+    }
+
+
+def time_call(fn: Callable[[], object], repeat: int = 20, warmup: int = 3) -> Dict[str, float]:
+    """Time `fn` `repeat` times (ms) after `warmup` untimed calls, with GC paused while timing."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    gc_was_enabled = gc.isenabled()
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - start) * 1000)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return summarize(samples)
+
+
+def result(
+    suite: str,
+    name: str,
+    value: float,
+    unit: str = "ms",
+    *,
+    stats: Optional[Dict] = None,
+    params: Optional[Dict] = None,
+    lower_is_better: bool = True,
+    **extra,
+) -> Dict:
+    record = {
+        "suite": suite,
+        "name": name,
+        "unit": unit,
+        "value": round(float(value), 4),
+        "lower_is_better": lower_is_better,
+        "stats": stats or {},
+        "params": params or {},
+    }
+    record.update(extra)
+    return record
+
+
+def timing_result(suite: str, name: str, fn: Callable[[], object], repeat: int, warmup: int = 3, **params) -> Dict:
+    stats = time_call(fn, repeat=repeat, warmup=warmup)
+    return result(suite, name, stats["median"], "ms", stats=stats, params=params)
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=str(REPO_DIR), capture_output=True, text=True, timeout=5
+        )
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def environment() -> Dict:
+    env = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "git_commit": _git_commit(),
+    }
+    for module_name, key in (("numpy", "numpy"), ("cv2", "opencv")):
+        try:
+            env[key] = __import__(module_name).__version__
+        except Exception:
+            env[key] = None
+    return env
+
+
+def write_results(results: List[Dict], path: Path) -> Dict:
+    document = {
+        "schema": SCHEMA_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "environment": environment(),
+        "results": results,
+    }
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(document, indent=2))
+    return document
+
+
+def load_results(path: Path) -> Dict:
+    document = json.loads(Path(path).read_text())
+    if document.get("schema") != SCHEMA_VERSION:
+        raise ValueError(f"Unsupported benchmark schema in {path}: {document.get('schema')}")
+    return document
+
+
+def compare(baseline: Dict, current: Dict, threshold: float = 0.15) -> List[Dict]:
+    """Match results by (suite, name) and report relative change of `value`.
+
+    `regression` is True when the change is worse than `threshold` (0.15 = 15 %).
+    """
+    base_index = {(r["suite"], r["name"]): r for r in baseline["results"]}
+    rows = []
+    for record in current["results"]:
+        base = base_index.get((record["suite"], record["name"]))
+        if base is None or not base["value"]:
+            continue
+        change = (record["value"] - base["value"]) / abs(base["value"])
+        worse = change if record.get("lower_is_better", True) else -change
+        rows.append(
+            {
+                "suite": record["suite"],
+                "name": record["name"],
+                "unit": record["unit"],
+                "baseline": base["value"],
+                "current": record["value"],
+                "change": round(change, 4),
+                "regression": worse > threshold,
+            }
+        )
+    return rows
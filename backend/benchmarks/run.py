@@ -0,0 +1,98 @@
+"""
+CoatVision benchmark suite.
+Usage:
+    python -m backend.benchmarks.run [--suite micro|http|framing|json|db|concurrency|catalog|knowledge|calibration|lighting|wash|series|similar|defects|reanalysis|parameters|shadow|startup|all] [--quick]
+                                     [--out results.json] [--compare baseline.json] [--threshold 0.15]
+                                     [--base-url https://...]   (http suite against a live server)
+
+Writes results in the JSON format described in harness.py. With --compare, each
+result is matched to the baseline by (suite, name). The exit code is 1 when any
+primary value is worse than the threshold.
+"""
+import argparse
+import importlib
+import os
+import sys
+from pathlib import Path
+
+# Benchmarks skal ikke skrive til utviklingsdatabasen
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(
+    os.environ.get("TMPDIR", "/tmp"), "coatvision-bench.db"))
+# Lastbenchmarks sender mange kall fra én klient; de skal måle serveren, ikke limiteren
+os.environ.setdefault("COATVISION_RATE_LIMIT", "0")
+
+from backend.benchmarks import harness  # noqa: E402
+
+SUITES = {
+    "micro": "backend.benchmarks.bench_core",
+    "http": "backend.benchmarks.bench_http",
+    "framing": "backend.benchmarks.bench_framing",
+    "json": "backend.benchmarks.bench_json",
+    "db": "backend.benchmarks.bench_db",
+    "concurrency": "backend.benchmarks.bench_concurrency",
+    "catalog": "backend.benchmarks.bench_catalog",
+    "knowledge": "backend.benchmarks.bench_knowledge",
+    "calibration": "backend.benchmarks.bench_calibration",
+    "lighting": "backend.benchmarks.bench_lighting",
+    "wash": "backend.benchmarks.bench_wash",
+    "series": "backend.benchmarks.bench_series",
+    "similar": "backend.benchmarks.bench_similar",
+    "defects": "backend.benchmarks.bench_defects",
+    "reanalysis": "backend.benchmarks.bench_reanalysis",
+    "parameters": "backend.benchmarks.bench_parameters",
+    "shadow": "backend.benchmarks.bench_shadow",
+    "startup": "backend.benchmarks.bench_startup",
+}
+
+
+def run_suites(names, quick: bool, base_url=None):
+    results = []
+    for name in names:
+        module = importlib.import_module(SUITES[name])
+        print(f"[bench] running {name} ({'quick' if quick else 'full'})", file=sys.stderr)
+        if name == "http":
+            results.extend(module.run(quick=quick, base_url=base_url))
+        else:
+            results.extend(module.run(quick=quick))
+    return results
+
+
+def print_table(results):
+    for r in results:
+        print(f"  {r['suite']:8} {r['value']:12.3f} {r['unit']:6} {r['name']}")
+
+
+def print_comparison(rows, threshold: float):
+    print(f"\nComparison against baseline (threshold {threshold:.0%}):")
+    for row in rows:
+        flag = "REGRESSION" if row["regression"] else ""
+        print(f"  {row['change']:+8.1%} {row['baseline']:12.3f} -> {row['current']:12.3f} {row['unit']:6} "
+              f"{row['name']} {flag}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suite", choices=sorted(SUITES) + ["all"], default="micro")
+    parser.add_argument("--quick", action="store_true", help="Small inputs and few repeats (smoke run)")
+    parser.add_argument("--out", type=Path, help="Write results JSON here")
+    parser.add_argument("--compare", type=Path, help="Baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15)
+    parser.add_argument("--base-url", help="Run the http suite against a live server")
+    args = parser.parse_args(argv)
+
+    names = sorted(SUITES) if args.suite == "all" else [args.suite]
+    results = run_suites(names, args.quick, args.base_url)
+    document = harness.write_results(results, args.out) if args.out else {
+        "schema": harness.SCHEMA_VERSION, "results": results}
+    print_table(results)
+
+    if args.compare:
+        rows = harness.compare(harness.load_results(args.compare), document, args.threshold)
+        print_comparison(rows, args.threshold)
+        if any(row["regression"] for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
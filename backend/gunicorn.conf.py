@@ -0,0 +1,36 @@
+# Gunicorn config for CoatVision backend (prefork + uvicorn workers).
+#   gunicorn -c gunicorn.conf.py backend.app.main:app
+#
+# preload_app laster appen og tung, skrivebeskyttet tilstand (OpenCV, warmup-analyse)
+# én gang i master; workerne arver den copy-on-write ved fork.
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+# Appen deler vertsbudsjetter (f.eks. skyggeevaluering) på antall workere
+os.environ.setdefault("WEB_CONCURRENCY", str(workers))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+# Én OpenCV-tråd per worker med mindre noe annet er satt
+os.environ.setdefault("COATVISION_CV_THREADS", "1")
+
+
+def on_starting(server):
+    from backend.app import warmup
+
+    timings = warmup.preload()
+    server.log.info("[warmup] preloaded in master: %s", timings)
+
+
+def post_fork(server, worker):
+    from backend.app import warmup
+
+    warmup.post_fork()
+    server.log.info("[warmup] worker %s rss=%.1f MiB", worker.pid, warmup.rss_bytes() / 2**20)
+
+
+def child_exit(server, worker):
+    from backend.app import warmup
+
+    warmup.forget_worker(worker.pid)
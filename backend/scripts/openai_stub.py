@@ -0,0 +1,79 @@
+"""
+Local stand-in for the OpenAI chat completions API (offline development and tests).
+Usage:
+    python backend/scripts/openai_stub.py [--port 8089] [--delay-ms 0]
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=stub uvicorn backend.app.main:app
+
+POST /v1/chat/completions answers deterministically with "Stub-svar: <last user
+message>", both as one completion and as an SSE stream of word chunks in the
+OpenAI chunk format. `calls` counts requests so tests can check for cache hits.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+app = FastAPI(title="OpenAI stub")
+app.state.calls = 0
+app.state.delay_s = 0.0
+
+
+def _reply_for(body: dict) -> str:
+    user = [m.get("content", "") for m in body.get("messages", []) if m.get("role") == "user"]
+    return f"Stub-svar: {user[-1] if user else ''}"
+
+
+def _envelope(body: dict, obj: str) -> dict:
+    return {"id": f"chatcmpl-stub-{app.state.calls}", "object": obj, "created": int(time.time()),
+            "model": body.get("model", "stub")}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    app.state.calls += 1
+    reply = _reply_for(body)
+    if app.state.delay_s:
+        await asyncio.sleep(app.state.delay_s)
+
+    if not body.get("stream"):
+        return {
+            **_envelope(body, "chat.completion"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": reply}}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": len(reply.split()), "total_tokens": 0},
+        }
+
+    async def chunks():
+        words = reply.split(" ")
+        for i, word in enumerate(words):
+            delta = {"content": word + (" " if i < len(words) - 1 else "")}
+            if i == 0:
+                delta["role"] = "assistant"
+            chunk = {**_envelope(body, "chat.completion.chunk"),
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+            yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+        done = {**_envelope(body, "chat.completion.chunk"), "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        yield f"data: {json.dumps(done)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(chunks(), media_type="text/event-stream")
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--delay-ms", type=float, default=0.0, help="Simulated model latency")
+    args = parser.parse_args()
+    app.state.delay_s = args.delay_ms / 1000
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Bulk re-analysis of stored images after the analysis parameters change.
+Usage:
+    python backend/scripts/reanalyze.py [PATH ...] [--from-db] [--workers N] [--prefetch N]
+                                        [--batch 200] [--checkpoint FILE] [--no-resume] [--force]
+                                        [--lighting off|flatten|clahe] [--json]
+
+Without PATH, walks uploads/ and training_data/. --from-db also re-analyzes the
+stale rows already in image_analyses (files that still exist). Images whose
+stored analysis_version is current and whose file is unchanged are skipped; an
+interrupted run resumes from its checkpoint. Writes to DATABASE_URL (the same
+database as the API). See backend/app/services/reanalysis.py for the pipeline.
+"""
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_DIR))
+
+DEFAULT_SOURCES = [str(REPO_DIR / "uploads"), str(REPO_DIR / "training_data")]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="*", help="Image directories or files (default: uploads/ and training_data/)")
+    parser.add_argument("--from-db", action="store_true", help="Also re-analyze stale rows in image_analyses")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Analysis processes (0 = in this process)")
+    parser.add_argument("--prefetch", type=int, default=4, help="File reader threads")
+    parser.add_argument("--batch", type=int, default=200, help="Rows per database transaction")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: runtime dir)")
+    parser.add_argument("--no-resume", action="store_true", help="Ignore an existing checkpoint")
+    parser.add_argument("--force", action="store_true", help="Re-analyze even current images")
+    parser.add_argument("--lighting", help="Lighting normalization mode (default COATVISION_LIGHTING)")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    args = parser.parse_args(argv)
+
+    from backend.app.services import lighting, parameters, reanalysis
+
+    try:
+        lighting.resolve_mode(args.lighting)
+    except ValueError as e:
+        parser.error(str(e))
+    sources = args.paths or ([] if args.from_db else DEFAULT_SOURCES)
+    checkpoint = reanalysis.Checkpoint(args.checkpoint) if args.checkpoint else reanalysis.Checkpoint()
+    progress = (lambda line: print(line, file=sys.stderr))
+    progress(f"[reanalyze] analysis version {parameters.source.refresh().version}, {args.workers} workers, {args.prefetch} readers")
+    stats = reanalysis.run(
+        sources, from_db=args.from_db, workers=args.workers, prefetch=args.prefetch, batch=args.batch,
+        checkpoint=checkpoint, resume=not args.no_resume, force=args.force, lighting=args.lighting,
+        progress=progress,
+    )
+    summary = stats.as_dict()
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print(f"{summary['analyzed']} analyzed, {summary['failed']} failed, {summary['skipped']} already current, "
+              f"{summary['resumed_past']} done before resume, in {summary['seconds']} s "
+              f"({summary['images_per_sec']} images/s)")
+    return 1 if stats.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
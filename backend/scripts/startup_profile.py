@@ -0,0 +1,78 @@
+"""
+Startup profile: per-module import time for `backend.app.main`.
+Usage:
+    python backend/scripts/startup_profile.py [--top 25] [--json]
+
+Runs a fresh interpreter with `-X importtime` and reports
+- the slowest modules by cumulative import time
+- self time grouped by top-level package (fastapi, sqlalchemy, cv2, ...)
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parents[2]
+
+
+def collect(module: str = "backend.app.main"):
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=str(REPO_DIR),
+        env=dict(os.environ),
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise SystemExit(f"Import failed:\n{proc.stderr[-2000:]}")
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = [part.strip() for part in line.replace("import time:", "").split("|")]
+        rows.append({"module": name, "self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000})
+    return rows
+
+
+def summarize(rows, top: int = 25):
+    by_package = defaultdict(float)
+    for row in rows:
+        by_package[row["module"].split(".")[0]] += row["self_ms"]
+    slowest = sorted(rows, key=lambda r: r["cumulative_ms"], reverse=True)[:top]
+    packages = sorted(by_package.items(), key=lambda kv: kv[1], reverse=True)[:top]
+    total = sum(r["self_ms"] for r in rows)
+    return {
+        "total_ms": round(total, 1),
+        "slowest_modules": slowest,
+        "by_package_ms": {name: round(ms, 1) for name, ms in packages},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--module", default="backend.app.main")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable JSON")
+    args = parser.parse_args()
+
+    report = summarize(collect(args.module), args.top)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"Total import time for {args.module}: {report['total_ms']} ms\n")
+    print("Slowest modules (cumulative):")
+    for row in report["slowest_modules"]:
+        print(f"  {row['cumulative_ms']:9.1f} ms  {row['module']}")
+    print("\nSelf time by top-level package:")
+    for name, ms in report["by_package_ms"].items():
+        print(f"  {ms:9.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
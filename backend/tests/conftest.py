@@ -0,0 +1,10 @@
+import os
+import tempfile
+
+# Testene skal aldri skrive til utviklingsdatabasen; pek DATABASE_URL mot en temp-fil
+# før backend.app.db importeres (load_dotenv overstyrer ikke eksisterende variabler).
+_tmp_dir = tempfile.mkdtemp(prefix="coatvision-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir, 'test.db')}"
+os.environ.setdefault("COATVISION_RUNTIME_DIR", os.path.join(_tmp_dir, "runtime"))
+# Testene kjører mange analysekall fra samme klient; rate limiting testes eksplisitt
+os.environ.setdefault("COATVISION_RATE_LIMIT", "0")
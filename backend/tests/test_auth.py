@@ -0,0 +1,49 @@
+import hashlib
+
+from fastapi.testclient import TestClient
+
+from backend.app.db import SessionLocal
+from backend.app.main import app
+from backend.app.models.user import User
+from backend.app.services import auth as auth_service
+
+client = TestClient(app)
+
+
+def test_register_login_me_with_scrypt():
+    r = client.post("/api/auth/register", json={"email": "Anna@Example.com", "password": "s3cret"})
+    assert r.status_code == 200
+    with SessionLocal() as db:
+        assert db.query(User).filter(User.email == "anna@example.com").one().password_hash.startswith("scrypt$")
+
+    assert client.post("/api/auth/login", json={"email": "anna@example.com", "password": "wrong"}).status_code == 401
+    token = client.post("/api/auth/login", json={"email": "anna@example.com", "password": "s3cret"}).json()["access_token"]
+    me = client.get("/api/auth/me", headers={"Authorization": f"Bearer {token}"})
+    assert me.json()["email"] == "anna@example.com"
+
+
+def test_legacy_sha256_hash_is_upgraded_on_login():
+    salt = "abc123"
+    with SessionLocal() as db:
+        db.add(User(id="legacy-user", email="legacy@example.com", salt=salt,
+                    password_hash=hashlib.sha256((salt + "oldpass").encode()).hexdigest()))
+        db.commit()
+
+    assert client.post("/api/auth/login", json={"email": "legacy@example.com", "password": "oldpass"}).status_code == 200
+    with SessionLocal() as db:
+        user = db.get(User, "legacy-user")
+        assert user.password_hash.startswith("scrypt$") and user.salt == ""
+    assert auth_service.verify_password("oldpass", user.password_hash) == (True, False)
+
+
+def test_token_cache_hits_and_honours_exp():
+    cache = auth_service.TokenCache(maxsize=2)
+    cache.put(b"a", {"sub": "1", "exp": 0})
+    assert cache.get(b"a") is None  # utløpt
+    cache.put(b"b", {"sub": "2", "exp": 2 ** 40})
+    cache.put(b"c", {"sub": "3", "exp": 2 ** 40})
+    cache.put(b"d", {"sub": "4", "exp": 2 ** 40})
+    assert cache.get(b"b") is None and cache.get(b"d")["sub"] == "4"
+
+    token = auth_service.create_access_token("u1", "u1@example.com")
+    assert auth_service.decode_token(token) is auth_service.decode_token(token)
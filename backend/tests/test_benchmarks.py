@@ -0,0 +1,26 @@
+from backend.benchmarks import bench_core, harness
+
+
+def test_compare_flags_regressions_by_direction():
+    baseline = {"results": [
+        harness.result("micro", "analyze", 10.0),
+        harness.result("http", "throughput", 100.0, "req/s", lower_is_better=False),
+    ]}
+    current = {"results": [
+        harness.result("micro", "analyze", 12.0),
+        harness.result("http", "throughput", 120.0, "req/s", lower_is_better=False),
+    ]}
+    rows = {r["name"]: r for r in harness.compare(baseline, current, threshold=0.15)}
+    assert rows["analyze"]["regression"] is True
+    assert rows["throughput"]["regression"] is False
+
+
+def test_quick_micro_suite_roundtrips_as_json(tmp_path):
+    results = bench_core.run(quick=True)
+    names = {r["name"].split("[")[0] for r in results}
+    assert names == {"analyze_coating", "decode_base64_image", "encode_image_base64", "create_analysis_overlay"}
+
+    path = tmp_path / "results.json"
+    harness.write_results(results, path)
+    loaded = harness.load_results(path)
+    assert not any(r["regression"] for r in harness.compare(loaded, loaded))
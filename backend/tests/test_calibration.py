@@ -15,7 +15,188 @@ def test_calibration_status():
 
 def test_run_calibration_demo_guard_no_token():
     # When ADMIN_TOKEN is not set, guard is a no-op
-    r = client.post("/api/calibration/run")
-    assert r.status_code == 200
-    assert r.json()["status"] == "started"
+    import cv2
+
+    from backend.app.services.calibration import chart
+    from backend.app.services.workers import pool
+
+    photo = cv2.imencode(".png", chart.render_chart(cast=(0.95, 1.0, 1.05), brightness=8))[1].tobytes()
+    blank = cv2.imencode(".png", chart.render_chart()[:40, :40])[1].tobytes()
+    r = client.post("/api/calibration/run", data={"scope": "device", "scope_id": "cam-chart"},
+                    files=[("photos", ("chart.png", photo, "image/png")), ("photos", ("blank.png", blank, "image/png"))])
+    assert r.status_code == 202
+    assert r.json()["status"] == "queued"
+
+    pool.wait(r.json()["job_id"])
+    job = client.get(r.json()["poll"]).json()
+    assert job["status"] == "done" and job["progress"] == 1.0
+    result = job["result"]
+    assert result["profile"] == {"scope": "device", "scope_id": "cam-chart", "version": 1}
+    assert (result["photos"], result["photos_used"], len(result["failures"])) == (2, 1, 1)
+    assert result["error_after"] < result["error_before"]
+
+    params = client.get("/api/calibration/parameters", params={"device_id": "cam-chart"}).json()
+    assert params["source"] == "chart"
+    assert abs(params["brightness_offset"] - 8) < 1
+    assert abs(params["white_balance"][0] / params["white_balance"][2] - 0.95 / 1.05) < 0.02
+    status = client.get("/api/calibration/status").json()
+    assert status["calibrated"] and status["last_calibration"] and status["last_job"]["id"] == job["id"]
+
+
+def test_run_without_chart_fails_job():
+    import cv2
+    import numpy as np
+
+    from backend.app.services.workers import pool
+
+    blank = cv2.imencode(".png", np.full((120, 160, 3), 90, np.uint8))[1].tobytes()
+    job_id = client.post("/api/calibration/run", files=[("photos", ("x.png", blank, "image/png"))]).json()["job_id"]
+    pool.wait(job_id)
+    job = client.get(f"/api/calibration/jobs/{job_id}").json()
+    assert job["status"] == "failed" and "No reference chart" in job["error"]
+    assert client.get("/api/calibration/jobs/unknown").status_code == 404
+
+
+def test_chart_detection_survives_rotation():
+    import cv2
+
+    from backend.app.services.calibration import chart
+
+    photo = chart.render_chart(cast=(1.1, 1.0, 0.9))
+    upright = chart.detect_patches(photo)
+    assert abs(upright - chart.detect_patches(cv2.rotate(photo, cv2.ROTATE_180))).max() < 2
+    tilted = cv2.warpAffine(photo, cv2.getRotationMatrix2D((480, 360), 10, 1.0), (960, 720),
+                            borderValue=(90, 90, 90))
+    assert abs(upright - chart.detect_patches(tilted)).max() < 6
+
+
+def test_compiled_lut_matches_float_math():
+    import numpy as np
+
+    from backend.app.services.calibration import profiles
+
+    profile = profiles.Profile("device", "cam-x", 1, brightness_offset=8, contrast_factor=1.2,
+                               color_correction=(1.1, 1.0, 0.9), white_balance=(1.0, 0.95, 1.05))
+    frame = np.random.default_rng(0).integers(0, 256, (32, 48, 3), dtype=np.uint8)
+    gains = np.array(profile.gains[::-1], dtype=np.float32)  # BGR
+    expected = np.clip(np.rint(((frame.astype(np.float32) - 128) * 1.2 + 136) * gains), 0, 255).astype(np.uint8)
+
+    out = profiles.apply(frame, profile)
+    assert out is frame and np.array_equal(frame, expected)
+    assert profiles.lut_cache.get(profile) is profiles.lut_cache.get(profile)
+    uniform = profiles.Profile("site", "s", 2, brightness_offset=-10)
+    assert profiles.compile_lut(uniform).shape == (1, 256)
+    expected = np.clip(frame.astype(np.int16) - 10, 0, 255).astype(np.uint8)
+    assert np.array_equal(profiles.apply(frame, uniform), expected)
+    identity = profiles.Profile("site", "s", 1)
+    assert identity.is_identity and profiles.apply(frame, identity) is frame
+
+
+def test_profile_versions_and_parameters_fallback():
+    assert client.get("/api/calibration/parameters").json()["version"] == 0
+    first = client.put("/api/calibration/profiles/site/oslo", json={"brightness_offset": 5}).json()["profile"]
+    second = client.put("/api/calibration/profiles/site/oslo",
+                        json={"contrast_factor": 1.1, "white_balance": [1.0, 1.0, 1.2]}).json()["profile"]
+    assert (first["version"], second["version"]) == (1, 2)
+
+    params = client.get("/api/calibration/parameters", params={"device_id": "unknown", "site_id": "oslo"}).json()
+    assert params["scope"] == "site" and params["version"] == 2
+    assert params["white_balance"] == [1.0, 1.0, 1.2] and params["brightness_offset"] == 0
+    listed = [(p["scope_id"], p["version"]) for p in client.get("/api/calibration/profiles").json()["profiles"]]
+    assert ("oslo", 2) in listed and ("oslo", 1) not in listed
+
+    r = client.put("/api/calibration/profiles/site/oslo", json={"white_balance": [1.0]})
+    assert r.status_code == 422
+
+
+def test_analysis_applies_device_profile():
+    import base64
+
+    import cv2
+    import numpy as np
+
+    image = np.full((48, 64, 3), 100, dtype=np.uint8)
+    b64 = base64.b64encode(cv2.imencode(".png", image)[1].tobytes()).decode()
+    plain = client.post("/api/analyze/base64", json={"image": b64}).json()["metrics"]
+    client.put("/api/calibration/profiles/device/cam-bright", json={"brightness_offset": 60})
+    calibrated = client.post("/api/analyze/base64",
+                             json={"image": b64, "meta": {"deviceId": "cam-bright"}}).json()["metrics"]
+    assert "calibration" not in plain
+    assert calibrated["calibration"] == {"scope": "device", "scope_id": "cam-bright", "version": 1}
+    assert calibrated["brightness_score"] > plain["brightness_score"]
+
+
+def test_save_profile_retries_when_a_concurrent_save_takes_the_version():
+    from backend.app.db import SessionLocal
+    from backend.app.services.calibration import profiles
+
+    with SessionLocal() as db, SessionLocal() as other:
+        execute = db.execute
+        raced = []
+
+        def racing(*args, **kwargs):
+            result = execute(*args, **kwargs)
+            # En annen arbeider lagrer versjon 1 mellom max(version) og innsettingen
+            if not raced:
+                raced.append(profiles.save_profile(other, "site", "race-site", brightness_offset=1))
+            return result
+
+        db.execute = racing
+        profile = profiles.save_profile(db, "site", "race-site", brightness_offset=2)
+    assert (raced[0].version, profile.version) == (1, 2)
+
+
+def test_profile_resolver_is_bounded_and_async_lookup_uses_cache():
+    import asyncio
+
+    from backend.app.services.calibration import profiles
+
+    resolver = profiles.ProfileResolver(ttl=60, maxsize=2)
+    for device in ("d1", "d2", "d3"):
+        assert resolver.get(device, None) is None
+    assert list(resolver._items) == [("d2", None), ("d3", None)]
+    assert resolver.cached("d1", None) is profiles._MISS and resolver.cached("d3", None) is None
+
+    client.put("/api/calibration/profiles/device/async-cam", json={"brightness_offset": 10})
+    profile = asyncio.run(profiles.for_request_async({"deviceId": "async-cam"}))
+    assert profile.scope_id == "async-cam"
+    assert profiles.resolver.cached("async-cam", None) == profile
+
+
+def test_job_state_is_visible_from_another_worker_pool(tmp_path):
+    import json
+    import threading
+
+    from backend.app.services.workers import JobFiles, WorkerPool
+
+    # To pooler med samme jobbkatalog = to gunicorn-workere på samme vert
+    owner, other = WorkerPool(workers=1, store=JobFiles(tmp_path)), WorkerPool(workers=1, store=JobFiles(tmp_path))
+    release = threading.Event()
+
+    def task(job):
+        job.report(0.5, "Halfway")
+        release.wait(5)
+        return {"ok": True}
+
+    try:
+        job = owner.submit("calibration", task)
+        for _ in range(500):
+            seen = other.get(job.id)
+            if seen is not None and seen.progress == 0.5:
+                break
+            release.wait(0.01)
+        assert (seen.status, seen.message) == ("running", "Halfway")
+        release.set()
+        done = other.wait(job.id, timeout=5)
+        assert (done.status, done.result) == ("done", {"ok": True})
+        assert [j.id for j in other.jobs("calibration")] == [job.id]
+        assert other.get("../../etc") is None and other.get("0123456789ab") is None
+    finally:
+        release.set()
+        owner.shutdown(wait=True)
 
+    # En jobb hvis prosess er borte blir aldri ferdig, og vises som feilet
+    (tmp_path / "0123456789ab.json").write_text(json.dumps(
+        {"kind": "calibration", "id": "0123456789ab", "status": "running", "created_at": 1.0, "pid": 2 ** 22 + 1}))
+    orphan = other.get("0123456789ab")
+    assert (orphan.status, orphan.error) == ("failed", "Worker process exited")
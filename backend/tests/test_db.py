@@ -0,0 +1,43 @@
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.orm import sessionmaker
+
+from backend.app.db import Base, build_engine, unit_of_work
+from backend.app.models.training import TrainingSessionRecord
+from backend.app.services import training_store
+from backend.app.services.training import Phase
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = build_engine(f"sqlite:///{tmp_path / 'uow.db'}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine, autoflush=False)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def _create(db, panel="hood"):
+    return training_store.create_session(db, car_brand="Volvo", panel=panel, color="black",
+                                         color_code="019", phase=Phase.BASE_INFO)
+
+
+def test_sqlite_profile_is_applied_on_connect(db):
+    assert db.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+    assert db.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+    assert db.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+
+
+def test_unit_of_work_commits_once_and_rolls_back_on_error(db):
+    with unit_of_work(db):
+        _create(db, "hood")
+        _create(db, "door")
+        assert db.in_transaction()
+    assert len(db.scalars(select(TrainingSessionRecord)).all()) == 2
+
+    with pytest.raises(RuntimeError):
+        with unit_of_work(db):
+            _create(db, "roof")
+            raise RuntimeError("boom")
+    assert {r.panel for r in db.scalars(select(TrainingSessionRecord))} == {"hood", "door"}
@@ -0,0 +1,52 @@
+import cv2
+import numpy as np
+
+
+def defect_panel(width: int = 1600, height: int = 1200, seed: int = 0):
+    """Panel with a dark blob (high spot), a bright band (streak) and fine arcs (holograms)."""
+    rng = np.random.default_rng(seed)
+    s = width / 1600
+    image = np.full((height, width, 3), (150, 140, 130), np.float32)
+    image *= np.linspace(0.9, 1.1, width, dtype=np.float32)[None, :, None]
+    image = np.clip(image + rng.normal(0, 2, image.shape), 0, 255).astype(np.uint8)
+    cv2.circle(image, (int(400 * s), int(400 * s)), int(60 * s), (110, 100, 95), -1)
+    image = cv2.GaussianBlur(image, (0, 0), 2 * s)
+    cv2.line(image, (int(900 * s), int(200 * s)), (int(1500 * s), int(260 * s)), (185, 175, 165), int(10 * s))
+    for _ in range(120):
+        cx, cy = int(rng.integers(1000, 1300) * s), int(rng.integers(750, 1000) * s)
+        start = int(rng.integers(0, 360))
+        cv2.ellipse(image, (cx, cy), (int(40 * s), int(40 * s)), 0, start, start + 40, (165, 155, 145), max(1, int(s)))
+    return image
+
+
+def _contains(bbox, point) -> bool:
+    x, y, w, h = bbox
+    return x <= point[0] <= x + w and y <= point[1] <= y + h
+
+
+def test_defects_are_localized_and_classified():
+    from backend.app.core.coatvision_core import analyze_coating
+
+    metrics = analyze_coating(defect_panel())
+    by_type = {d["type"]: d for d in metrics["defects"]}
+    assert metrics["defect_counts"] == {"high_spot": 1, "hologram": 1, "streak": 1}
+    assert _contains(by_type["high_spot"]["bbox"], (400, 400)) and by_type["high_spot"]["tone"] < 0
+    assert _contains(by_type["streak"]["bbox"], (1200, 230))
+    assert _contains(by_type["hologram"]["bbox"], (1150, 875))
+    assert all(0 < d["severity"] <= 1 for d in metrics["defects"])
+
+
+def test_clean_panel_has_no_defects_and_boxes_scale_with_resolution():
+    from backend.app.services import defects
+
+    clean = np.clip(np.random.default_rng(1).normal(140, 2, (900, 1200)), 0, 255).astype(np.uint8)
+    assert defects.detect(clean, cv2.Canny(clean, 50, 150), cv2.Laplacian(clean, cv2.CV_64F)) == []
+
+    def spot(width):
+        gray = cv2.cvtColor(defect_panel(width, width * 3 // 4), cv2.COLOR_BGR2GRAY)
+        found = defects.detect(gray, cv2.Canny(gray, 50, 150), cv2.Laplacian(gray, cv2.CV_64F))
+        return min(found, key=lambda d: d.tone)
+
+    small, large = spot(800), spot(3200)
+    # Samme arbeidsrutenett uansett oppløsning; boksene skaleres med bildet
+    assert all(abs(b / 4 - a) <= 12 for a, b in zip(small.bbox, large.bbox))
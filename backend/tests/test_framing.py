@@ -0,0 +1,59 @@
+import base64
+
+import cbor2
+import cv2
+import msgpack
+import numpy as np
+from fastapi.testclient import TestClient
+
+from backend.app.main import app
+
+client = TestClient(app)
+
+
+def _jpeg() -> bytes:
+    image = np.full((48, 64, 3), 120, dtype=np.uint8)
+    cv2.rectangle(image, (10, 10), (40, 30), (20, 200, 20), -1)
+    return cv2.imencode(".jpg", image)[1].tobytes()
+
+
+def test_raw_jpeg_matches_json_base64():
+    jpeg = _jpeg()
+    as_json = client.post("/api/analyze/base64", json={"image": base64.b64encode(jpeg).decode()})
+    as_raw = client.post("/api/analyze/base64", content=jpeg, headers={"content-type": "image/jpeg"})
+    assert as_json.status_code == as_raw.status_code == 200
+    assert as_json.json()["metrics"] == as_raw.json()["metrics"]
+
+
+def test_live_msgpack_envelope_and_msgpack_response():
+    body = msgpack.packb({"frame": _jpeg(), "meta": {"device": "cam-1", "seq": 7}})
+    r = client.post(
+        "/v1/coatvision/analyze-live",
+        content=body,
+        headers={"content-type": "application/msgpack", "accept": "application/msgpack"},
+    )
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/msgpack"
+    result = msgpack.unpackb(r.content)
+    assert result["mode"] == "live"
+    assert result["request"] == {"device": "cam-1", "seq": 7, "source": "live"}
+
+
+def test_live_cbor_and_raw_query_metadata():
+    r = client.post("/v1/coatvision/analyze-live", content=cbor2.dumps({"frame": _jpeg()}),
+                    headers={"content-type": "application/cbor", "accept": "application/cbor"})
+    assert r.status_code == 200 and cbor2.loads(r.content)["mode"] == "live"
+
+    r = client.post("/v1/coatvision/analyze-live?device=cam-2", content=_jpeg(),
+                    headers={"content-type": "image/jpeg"})
+    assert r.status_code == 200
+    assert r.json()["request"] == {"device": "cam-2", "source": "live"}
+
+
+def test_bad_bodies_are_rejected():
+    r = client.post("/v1/coatvision/analyze-live", json={"frame": {}})
+    assert r.status_code == 400 and r.json()["detail"] == "Missing frame.frameBase64"
+    r = client.post("/api/analyze/base64", content=b"not an image", headers={"content-type": "image/jpeg"})
+    assert r.status_code == 400
+    r = client.post("/api/analyze/base64", content=b"x", headers={"content-type": "text/plain"})
+    assert r.status_code == 415
@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+from backend.app.main import app
+
+client = TestClient(app)
+
+START = datetime(2025, 1, 6, 9, tzinfo=timezone.utc)
+
+
+def _record_year(vehicle_id: str):
+    from backend.app.db import SessionLocal, init_db
+    from backend.app.services import analysis_store
+
+    init_db()
+    with SessionLocal() as db:
+        # To analyser per dag i ett år; CQI faller 1 poeng per 30 dager
+        for day in range(365):
+            for hour in (0, 6):
+                at = START + timedelta(days=day, hours=hour)
+                analysis_store.record_analysis(db, vehicle_id, "hood", {"cqi": 90 - day / 30, "cvi": 70.0}, at=at)
+
+
+def test_series_tiers_downsample_and_retain():
+    from backend.app.db import SessionLocal
+    from backend.app.models.series import PanelSeries
+    from backend.app.services import series
+
+    _record_year("TS-1")
+    with SessionLocal() as db:
+        rows = {r.tier: r for r in db.query(PanelSeries).filter_by(vehicle_id="TS-1", panel="hood")}
+        assert rows["raw"].points == 2 * 90 + 1 and rows["raw"].retained_from > 0
+        assert rows["day"].points == 365 and rows["day"].retained_from == 0
+        assert rows["week"].points == 53
+        assert len(rows["raw"].data) == rows["raw"].points * series.point_dtype().itemsize
+
+    recent = client.get("/api/history/TS-1/hood", params={"start": (START + timedelta(days=350)).isoformat()}).json()
+    assert recent["tier"] == "raw" and len(recent["points"]) == 30
+
+    everything = client.get("/api/history/TS-1/hood", params={"max_points": 100}).json()
+    assert everything["tier"] == "day" and len(everything["points"]) <= 100
+    assert sum(p["n"] for p in everything["points"]) == 730
+    first = everything["points"][0]
+    assert first["cqi_min"] <= first["cqi"] <= first["cqi_max"] and first["t"].startswith("2025-01-06")
+
+    ranged = client.get("/api/history/TS-1/hood", params={
+        "start": (START + timedelta(days=10)).isoformat(), "end": (START + timedelta(days=19, hours=12)).isoformat(),
+    }).json()
+    assert ranged["tier"] == "day" and len(ranged["points"]) == 10
+
+
+def test_trend_endpoints():
+    _record_year("TS-2")
+    trend = client.get("/api/history/TS-2/hood/trend").json()
+    assert trend["direction"] == "declining" and trend["analyses"] == 730
+    assert abs(trend["cqi_per_30d"] + 1.0) < 0.02
+    assert abs(trend["cqi_change"] + 364 / 30) < 0.01
+
+    recent = client.get("/api/history/TS-2/hood/trend", params={"days": 30}).json()
+    assert recent["analyses"] == 62 and recent["tier"] == "day"
+
+    vehicle = client.get("/api/history/TS-2").json()
+    assert [p["panel"] for p in vehicle["panels"]] == ["hood"]
+    assert client.get("/api/history/NOPE").status_code == 404
+    assert client.get("/api/history/NOPE/hood").status_code == 404
+
+
+def test_panel_named_trend_has_history():
+    from backend.app.db import SessionLocal
+    from backend.app.services import analysis_store
+
+    with SessionLocal() as db:
+        analysis_store.record_analysis(db, "TS-3", "trend", {"cqi": 80.0, "cvi": 70.0}, at=START)
+    out = client.get("/api/history/TS-3/trend").json()
+    assert out["panel"] == "trend" and len(out["points"]) == 1
+    assert [p["panel"] for p in client.get("/api/history/TS-3").json()["panels"]] == ["trend"]
+
+
+def test_concurrent_first_appends_keep_both_points():
+    from backend.app.db import SessionLocal
+    from backend.app.services import series
+
+    with SessionLocal() as db, SessionLocal() as other:
+        execute = db.execute
+        raced = []
+
+        def racing(*args, **kwargs):
+            result = execute(*args, **kwargs)
+            # En annen arbeider oppretter panelets rader etter at denne fant dem manglende
+            if not raced:
+                raced.append(series.append(other, "TS-4", "roof", START, 70.0, 60.0))
+                other.commit()
+            return result
+
+        db.execute = racing
+        series.append(db, "TS-4", "roof", START + timedelta(hours=1), 80.0, 60.0)
+        db.commit()
+    out = client.get("/api/history/TS-4/roof").json()
+    assert [p["cqi"] for p in out["points"]] == [70.0, 80.0]
@@ -0,0 +1,33 @@
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+
+from backend.app.db import Base, build_engine
+from backend.app.main import app
+from backend.app.models.catalog import Producer, Product
+from backend.app.services import knowledge
+
+
+def test_index_covers_docs_and_catalog(tmp_path):
+    engine = build_engine(f"sqlite:///{tmp_path / 'kb.db'}")
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as db:
+        db.add(Producer(id=1, name="Nordic Coat", country="NO"))
+        db.add(Product(producer_id=1, name="Graphene Shield", product_type="graphene", cure_time=720))
+        db.commit()
+        index = tmp_path / "knowledge.db"
+        assert knowledge.build_index(db, index) > 10
+
+    hits = knowledge.search("graphene shield herdetid", path=index)
+    assert hits[0].source.startswith("product:") and "720" in hits[0].snippet
+    faq_hits = knowledge.search("How much does OpenAI cost?", path=index)
+    assert knowledge.direct_answer("How much does OpenAI cost?", faq_hits).source == "AI_FAQ.md#How much does OpenAI cost?"
+    assert knowledge.direct_answer("openai pricing for polishing", faq_hits) is None
+    assert knowledge.search('" OR * NEAR(', path=index) == []
+    engine.dispose()
+
+
+def test_chat_answers_faq_directly_without_llm():
+    r = TestClient(app).post("/api/lyxbot/chat", json={"message": "Is my API key secure?"})
+    assert r.status_code == 200
+    body = r.json()
+    assert body["source"] == "faq" and body["sources"] == ["AI_FAQ.md#Is my API key secure?"]
@@ -0,0 +1,48 @@
+import base64
+
+import cv2
+import numpy as np
+from fastapi.testclient import TestClient
+
+from backend.app.core.coatvision_core import analyze_coating
+from backend.app.main import app
+from backend.app.services import lighting
+
+client = TestClient(app)
+
+
+def _panel(exposure: float = 1.0, falloff: float = 0.0) -> np.ndarray:
+    """Blue panel filling the middle of a textured gray background, lit with a falloff."""
+    rng = np.random.default_rng(1)
+    image = rng.integers(70, 110, (360, 480, 3), dtype=np.uint8)
+    cv2.rectangle(image, (80, 60), (400, 300), (170, 110, 60), -1)
+    ramp = exposure * (1.0 - falloff * np.linspace(0, 1, 480, dtype=np.float32))
+    return np.clip(image * ramp[None, :, None], 0, 255).astype(np.uint8)
+
+
+def test_flatten_segments_panel_and_evens_out_light():
+    frame = _panel(falloff=0.5)
+    result = lighting.normalize(frame, "flatten")
+    assert 0.35 < result.panel_fraction < 0.55
+    assert result.mask[180, 240] == 255 and result.mask[10, 10] == 0
+
+    panel = frame[80:280, 100:380, 0].astype(np.float32)
+    left, right = panel[:, :40].mean(), panel[:, -40:].mean()
+    assert abs(left - right) / left < 0.1  # uten normalisering faller høyre side ~40 %
+
+
+def test_brightness_is_stable_across_exposure_with_flatten():
+    def spread(mode):
+        values = [analyze_coating(_panel(e), lighting=mode)["brightness_score"] for e in (0.6, 1.0, 1.4)]
+        return max(values) - min(values)
+
+    assert spread("flatten") < spread("off") / 5
+
+
+def test_lighting_mode_from_request_meta():
+    b64 = base64.b64encode(cv2.imencode(".png", _panel())[1].tobytes()).decode()
+    r = client.post("/api/analyze/base64", json={"image": b64, "meta": {"lighting": "clahe"}})
+    assert r.status_code == 200
+    assert r.json()["metrics"]["lighting"]["mode"] == "clahe"
+    assert "lighting" not in client.post("/api/analyze/base64", json={"image": b64}).json()["metrics"]
+    assert client.post("/api/analyze/base64", json={"image": b64, "meta": {"lighting": "sun"}}).status_code == 400
@@ -0,0 +1,94 @@
+import socket
+import threading
+import time
+
+import pytest
+import uvicorn
+from fastapi.testclient import TestClient
+
+from backend.app.main import app
+from backend.app.services import lyxbot
+from backend.scripts import openai_stub
+
+
+@pytest.fixture(scope="module")
+def stub_url():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(openai_stub.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    yield f"http://127.0.0.1:{port}/v1"
+    server.should_exit = True
+    thread.join(timeout=5)
+
+
+@pytest.fixture
+def client(stub_url, monkeypatch):
+    monkeypatch.setattr(lyxbot, "OPENAI_BASE_URL", stub_url)
+    monkeypatch.setattr(lyxbot, "OPENAI_API_KEY", "stub")
+    lyxbot._clients.clear()
+    lyxbot.response_cache.clear()
+    with TestClient(app) as c:
+        yield c
+
+
+def test_normalize_prompt_ignores_case_whitespace_and_punctuation():
+    assert lyxbot.normalize_prompt("  Hvor lenge  må coating herde?? ") == "hvor lenge må coating herde"
+
+
+def test_chat_is_cached_by_normalized_prompt(client):
+    calls = openai_stub.app.state.calls
+    first = client.post("/api/lyxbot/chat", json={"message": "Hvordan vasker jeg bilen?"}).json()
+    second = client.post("/api/lyxbot/chat", json={"message": "hvordan vasker jeg  bilen"}).json()
+    assert first["reply"] == "Stub-svar: Hvordan vasker jeg bilen?"
+    assert first["cached"] is False and first["source"] == "llm"
+    assert second["cached"] is True and second["reply"] == first["reply"]
+    assert openai_stub.app.state.calls == calls + 1
+
+
+def test_stream_forwards_deltas_and_fills_cache(client):
+    r = client.post("/api/lyxbot/chat/stream", json={"message": "Hva er keramisk coating"})
+    assert r.headers["content-type"].startswith("text/event-stream")
+    events = [line[6:] for line in r.text.splitlines() if line.startswith("data: ")]
+    assert events[-1] == "[DONE]" and len(events) > 3
+    assert client.post("/api/lyxbot/chat", json={"message": "hva er keramisk coating?"}).json()["cached"] is True
+
+
+def test_cache_ttl_and_size():
+    cache = lyxbot.ResponseCache(maxsize=1, ttl=60)
+    cache.put("a", "A")
+    cache.put("b", "B")
+    assert cache.get("a") is None and cache.get("b") == "B"
+    expired = lyxbot.ResponseCache(maxsize=4, ttl=-1)
+    expired.put("a", "A")
+    assert expired.get("a") is None
+
+
+def test_followers_retry_when_the_leader_is_cancelled(monkeypatch):
+    import asyncio
+
+    calls = []
+
+    async def complete(message, context):
+        calls.append(message)
+        if len(calls) == 1:
+            await asyncio.sleep(10)
+        return "svar"
+
+    monkeypatch.setattr(lyxbot, "_complete", complete)
+    lyxbot.response_cache.clear()
+
+    async def run():
+        leader = asyncio.create_task(lyxbot.get_reply("avbrutt leder"))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(lyxbot.get_reply("avbrutt leder"))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await asyncio.wait_for(follower, timeout=2)
+
+    assert asyncio.run(run()) == ("svar", False)
+    assert len(calls) == 2 and not lyxbot._inflight
@@ -0,0 +1,29 @@
+from fastapi.testclient import TestClient
+from backend.app.main import app
+from backend.app.services import metrics
+
+client = TestClient(app)
+
+
+def test_metrics_endpoint_exports_request_counters():
+    client.get("/api/wash/status")
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'coatvision_http_requests_total{route="/api/wash/status",method="GET",status="200"}' in r.text
+    assert "# TYPE coatvision_stage_seconds histogram" in r.text
+
+
+def test_stage_histogram_and_cache_ratio():
+    with metrics.stage("unit_test_stage"):
+        pass
+    assert metrics.STAGE_SECONDS.count("unit_test_stage") == 1
+
+    metrics.cache_hit("unit_test_cache")
+    metrics.cache_miss("unit_test_cache")
+    assert metrics.cache_hit_ratio("unit_test_cache") == 0.5
+
+
+def test_disabled_stage_is_shared_noop(monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", False)
+    assert metrics.stage("a") is metrics.stage("b")
@@ -0,0 +1,122 @@
+import json
+import os
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from backend.app.main import app
+
+client = TestClient(app)
+
+
+def test_parameter_sets_are_validated_and_content_versioned():
+    from backend.app.services import parameters
+
+    assert parameters.from_mapping({}).version == parameters.DEFAULT.version
+    assert parameters.from_mapping({"canny_low": 50}, source="file").version == parameters.DEFAULT.version
+    assert parameters.from_mapping({"canny_low": 40}).version != parameters.DEFAULT.version
+    for bad in ({"unknown": 1}, {"canny_low": 200, "canny_high": 100}, {"canny_low": 1.5},
+                {"max_hue_std": 0}, {"cqi_weights": {"coverage": 1.0}},
+                {"cvi_weights": {"color_uniformity": 0.5, "saturation": 0.5, "smoothness": 0.5, "flatness": 0}}):
+        with pytest.raises(ValueError):
+            parameters.from_mapping(bad)
+
+
+def test_file_source_hot_reloads_and_keeps_last_good_set(tmp_path):
+    from backend.app.services import parameters
+
+    path = tmp_path / "params.json"
+    path.write_text(json.dumps({"max_laplacian_variance": 4000}))
+    source = parameters.ParameterSource(str(path), ttl=0)
+    first = source.current()
+    assert (first.source, first.max_laplacian_variance) == ("file", 4000.0)
+
+    path.write_text(json.dumps({"max_laplacian_variance": 3000, "canny_high": 120}))
+    os.utime(path, ns=(1, 1))
+    second = source.current()
+    assert (second.max_laplacian_variance, second.canny_high) == (3000.0, 120)
+    assert second.version != first.version
+
+    path.write_text("{broken")
+    os.utime(path, ns=(2, 2))
+    assert source.current() is second
+
+
+def test_analysis_uses_and_stamps_parameter_version():
+    from backend.app.core.coatvision_core import analyze_coating
+    from backend.app.services import parameters
+
+    rng = np.random.default_rng(3)
+    image = np.clip(rng.normal(120, 25, (120, 160, 3)), 0, 255).astype(np.uint8)
+    default = analyze_coating(image.copy(), params=parameters.DEFAULT)
+    strict = parameters.from_mapping({"max_laplacian_variance": 20000, "canny_low": 10, "canny_high": 30})
+    other = analyze_coating(image.copy(), params=strict)
+    assert default["analysis_version"] == parameters.DEFAULT.version
+    assert other["analysis_version"] == strict.version
+    assert other["smoothness"] > default["smoothness"]
+    assert other["edge_density"] > default["edge_density"]
+
+
+def test_saved_set_becomes_active_and_marks_results_stale():
+    from backend.app.db import SessionLocal, init_db
+    from backend.app.services import analysis_store, parameters
+
+    init_db()
+    with SessionLocal() as db:
+        analysis_store.record_analysis(db, "PV-1", "roof", {"cqi": 80.0, "cvi": 70.0,
+                                                           "analysis_version": parameters.DEFAULT.version})
+    before = client.get("/api/parameters/stale").json()
+
+    assert client.put("/api/parameters", json={"canny_low": 500, "canny_high": 100}).status_code == 422
+    r = client.put("/api/parameters", json={"max_hue_std": 60, "note": "tighter hue"})
+    try:
+        assert r.status_code == 200
+        saved = r.json()["saved"]
+        active = client.get("/api/parameters").json()
+        assert active["version"] == saved["version"] != parameters.DEFAULT.version
+        assert (active["source"], active["set_id"], active["max_hue_std"]) == ("db", saved["set_id"], 60.0)
+        assert client.get("/api/parameters/sets").json()["sets"][0]["note"] == "tighter hue"
+        stale = client.get("/api/parameters/stale").json()
+        assert stale["analysis_records"]["stale"] == before["analysis_records"]["stale"] + 1
+    finally:
+        # Samme verdier som standard gir samme versjon som før testen
+        client.put("/api/parameters", json=parameters.DEFAULTS)
+    assert client.get("/api/parameters").json()["version"] == parameters.DEFAULT.version
+
+
+def test_weights_are_read_only_and_sets_pickle():
+    import pickle
+
+    from backend.app.services import parameters
+
+    params = parameters.from_mapping({"canny_low": 40}, source="db", set_id=7)
+    with pytest.raises(TypeError):
+        params.cqi_weights["coverage"] = 1.0
+    copy = pickle.loads(pickle.dumps(params))
+    assert copy == params and (copy.version, copy.source, copy.set_id) == (params.version, "db", 7)
+
+
+def test_database_source_refreshes_off_the_calling_thread(monkeypatch):
+    import threading
+
+    from backend.app.services import parameters
+
+    source = parameters.ParameterSource("", ttl=60)
+    release, calls = threading.Event(), []
+    newer = parameters.from_mapping({"canny_low": 40}, source="db", set_id=1)
+
+    def slow_db():
+        calls.append(threading.current_thread().name)
+        release.wait(5)
+        return ("db", 1), lambda: newer
+
+    monkeypatch.setattr(source, "_db", slow_db)
+    # Kallet venter ikke på databasen; det gir settet det allerede har
+    assert source.current() is parameters.DEFAULT
+    assert source.current() is parameters.DEFAULT
+    release.set()
+    for thread in threading.enumerate():
+        if thread.name == "analysis-params-refresh":
+            thread.join(5)
+    assert calls == ["analysis-params-refresh"]
+    assert source.current() is newer
@@ -0,0 +1,52 @@
+from fastapi.testclient import TestClient
+
+from backend.app.db_async import async_url
+from backend.app.main import app
+
+client = TestClient(app)
+
+
+def test_async_url_swaps_in_async_driver():
+    assert async_url("sqlite:////tmp/a.db") == "sqlite+aiosqlite:////tmp/a.db"
+    assert async_url("postgresql://u:p@h/db") == "postgresql+asyncpg://u:p@h/db"
+    assert async_url("sqlite+aiosqlite:///x.db") == "sqlite+aiosqlite:///x.db"
+
+
+def test_create_and_list_producers_and_products():
+    producer = client.post("/api/producers", json={"name": "Nordic Coat", "country": "NO"}).json()["producer"]
+    r = client.post("/api/products", json={"producer_id": producer["id"], "name": "Ceramic Pro", "cure_time": 60})
+    assert r.status_code == 200
+
+    names = [p["name"] for p in client.get("/api/producers").json()["producers"]]
+    assert "Nordic Coat" in names
+    products = client.get("/api/products", params={"producer_id": producer["id"]}).json()["products"]
+    assert [(p["name"], p["cure_time"]) for p in products] == [("Ceramic Pro", 60)]
+
+
+def test_product_for_unknown_producer_is_404():
+    r = client.post("/api/products", json={"producer_id": 999999, "name": "Ghost"})
+    assert r.status_code == 404
+
+
+def test_products_keyset_pages_filters_and_search():
+    producer = client.post("/api/producers", json={"name": "Paging Co"}).json()["producer"]
+    for i in range(5):
+        client.post("/api/products", json={"producer_id": producer["id"], "name": f"Shield_{i}",
+                                           "product_type": "wax" if i % 2 else "ceramic"})
+    params = {"producer_id": producer["id"], "limit": 2}
+
+    seen, before_id = [], None
+    while True:
+        page = client.get("/api/products", params={**params, **({"before_id": before_id} if before_id else {})}).json()
+        seen += [p["name"] for p in page["products"]]
+        before_id = page["next_before_id"]
+        if before_id is None:
+            break
+    assert seen == [f"Shield_{i}" for i in reversed(range(5))]
+
+    wax = client.get("/api/products", params={**params, "limit": 10, "product_type": "wax"}).json()["products"]
+    assert [p["name"] for p in wax] == ["Shield_3", "Shield_1"]
+    # % og _ i søket er bokstavelige, og søket er case-insensitivt
+    found = client.get("/api/products", params={"q": "shield_2"}).json()["products"]
+    assert [p["name"] for p in found] == ["Shield_2"]
+    assert client.get("/api/products", params={"q": "%"}).json()["products"] == []
@@ -0,0 +1,127 @@
+import asyncio
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from backend.app.services import ratelimit
+from backend.app.services.ratelimit import MemoryBuckets, RateLimitMiddleware, SQLiteBuckets, client_key
+
+
+def _app(**kwargs):
+    app = FastAPI()
+
+    @app.post("/api/analyze/")
+    async def analyze(request: Request):
+        return {"size": len(await request.body())}
+
+    @app.get("/api/jobs/")
+    async def jobs():
+        return {"jobs": []}
+
+    app.add_middleware(RateLimitMiddleware, enabled=True, backend=MemoryBuckets(),
+                       budgets={"heavy": (0.001, 2), "cheap": (0.001, 5)}, **kwargs)
+    return app
+
+
+def test_heavy_and_cheap_budgets_are_separate_and_keyed_per_client(monkeypatch):
+    monkeypatch.setattr(ratelimit, "API_KEY_HASHES", ratelimit._key_hashes("other"))
+    client = TestClient(_app())
+    statuses = [client.post("/api/analyze/", content=b"x").status_code for _ in range(3)]
+    assert statuses == [200, 200, 429]
+    assert client.post("/api/analyze/", content=b"x").headers["retry-after"]
+    # Eget budsjett for billige ruter, og en annen API-nøkkel har egen bøtte
+    assert client.get("/api/jobs/").status_code == 200
+    assert client.post("/api/analyze/", content=b"x", headers={"x-api-key": "other"}).status_code == 200
+    # Ukjente nøkler gir ingen ny bøtte
+    assert client.post("/api/analyze/", content=b"x", headers={"x-api-key": "random"}).status_code == 429
+
+
+def test_rejection_happens_before_the_body_is_read():
+    app = _app()
+    received = []
+
+    async def run():
+        scope = {"type": "http", "method": "POST", "path": "/api/analyze/", "headers": [], "client": ("9.9.9.9", 1),
+                 "query_string": b"", "root_path": "", "http_version": "1.1", "scheme": "http", "server": ("t", 80)}
+
+        async def receive():
+            received.append(1)
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            pass
+
+        middleware = app.build_middleware_stack()
+        for _ in range(3):
+            await middleware(scope, receive, send)
+
+    asyncio.run(run())
+    assert len(received) == 2  # tredje kall avvist uten å lese body
+
+
+def test_sqlite_backend_is_shared_between_instances(tmp_path):
+    a, b = SQLiteBuckets(str(tmp_path / "rl.db")), SQLiteBuckets(str(tmp_path / "rl.db"))
+    assert a.take("k", 1.0, 2, now=100.0) == 0
+    assert b.take("k", 1.0, 2, now=100.0) == 0
+    assert a.take("k", 1.0, 2, now=100.0) > 0
+    assert b.take("k", 1.0, 2, now=101.0) == 0  # fylt på etter ett sekund
+    b.take("other", 1.0, 2, now=101.0 + ratelimit.IDLE_S + ratelimit.PRUNE_EVERY_S)
+    assert b._connect().execute("SELECT key FROM buckets").fetchall() == [("other",)]
+
+
+def test_sqlite_backend_runs_off_the_event_loop(tmp_path):
+    app = FastAPI()
+
+    @app.post("/api/analyze/")
+    async def analyze():
+        return {}
+
+    backend = SQLiteBuckets(str(tmp_path / "rl.db"))
+    on_loop = []
+    take = backend.take
+
+    def traced_take(*args):
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(True)
+        except RuntimeError:
+            on_loop.append(False)
+        return take(*args)
+
+    backend.take = traced_take
+    app.add_middleware(RateLimitMiddleware, enabled=True, backend=backend, budgets={"heavy": (1, 5), "cheap": (1, 5)})
+    assert TestClient(app).post("/api/analyze/").status_code == 200
+    assert on_loop == [False]
+
+
+def test_client_key_prefers_known_api_key_then_ip(monkeypatch):
+    monkeypatch.setattr(ratelimit, "API_KEY_HASHES", ratelimit._key_hashes("abc, def"))
+    assert client_key({"headers": [(b"x-api-key", b"abc")], "client": ("1.2.3.4", 1)}).startswith("key:")
+    assert client_key({"headers": [(b"x-api-key", b"xyz")], "client": ("1.2.3.4", 1)}) == "ip:1.2.3.4"
+    assert client_key({"headers": [(b"authorization", b"Bearer junk")], "client": ("1.2.3.4", 1)}) == "ip:1.2.3.4"
+
+
+def test_lyxbot_chat_is_a_heavy_path():
+    # Chat går til OpenAI og er den dyreste LYXbot-ruten
+    assert ratelimit.budget_for("/api/lyxbot/chat") == "heavy"
+    assert ratelimit.budget_for("/api/lyxbot/chat/stream") == "heavy"
+    assert ratelimit.budget_for("/api/lyxbot/status") == "cheap"
+
+
+def test_sqlite_backend_fails_open_while_another_worker_holds_the_lock(tmp_path):
+    import sqlite3
+
+    buckets = SQLiteBuckets(str(tmp_path / "rl.db"))
+    assert buckets.take("k", 0.001, 1, now=100.0) == 0
+    assert buckets.take("k", 0.001, 1, now=100.0) > 0
+    other = sqlite3.connect(str(tmp_path / "rl.db"), isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    try:
+        before = ratelimit.LIMITER_ERRORS.value("sqlite")
+        # Tom bøtte, men låst fil: forespørselen slippes gjennom i stedet for å gi 500
+        assert buckets.take("k", 0.001, 1, now=100.0) == 0
+        assert ratelimit.LIMITER_ERRORS.value("sqlite") == before + 1
+    finally:
+        other.execute("ROLLBACK")
+        other.close()
+    assert buckets.take("k", 0.001, 1, now=100.0) > 0
@@ -0,0 +1,100 @@
+import os
+
+import cv2
+import numpy as np
+
+
+def _images(tmp_path, count=3):
+    folder = tmp_path / "images"
+    (folder / "nested").mkdir(parents=True)
+    paths = []
+    for i in range(count):
+        path = folder / ("nested" if i == count - 1 else "") / f"panel_{i}.png"
+        cv2.imwrite(str(path), np.full((60, 80, 3), 60 + 40 * i, np.uint8))
+        paths.append(str(path))
+    (folder / "notes.txt").write_text("not an image")
+    (folder / "broken.jpg").write_bytes(b"not a jpeg")
+    return folder, sorted(paths)
+
+
+def _rows():
+    from backend.app.db import SessionLocal
+    from backend.app.models.analysis import ImageAnalysis
+
+    with SessionLocal() as db:
+        return {r.path: r for r in db.query(ImageAnalysis)}
+
+
+def test_reanalysis_skips_current_images_and_redoes_stale_ones(tmp_path, monkeypatch):
+    from backend.app.core import coatvision_core
+    from backend.app.services import parameters, reanalysis
+
+    folder, paths = _images(tmp_path)
+    checkpoint = reanalysis.Checkpoint(tmp_path / "checkpoint.json")
+    first = reanalysis.run([str(folder)], workers=0, batch=2, checkpoint=checkpoint, progress=None)
+    assert (first.candidates, first.analyzed, first.failed, first.batches) == (4, 3, 1, 2)
+    rows = _rows()
+    first_version = coatvision_core.analysis_version()
+    assert rows[paths[0]].analysis_version == first_version
+    assert rows[paths[0]].cqi is not None and rows[str(folder / "broken.jpg")].cqi is None
+    assert rows[str(folder / "broken.jpg")].error
+    assert not checkpoint.path.exists()
+
+    again = reanalysis.run([str(folder)], workers=0, checkpoint=checkpoint, progress=None)
+    # Den ødelagte filen prøves igjen; de tre andre er oppdaterte
+    assert (again.skipped, again.analyzed, again.failed) == (3, 0, 1)
+    assert _rows()[paths[0]].lighting == "off"
+
+    # Samme parametre med en annen lysmodus gir andre tall, så radene er utdaterte
+    flattened = reanalysis.run([str(folder)], workers=0, checkpoint=checkpoint, lighting="flatten", progress=None)
+    assert (flattened.skipped, flattened.analyzed) == (0, 3)
+    assert _rows()[paths[0]].lighting == "flatten"
+    from_db = reanalysis.run([], from_db=True, workers=0, checkpoint=checkpoint, lighting="off", progress=None)
+    assert from_db.analyzed == 3 and _rows()[paths[0]].lighting == "off"
+
+    os.utime(paths[1], ns=(1, 1))
+    params_file = tmp_path / "params.json"
+    params_file.write_text('{"max_laplacian_variance": 4000}')
+    monkeypatch.setattr(parameters, "source", parameters.ParameterSource(str(params_file), ttl=0))
+    stale = reanalysis.run([], from_db=True, workers=0, checkpoint=checkpoint, progress=None)
+    assert stale.analyzed == 3 and stale.skipped == 0
+    assert _rows()[paths[1]].mtime_ns == 1
+    assert _rows()[paths[1]].analysis_version == coatvision_core.analysis_version() != first_version
+
+
+def test_reanalysis_resumes_from_checkpoint_with_process_pool(tmp_path):
+    from backend.app.core.coatvision_core import analysis_version
+    from backend.app.services import reanalysis
+
+    folder, paths = _images(tmp_path)
+    os.remove(folder / "broken.jpg")
+    checkpoint = reanalysis.Checkpoint(tmp_path / "checkpoint.json")
+    key = reanalysis.run_key(analysis_version(), [str(folder)], False, None)
+    checkpoint.save(key, paths[0], reanalysis.Stats())
+
+    stats = reanalysis.run([str(folder)], workers=1, prefetch=2, force=True, checkpoint=checkpoint, progress=None)
+    assert (stats.resumed_past, stats.analyzed, stats.failed) == (1, 2, 0)
+    assert stats.images_per_sec > 0
+    assert not checkpoint.path.exists()
+
+
+def test_fresh_process_reanalyzes_with_the_saved_database_set(tmp_path, monkeypatch):
+    from backend.app.db import SessionLocal
+    from backend.app.services import parameters, reanalysis
+
+    folder, paths = _images(tmp_path, count=1)
+    os.remove(folder / "broken.jpg")
+    with SessionLocal() as db:
+        saved = parameters.save_set(db, {"max_laplacian_variance": 1234})
+    try:
+        # Ny prosess: kilden har ikke lest databasen ennå
+        monkeypatch.setattr(parameters, "source", parameters.ParameterSource("", ttl=60))
+        stats = reanalysis.run([str(folder)], workers=0, force=True,
+                               checkpoint=reanalysis.Checkpoint(tmp_path / "checkpoint.json"), progress=None)
+        assert stats.analyzed == 1
+        assert _rows()[paths[0]].analysis_version == saved.version != parameters.DEFAULT.version
+    finally:
+        monkeypatch.undo()
+        with SessionLocal() as db:
+            parameters.save_set(db, parameters.DEFAULTS)
+    assert parameters.current().version == parameters.DEFAULT.version
@@ -0,0 +1,23 @@
+import json
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+from backend.app.main import app
+from backend.app.responses import FastJSONResponse, dumps
+
+client = TestClient(app)
+
+
+def test_dumps_handles_numpy_and_views():
+    grid = np.arange(12, dtype=np.float32).reshape(3, 4)
+    body = json.loads(dumps({"heatmap": grid, "column": grid[:, 1], "peak": np.float32(2.5), "n": np.int64(3)}))
+    assert body == {"heatmap": grid.tolist(), "column": [1.0, 5.0, 9.0], "peak": 2.5, "n": 3}
+
+
+def test_fast_response_matches_default_json_for_routes():
+    assert FastJSONResponse({"a": [1, 2]}).body == b'{"a":[1,2]}'
+    r = client.get("/api/jobs/")
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/json"
+    assert "jobs" in r.json()
@@ -0,0 +1,124 @@
+import base64
+
+import cv2
+import numpy as np
+from fastapi.testclient import TestClient
+from backend.app.main import app
+
+client = TestClient(app)
+
+
+def _frame(seed=0):
+    rng = np.random.default_rng(seed)
+    return np.clip(rng.normal(120, 25, (120, 160, 3)), 0, 255).astype(np.uint8)
+
+
+def test_shadow_records_deltas_without_changing_primary_result():
+    from backend.app.core.coatvision_core import analyze_coating
+    from backend.app.services import parameters, shadow
+
+    rows = []
+    runner = shadow.ShadowRunner(sample_rate=1.0, use_process=False, store=rows.append)
+    candidate = parameters.from_mapping({"max_laplacian_variance": 20000, "canny_low": 10, "canny_high": 30})
+    runner.set_candidate(shadow.Candidate.from_parameters(candidate))
+    try:
+        for seed in range(3):
+            frame = _frame(seed)
+            expected = analyze_coating(frame.copy())
+            assert runner.analyze(frame) == expected
+        assert runner.wait()
+    finally:
+        runner.shutdown()
+
+    assert len(rows) == 3 and not any(r["error"] for r in rows)
+    assert {r["candidate_version"] for r in rows} == {candidate.version}
+    assert all(r["cqi_delta"] > 0 and r["candidate_cpu_ms"] > 0 for r in rows)
+    assert '"edge_density"' in rows[0]["deltas"] and "defects.streak" in rows[0]["deltas"]
+
+
+def test_cpu_budget_drops_samples_at_the_request():
+    from backend.app.services import parameters, shadow
+
+    rows = []
+    runner = shadow.ShadowRunner(sample_rate=1.0, cpu_budget=0.001, use_process=False, store=rows.append)
+    runner.set_candidate(shadow.Candidate.from_parameters(parameters.from_mapping({"canny_low": 40})))
+    runner.budget.charge(runner.budget.burst + 1.0)
+    dropped = shadow.SAMPLES.value("dropped_budget")
+    try:
+        assert runner.analyze(_frame())["cqi"] > 0
+        assert runner.wait()
+    finally:
+        runner.shutdown()
+    assert rows == [] and shadow.SAMPLES.value("dropped_budget") == dropped + 1
+    assert runner.budget.wait_s() > 100
+
+
+def test_candidate_runs_in_low_priority_process():
+    from backend.app.services import parameters, shadow
+
+    rows = []
+    runner = shadow.ShadowRunner(sample_rate=1.0, use_process=True, store=rows.append)
+    runner.set_candidate(shadow.Candidate.from_parameters(parameters.from_mapping({"max_hue_std": 45})))
+    try:
+        runner.analyze(_frame())
+        assert runner.wait(timeout=60)
+    finally:
+        runner.shutdown()
+    assert len(rows) == 1 and rows[0]["error"] is None and rows[0]["cqi_delta"] < 0
+
+
+def test_shadow_endpoints_configure_and_summarize(monkeypatch):
+    from backend.app.services import shadow
+
+    monkeypatch.setattr(shadow.runner, "use_process", False)
+    assert client.put("/api/shadow", json={"parameters": {"canny_low": 999, "canny_high": 1}}).status_code == 422
+    status = client.put("/api/shadow", json={"parameters": {"canny_low": 20, "canny_high": 60},
+                                              "sample_rate": 1.0, "label": "low-canny"}).json()
+    try:
+        assert status["enabled"] and status["candidate"]["label"] == "low-canny"
+        image = base64.b64encode(cv2.imencode(".png", _frame(5))[1].tobytes()).decode()
+        for _ in range(2):
+            assert client.post("/api/analyze/base64", json={"image": image}).status_code == 200
+        assert shadow.runner.wait()
+        out = client.get("/api/shadow/summary").json()
+        assert out["candidate_version"] == status["candidate"]["version"] and out["samples"] == 2
+        assert out["metrics"]["edge_density"]["mean"] > 0
+        assert out["timing"]["candidate_ms_p50"] > 0 and out["timing"]["primary_ms_p50"] > 0
+        assert out["versions"][0]["candidate"] == "low-canny"
+    finally:
+        client.delete("/api/shadow")
+        shadow.runner.set_candidate(None, sample_rate=0.0)
+    assert not client.get("/api/shadow/status").json()["enabled"]
+    assert client.get("/api/shadow/summary", params={"candidate_version": "0-missing"}).status_code == 404
+
+
+def test_candidate_set_through_one_worker_reaches_the_others():
+    from backend.app.services import shadow
+
+    # En annen server-worker: egen runner og egen kilde mot samme database
+    other = shadow.ShadowRunner(sample_rate=0.0, use_process=False, shared=shadow.CandidateSource(ttl=60))
+    status = client.put("/api/shadow", json={"parameters": {"canny_low": 25, "canny_high": 75},
+                                              "sample_rate": 0.5, "label": "shared"}).json()
+    try:
+        other.shared.refresh()
+        seen = other.status()
+        assert seen["enabled"] and seen["sample_rate"] == 0.5
+        assert seen["candidate"] == status["candidate"] and seen["candidate"]["label"] == "shared"
+    finally:
+        client.delete("/api/shadow")
+    other.shared.refresh()
+    assert other.candidate() is None and not other.status()["enabled"]
+    assert not client.get("/api/shadow/status").json()["enabled"]
+
+
+def test_cpu_budget_is_split_across_server_workers():
+    import os
+    import subprocess
+    import sys
+    from pathlib import Path
+
+    probe = "from backend.app.services import shadow; print(shadow.CPU_BUDGET, shadow.runner.status()['server_workers'])"
+    env = {**os.environ, "WEB_CONCURRENCY": "4", "COATVISION_SHADOW_CPU_BUDGET": "0.2"}
+    out = subprocess.run([sys.executable, "-c", probe], cwd=str(Path(__file__).resolve().parents[2]),
+                         env=env, capture_output=True, text=True, check=True)
+    assert out.stdout.strip().splitlines()[-1] == "0.05 4"
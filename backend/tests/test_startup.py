@@ -0,0 +1,27 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+from backend.app.main import app
+
+client = TestClient(app)
+REPO_DIR = Path(__file__).resolve().parents[2]
+
+
+def test_app_import_does_not_load_heavy_deps():
+    probe = (
+        "import sys, json; import backend.app.main; "
+        "print(json.dumps([m for m in ('cv2', 'numpy', 'reportlab', 'openai') if m in sys.modules]))"
+    )
+    out = subprocess.run([sys.executable, "-c", probe], cwd=str(REPO_DIR), capture_output=True, text=True, check=True)
+    assert json.loads(out.stdout.strip().splitlines()[-1]) == []
+
+
+def test_startup_report_lists_router_imports():
+    r = client.get("/api/diagnostics/startup")
+    assert r.status_code == 200
+    data = r.json()
+    assert "backend.app.routers.analyze" in data["import_ms"]
+    assert set(data["heavy_modules_loaded"]) >= {"cv2", "numpy", "reportlab"}
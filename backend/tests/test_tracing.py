@@ -0,0 +1,81 @@
+import base64
+import json
+import logging
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+from backend.app.main import app
+from backend.app.services import tracing
+
+client = TestClient(app)
+SAMPLE_IMAGE = Path(__file__).resolve().parents[2] / "uploads" / "sample.jpg"
+
+
+def _request_logs(caplog):
+    return [json.loads(r.getMessage()) for r in caplog.records if r.name == "coatvision.request"]
+
+
+def test_request_id_is_assigned_or_propagated():
+    r = client.get("/health")
+    assert len(r.headers["x-request-id"]) == 32
+
+    r = client.get("/health", headers={"X-Request-ID": "edge-123"})
+    assert r.headers["x-request-id"] == "edge-123"
+
+
+def test_structured_log_contains_db_spans(caplog):
+    caplog.set_level(logging.INFO, logger="coatvision.request")
+    client.get("/api/training-sessions/", headers={"X-Request-ID": "trace-db"})
+    record = [r for r in _request_logs(caplog) if r["request_id"] == "trace-db"][0]
+    assert record["route"] == "/api/training-sessions/"
+    assert record["status"] == 200
+    assert record["spans"]["db"]["count"] >= 1
+
+
+def test_slow_request_writes_profile(monkeypatch, tmp_path, caplog):
+    monkeypatch.setattr(tracing, "PROFILE_ENABLED", True)
+    monkeypatch.setattr(tracing, "SLOW_REQUEST_MS", 0.0)
+    monkeypatch.setattr(tracing._sampler, "interval", 0.001)
+    monkeypatch.setenv("COATVISION_PROFILE_DIR", str(tmp_path))
+    caplog.set_level(logging.INFO, logger="coatvision.request")
+
+    image = base64.b64encode(SAMPLE_IMAGE.read_bytes()).decode()
+    r = client.post("/api/analyze/base64", json={"image": image}, headers={"X-Request-ID": "slow-1"})
+    assert r.status_code == 200
+
+    record = [r for r in _request_logs(caplog) if r["request_id"] == "slow-1"][0]
+    assert "decode" in record["spans"] and "laplacian" in record["spans"]
+    profile = json.loads(Path(record["profile"]).read_text())
+    assert profile["request_id"] == "slow-1"
+    assert any("analyze.py" in line for line in profile["folded"])
+
+
+def test_sampler_only_samples_the_traced_request_threads():
+    import threading
+    import time
+
+    sampler = tracing.StackSampler(interval_ms=1)
+    stop = threading.Event()
+
+    def unrelated_busy_loop():
+        while not stop.is_set():
+            sum(range(1000))
+
+    other = threading.Thread(target=unrelated_busy_loop)
+    other.start()
+    trace = tracing.Trace("threads-1")
+    sampler.attach(trace)
+    try:
+        deadline = time.perf_counter() + 0.3
+
+        def traced_busy_loop():
+            while time.perf_counter() < deadline:
+                sum(range(1000))
+
+        traced_busy_loop()
+    finally:
+        sampler.detach(trace)
+        stop.set()
+        other.join()
+    assert any("traced_busy_loop" in stack for stack in trace.samples)
+    assert not any("unrelated_busy_loop" in stack for stack in trace.samples)
@@ -0,0 +1,66 @@
+from fastapi.testclient import TestClient
+from backend.app.main import app
+
+client = TestClient(app)
+
+
+def _create(panel="front_fender", phase="phase_1_base_info"):
+    body = {
+        "car_brand": "Tesla",
+        "panel": panel,
+        "color": "black",
+        "color_code": "PMBL",
+        "phase": phase,
+    }
+    r = client.post("/api/training-sessions/", json=body)
+    assert r.status_code == 200
+    return r.json()["session"]
+
+
+def test_create_and_list_sessions_paginated():
+    first = _create(panel="hood")
+    second = _create(panel="hood")
+
+    r = client.get("/api/training-sessions/", params={"panel": "hood", "limit": 1})
+    assert r.status_code == 200
+    data = r.json()
+    assert data["total"] == 2
+    assert len(data["sessions"]) == 1
+    assert data["next_offset"] == 1
+
+    r = client.get("/api/training-sessions/", params={"panel": "hood", "limit": 1, "offset": 1})
+    ids = {data["sessions"][0]["id"], r.json()["sessions"][0]["id"]}
+    assert ids == {first["id"], second["id"]}
+    assert r.json()["next_offset"] is None
+
+
+def test_bulk_add_images_updates_counts():
+    session = _create(panel="roof", phase="phase_5_new_light")
+    paths = [f"training_data/roof_{i}.jpg" for i in range(1200)]
+
+    r = client.post(f"/api/training-sessions/{session['id']}/images/bulk", json={"image_paths": paths})
+    assert r.status_code == 200
+    assert r.json()["added"] == 1200
+    assert r.json()["image_count"] == 1200
+
+    r = client.get(f"/api/training-sessions/{session['id']}/images", params={"limit": 500})
+    page = r.json()
+    assert len(page["images"]) == 500
+    r = client.get(
+        f"/api/training-sessions/{session['id']}/images",
+        params={"limit": 500, "after_id": page["next_after_id"]},
+    )
+    assert r.json()["images"][0]["path"] == "training_data/roof_500.jpg"
+
+    counts = client.get("/api/training-sessions/counts").json()["counts"]
+    roof = [c for c in counts if c["panel"] == "roof" and c["phase"] == "phase_5_new_light"]
+    assert roof == [{"phase": "phase_5_new_light", "panel": "roof", "session_count": 1, "image_count": 1200}]
+
+
+def test_unknown_session_and_phase():
+    assert client.get("/api/training-sessions/does-not-exist").status_code == 404
+    r = client.post(
+        "/api/training-sessions/",
+        json={"car_brand": "x", "panel": "y", "color": "z", "color_code": "c", "phase": "phase_9"},
+    )
+    assert r.status_code == 422
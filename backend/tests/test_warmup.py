@@ -0,0 +1,21 @@
+import os
+
+from fastapi.testclient import TestClient
+from backend.app import warmup
+from backend.app.main import app
+
+client = TestClient(app)
+
+
+def test_warmup_analysis_runs_full_pipeline():
+    metrics = warmup.warmup_analysis()
+    assert 0 <= metrics["cqi"] <= 100
+    assert "laplacian_variance" in metrics
+
+
+def test_workers_endpoint_reports_own_rss():
+    r = client.get("/api/diagnostics/workers")
+    assert r.status_code == 200
+    data = r.json()
+    own = [w for w in data["workers"] if w["pid"] == os.getpid()]
+    assert own and own[0]["rss_bytes"] > 0
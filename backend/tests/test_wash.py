@@ -18,3 +18,112 @@ def test_analyze_wash():
     assert data["status"] == "analyzed"
     assert data["wash_count"] == 10
     assert data["durability_score"] == max(0, 100 - (10 * 2))
+
+
+def test_live_analysis_with_vehicle_meta_is_recorded():
+    import cv2
+    import numpy as np
+
+    jpeg = cv2.imencode(".jpg", np.full((48, 64, 3), 120, np.uint8))[1].tobytes()
+    r = client.post("/v1/coatvision/analyze-live?vehicleId=EV-1&panel=hood&productId=7",
+                    content=jpeg, headers={"content-type": "image/jpeg"})
+    assert r.status_code == 200
+    analysis_id = r.json()["analysisId"]
+
+    event = client.post("/api/wash/events", json={"vehicle_id": "EV-1", "panel": "hood", "wash_count": 0}).json()
+    assert event["event"]["analysis_id"] == analysis_id and event["event"]["retention"] is None
+    assert event["prediction"]["product_key"] == "7"
+
+
+def test_same_second_live_analyses_link_to_their_own_panel():
+    import cv2
+    import numpy as np
+
+    jpeg = cv2.imencode(".jpg", np.full((48, 64, 3), 120, np.uint8))[1].tobytes()
+    results = [client.post(f"/v1/coatvision/analyze-live?vehicleId={vehicle}&panel=roof&productId={product}",
+                           content=jpeg, headers={"content-type": "image/jpeg"}).json()
+               for vehicle, product in (("SEC-1", 11), ("SEC-2", 12))]
+    # Samme sekund: resultat-id-ene må likevel være forskjellige
+    assert results[0]["id"] != results[1]["id"]
+    by_result_id = client.post("/api/wash/analyze", json={"wash_count": 5, "image_id": results[0]["id"]}).json()
+    by_analysis_id = client.post("/api/wash/analyze",
+                                 json={"wash_count": 5, "analysis_id": results[0]["analysisId"]}).json()
+    assert by_result_id["analysis_id"] == by_analysis_id["analysis_id"] == results[0]["analysisId"]
+    assert by_analysis_id["product_key"] == "11"
+    assert client.post("/api/wash/analyze", json={"wash_count": 5, "analysis_id": 999999}).status_code == 404
+
+
+def test_wash_events_fit_product_curve_incrementally():
+    from backend.app.db import SessionLocal
+    from backend.app.services import analysis_store, wash_model
+
+    with SessionLocal() as db:
+        ids = {}
+        for vehicle in ("AB1", "AB2"):
+            analysis_store.record_analysis(db, vehicle, "door", {"cqi": 80.0, "cvi": 70.0}, product_id=42)
+            for washes, cqi in ((10, 64.0), (20, 52.0)):
+                ids[vehicle, washes] = analysis_store.record_analysis(
+                    db, vehicle, "door", {"cqi": cqi, "cvi": 60.0}, product_id=42).id
+
+    before = client.post("/api/wash/analyze", json={"wash_count": 20, "product_id": 42}).json()
+    assert before["model"] == "default" and before["durability_score"] == 60
+
+    for (vehicle, washes), analysis_id in ids.items():
+        r = client.post("/api/wash/events", json={"vehicle_id": vehicle, "panel": "door",
+                                                  "wash_count": washes, "analysis_id": analysis_id})
+        assert r.status_code == 200
+    assert r.json()["event"]["retention"] == 65.0
+
+    after = client.post("/api/wash/analyze", json={"wash_count": 20, "product_id": 42}).json()
+    assert after["model"] == "fitted" and after["samples"] == 4
+    # Observert retensjon 0.8 etter 10 og 0.65 etter 20 vask; prior 0.02 trekker litt opp
+    assert 0.021 < after["decay_per_wash"] < 0.022
+    assert abs(after["durability_score"] - 65) < 1.5 and after["washes_until_recoat"] == 33
+    assert wash_model.fits._fits["42"][1].samples == 4
+
+    with SessionLocal() as db:
+        analysis_store.record_analysis(db, "AB1", "door", {"cqi": 40.0, "cvi": 50.0}, image_id="res_ab1", product_id=42)
+    linked = client.post("/api/wash/analyze", json={"wash_count": 30, "image_id": "res_ab1"}).json()
+    assert linked["product_key"] == "42" and linked["observed_retention"] == 50.0
+
+
+def test_wash_event_rejects_foreign_analysis():
+    from backend.app.db import SessionLocal
+    from backend.app.services import analysis_store
+
+    with SessionLocal() as db:
+        other = analysis_store.record_analysis(db, "ZZ9", "roof", {"cqi": 50.0, "cvi": 50.0}).id
+    r = client.post("/api/wash/events", json={"vehicle_id": "AB1", "panel": "door", "wash_count": 3,
+                                              "analysis_id": other})
+    assert r.status_code == 409
+    assert client.post("/api/wash/events", json={"vehicle_id": "AB1", "panel": "door", "wash_count": 3,
+                                                 "analysis_id": 999999}).status_code == 404
+
+
+def test_accumulate_upserts_and_cache_reloads_other_workers_events(monkeypatch):
+    from backend.app.db import SessionLocal
+    from backend.app.models.wash import WashModel
+    from backend.app.services import wash_model
+
+    cache = wash_model.FitCache(ttl=60, maxsize=2)
+    with SessionLocal() as db:
+        assert cache.get(db, "upsert-1").samples == 0
+    # To "arbeidere" med hver sin sesjon; den andre finner raden den første la inn
+    with SessionLocal() as first, SessionLocal() as second:
+        assert wash_model._accumulate(first, "upsert-1", 2.0, 0.1).samples == 1
+        first.commit()
+        row = wash_model._accumulate(second, "upsert-1", 3.0, 0.2)
+        second.commit()
+        assert (row.samples, row.sum_xx) == (2, 13.0)
+
+    with SessionLocal() as db:
+        assert cache.get(db, "upsert-1").samples == 0
+        now = wash_model.time.monotonic()
+        monkeypatch.setattr(wash_model.time, "monotonic", lambda: now + 61)
+        assert cache.get(db, "upsert-1").samples == 2
+        cache.get(db, "upsert-2")
+        cache.get(db, "upsert-3")
+    assert list(cache._fits) == ["upsert-2", "upsert-3"]
+    with SessionLocal() as db:
+        db.query(WashModel).filter(WashModel.product_key == "upsert-1").delete()
+        db.commit()